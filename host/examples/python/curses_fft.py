@@ -10,7 +10,6 @@ Curses FFT example using Python API
 
 import argparse
 import curses as cs
-import numpy as np
 import uhd
 
 
@@ -28,17 +27,6 @@ def parse_args():
     return parser.parse_args()
 
 
-def psd(nfft, samples):
-    """Return the power spectral density of `samples`"""
-    window = np.hamming(nfft)
-    result = np.multiply(window, samples)
-    result = np.fft.fftshift(np.fft.fft(result, nfft))
-    result = np.square(np.abs(result))
-    result = np.nan_to_num(10.0 * np.log10(result))
-    result = np.abs(result)
-    return result
-
-
 def clip(minval, maxval, value):
     """Clip the value between a and b"""
     return min(minval, max(maxval, value))
@@ -66,28 +54,29 @@ def main():
     y_axis_width = 10
     y_axis = cs.newwin(height, y_axis_width, 0, 0)
 
-    # Create the buffer to recv samples
+    # Start streaming. Samples are received in the background while the FFT
+    # is drawn. Blocks which arrive while drawing are dropped, so we always
+    # show the most recent samples.
     num_samps = max(args.nsamps, width)
-    samples = np.empty((1, num_samps), dtype=np.complex64)
-
-    st_args = uhd.usrp.StreamArgs("fc32", "sc16")
-    st_args.channels = [args.channel]
-
-    metadata = uhd.types.RXMetadata()
-    streamer = usrp.get_rx_stream(st_args)
-    buffer_samps = streamer.get_max_num_samps()
-    recv_buffer = np.zeros((1, buffer_samps), dtype=np.complex64)
-
-    stream_cmd = uhd.types.StreamCMD(uhd.types.StreamMode.start_cont)
-    stream_cmd.stream_now = True
-    streamer.issue_stream_cmd(stream_cmd)
+    blocks = usrp.stream_blocks(channels=[args.channel], block_samps=num_samps,
+                                num_blocks=2, overflow_policy='drop_oldest')
 
     db_step = float(args.dyn) / (height - 1.0)
     db_start = db_step * int((args.ref - args.dyn) / db_step)
     db_stop = db_step * int(args.ref / db_step)
 
+    # One bin per column. The estimator keeps its window and buffers, so we
+    # only need a new one when the screen is resized.
+    psd = uhd.dsp.signals.WelchPSD(width)
+
     try:
-        while True:
+        for block in blocks:
+            if block.dropped_metadata is not None:
+                print(block.dropped_metadata.strerror())
+            if block.metadata.error_code != uhd.types.RXMetadataErrorCode.none:
+                print(block.metadata.strerror())
+            if not block.samples.shape[1]:
+                continue
             # Resize the frequency plot on screen resize
             screen.clear()
             if cs.is_term_resized(height, width):
@@ -99,6 +88,7 @@ def main():
                 db_stop = db_step * int(args.ref / db_step)
 
                 y_axis.clear()
+                psd = uhd.dsp.signals.WelchPSD(width)
 
             # Create the vertical (dBfs) axis
             y_axis.addstr(0, 1, "{:> 6.2f} |-".format(db_stop))
@@ -111,23 +101,13 @@ def main():
                 pass
             y_axis.refresh()
 
-            # Receive the samples
-            recv_samps = 0
-            while recv_samps < num_samps:
-                samps = streamer.recv(recv_buffer, metadata)
-
-                if metadata.error_code != uhd.types.RXMetadataErrorCode.none:
-                    print(metadata.strerror())
-                if samps:
-                    real_samps = min(num_samps - recv_samps, samps)
-                    samples[:, recv_samps:recv_samps + real_samps] = recv_buffer[:, 0:real_samps]
-                    recv_samps += real_samps
-
-            # Get the power in each bin
-            bins = psd(width, samples[args.channel][0:width])
+            # Get the power in each bin, averaged over the whole block
+            psd.reset()
+            psd.update(block.samples[0])
+            bins = psd.get_psd_dbfs()
 
             for i in range(y_axis_width, width):
-                vertical_slot = clip(height, 0, np.int(bins[i] / db_step))
+                vertical_slot = clip(height, 0, int((db_stop - bins[i]) / db_step))
                 try:
                     for j in range(vertical_slot, height):
                         screen.addch(j, i, '*')
@@ -138,8 +118,7 @@ def main():
     except KeyboardInterrupt:
         pass
 
-    stream_cmd = uhd.types.StreamCMD(uhd.types.StreamMode.stop_cont)
-    streamer.issue_stream_cmd(stream_cmd)
+    blocks.stop()
 
     cs.curs_set(1)
     cs.nocbreak()
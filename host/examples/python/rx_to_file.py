@@ -25,6 +25,15 @@ def parse_args():
     parser.add_argument("-g", "--gain", type=int, default=10)
     parser.add_argument("-n", "--numpy", default=False, action="store_true",
                         help="Save output file in NumPy format (default: No)")
+    parser.add_argument("--format", default="raw", choices=("raw", "npy", "sigmf"),
+                        help="Output file format. --numpy is the same as --format npy.")
+    parser.add_argument("--cpu-format", default="fc32", choices=("fc32", "sc16"),
+                        help="Sample format in the file. sc16 writes the samples as "
+                             "they come over the wire, without converting them.")
+    parser.add_argument("--interleave", default=False, action="store_true",
+                        help="Interleave the samples of all channels, instead of "
+                             "writing one channel after the other. Always on for "
+                             "--format sigmf.")
     return parser.parse_args()
 
 
@@ -35,12 +44,18 @@ def main():
     num_samps = int(np.ceil(args.duration*args.rate))
     if not isinstance(args.channels, list):
         args.channels = [args.channels]
-    samps = usrp.recv_num_samps(num_samps, args.freq, args.rate, args.channels, args.gain)
-    with open(args.output_file, 'wb') as out_file:
-        if args.numpy:
-            np.save(out_file, samps, allow_pickle=False, fix_imports=False)
-        else:
-            samps.tofile(out_file)
+    file_format = "npy" if args.numpy else args.format
+    # Samples are written while streaming, so long captures don't need to fit
+    # into memory
+    capture = usrp.recv_to_file(args.output_file, num_samps, args.freq, args.rate,
+                                args.channels, args.gain, file_format=file_format,
+                                cpu_format=args.cpu_format,
+                                interleave=args.interleave or file_format == "sigmf")
+    print("Wrote {} samples per channel.".format(capture.num_samps))
+    for event in capture.events:
+        print("{} after {} samples ({} samples lost)".format(
+            event.error, event.offset,
+            "?" if event.lost_samps is None else event.lost_samps))
 
 if __name__ == "__main__":
     main()
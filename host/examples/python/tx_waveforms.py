@@ -14,10 +14,10 @@ import uhd
 
 WAVEFORMS = {
     "sine": lambda n, tone_offset, rate: np.exp(n * 2j * np.pi * tone_offset / rate),
-    "square": lambda n, tone_offset, rate: np.sign(WAVEFORMS["sine"](n, tone_offset, rate)),
-    "const": lambda n, tone_offset, rate: 1 + 1j,
+    "square": lambda n, tone_offset, rate: np.sign(WAVEFORMS["sine"](n, tone_offset, rate).real),
+    "const": lambda n, tone_offset, rate: np.full(n.shape, 1 + 1j),
     "ramp": lambda n, tone_offset, rate:
-            2*(n*(tone_offset/rate) - np.floor(float(0.5 + n*(tone_offset/rate))))
+            2*(n*(tone_offset/rate) - np.floor(0.5 + n*(tone_offset/rate)))
 }
 
 
@@ -43,12 +43,17 @@ def main():
     usrp = uhd.usrp.MultiUSRP(args.args)
     if not isinstance(args.channels, list):
         args.channels = [args.channels]
-    data = np.array(
-        list(map(lambda n: args.wave_ampl * WAVEFORMS[args.waveform](n, args.wave_freq, args.rate),
-                 np.arange(
-                     int(10 * np.floor(args.rate / args.wave_freq)),
-                     dtype=np.complex64))),
-        dtype=np.complex64)  # One period
+    if args.waveform == "sine":
+        # A phase-continuous tone, shared with other users of the same tone.
+        # Like the other waveforms, it only needs a few periods: send_waveform()
+        # repeats it to fill the send buffer.
+        data = uhd.dsp.signals.get_continuous_tone(
+            args.rate, args.wave_freq, args.wave_ampl,
+            desired_size=10 * np.floor(args.rate / args.wave_freq))
+    else:
+        n = np.arange(int(10 * np.floor(args.rate / args.wave_freq)))
+        data = (args.wave_ampl * WAVEFORMS[args.waveform](
+            n, args.wave_freq, args.rate)).astype(np.complex64)
 
     usrp.send_waveform(data, args.duration, args.freq, args.rate,
                        args.channels, args.gain)
@@ -34,7 +34,11 @@ def parse_args():
                         help="RX reference power level. "
                              "This should be higher than the expected power.")
     parser.add_argument("-n", "--samps-per-est", type=float, default=1e6,
-                        help="Samples per estimate.")
+                        help="Maximum number of samples per estimate.")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="Stop collecting samples for an estimate once its "
+                             "standard error is below this value (in dB). "
+                             "Set to 0 to always use --samps-per-est samples.")
     parser.add_argument("--mode", choices=['one-shot', 'continuous'], default='one-shot',
                         help="Measure once, or keep measuring until Ctrl-C is pressed.")
     return parser.parse_args()
@@ -123,7 +127,8 @@ def main():
     while RUN:
         try:
             power_dbfs = uhd.dsp.signals.get_usrp_power(
-                streamer, num_samps=int(args.samps_per_est))
+                streamer, num_samps=int(args.samps_per_est),
+                tolerance=args.tolerance or None)
         except RuntimeError:
             # This is a hack b/c the signal handler is not gracefully handling
             # SIGINT
@@ -7,11 +7,174 @@
 Utilities for generating/analyzing signals
 """
 
+import collections
 import math
+import threading
 import numpy
 import uhd
 
-def get_continuous_tone(rate, freq, ampl, desired_size=None, max_size=None):
+class WaveformCache:
+    """
+    LRU cache for generated waveforms, limited in the number of waveforms and
+    in the total memory they use.
+
+    Waveforms are shared between all callers that ask for the same key, so
+    they must not be modified in place.
+    """
+    def __init__(self, max_entries=32, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._waveforms = collections.OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, generator):
+        """
+        Return the waveform for key. If it's not cached, call generator() to
+        create it, and cache the result. Waveforms larger than max_bytes are
+        not cached.
+        """
+        with self._lock:
+            waveform = self._waveforms.get(key)
+            if waveform is not None:
+                self._waveforms.move_to_end(key)
+                self.hits += 1
+                return waveform
+            self.misses += 1
+        waveform = generator()
+        if waveform.nbytes > self.max_bytes:
+            return waveform
+        with self._lock:
+            if key not in self._waveforms:
+                self._waveforms[key] = waveform
+                self._nbytes += waveform.nbytes
+            while len(self._waveforms) > self.max_entries \
+                    or self._nbytes > self.max_bytes:
+                _, evicted = self._waveforms.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+        return waveform
+
+    def clear(self):
+        """
+        Drop all cached waveforms
+        """
+        with self._lock:
+            self._waveforms.clear()
+            self._nbytes = 0
+
+    def get_nbytes(self):
+        """
+        Return the number of bytes used by the cached waveforms
+        """
+        return self._nbytes
+
+# The cache used by the get_*() functions below, unless they are given another
+# one
+WAVEFORM_CACHE = WaveformCache()
+
+class NCO:
+    """
+    Numerically controlled oscillator: Generates a continuous tone, or a sum of
+    tones, chunk by chunk, for any number of samples. The phase continues
+    from one call of read() to the next.
+
+    Only one chunk of each tone is ever computed (with numpy.exp()), all
+    samples are then derived from it by a complex rotation. Unlike
+    get_continuous_tone(), the frequencies need not fit into the sampling rate
+    in any way.
+
+    Arguments:
+    rate   -- Sampling rate in Hz.
+    freqs  -- Tone frequency in Hz, or a list of them
+    ampls  -- Amplitude, or a list of them (one per tone)
+    phases -- Start phase in radians, or a list of them (one per tone)
+    chunk_size -- Number of samples computed at once
+    dtype  -- Type of the samples
+    """
+    def __init__(self, rate, freqs, ampls=1.0, phases=0.0, chunk_size=65536,
+                 dtype=numpy.complex64):
+        freqs = numpy.atleast_1d(numpy.asarray(freqs, dtype=numpy.float64))
+        self._ampls = numpy.broadcast_to(
+            numpy.asarray(ampls, dtype=numpy.float64), freqs.shape).copy()
+        self._phases = numpy.broadcast_to(
+            numpy.asarray(phases, dtype=numpy.float64), freqs.shape).copy()
+        self._steps = 2 * numpy.pi * freqs / rate
+        self._chunk = numpy.exp(
+            1j * numpy.outer(self._steps, numpy.arange(chunk_size)))
+        self._scratch = numpy.empty(chunk_size, dtype=numpy.complex128)
+        self.dtype = numpy.dtype(dtype)
+
+    def read(self, num_samps, out=None):
+        """
+        Return the next num_samps samples. If out is given, the samples are
+        written into it (it must have at least num_samps elements), and out is
+        returned.
+        """
+        if out is None:
+            out = numpy.empty(num_samps, dtype=self.dtype)
+        chunk_size = self._chunk.shape[1]
+        pos = 0
+        while pos < num_samps:
+            samps = min(chunk_size, num_samps - pos)
+            numpy.dot(self._ampls * numpy.exp(1j * self._phases),
+                      self._chunk[:, :samps], out=self._scratch[:samps])
+            out[pos:pos + samps] = self._scratch[:samps]
+            self._phases = numpy.mod(self._phases + self._steps * samps, 2 * numpy.pi)
+            pos += samps
+        return out
+
+def get_multi_tone(rate, freqs, ampls, desired_size=None, max_size=None,
+                   dtype=numpy.complex64, cache=WAVEFORM_CACHE):
+    """
+    Return a buffer containing the sum of complex tones at the frequencies
+    freqs. Like get_continuous_tone(), the buffer contains a whole number of
+    periods of all tones, so repeating it produces a continuous signal.
+    The buffer will try and approximate desired_size in length. If it is not
+    possible to create a buffer smaller than max_size, an exception is thrown
+    (in that case, use an NCO).
+
+    The buffer is shared with other callers using the same arguments (see
+    WaveformCache), do not modify it. Pass cache=None to get a new buffer.
+
+    Arguments:
+    rate   -- Sampling rate in Hz.
+    freqs  -- List of tone frequencies in Hz
+    ampls  -- List of amplitudes, one per tone
+    desired_size -- Number of samples ideally in returned buffer
+    max_size -- Number of samples maximally in returned buffer
+    dtype  -- Type of the samples
+    cache  -- The WaveformCache to use, or None
+    """
+    freqs = tuple(freqs)
+    ampls = tuple(ampls)
+    dtype = numpy.dtype(dtype)
+    desired_size = desired_size or 1.0 * rate # About one second worth of data
+    max_size = max_size or 100e6
+    assert all(rate > abs(freq) for freq in freqs)
+    def generate():
+        " Generate the tones "
+        rate_int = int(rate)
+        gcd = rate_int
+        for freq in freqs:
+            gcd = math.gcd(gcd, int(freq))
+        # The tones repeat after rate/gcd samples
+        length = max(rate_int // gcd, 1)
+        if length > max_size:
+            raise ValueError("Cannot create a TX buffer! Rate/Freq ratio is too odd.")
+        period = NCO(rate, freqs, ampls, dtype=dtype).read(length)
+        if length < desired_size:
+            return numpy.tile(period, int(desired_size // length))
+        return period
+    if cache is None:
+        return generate()
+    return cache.get(
+        ('multi_tone', rate, freqs, ampls, desired_size, max_size, dtype.str),
+        generate)
+
+def get_continuous_tone(rate, freq, ampl, desired_size=None, max_size=None,
+                        dtype=numpy.complex64, cache=WAVEFORM_CACHE):
     """
     Return a buffer containing a complex tone at frequency freq. The tone is
     continuous, that is, repeating this signal will produce a continuous phase
@@ -19,30 +182,72 @@ def get_continuous_tone(rate, freq, ampl, desired_size=None, max_size=None):
     The buffer will try and approximate desired_size in length. If it is not
     possible to create a buffer smaller than max_size, an exception is thrown.
 
+    The buffer is cached, see get_multi_tone().
+
     Arguments:
     rate   -- Sampling rate in Hz.
     freq   -- Tone frequency in Hz
     ampl   -- Amplitude
     desired_size -- Number of samples ideally in returned buffer
     max_size -- Number of samples maximally in returned buffer
+    dtype  -- Type of the samples
+    cache  -- The WaveformCache to use, or None
     """
-    desired_size = desired_size or 1.0 * rate # About one second worth of data
-    max_size = max_size or 100e6
     assert rate > freq
-    rate_int = int(rate)
-    freq_int = int(freq)
-    gcd = math.gcd(rate_int, freq_int)
-    rate_int = rate_int / gcd
-    freq_int = freq_int / gcd
-    length = max(freq_int * rate_int, 1) # freq may be zero
-    tone = \
-        numpy.exp(1j * 2 * numpy.pi * (freq/rate) * numpy.arange(length), dtype=numpy.complex64) \
-        * ampl
-    if length < desired_size:
-        tone = numpy.tile(tone, int(desired_size // length))
-    if length > max_size:
-        raise ValueError("Cannot create a TX buffer! Rate/Freq ratio is too odd.")
-    return tone
+    return get_multi_tone(
+        rate, (freq,), (ampl,), desired_size, max_size, dtype, cache)
+
+def get_chirp(rate, start_freq, stop_freq, duration, ampl=1.0,
+              dtype=numpy.complex64, cache=WAVEFORM_CACHE):
+    """
+    Return a buffer containing a linear chirp from start_freq to stop_freq,
+    which lasts duration seconds. The buffer is cached, see get_multi_tone().
+
+    Arguments:
+    rate   -- Sampling rate in Hz.
+    start_freq -- Frequency in Hz at the start of the chirp
+    stop_freq -- Frequency in Hz at the end of the chirp
+    duration -- Length of the chirp in seconds
+    ampl   -- Amplitude
+    dtype  -- Type of the samples
+    cache  -- The WaveformCache to use, or None
+    """
+    dtype = numpy.dtype(dtype)
+    def generate():
+        " Generate the chirp "
+        times = numpy.arange(int(round(duration * rate))) / rate
+        phase = 2 * numpy.pi * (start_freq * times
+                                + (stop_freq - start_freq) / (2 * duration) * times**2)
+        return (ampl * numpy.exp(1j * phase)).astype(dtype)
+    if cache is None:
+        return generate()
+    return cache.get(
+        ('chirp', rate, start_freq, stop_freq, duration, ampl, dtype.str),
+        generate)
+
+def get_noise(num_samps, ampl=1.0, seed=None, dtype=numpy.complex64,
+              cache=WAVEFORM_CACHE):
+    """
+    Return a buffer containing complex white Gaussian noise with RMS amplitude
+    ampl. If seed is given, the noise is reproducible, and cached (see
+    get_multi_tone()).
+
+    Arguments:
+    num_samps -- Number of samples
+    ampl   -- RMS amplitude
+    seed   -- Seed of the random number generator, or None
+    dtype  -- Type of the samples
+    cache  -- The WaveformCache to use, or None
+    """
+    dtype = numpy.dtype(dtype)
+    def generate():
+        " Generate the noise "
+        rng = numpy.random.RandomState(seed)
+        noise = rng.standard_normal((2, int(num_samps))) * (ampl / math.sqrt(2))
+        return (noise[0] + 1j * noise[1]).astype(dtype)
+    if cache is None or seed is None:
+        return generate()
+    return cache.get(('noise', num_samps, ampl, seed, dtype.str), generate)
 
 def get_power_dbfs(signal):
     """
@@ -53,22 +258,427 @@ def get_power_dbfs(signal):
     """
     return 10 * numpy.log10(numpy.var(signal))
 
-def get_usrp_power(streamer, num_samps=1e6, chan=0):
+class _BatchStats:
+    """
+    Running mean and variance (Welford's algorithm) of an estimate computed
+    once per batch of samples. The spread of the per-batch estimates tells how
+    precise their mean is, which is what the estimators below use to decide
+    when they have seen enough samples.
     """
-    Return the measured input power in dBFS
+    def __init__(self, shape=()):
+        self.count = 0
+        self.mean = numpy.zeros(shape)
+        self._m2 = numpy.zeros(shape)
+
+    def add(self, values):
+        """
+        Add the estimates of one or more batches (along the first axis of
+        values)
+        """
+        values = numpy.asarray(values, dtype=numpy.float64).reshape(
+            (-1,) + self.mean.shape)
+        count = len(values)
+        if not count:
+            return
+        mean = values.mean(axis=0)
+        total = self.count + count
+        delta = mean - self.mean
+        self._m2 = self._m2 + ((values - mean)**2).sum(axis=0) \
+            + delta**2 * self.count * count / total
+        self.mean = self.mean + delta * count / total
+        self.count = total
 
-    The return value is a list of dBFS power values, one per channel.
+    def get_stderr(self):
+        """
+        Return the standard error of the mean, or infinity if there are fewer
+        than two batches
+        """
+        if self.count < 2:
+            return numpy.full(self.mean.shape, numpy.inf)
+        return numpy.sqrt(self._m2 / (self.count - 1) / self.count)
+
+class PowerEstimator:
     """
-    recv_buffer = numpy.zeros(
-        (streamer.get_num_channels(), num_samps), dtype=numpy.complex64)
+    Streaming estimate of the power (variance) and DC offset (mean) of a
+    signal. Samples are fed in chunks, e.g., as they come from recv(), and
+    nothing but the running sums is kept.
+
+    The chunks are split into batches of about batch_samps samples, and the
+    spread of the per-batch power estimates gives the precision of the overall
+    estimate. Once its standard error is below tolerance (in dB), and at least
+    min_batches batches were seen, is_converged() returns True.
+
+    Arguments:
+    tolerance   -- Standard error (in dB) at which the estimate is considered
+                   converged. None means it never is.
+    batch_samps -- Nominal number of samples per batch
+    min_batches -- Minimum number of batches before the estimate is considered
+                   converged
+    """
+    def __init__(self, tolerance=0.01, batch_samps=4096, min_batches=8):
+        self.tolerance = tolerance
+        self.batch_samps = batch_samps
+        self.min_batches = min_batches
+        self.reset()
+
+    def reset(self):
+        """
+        Drop all samples seen so far
+        """
+        self.num_samps = 0
+        self._mean = 0j
+        self._m2 = 0.0
+        self._batches = _BatchStats()
+
+    def update(self, samples):
+        """
+        Add a chunk of samples (a 1-D array) to the estimate
+        """
+        samples = numpy.asarray(samples)
+        num_batches = max(1, len(samples) // self.batch_samps)
+        for batch in numpy.array_split(samples, num_batches):
+            num_samps = len(batch)
+            if not num_samps:
+                continue
+            mean = complex(batch.mean(dtype=numpy.complex128))
+            var = numpy.var(batch, dtype=numpy.complex128).real
+            # Merge the batch into the running sums (Chan et al.)
+            total = self.num_samps + num_samps
+            delta = mean - self._mean
+            self._m2 += var * num_samps \
+                + abs(delta)**2 * self.num_samps * num_samps / total
+            self._mean += delta * num_samps / total
+            self.num_samps = total
+            self._batches.add(var)
+
+    def get_mean(self):
+        """
+        Return the mean of the samples, i.e., the DC offset
+        """
+        return self._mean
+
+    def get_variance(self):
+        """
+        Return the variance of the samples, i.e., the power without DC
+        """
+        return self._m2 / self.num_samps if self.num_samps else 0.0
+
+    def get_power_dbfs(self):
+        """
+        Return the power in dBFS, like get_power_dbfs() would for all samples
+        seen so far
+        """
+        return 10 * numpy.log10(self.get_variance())
+
+    def get_stderr_db(self):
+        """
+        Return the standard error of get_power_dbfs() (in dB)
+        """
+        variance = self.get_variance()
+        if not variance:
+            return numpy.inf
+        return 10 * numpy.log10(1 + self._batches.get_stderr() / variance)
+
+    def is_converged(self):
+        """
+        Return True if the estimate is as precise as requested by tolerance
+        """
+        return self.tolerance is not None \
+            and self._batches.count >= self.min_batches \
+            and self.get_stderr_db() <= self.tolerance
+
+class WelchPSD:
+    """
+    Streaming power spectral density estimate using Welch's method: The
+    samples are cut into overlapping, windowed segments of nfft samples, and
+    the periodograms of all segments are averaged.
+
+    Samples are fed in chunks of any size, segments may span chunks. The
+    window and the work buffers are allocated once and reused for every
+    chunk.
+
+    The PSD is scaled such that a tone at the center of a bin shows its
+    power, i.e., a full-scale tone is at 0 dBFS. Bins are in FFT-shifted order
+    (lowest frequency first), see get_freqs().
+
+    is_converged() returns True once the standard error of every bin is below
+    tolerance (in dB), and at least min_segments segments were averaged.
+
+    Arguments:
+    nfft      -- FFT size, i.e., number of bins
+    window    -- Name of a NumPy window function ('hamming', 'hanning',
+                 'blackman', or 'bartlett'), an array of nfft window values,
+                 or None for a rectangular window
+    overlap   -- Overlap between segments, as a fraction of nfft
+    tolerance -- Standard error (in dB) at which the estimate is considered
+                 converged. None means it never is.
+    min_segments -- Minimum number of segments before the estimate is
+                    considered converged
+    """
+    def __init__(self, nfft, window='hamming', overlap=0.5, tolerance=0.1,
+                 min_segments=8):
+        if window is None:
+            window = numpy.ones(nfft)
+        elif isinstance(window, str):
+            window = getattr(numpy, window)(nfft)
+        self._window = numpy.asarray(window, dtype=numpy.float64)
+        if self._window.shape != (nfft,):
+            raise ValueError("Window must have nfft={} values!".format(nfft))
+        self.nfft = nfft
+        self._step = nfft - int(nfft * overlap)
+        if not 0 < self._step <= nfft:
+            raise ValueError("Invalid overlap: {}".format(overlap))
+        self._scale = 1.0 / numpy.sum(self._window)**2
+        self.tolerance = tolerance
+        self.min_segments = min_segments
+        # Samples which are not part of a complete segment yet
+        self._tail = numpy.empty(nfft, dtype=numpy.complex128)
+        # Work buffers, grown as needed
+        self._staging = numpy.empty(0, dtype=numpy.complex128)
+        self._segments = numpy.empty((0, nfft), dtype=numpy.complex128)
+        self._power = numpy.empty((0, nfft))
+        self.reset()
+
+    def reset(self):
+        """
+        Drop all samples seen so far
+        """
+        self._tail_len = 0
+        self._periodograms = _BatchStats((self.nfft,))
+
+    def get_num_segments(self):
+        """
+        Return the number of segments averaged so far
+        """
+        return self._periodograms.count
+
+    def update(self, samples):
+        """
+        Add a chunk of samples (a 1-D array) to the estimate
+        """
+        num_samps = self._tail_len + len(samples)
+        if num_samps < self.nfft:
+            self._tail[self._tail_len:num_samps] = samples
+            self._tail_len = num_samps
+            return
+        if len(self._staging) < num_samps:
+            self._staging = numpy.empty(num_samps, dtype=numpy.complex128)
+        staging = self._staging[:num_samps]
+        staging[:self._tail_len] = self._tail[:self._tail_len]
+        staging[self._tail_len:] = samples
+        num_segments = (num_samps - self.nfft) // self._step + 1
+        segments = numpy.lib.stride_tricks.as_strided(
+            staging, shape=(num_segments, self.nfft),
+            strides=(self._step * staging.itemsize, staging.itemsize),
+            writeable=False)
+        if len(self._segments) < num_segments:
+            self._segments = numpy.empty((num_segments, self.nfft), dtype=numpy.complex128)
+            self._power = numpy.empty((num_segments, self.nfft))
+        windowed = self._segments[:num_segments]
+        power = self._power[:num_segments]
+        numpy.multiply(segments, self._window, out=windowed)
+        numpy.abs(numpy.fft.fft(windowed), out=power)
+        numpy.square(power, out=power)
+        self._periodograms.add(power)
+        consumed = num_segments * self._step
+        self._tail_len = num_samps - consumed
+        self._tail[:self._tail_len] = staging[consumed:]
+
+    def get_psd(self):
+        """
+        Return the PSD (linear power per bin)
+        """
+        return numpy.fft.fftshift(self._periodograms.mean * self._scale)
+
+    def get_psd_dbfs(self, floor=-200.0):
+        """
+        Return the PSD in dBFS per bin. Empty bins are set to floor.
+        """
+        psd = self.get_psd()
+        with numpy.errstate(divide='ignore'):
+            return numpy.maximum(10 * numpy.log10(psd), floor)
+
+    def get_freqs(self, rate=1.0):
+        """
+        Return the frequency of every bin of get_psd(), relative to the
+        center frequency, for a sampling rate of rate.
+        """
+        return numpy.fft.fftshift(numpy.fft.fftfreq(self.nfft, 1.0 / rate))
+
+    def is_converged(self):
+        """
+        Return True if the estimate is as precise as requested by tolerance
+        """
+        if self.tolerance is None or self.get_num_segments() < self.min_segments:
+            return False
+        mean = self._periodograms.mean
+        stderr = self._periodograms.get_stderr()
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            rel_stderr = numpy.where(mean > 0, stderr / mean, 0)
+        return 10 * numpy.log10(1 + numpy.max(rel_stderr)) <= self.tolerance
+
+class IQImbalanceEstimator:
+    """
+    Streaming estimate of the IQ imbalance of a signal: The gain and phase
+    mismatch between I and Q, and the resulting image rejection. This assumes
+    a proper (circularly symmetric) input signal, like noise or an off-center
+    tone, so any correlation between I and Q is attributed to the imbalance.
+    The DC offset is removed first (see PowerEstimator for estimating it).
+
+    Like PowerEstimator, the chunks are split into batches. is_converged()
+    returns True once the standard errors of the gain (in dB) and phase (in
+    degrees) imbalances are both below tolerance.
+
+    Arguments:
+    tolerance   -- Standard error (in dB and degrees) at which the estimate
+                   is considered converged. None means it never is.
+    batch_samps -- Nominal number of samples per batch
+    min_batches -- Minimum number of batches before the estimate is considered
+                   converged
+    """
+    def __init__(self, tolerance=0.1, batch_samps=4096, min_batches=8):
+        self.tolerance = tolerance
+        self.batch_samps = batch_samps
+        self.min_batches = min_batches
+        self.reset()
+
+    def reset(self):
+        """
+        Drop all samples seen so far
+        """
+        self.num_samps = 0
+        self._mean = 0j
+        # Running sums of |x - mean|^2 and (x - mean)^2
+        self._m2 = 0.0
+        self._pseudo_m2 = 0j
+        self._batches = _BatchStats((2,))
+
+    @staticmethod
+    def _get_imbalance(var, pseudo_var):
+        """
+        Return (gain imbalance in dB, phase imbalance in degrees), given the
+        variance E|x|^2 and the pseudo-variance E[x^2] of a zero-mean signal
+        """
+        i_power = (var + pseudo_var.real) / 2
+        q_power = (var - pseudo_var.real) / 2
+        iq_corr = pseudo_var.imag / 2
+        return (10 * numpy.log10(q_power / i_power),
+                numpy.degrees(numpy.arcsin(iq_corr / numpy.sqrt(i_power * q_power))))
+
+    def update(self, samples):
+        """
+        Add a chunk of samples (a 1-D array) to the estimate
+        """
+        samples = numpy.asarray(samples)
+        num_batches = max(1, len(samples) // self.batch_samps)
+        for batch in numpy.array_split(samples, num_batches):
+            num_samps = len(batch)
+            if not num_samps:
+                continue
+            mean = complex(batch.mean(dtype=numpy.complex128))
+            centered = numpy.subtract(batch, mean, dtype=numpy.complex128)
+            var = numpy.vdot(centered, centered).real / num_samps
+            pseudo_var = numpy.dot(centered, centered) / num_samps
+            total = self.num_samps + num_samps
+            delta = mean - self._mean
+            weight = self.num_samps * num_samps / total
+            self._m2 += var * num_samps + abs(delta)**2 * weight
+            self._pseudo_m2 += pseudo_var * num_samps + delta**2 * weight
+            self._mean += delta * num_samps / total
+            self.num_samps = total
+            self._batches.add(self._get_imbalance(var, pseudo_var))
+
+    def get_imbalance(self):
+        """
+        Return the tuple (gain imbalance in dB, phase imbalance in degrees).
+        The gain imbalance is the power of Q relative to I, the phase
+        imbalance is the deviation of the I/Q phase difference from 90
+        degrees.
+        """
+        return self._get_imbalance(self._m2 / self.num_samps,
+                                   self._pseudo_m2 / self.num_samps)
+
+    def get_image_rejection_db(self):
+        """
+        Return the image rejection ratio in dB, i.e., the power of a tone
+        relative to the power of its image
+        """
+        # For x = mu*s + nu*conj(s), |E[x^2]| / E|x|^2 = 2r / (1 + r^2), with
+        # r = |nu / mu|
+        ratio = abs(self._pseudo_m2) / self._m2
+        if not ratio:
+            return numpy.inf
+        image_ampl = (1 - numpy.sqrt(max(1 - ratio**2, 0))) / ratio
+        return -20 * numpy.log10(image_ampl)
+
+    def is_converged(self):
+        """
+        Return True if the estimate is as precise as requested by tolerance
+        """
+        return self.tolerance is not None \
+            and self._batches.count >= self.min_batches \
+            and numpy.all(self._batches.get_stderr() <= self.tolerance)
+
+def run_estimator(streamer, estimator, num_samps=1e6, chan=0, timeout=1.0):
+    """
+    Receive samples from streamer into estimator, until estimator.is_converged()
+    or num_samps samples were received, whichever happens first. The estimator
+    may be any of the estimators above, or anything else with update() and
+    is_converged() methods.
+
+    The samples are received packet by packet into a single buffer, so this
+    does not allocate memory in proportion to num_samps. The streamer must have
+    the fc32 CPU format.
+
+    Arguments:
+    streamer  -- RX streamer
+    estimator -- The estimator which is fed the samples
+    num_samps -- Maximum number of samples to receive
+    chan      -- Streamer channel which is fed to the estimator
+    timeout   -- Timeout (in seconds) for receiving a packet
+
+    Returns the number of samples which were received.
+    """
+    num_samps = int(num_samps)
+    recv_buffer = numpy.empty(
+        (streamer.get_num_channels(), streamer.get_max_num_samps()),
+        dtype=numpy.complex64)
     metadata = uhd.types.RXMetadata()
     stream_cmd = uhd.types.StreamCMD(uhd.types.StreamMode.num_done)
     stream_cmd.num_samps = num_samps
     stream_cmd.stream_now = True
     streamer.issue_stream_cmd(stream_cmd)
-    # Pass in long timeout, so we can rx the entire buffer in one go
-    samps_recvd = streamer.recv(recv_buffer, metadata, 5.0)
-    if samps_recvd != num_samps:
+    samps_recvd = 0
+    try:
+        while samps_recvd < num_samps and not estimator.is_converged():
+            samps = streamer.recv(recv_buffer, metadata, timeout)
+            if metadata.error_code not in (uhd.types.RXMetadataErrorCode.none,
+                                           uhd.types.RXMetadataErrorCode.overflow):
+                raise RuntimeError(
+                    "Error while receiving samples: {}".format(metadata.strerror()))
+            samps = min(samps, num_samps - samps_recvd)
+            estimator.update(recv_buffer[chan, :samps])
+            samps_recvd += samps
+    finally:
+        if samps_recvd < num_samps:
+            # Stop early, and flush the samples which are still in flight
+            streamer.issue_stream_cmd(
+                uhd.types.StreamCMD(uhd.types.StreamMode.stop_cont))
+            while streamer.recv(recv_buffer, metadata, 0.1):
+                pass
+    return samps_recvd
+
+def get_usrp_power(streamer, num_samps=1e6, chan=0, tolerance=None):
+    """
+    Return the measured input power in dBFS of channel chan.
+
+    If tolerance is given, streaming stops as soon as the estimate has a
+    standard error of less than tolerance (in dB), otherwise (or if that takes
+    too long) after num_samps samples.
+    """
+    estimator = PowerEstimator(tolerance)
+    samps_recvd = run_estimator(streamer, estimator, num_samps, chan)
+    if not estimator.is_converged() and samps_recvd != int(num_samps):
         raise RuntimeError(
             "ERROR! get_usrp_power(): Did not receive the correct number of samples!")
-    return get_power_dbfs(recv_buffer[chan])
+    return estimator.get_power_dbfs()
@@ -7,7 +7,9 @@
 Python UHD module containing the MultiUSRP and other objects
 """
 
-from .multi_usrp import MultiUSRP
+from .multi_usrp import MultiUSRP, TxWaveform
+from .rx_blocks import RxBlockStream, RxBlock, CPU_FORMAT_TYPES, SC8_DTYPE
+from .capture import RxCapture, CaptureEvent, SC16_DTYPE
 # Disable PyLint because the entire libtypes modules is a list of renames. It is
 # thus less redundant to do a wildcard import, even if generally discouraged.
 # We could also paste the contents of libtypes.py into here, but by leaving it
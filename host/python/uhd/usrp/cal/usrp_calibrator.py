@@ -23,6 +23,9 @@ PWR_EST_LLIM = -20
 PWR_EST_IDEAL_LEVEL = -6
 PWR_EST_ULIM = -3
 SIGPWR_LOCK_MAX_ITER = 4
+# Standard error (in dB) at which we stop collecting samples for a power
+# estimate. NUM_SAMPS_PER_EST is the upper limit.
+PWR_EST_TOLERANCE = 0.01
 
 # The default distance between frequencies at which we measure
 DEFAULT_FREQ_STEP = 10e6 # Hz
@@ -52,21 +55,10 @@ def get_usrp_power(streamer, num_samps=NUM_SAMPS_PER_EST, chan=0):
     """
     Return the measured input power in dBFS
 
-    The return value is a list of dBFS power values, one per channel.
+    Streaming stops early once the estimate is within PWR_EST_TOLERANCE.
     """
-    recv_buffer = numpy.zeros(
-        (streamer.get_num_channels(), num_samps), dtype=numpy.complex64)
-    metadata = uhd.types.RXMetadata()
-    stream_cmd = uhd.types.StreamCMD(uhd.types.StreamMode.num_done)
-    stream_cmd.num_samps = num_samps
-    stream_cmd.stream_now = True
-    streamer.issue_stream_cmd(stream_cmd)
-    # Pass in long timeout, so we can rx the entire buffer in one go
-    samps_recvd = streamer.recv(recv_buffer, metadata, 5.0)
-    if samps_recvd != num_samps:
-        raise RuntimeError(
-            "ERROR! get_usrp_power(): Did not receive the correct number of samples!")
-    return uhd.dsp.signals.get_power_dbfs(recv_buffer[chan])
+    return uhd.dsp.signals.get_usrp_power(
+        streamer, num_samps, chan, tolerance=PWR_EST_TOLERANCE)
 
 
 def subtract_power(p1_db, p2_db):
@@ -0,0 +1,442 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+""" @package usrp
+Streaming of RX samples to disk
+
+RxCapture receives samples from an RX streamer into a ring of preallocated
+buffers, and writes them to a file from a second thread. Disk I/O thus
+overlaps with streaming, and the memory use does not depend on the length of
+the capture.
+
+By default, the channels are written one after the other (all samples of
+channel 0, then all samples of channel 1, and so on), as samps.tofile() does
+with the array returned by MultiUSRP.recv_num_samps(). With interleave=True,
+they are written interleaved instead (sample 0 of all channels, then sample 1
+of all channels, and so on). The file formats are:
+- 'raw': Samples only
+- 'npy': A NumPy file. The array has the shape (channels, num_samps), so
+  np.load() returns the same array as MultiUSRP.recv_num_samps(). Interleaved
+  files are stored in Fortran order.
+- 'sigmf': A SigMF recording, i.e., a .sigmf-data file with the samples and
+  a .sigmf-meta file with the metadata. Overflows are written as annotations.
+  SigMF requires interleaved channels.
+
+With cpu_format 'fc32', samples are complex64. With 'sc16', the samples are
+passed through in the wire format without converting them to floats, and are
+stored as pairs of int16 (see SC16_DTYPE).
+"""
+
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+from .. import libpyuhd as lib
+
+# NumPy type of a sample in sc16 format
+SC16_DTYPE = np.dtype([('re', '<i2'), ('im', '<i2')])
+
+CPU_FORMATS = {
+    'fc32': (np.dtype(np.complex64), 'cf32_le'),
+    'sc16': (SC16_DTYPE, 'ci16_le'),
+}
+
+FILE_FORMATS = ('raw', 'npy', 'sigmf')
+
+SIGMF_VERSION = '1.0.0'
+
+# An error reported by the streamer during a capture
+# offset -- Number of samples (per channel) which were written to the file
+#           before the error occurred
+# error -- The error, as string (e.g., 'overflow')
+# time -- The time (in seconds, device time) of the first sample after the
+#         error, or None if it is unknown
+# lost_samps -- Number of samples which are missing in the file after offset,
+#               or None if it is unknown
+CaptureEvent = namedtuple('CaptureEvent', ['offset', 'error', 'time', 'lost_samps'])
+
+
+def _get_npy_header(dtype, shape, fortran_order, header_len=None):
+    """
+    Return the header of a .npy file (format version 1.0).
+    If header_len is given, the header is padded to that length, so it can
+    replace a previously written header of that length.
+    """
+    header = "{{'descr': {!r}, 'fortran_order': {!r}, 'shape': {!r}, }}".format(
+        np.lib.format.dtype_to_descr(dtype), bool(fortran_order), tuple(shape))
+    magic = b'\x93NUMPY\x01\x00'
+    if header_len is None:
+        # The total length must be a multiple of 64
+        header_len = -(-(len(magic) + 2 + len(header) + 1) // 64) * 64
+    header += ' ' * (header_len - len(magic) - 2 - len(header) - 1) + '\n'
+    assert len(magic) + 2 + len(header) == header_len
+    return magic + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+
+class RxCapture(object):
+    """
+    Receive samples from an RX streamer into a file.
+
+    >>> capture = RxCapture(streamer, "capture.npy", num_samps=int(1e9),
+    ...                     file_format='npy')
+    >>> capture.start()
+    >>> capture.wait()
+    >>> print(capture.num_samps, capture.events)
+
+    :param streamer: An RX streamer object. Its CPU format must match
+                     cpu_format.
+    :param filename: The file to write. For SigMF, the .sigmf-data and
+                     .sigmf-meta files are named after filename, without its
+                     extension.
+    :param num_samps: Number of samples (per channel) to capture. If None, the
+                      capture runs until stop() is called. Required for the
+                      'npy' format, and for more than one channel if
+                      interleave is False.
+    :param file_format: 'raw', 'npy', or 'sigmf'
+    :param cpu_format: 'fc32' or 'sc16'
+    :param interleave: If True, the samples of all channels are interleaved.
+                       Otherwise, the channels are written one after the
+                       other. Defaults to True for 'sigmf', and to False for
+                       the other formats.
+    :param rate: The sample rate (Hz). Used to calculate the number of lost
+                 samples after an overflow, and for the SigMF metadata.
+    :param num_buffers: Number of buffers in the ring
+    :param buffer_samps: Number of samples (per channel) per buffer. Defaults
+                         to 16 packets.
+    :param recv_timeout: Timeout (in seconds) for receiving samples. A timeout
+                         ends the capture.
+    :param sigmf_metadata: Dictionary with additional entries for the 'global'
+                           object of the SigMF metadata, e.g. 'core:hw'.
+    :param sigmf_capture: Dictionary with additional entries for the capture
+                          segment of the SigMF metadata, e.g. 'core:frequency'.
+    """
+    def __init__(self,
+                 streamer,
+                 filename,
+                 num_samps=None,
+                 file_format='raw',
+                 cpu_format='fc32',
+                 interleave=None,
+                 rate=None,
+                 num_buffers=16,
+                 buffer_samps=None,
+                 recv_timeout=0.5,
+                 sigmf_metadata=None,
+                 sigmf_capture=None):
+        if file_format not in FILE_FORMATS:
+            raise ValueError("Invalid file format `{}'! Must be one of: {}".format(
+                file_format, ', '.join(FILE_FORMATS)))
+        if cpu_format not in CPU_FORMATS:
+            raise ValueError("Invalid CPU format `{}'! Must be one of: {}".format(
+                cpu_format, ', '.join(CPU_FORMATS)))
+        if file_format == 'npy' and num_samps is None:
+            raise ValueError("The npy format requires num_samps!")
+        if interleave is None:
+            interleave = file_format == 'sigmf'
+        if file_format == 'sigmf' and not interleave:
+            raise ValueError("The sigmf format requires interleaved channels!")
+        self._streamer = streamer
+        self._num_chans = streamer.get_num_channels()
+        if self._num_chans > 1 and not interleave and num_samps is None:
+            raise ValueError("Writing the channels one after the other requires "
+                             "num_samps! Use interleave=True instead.")
+        self._interleave = interleave
+        self._dtype, self._sigmf_datatype = CPU_FORMATS[cpu_format]
+        self._file_format = file_format
+        self._num_samps = num_samps
+        self._rate = rate
+        self._recv_timeout = recv_timeout
+        self._sigmf_metadata = sigmf_metadata or {}
+        self._sigmf_capture = sigmf_capture or {}
+        if file_format == 'sigmf':
+            base_name = os.path.splitext(filename)[0]
+            self._data_filename = base_name + '.sigmf-data'
+            self._meta_filename = base_name + '.sigmf-meta'
+        else:
+            self._data_filename = filename
+            self._meta_filename = None
+        buffer_samps = buffer_samps or 16 * streamer.get_max_num_samps()
+        # Buffers are passed from the receive thread to the writer thread in
+        # full_buffers as (buffer, number of samples), and back in
+        # free_buffers. None in full_buffers ends the writer thread.
+        self._free_buffers = queue.Queue()
+        self._full_buffers = queue.Queue()
+        for _ in range(num_buffers):
+            self._free_buffers.put(
+                np.empty((self._num_chans, buffer_samps), dtype=self._dtype))
+        # Interleaving the channels needs a copy. It's done in the writer
+        # thread, into this buffer.
+        self._interleave_buffer = \
+            np.empty((buffer_samps, self._num_chans), dtype=self._dtype) \
+            if self._num_chans > 1 and interleave else None
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._error = None
+        self._npy_header_len = None
+        # Number of samples (per channel) written by the writer thread
+        self._samps_written = 0
+        # Host time of the first sample
+        self._start_datetime = None
+        ## Results
+        # Number of samples (per channel) received
+        self.num_samps = 0
+        # List of CaptureEvent
+        self.events = []
+        # Number of times the receive thread had to wait for a free buffer,
+        # i.e., the disk was too slow
+        self.writer_stalls = 0
+        # Time of the first sample (device time), or None
+        self.start_time = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        self.wait()
+
+    def start(self, stream_cmd=None, first_timeout=None):
+        """
+        Open the file, issue stream_cmd, and start the capture threads. If
+        stream_cmd is None, streaming starts immediately.
+        first_timeout is the timeout (in seconds) for receiving the first
+        samples. It must be long enough if streaming starts in the future. If
+        None, recv_timeout is used.
+        """
+        if stream_cmd is None:
+            stream_cmd = lib.types.stream_cmd(lib.types.stream_mode.start_cont)
+            stream_cmd.stream_now = True
+        out_file = open(self._data_filename, 'w+b', buffering=0)
+        try:
+            if self._file_format == 'npy':
+                header = _get_npy_header(
+                    self._dtype, (self._num_chans, self._num_samps), self._interleave)
+                self._npy_header_len = len(header)
+                out_file.write(header)
+            self._threads = [
+                threading.Thread(target=self._write_loop, args=(out_file,),
+                                 name="RxCaptureWriter"),
+                threading.Thread(target=self._recv_loop, args=(stream_cmd, first_timeout),
+                                 name="RxCaptureRecv"),
+            ]
+        except:
+            out_file.close()
+            raise
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """
+        End the capture. Returns immediately, use wait() to wait for all
+        samples to be written.
+        """
+        self._stop_event.set()
+
+    def wait(self, timeout=None):
+        """
+        Wait until the capture is done and the file is complete. Returns False
+        if the timeout expired before that, True otherwise.
+        Errors in the capture threads (e.g., a full disk) are re-raised here.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None
+                        else max(0, deadline - time.monotonic()))
+            if thread.is_alive():
+                return False
+        if self._error is not None:
+            raise self._error
+        return True
+
+    def _recv_loop(self, stream_cmd, first_timeout):
+        """
+        Receive thread: Fill buffers, and hand them to the writer thread
+        """
+        metadata = lib.types.rx_metadata()
+        # Device time of the next sample, for calculating the number of lost
+        # samples after an error
+        next_time = None
+        try:
+            self._streamer.issue_stream_cmd(stream_cmd)
+            timeout = first_timeout or self._recv_timeout
+            while not self._stop_event.is_set() and \
+                    (self._num_samps is None or self.num_samps < self._num_samps):
+                try:
+                    buf = self._free_buffers.get(False)
+                except queue.Empty:
+                    self.writer_stalls += 1
+                    buf = self._free_buffers.get()
+                samps = self._streamer.recv(buf, metadata, timeout)
+                timeout = self._recv_timeout
+                if self._num_samps is not None:
+                    samps = min(samps, self._num_samps - self.num_samps)
+                if samps and self._start_datetime is None:
+                    self._start_datetime = datetime.datetime.utcnow()
+                if samps and metadata.has_time_spec:
+                    chunk_time = metadata.time_spec.get_real_secs()
+                    if self.start_time is None:
+                        self.start_time = chunk_time
+                    if self.events and self.events[-1].lost_samps is None \
+                            and self.events[-1].offset == self.num_samps \
+                            and next_time is not None and self._rate:
+                        self.events[-1] = self.events[-1]._replace(
+                            time=chunk_time,
+                            lost_samps=max(0, int(round(
+                                (chunk_time - next_time) * self._rate))))
+                    if self._rate:
+                        next_time = chunk_time + samps / self._rate
+                if samps:
+                    self._full_buffers.put((buf, samps))
+                    self.num_samps += samps
+                else:
+                    self._free_buffers.put(buf)
+                error_code = metadata.error_code
+                if error_code == lib.types.rx_metadata_error_code.none:
+                    continue
+                self.events.append(CaptureEvent(
+                    self.num_samps,
+                    'drop' if metadata.out_of_sequence else str(error_code).split('.')[-1],
+                    None, None))
+                if error_code == lib.types.rx_metadata_error_code.timeout:
+                    break
+        except Exception as ex: # pylint: disable=broad-except
+            self._error = ex
+        finally:
+            self._full_buffers.put(None)
+            self._stop_stream(metadata)
+
+    def _stop_stream(self, metadata):
+        """
+        Issue the stop-stream command and flush the queue
+        """
+        try:
+            self._streamer.issue_stream_cmd(
+                lib.types.stream_cmd(lib.types.stream_mode.stop_cont))
+            flush_buffer = np.empty(
+                (self._num_chans, self._streamer.get_max_num_samps()),
+                dtype=self._dtype)
+            while self._streamer.recv(flush_buffer, metadata):
+                pass
+        except Exception as ex: # pylint: disable=broad-except
+            if self._error is None:
+                self._error = ex
+
+    def _write_loop(self, out_file):
+        """
+        Writer thread: Write full buffers to out_file
+        """
+        try:
+            item = self._full_buffers.get()
+            while item is not None:
+                buf, samps = item
+                # After an error, buffers are only passed back, until the
+                # receive thread has stopped
+                if self._error is None:
+                    try:
+                        self._write_buffer(out_file, buf, samps)
+                    except Exception as ex: # pylint: disable=broad-except
+                        self._error = ex
+                        self._stop_event.set()
+                self._free_buffers.put(buf)
+                item = self._full_buffers.get()
+            if self._error is None:
+                self._finish_file(out_file)
+        except Exception as ex: # pylint: disable=broad-except
+            self._error = ex
+        finally:
+            out_file.close()
+
+    def _write_buffer(self, out_file, buf, samps):
+        """
+        Write the first samps samples of buf
+        """
+        if self._interleave_buffer is not None:
+            np.copyto(self._interleave_buffer[:samps], buf[:, :samps].T)
+            out_file.write(self._interleave_buffer[:samps].data)
+        elif self._num_chans == 1:
+            out_file.write(buf[0, :samps].data)
+        else:
+            # Every channel has its own section of num_samps samples
+            for chan in range(self._num_chans):
+                out_file.seek(self._get_file_offset(chan, self._samps_written))
+                out_file.write(buf[chan, :samps].data)
+        self._samps_written += samps
+
+    def _get_file_offset(self, chan, samp, chan_samps=None):
+        """
+        Return the file offset of sample samp of channel chan, in a file where
+        the channels are written one after the other, with chan_samps samples
+        each (default: num_samps)
+        """
+        chan_samps = self._num_samps if chan_samps is None else chan_samps
+        return (self._npy_header_len or 0) + \
+            (chan * chan_samps + samp) * self._dtype.itemsize
+
+    def _compact_channels(self, out_file):
+        """
+        Move the channels of a capture which ended early together, so they
+        follow each other without gaps, and truncate the file
+        """
+        chunk_samps = 1 << 20
+        for chan in range(1, self._num_chans):
+            for samp in range(0, self._samps_written, chunk_samps):
+                chunk_len = min(chunk_samps, self._samps_written - samp)
+                out_file.seek(self._get_file_offset(chan, samp))
+                chunk = out_file.read(chunk_len * self._dtype.itemsize)
+                out_file.seek(self._get_file_offset(chan, samp, self._samps_written))
+                out_file.write(chunk)
+        out_file.truncate(self._get_file_offset(self._num_chans, 0, self._samps_written))
+
+    def _finish_file(self, out_file):
+        """
+        Write everything that's only known at the end of the capture
+        """
+        if self._num_chans > 1 and not self._interleave \
+                and self._samps_written != self._num_samps:
+            self._compact_channels(out_file)
+        if self._file_format == 'npy' and self._samps_written != self._num_samps:
+            out_file.seek(0)
+            out_file.write(_get_npy_header(
+                self._dtype, (self._num_chans, self._samps_written),
+                self._interleave, self._npy_header_len))
+        elif self._file_format == 'sigmf':
+            with open(self._meta_filename, 'w') as meta_file:
+                json.dump(self._get_sigmf_metadata(), meta_file, indent=4)
+
+    def _get_sigmf_metadata(self):
+        """
+        Return the SigMF metadata of the capture
+        """
+        global_info = {
+            'core:datatype': self._sigmf_datatype,
+            'core:version': SIGMF_VERSION,
+            'core:num_channels': self._num_chans,
+            'core:recorder': 'UHD Python API',
+        }
+        if self._rate:
+            global_info['core:sample_rate'] = self._rate
+        global_info.update(self._sigmf_metadata)
+        capture = {'core:sample_start': 0}
+        if self._start_datetime is not None:
+            capture['core:datetime'] = self._start_datetime.isoformat() + 'Z'
+        capture.update(self._sigmf_capture)
+        annotations = [
+            {
+                'core:sample_start': event.offset,
+                'core:comment': "{} ({} samples lost)".format(
+                    event.error,
+                    '?' if event.lost_samps is None else event.lost_samps),
+            }
+            for event in self.events
+        ]
+        return {
+            'global': global_info,
+            'captures': [capture],
+            'annotations': annotations,
+        }
@@ -9,6 +9,8 @@ Python UHD module containing the MultiUSRP and other objects
 
 import numpy as np
 from .. import libpyuhd as lib
+from .capture import RxCapture
+from .rx_blocks import CPU_FORMAT_TYPES, RxBlockStream
 
 
 def _get_mpm_client(token, mb_args):
@@ -21,6 +23,96 @@ def _get_mpm_client(token, mb_args):
     rpc_port = mb_args.get('rpc_port', mpmtools.MPM_RPC_PORT)
     return mpmtools.MPMClient(mpmtools.InitMode.Hijack, rpc_addr, rpc_port, token)
 
+def _get_otw_format(cpu_format):
+    """
+    Return the over-the-wire format for a CPU format. sc8 samples are sent as
+    sc8, so they don't need to be converted.
+    """
+    return 'sc8' if cpu_format == 'sc8' else 'sc16'
+
+def _empty_samples(cpu_format, num_chans, num_samps):
+    """
+    Return an uninitialized sample buffer for cpu_format
+    """
+    if cpu_format not in CPU_FORMAT_TYPES:
+        raise ValueError("Unsupported CPU format `{}'! Must be one of: {}".format(
+            cpu_format, ', '.join(CPU_FORMAT_TYPES)))
+    return np.empty((num_chans, num_samps), dtype=CPU_FORMAT_TYPES[cpu_format])
+
+def _check_samples(samples, cpu_format, num_chans, num_samps):
+    """
+    Raise a ValueError if samples is not a C-contiguous sample buffer for
+    cpu_format, with num_chans channels and num_samps samples
+    """
+    dtype = CPU_FORMAT_TYPES[cpu_format]
+    expected_shape = (num_chans, num_samps)
+    if samples.dtype != dtype or samples.shape != expected_shape \
+            or not samples.flags.c_contiguous:
+        raise ValueError(
+            "Invalid sample buffer for {}: Expected a C-contiguous array of {} "
+            "with shape {}, got {} with shape {}".format(
+                cpu_format, dtype.name, expected_shape,
+                samples.dtype.name, samples.shape))
+
+class TxWaveform(object):
+    """
+    A waveform for MultiUSRP.send_waveform(), which is prepared once and then
+    reused: The samples are repeated until they fill a whole send buffer, and
+    the channels are expanded.
+
+    The samples are only copied if they need to be converted to the CPU
+    format, or to one C-contiguous row per channel. Otherwise, the TxWaveform
+    refers to waveform_proto, which must not be modified while it's in use.
+
+    :param waveform_proto: numpy array of samples, with one row per channel,
+                           or a single row for all channels. For sc16 and sc8,
+                           the samples are of the type in CPU_FORMAT_TYPES, or
+                           I/Q pairs of integers (in a trailing dimension of
+                           size 2).
+    :param num_chans: number of channels the waveform is sent on
+    :param cpu_format: 'fc32', 'fc64', 'sc16', or 'sc8'
+    """
+    def __init__(self, waveform_proto, num_chans=1, cpu_format='fc32'):
+        dtype = CPU_FORMAT_TYPES[cpu_format]
+        waveform_proto = np.asarray(waveform_proto)
+        if dtype.names and waveform_proto.dtype != dtype:
+            # I/Q pairs -> one structured element per sample
+            waveform_proto = np.ascontiguousarray(
+                waveform_proto, dtype=dtype['re']).view(dtype)[..., 0]
+        waveform_proto = np.asarray(waveform_proto, dtype=dtype)
+        if waveform_proto.ndim == 1:
+            waveform_proto = waveform_proto.reshape((1,) + waveform_proto.shape)
+        if waveform_proto.shape[0] < num_chans:
+            waveform_proto = np.broadcast_to(
+                waveform_proto[:1], (num_chans,) + waveform_proto.shape[1:])
+        self._proto = np.ascontiguousarray(waveform_proto[:num_chans])
+        # Send buffer size -> prepared buffer
+        self._buffers = {}
+        # The last result of get_head(), as ((buffer_samps, num_samps), head)
+        self._head = (None, None)
+
+    def get_buffer(self, buffer_samps):
+        """
+        Return the waveform, repeated so it's at least buffer_samps long
+        """
+        if buffer_samps not in self._buffers:
+            proto_len = self._proto.shape[1]
+            reps = int(np.ceil(float(buffer_samps) / proto_len))
+            self._buffers[buffer_samps] = \
+                np.tile(self._proto, (1, reps)) if reps > 1 else self._proto
+        return self._buffers[buffer_samps]
+
+    def get_head(self, buffer_samps, num_samps):
+        """
+        Return the first num_samps samples of get_buffer(buffer_samps), as
+        C-contiguous array (so it can be sent without a copy)
+        """
+        key = (buffer_samps, num_samps)
+        if self._head[0] != key:
+            self._head = (key, np.array(
+                self.get_buffer(buffer_samps)[:, :num_samps], order='C'))
+        return self._head[1]
+
 class MultiUSRP(lib.usrp.multi_usrp):
     """
     MultiUSRP object for controlling devices
@@ -35,6 +127,77 @@ class MultiUSRP(lib.usrp.multi_usrp):
             mb_args = \
                 self.get_tree().access_device_addr("/mboards/0/args").get().to_dict()
             setattr(self, 'get_mpm_client', lambda: _get_mpm_client(token, mb_args))
+        # Streamers of recv_num_samps() and send_waveform(), by (channels, CPU
+        # format)
+        self._rx_streamers = {}
+        self._tx_streamers = {}
+
+    @staticmethod
+    def _release_streamers(streamers, channels):
+        """
+        Drop the cached streamers (of _get_rx_streamer() or
+        _get_tx_streamer()) which use any of channels. Most devices only allow
+        one streamer per channel.
+        """
+        for key in [key for key in streamers if set(key[0]) & set(channels)]:
+            del streamers[key]
+
+    def get_rx_stream(self, stream_args):
+        """
+        Create an RX streamer. Streamers which recv_num_samps() and the like
+        keep for reuse are released first if they use the same channels.
+        """
+        self._release_streamers(self._rx_streamers, list(stream_args.channels) or [0])
+        return super(MultiUSRP, self).get_rx_stream(stream_args)
+
+    def get_tx_stream(self, stream_args):
+        """
+        Create a TX streamer. Streamers which send_waveform() keeps for reuse
+        are released first if they use the same channels.
+        """
+        self._release_streamers(self._tx_streamers, list(stream_args.channels) or [0])
+        return super(MultiUSRP, self).get_tx_stream(stream_args)
+
+    def _get_rx_streamer(self, channels, cpu_format):
+        """
+        Return a cached RX streamer for channels and cpu_format, and a receive
+        buffer for it, as tuple. The streamer is created on first use.
+        Streamers on any of the same channels are released first.
+        """
+        key = (tuple(channels), cpu_format)
+        if key not in self._rx_streamers:
+            self._release_streamers(self._rx_streamers, channels)
+            st_args = lib.usrp.stream_args(cpu_format, _get_otw_format(cpu_format))
+            st_args.channels = channels
+            streamer = super(MultiUSRP, self).get_rx_stream(st_args)
+            recv_buffer = _empty_samples(
+                cpu_format, len(channels), streamer.get_max_num_samps())
+            self._rx_streamers[key] = (streamer, recv_buffer)
+        return self._rx_streamers[key]
+
+    def _get_tx_streamer(self, channels, cpu_format):
+        """
+        Return a cached TX streamer for channels and cpu_format, and an empty
+        buffer for sending an EOB, as tuple. See _get_rx_streamer().
+        """
+        key = (tuple(channels), cpu_format)
+        if key not in self._tx_streamers:
+            self._release_streamers(self._tx_streamers, channels)
+            st_args = lib.usrp.stream_args(cpu_format, _get_otw_format(cpu_format))
+            st_args.channels = channels
+            streamer = super(MultiUSRP, self).get_tx_stream(st_args)
+            self._tx_streamers[key] = \
+                (streamer, _empty_samples(cpu_format, len(channels), 0))
+        return self._tx_streamers[key]
+
+    def clear_streamer_cache(self):
+        """
+        Drop the streamers that recv_num_samps() and send_waveform() keep for
+        reuse. get_rx_stream() and get_tx_stream() release them as needed, so
+        this is only required when streamers are created by other means.
+        """
+        self._rx_streamers = {}
+        self._tx_streamers = {}
 
     def recv_num_samps(self,
                        num_samps,
@@ -43,14 +206,16 @@ class MultiUSRP(lib.usrp.multi_usrp):
                        channels=(0,),
                        gain=10,
                        start_time=None,
-                       streamer=None):
+                       streamer=None,
+                       out=None,
+                       cpu_format='fc32'):
         """
         RX a finite number of samples from the USRP
 
         This is a convenience function to minimize the amount of code required
-        for just capturing samples. When calling this function more than once
-        in a script, pass in a streamer object to avoid recreating streamers
-        more than once.
+        for just capturing samples. The streamer is created on the first call,
+        and reused by later calls on the same channels with the same format
+        (see clear_streamer_cache()).
 
         :param num_samps: number of samples to RX
         :param freq: RX frequency (Hz)
@@ -59,19 +224,19 @@ class MultiUSRP(lib.usrp.multi_usrp):
         :param gain: RX gain (dB)
         :param start_time: A valid TimeSpec object with the starting time. If
                            None, then streaming starts immediately.
-        :param streamer: An RX streamer object. If None, this function will create
-                         one locally and attempt to destroy it afterwards.
-        :return: numpy array of complex floating-point samples (fc32)
+        :param streamer: An RX streamer object, with CPU format cpu_format. If
+                         None, a cached streamer is used.
+        :param out: A numpy array to receive into, instead of allocating a new
+                    one. Must be C-contiguous, and of the same shape and type
+                    as the return value.
+        :param cpu_format: 'fc32', 'fc64', 'sc16', or 'sc8'
+        :return: numpy array of samples, with shape (channels, num_samps),
+                 of type complex64 for fc32, complex128 for fc64, or the
+                 structured types SC16_DTYPE and SC8_DTYPE (fields 're' and
+                 'im') for sc16 and sc8. This is out, if given. For
+                 interleaved integers, use .view(np.int16) or .view(np.int8)
+                 on the result.
         """
-        def _config_streamer(streamer):
-            """
-            Set up the correct streamer
-            """
-            if streamer is None:
-                st_args = lib.usrp.stream_args("fc32", "sc16")
-                st_args.channels = channels
-                streamer = super(MultiUSRP, self).get_rx_stream(st_args)
-            return streamer
         def _start_stream(streamer):
             """
             Issue the start-stream command.
@@ -89,7 +254,6 @@ class MultiUSRP(lib.usrp.multi_usrp):
             """
             Issue the stop-stream command and flush the queue.
             """
-            metadata = lib.types.rx_metadata()
             stream_cmd = lib.types.stream_cmd(lib.types.stream_mode.stop_cont)
             streamer.issue_stream_cmd(stream_cmd)
             while streamer.recv(recv_buffer, metadata):
@@ -101,31 +265,189 @@ class MultiUSRP(lib.usrp.multi_usrp):
             super(MultiUSRP, self).set_rx_freq(lib.types.tune_request(freq), chan)
             super(MultiUSRP, self).set_rx_gain(gain, chan)
         # Configure streamer
-        streamer = _config_streamer(streamer)
+        if streamer is None:
+            streamer, recv_buffer = self._get_rx_streamer(channels, cpu_format)
+        else:
+            recv_buffer = _empty_samples(
+                cpu_format, len(channels), streamer.get_max_num_samps())
         metadata = lib.types.rx_metadata()
         # Set up buffers and counters
-        result = np.empty((len(channels), num_samps), dtype=np.complex64)
-        recv_buffer = np.zeros(
-            (len(channels), streamer.get_max_num_samps()), dtype=np.complex64)
+        if out is None:
+            result = _empty_samples(cpu_format, len(channels), num_samps)
+        else:
+            _check_samples(out, cpu_format, len(channels), num_samps)
+            result = out
         recv_samps = 0
         samps = 0
         # Now stream
         _start_stream(streamer)
         while recv_samps < num_samps:
-            samps = streamer.recv(recv_buffer, metadata)
+            if len(channels) == 1:
+                # A single channel can be received straight into the result
+                samps = streamer.recv(result[:, recv_samps:], metadata)
+            else:
+                samps = streamer.recv(recv_buffer, metadata)
             if metadata.error_code != lib.types.rx_metadata_error_code.none:
                 print(metadata.strerror())
             if samps:
                 real_samps = min(num_samps - recv_samps, samps)
-                result[:, recv_samps:recv_samps + real_samps] = \
-                        recv_buffer[:, 0:real_samps]
+                if len(channels) > 1:
+                    result[:, recv_samps:recv_samps + real_samps] = \
+                            recv_buffer[:, 0:real_samps]
                 recv_samps += real_samps
         # Stop and clean up
         _stop_stream(streamer)
-        # Help the garbage collection
-        streamer = None
         return result
 
+    def recv_to_file(self,
+                     filename,
+                     num_samps,
+                     freq,
+                     rate=1e6,
+                     channels=(0,),
+                     gain=10,
+                     start_time=None,
+                     file_format='raw',
+                     cpu_format='fc32',
+                     **capture_args):
+        """
+        RX samples from the USRP directly into a file
+
+        Unlike recv_num_samps(), this does not keep the samples in memory:
+        They are written to disk while streaming (see RxCapture), so
+        the length of the capture is only limited by the disk. As with
+        samps.tofile(), the channels are written one after the other, unless
+        interleave=True is passed (which the 'sigmf' format requires).
+
+        :param filename: The file to write
+        :param num_samps: number of samples to RX, per channel. If None, the
+                          capture runs until it's interrupted (KeyboardInterrupt).
+                          With more than one channel, this requires
+                          interleave=True.
+        :param freq: RX frequency (Hz)
+        :param rate: RX sample rate (Hz)
+        :param channels: list of channels to RX on
+        :param gain: RX gain (dB)
+        :param start_time: A valid TimeSpec object with the starting time. If
+                           None, then streaming starts immediately.
+        :param file_format: 'raw', 'npy', or 'sigmf'
+        :param cpu_format: 'fc32' to write complex floats, or 'sc16' to write
+                           the samples as they come over the wire (int16 I/Q
+                           pairs), without converting them
+        :param capture_args: Further arguments for RxCapture, e.g.,
+                             interleave or num_buffers
+        :return: the RxCapture object. Its attributes num_samps and events
+                 tell how many samples were written, and where overflows or
+                 dropped packets occurred.
+        """
+        # Configure USRP
+        for chan in channels:
+            super(MultiUSRP, self).set_rx_rate(rate, chan)
+            super(MultiUSRP, self).set_rx_freq(lib.types.tune_request(freq), chan)
+            super(MultiUSRP, self).set_rx_gain(gain, chan)
+        # Configure streamer
+        streamer, _ = self._get_rx_streamer(channels, cpu_format)
+        sigmf_metadata = {
+            'core:hw': super(MultiUSRP, self).get_mboard_name(),
+        }
+        sigmf_metadata.update(capture_args.pop('sigmf_metadata', {}))
+        sigmf_capture = {
+            'core:frequency': super(MultiUSRP, self).get_rx_freq(channels[0]),
+        }
+        sigmf_capture.update(capture_args.pop('sigmf_capture', {}))
+        capture = RxCapture(
+            streamer, filename, num_samps,
+            file_format=file_format,
+            cpu_format=cpu_format,
+            rate=super(MultiUSRP, self).get_rx_rate(channels[0]),
+            sigmf_metadata=sigmf_metadata,
+            sigmf_capture=sigmf_capture,
+            **capture_args)
+        # Issue the start-stream command, and allow for the time until the
+        # start for the first samples
+        stream_cmd = lib.types.stream_cmd(lib.types.stream_mode.start_cont)
+        stream_cmd.stream_now = (len(channels) == 1) and start_time is None
+        first_timeout = None
+        if not stream_cmd.stream_now:
+            time_now = super(MultiUSRP, self).get_time_now().get_real_secs()
+            if start_time is not None:
+                stream_cmd.time_spec = start_time
+            else:
+                stream_cmd.time_spec = lib.types.time_spec(time_now + 0.05)
+            first_timeout = 0.5 + max(
+                0.0, stream_cmd.time_spec.get_real_secs() - time_now)
+        capture.start(stream_cmd, first_timeout)
+        try:
+            # Wait with a timeout, so a KeyboardInterrupt gets through
+            while not capture.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            capture.stop()
+            capture.wait()
+        return capture
+
+    def stream_blocks(self,
+                      channels=(0,),
+                      block_samps=None,
+                      num_samps=None,
+                      start_time=None,
+                      cpu_format='fc32',
+                      **stream_args):
+        """
+        Start streaming in a background thread, and return an RxBlockStream,
+        which yields the samples block by block. Iterate over it with `for`
+        or `async for`, and the DSP runs while the next blocks are received:
+
+        >>> for block in usrp.stream_blocks(block_samps=4096):
+        ...     spectrum = np.fft.fft(block.samples[0])
+
+        The frequency, rate, and gain are not changed, set them before.
+        The stream stops when the iteration ends, or when stop() is called.
+        It has a streamer of its own: Streamers which recv_num_samps() keeps
+        for reuse are released if they use the same channels, and
+        recv_num_samps() must not be called on these channels until the
+        stream has stopped.
+
+        :param channels: list of channels to RX on
+        :param block_samps: number of samples (per channel) per block
+        :param num_samps: number of samples (per channel) after which the
+                          stream ends. If None, it runs until stopped.
+        :param start_time: A valid TimeSpec object with the starting time. If
+                           None, then streaming starts immediately.
+        :param cpu_format: 'fc32', 'fc64', 'sc16', or 'sc8'. The samples of
+                           the blocks are of the type in CPU_FORMAT_TYPES,
+                           like those of recv_num_samps(): sc16 and sc8
+                           samples have the structured types SC16_DTYPE and
+                           SC8_DTYPE (fields 're' and 'im'). For interleaved
+                           integers, use samples.view(np.int16) or
+                           samples.view(np.int8).
+        :param stream_args: Further arguments for RxBlockStream, e.g.,
+                            num_blocks or overflow_policy
+        :return: the RxBlockStream
+        """
+        st_args = lib.usrp.stream_args(cpu_format, _get_otw_format(cpu_format))
+        st_args.channels = channels
+        streamer = self.get_rx_stream(st_args)
+        blocks = RxBlockStream(
+            streamer,
+            block_samps=block_samps,
+            cpu_format=cpu_format,
+            num_samps=num_samps,
+            **stream_args)
+        stream_cmd = lib.types.stream_cmd(lib.types.stream_mode.start_cont)
+        stream_cmd.stream_now = (len(channels) == 1) and start_time is None
+        first_timeout = None
+        if not stream_cmd.stream_now:
+            time_now = super(MultiUSRP, self).get_time_now().get_real_secs()
+            if start_time is not None:
+                stream_cmd.time_spec = start_time
+            else:
+                stream_cmd.time_spec = lib.types.time_spec(time_now + 0.05)
+            first_timeout = 0.5 + max(
+                0.0, stream_cmd.time_spec.get_real_secs() - time_now)
+        blocks.start(stream_cmd, first_timeout)
+        return blocks
+
     def send_waveform(self,
                       waveform_proto,
                       duration,
@@ -134,10 +456,13 @@ class MultiUSRP(lib.usrp.multi_usrp):
                       channels=(0,),
                       gain=10,
                       start_time=None,
-                      streamer=None):
+                      streamer=None,
+                      cpu_format='fc32'):
         """
         TX a finite number of samples from the USRP
-        :param waveform_proto: numpy array of samples to TX
+        :param waveform_proto: numpy array of samples to TX, or a TxWaveform.
+                               When sending the same waveform repeatedly, pass
+                               a TxWaveform, so it's only prepared once.
         :param duration: time in seconds to transmit at the supplied rate
         :param freq: TX frequency (Hz)
         :param rate: TX sample rate (Hz)
@@ -145,19 +470,13 @@ class MultiUSRP(lib.usrp.multi_usrp):
         :param gain: TX gain (dB)
         :param start_time: A valid TimeSpec object with the starting time. If
                            None, then streaming starts immediately.
-        :param streamer: A TX streamer object. If None, this function will create
-                         one locally and attempt to destroy it afterwards.
+        :param streamer: A TX streamer object, with CPU format cpu_format. If
+                         None, a cached streamer is used (see
+                         recv_num_samps()).
+        :param cpu_format: 'fc32', 'fc64', 'sc16', or 'sc8'. Must match the
+                           type of waveform_proto (see recv_num_samps()).
         :return: the number of transmitted samples
         """
-        def _config_streamer(streamer):
-            """
-            Set up the correct streamer
-            """
-            if streamer is None:
-                st_args = lib.usrp.stream_args("fc32", "sc16")
-                st_args.channels = channels
-                streamer = super(MultiUSRP, self).get_tx_stream(st_args)
-            return streamer
         ## And go!
         for chan in channels:
             super(MultiUSRP, self).set_tx_rate(rate, chan)
@@ -165,20 +484,18 @@ class MultiUSRP(lib.usrp.multi_usrp):
             super(MultiUSRP, self).set_tx_gain(gain, chan)
 
         # Configure streamer
-        streamer = _config_streamer(streamer)
+        if streamer is None:
+            streamer, eob_buffer = self._get_tx_streamer(channels, cpu_format)
+        else:
+            eob_buffer = _empty_samples(cpu_format, len(channels), 0)
         # Set up buffers and counters
+        if not isinstance(waveform_proto, TxWaveform):
+            waveform_proto = TxWaveform(waveform_proto, len(channels), cpu_format)
         buffer_samps = streamer.get_max_num_samps()
-        proto_len = waveform_proto.shape[-1]
-        if proto_len < buffer_samps:
-            waveform_proto = np.tile(waveform_proto,
-                                     (1, int(np.ceil(float(buffer_samps)/proto_len))))
-            proto_len = waveform_proto.shape[-1]
+        waveform = waveform_proto.get_buffer(buffer_samps)
+        proto_len = waveform.shape[1]
         send_samps = 0
         max_samps = int(np.floor(duration * rate))
-        if len(waveform_proto.shape) == 1:
-            waveform_proto = waveform_proto.reshape(1, waveform_proto.size)
-        if waveform_proto.shape[0] < len(channels):
-            waveform_proto = np.tile(waveform_proto[0], (len(channels), 1))
         # Now stream
         metadata = lib.types.tx_metadata()
         if start_time is not None:
@@ -186,14 +503,12 @@ class MultiUSRP(lib.usrp.multi_usrp):
         while send_samps < max_samps:
             real_samps = min(proto_len, max_samps-send_samps)
             if real_samps < proto_len:
-                print(waveform_proto[:, :real_samps])
-                samples = streamer.send(waveform_proto[:, :real_samps], metadata)
+                samples = streamer.send(
+                    waveform_proto.get_head(buffer_samps, real_samps), metadata)
             else:
-                samples = streamer.send(waveform_proto, metadata)
+                samples = streamer.send(waveform, metadata)
             send_samps += samples
         # Send EOB to terminate Tx
         metadata.end_of_burst = True
-        streamer.send(np.zeros((len(channels), 1), dtype=np.complex64), metadata)
-        # Help the garbage collection
-        streamer = None
+        streamer.send(eob_buffer, metadata)
         return send_samps
@@ -0,0 +1,326 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+""" @package usrp
+Block-wise RX streaming with a background receive thread
+
+RxBlockStream receives samples from an RX streamer in a background thread,
+into a fixed pool of blocks. The samples are handed to the consumer without
+copying them, so the consumer's processing (e.g., FFTs) overlaps with the
+reception of the next blocks.
+
+>>> with RxBlockStream(streamer, block_samps=4096) as blocks:
+...     for block in blocks:
+...         process(block.samples)
+
+The same works in a coroutine, with `async for`.
+
+A block is only valid until the next one is requested: Then, it goes back to
+the pool and gets overwritten. Copy the samples to keep them for longer.
+
+If the consumer is slower than the stream, the pool runs empty. Then, the
+overflow policy applies:
+- 'block': The receive thread waits for the consumer. The device will
+  overflow, which is reported in the metadata of the next block.
+- 'drop_oldest': The oldest block which the consumer hasn't requested yet is
+  dropped and reused, so the consumer always gets the most recent samples.
+  Dropped blocks are counted in RxBlockStream.dropped_blocks. If a dropped
+  block reported an error (e.g., an overflow), its metadata is passed on in
+  RxBlock.dropped_metadata of the next block that is delivered.
+"""
+
+import asyncio
+import collections
+import threading
+import numpy as np
+from .. import libpyuhd as lib
+from .capture import SC16_DTYPE
+
+OVERFLOW_POLICIES = ('block', 'drop_oldest')
+
+# Complex int8 samples, as stored by the sc8 CPU format
+SC8_DTYPE = np.dtype([('re', 'i1'), ('im', 'i1')])
+
+# CPU format -> NumPy type of a sample. Complex integer samples have a
+# structured type, so that sample buffers have one element per sample, like
+# the streamers expect (see SC16_DTYPE).
+CPU_FORMAT_TYPES = {
+    'fc32': np.dtype(np.complex64),
+    'fc64': np.dtype(np.complex128),
+    'sc16': SC16_DTYPE,
+    'sc8': SC8_DTYPE,
+}
+
+
+class RxBlock(object):
+    """
+    A block of received samples
+
+    samples -- Array with shape (channels, number of samples), of the type
+               in CPU_FORMAT_TYPES. For sc16 and sc8, that's the structured
+               type SC16_DTYPE or SC8_DTYPE (fields 're' and 'im'), and
+               samples.view(np.int16) or samples.view(np.int8) has the
+               interleaved integers. This is a view into the stream's block
+               pool, see the module documentation.
+    metadata -- The RXMetadata of the block. Blocks with an error code may
+                have no samples.
+    offset -- Number of samples (per channel) received before this block,
+              including those of dropped blocks
+    dropped_metadata -- If blocks were dropped right before this one, and any
+                        of them reported an error, the RXMetadata of the first
+                        such block. Otherwise None.
+    """
+    __slots__ = ('samples', 'metadata', 'offset', 'dropped_metadata', '_buffer')
+
+    def __init__(self, buffer, metadata):
+        self._buffer = buffer
+        self.metadata = metadata
+        self.samples = buffer[:, :0]
+        self.offset = 0
+        self.dropped_metadata = None
+
+
+class RxBlockStream(object):
+    """
+    Receive blocks of samples from an RX streamer in a background thread. See
+    the module documentation.
+
+    :param streamer: An RX streamer object. Its CPU format must match
+                     cpu_format.
+    :param block_samps: Number of samples (per channel) per block. Defaults
+                        to one packet. Blocks are only shorter if an error
+                        occurs.
+    :param num_blocks: Number of blocks in the pool. The consumer holds one of
+                       them at a time.
+    :param cpu_format: 'fc32', 'fc64', 'sc16', or 'sc8'
+    :param overflow_policy: 'block' or 'drop_oldest'
+    :param num_samps: Number of samples (per channel) after which the stream
+                      ends. If None, it runs until stop() is called.
+    :param recv_timeout: Timeout (in seconds) for receiving a block. On a
+                         timeout, a block with the timeout error and no
+                         samples is returned, and the stream goes on.
+    """
+    def __init__(self,
+                 streamer,
+                 block_samps=None,
+                 num_blocks=8,
+                 cpu_format='fc32',
+                 overflow_policy='block',
+                 num_samps=None,
+                 recv_timeout=0.5):
+        if cpu_format not in CPU_FORMAT_TYPES:
+            raise ValueError("Unsupported CPU format `{}'! Must be one of: {}".format(
+                cpu_format, ', '.join(CPU_FORMAT_TYPES)))
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError("Invalid overflow policy `{}'! Must be one of: {}".format(
+                overflow_policy, ', '.join(OVERFLOW_POLICIES)))
+        if num_blocks < 2:
+            raise ValueError("At least two blocks are required!")
+        self._streamer = streamer
+        self._overflow_policy = overflow_policy
+        self._num_samps = num_samps
+        self._recv_timeout = recv_timeout
+        dtype = CPU_FORMAT_TYPES[cpu_format]
+        block_samps = block_samps or streamer.get_max_num_samps()
+        num_chans = streamer.get_num_channels()
+        # Shape and type of a buffer for flushing the stream, see
+        # _stop_stream()
+        self._flush_buffer_type = (
+            (num_chans, streamer.get_max_num_samps()), dtype)
+        # The block pool. Blocks are in exactly one of these places: In
+        # _free_blocks, in _full_blocks (received, not requested yet), in
+        # _held_block (requested by the consumer), or in the receive thread.
+        # _lock protects all of them.
+        self._free_blocks = collections.deque(
+            RxBlock(np.empty((num_chans, block_samps), dtype=dtype),
+                    lib.types.rx_metadata())
+            for _ in range(num_blocks))
+        self._full_blocks = collections.deque()
+        self._held_block = None
+        self._lock = threading.Condition()
+        self._thread = None
+        self._stop_event = threading.Event()
+        # True when the receive thread has handed over its last block
+        self._done = False
+        self._error = None
+        # Metadata with an error from a dropped block, which goes with the
+        # next block that is queued
+        self._dropped_metadata = None
+        ## Statistics
+        # Number of samples (per channel) received, including dropped blocks
+        self.num_samps = 0
+        # Number of blocks and samples dropped by the 'drop_oldest' policy
+        self.dropped_blocks = 0
+        self.dropped_samps = 0
+
+    def __enter__(self):
+        if self._thread is None:
+            self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self, stream_cmd=None, first_timeout=None):
+        """
+        Issue stream_cmd, and start the receive thread. If stream_cmd is None,
+        streaming starts immediately.
+        first_timeout is the timeout (in seconds) for receiving the first
+        samples. It must be long enough if streaming starts in the future. If
+        None, recv_timeout is used.
+        """
+        if self._thread is not None:
+            raise RuntimeError("RxBlockStream was already started!")
+        if stream_cmd is None:
+            stream_cmd = lib.types.stream_cmd(lib.types.stream_mode.start_cont)
+            stream_cmd.stream_now = True
+        self._thread = threading.Thread(
+            target=self._recv_loop, args=(stream_cmd, first_timeout),
+            name="RxBlockStream")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop streaming, and wait for the receive thread to finish. Blocks
+        which were received, but not requested yet, can still be read with
+        get_block().
+        """
+        self._stop_event.set()
+        with self._lock:
+            # Unblock the receive thread if it's waiting for a free block
+            self._lock.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def get_block(self, timeout=None):
+        """
+        Return the next RxBlock, or None if the stream has ended. The block
+        returned by the previous call goes back to the pool.
+        Raises a TimeoutError if no block arrives within timeout seconds, and
+        re-raises errors of the receive thread.
+        """
+        with self._lock:
+            if self._held_block is not None:
+                self._free_blocks.append(self._held_block)
+                self._held_block = None
+                self._lock.notify_all()
+            if not self._lock.wait_for(
+                    lambda: self._full_blocks or self._done, timeout):
+                raise TimeoutError("No RX block received within {} s".format(timeout))
+            if self._full_blocks:
+                self._held_block = self._full_blocks.popleft()
+                return self._held_block
+        if self._error is not None:
+            raise self._error
+        return None
+
+    def __iter__(self):
+        """
+        Yield all blocks (see get_block()). Starts the stream if necessary,
+        and stops it when the iteration ends.
+        """
+        if self._thread is None:
+            self.start()
+        try:
+            block = self.get_block()
+            while block is not None:
+                yield block
+                block = self.get_block()
+        finally:
+            self.stop()
+
+    def __aiter__(self):
+        if self._thread is None:
+            self.start()
+        return self
+
+    async def __anext__(self):
+        """
+        Return the next block (see get_block()). Waiting for it happens in the
+        event loop's default executor, so other tasks keep running.
+        """
+        block = await asyncio.get_running_loop().run_in_executor(None, self.get_block)
+        if block is None:
+            self.stop()
+            raise StopAsyncIteration
+        return block
+
+    def _get_free_block(self):
+        """
+        Return a block to receive into, according to the overflow policy, or
+        None if the stream was stopped while waiting for one.
+        """
+        with self._lock:
+            if not self._free_blocks and self._overflow_policy == 'drop_oldest' \
+                    and self._full_blocks:
+                block = self._full_blocks.popleft()
+                self.dropped_blocks += 1
+                self.dropped_samps += block.samples.shape[1]
+                if self._dropped_metadata is None:
+                    if block.dropped_metadata is not None:
+                        self._dropped_metadata = block.dropped_metadata
+                    elif block.metadata.error_code != \
+                            lib.types.rx_metadata_error_code.none:
+                        # Keep the metadata, and receive into a new one
+                        self._dropped_metadata = block.metadata
+                        block.metadata = lib.types.rx_metadata()
+                return block
+            self._lock.wait_for(
+                lambda: self._free_blocks or self._stop_event.is_set())
+            if not self._free_blocks:
+                return None
+            return self._free_blocks.popleft()
+
+    def _recv_loop(self, stream_cmd, first_timeout):
+        """
+        Receive thread: Fill blocks, and queue them for the consumer
+        """
+        try:
+            self._streamer.issue_stream_cmd(stream_cmd)
+            timeout = first_timeout or self._recv_timeout
+            while not self._stop_event.is_set() and \
+                    (self._num_samps is None or self.num_samps < self._num_samps):
+                block = self._get_free_block()
+                if block is None:
+                    break
+                samps = self._streamer.recv(block._buffer, block.metadata, timeout)
+                timeout = self._recv_timeout
+                if self._num_samps is not None:
+                    samps = min(samps, self._num_samps - self.num_samps)
+                block.samples = block._buffer[:, :samps]
+                block.offset = self.num_samps
+                self.num_samps += samps
+                with self._lock:
+                    if samps or block.metadata.error_code != \
+                            lib.types.rx_metadata_error_code.none:
+                        block.dropped_metadata = self._dropped_metadata
+                        self._dropped_metadata = None
+                        self._full_blocks.append(block)
+                    else:
+                        self._free_blocks.append(block)
+                    self._lock.notify_all()
+        except Exception as ex: # pylint: disable=broad-except
+            self._error = ex
+        finally:
+            self._stop_stream()
+            with self._lock:
+                self._done = True
+                self._lock.notify_all()
+
+    def _stop_stream(self):
+        """
+        Issue the stop-stream command and flush the queue
+        """
+        try:
+            self._streamer.issue_stream_cmd(
+                lib.types.stream_cmd(lib.types.stream_mode.stop_cont))
+            flush_buffer = np.empty(*self._flush_buffer_type)
+            metadata = lib.types.rx_metadata()
+            while self._streamer.recv(flush_buffer, metadata):
+                pass
+        except Exception as ex: # pylint: disable=broad-except
+            if self._error is None:
+                self._error = ex
@@ -124,6 +124,90 @@ class MPMClaimer:
             self.token = self._token_q.get(False)
         return self.token
 
+class MPMBatchCall:
+    """
+    A call which was queued in an MPMBatch. Its result is available once
+    the batch has been flushed.
+    """
+    def __init__(self, command):
+        self.command = command
+        self._done = False
+        self._success = None
+        self._value = None
+
+    def _set_result(self, success, value):
+        self._done = True
+        self._success = success
+        self._value = value
+
+    def result(self):
+        """
+        Return the return value of the call, or raise a RuntimeError if it
+        failed
+        """
+        if not self._done:
+            raise RuntimeError(
+                "[MPMRPC] The batch of `{}' has not been flushed yet"
+                .format(self.command))
+        if not self._success:
+            raise RuntimeError(
+                "[MPMRPC] `{}' failed: {}".format(self.command, self._value))
+        return self._value
+
+class MPMBatch:
+    """
+    Queues RPC calls and sends them to MPM in a single multicall request.
+    It offers the same methods as the MPMClient it comes from, but they
+    return an MPMBatchCall instead of the result. Use it as a context
+    manager, which flushes the queue when the block is left:
+
+    >>> with client.batch() as batch:
+    ...     gain = batch.db_0_get_gain(0)
+    ...     freq = batch.db_0_get_freq(0)
+    >>> print(gain.result(), freq.result())
+    """
+    def __init__(self, client):
+        self._client = client
+        self._calls = []
+        for command in client._remote_methods:
+            if command == 'multicall':
+                continue
+            setattr(self, command,
+                    lambda *args, command=command, **kwargs:
+                    self._queue(command, *args, **kwargs))
+
+    def _queue(self, command, *args, **kwargs):
+        """
+        Queue a call of command
+        """
+        if kwargs:
+            raise TypeError("[MPMRPC] Batched calls don't support keyword arguments")
+        call = MPMBatchCall(command)
+        self._calls.append((call, args))
+        return call
+
+    def flush(self):
+        """
+        Send all queued calls in one request. Returns the list of
+        MPMBatchCalls which were sent.
+        """
+        calls, self._calls = self._calls, []
+        if not calls:
+            return []
+        results = self._client.multicall(
+            [(call.command, list(args)) for call, args in calls])
+        for (call, _), (success, value) in zip(calls, results):
+            call._set_result(success, value)
+        return [call for call, _ in calls]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Don't send anything if the block failed
+        if exc_type is None:
+            self.flush()
+
 class InitMode(Enum):
     """
     Init modes for MPM session
@@ -187,6 +271,15 @@ class MPMClient:
         """
         self._claimer.exit()
 
+    def batch(self):
+        """
+        Return an MPMBatch, which sends the calls made on it to MPM in one
+        request. This requires a claim.
+        """
+        if 'multicall' not in self._remote_methods:
+            raise RuntimeError("[MPMRPC] This version of MPM does not support batched calls")
+        return MPMBatch(self)
+
     def _add_command(self, command, docs, requires_token):
         """
         Add a command to the current session
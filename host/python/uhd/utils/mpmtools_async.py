@@ -0,0 +1,199 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+Asyncio RPC client for MPM, for tools which talk to many USRPs at once
+
+Unlike mpmtools.MPMClient, requests are pipelined: every call is sent
+right away, and any number of calls may be in flight on a connection at
+the same time (they are matched to their responses by msgpack-RPC
+message ID). The claim is kept alive by a task, rather than a process.
+
+>>> async def get_infos(hosts):
+...     clients = [AsyncMPMClient(host) for host in hosts]
+...     await asyncio.gather(*(client.connect() for client in clients))
+...     return await asyncio.gather(*(client.get_device_info() for client in clients))
+"""
+
+import asyncio
+import itertools
+import msgpack
+from mprpc.exceptions import RPCError
+from .mpmtools import MPM_RPC_PORT
+
+# See the msgpack-RPC specification
+MSGPACKRPC_REQUEST = 0
+MSGPACKRPC_RESPONSE = 1
+
+class AsyncMPMClient:
+    """
+    MPM RPC Client for asyncio. After connect(), all MPM commands are
+    accessible as coroutine methods. Commands which require a claim get
+    the token of claim() passed in automatically.
+    """
+    # Seconds between two reclaims (see mpmtools._claim_loop())
+    RECLAIM_INTERVAL = 1.0
+    # Bytes to read from the socket at once
+    READ_SIZE = 65536
+
+    def __init__(self, host, port=MPM_RPC_PORT):
+        self.host = host
+        self.port = port
+        self._loop = None
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._reclaim_task = None
+        self._msg_ids = itertools.count()
+        # Message ID -> Future of the response
+        self._pending = {}
+        self._remote_methods = []
+        self._token = None
+        # Why the claim was lost, raised by the next call
+        self._claim_error = None
+
+    async def connect(self):
+        """
+        Open the connection, and add the methods MPM offers
+        """
+        self._loop = asyncio.get_running_loop()
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._read_task = asyncio.ensure_future(self._read_responses())
+        for method in await self.call('list_methods'):
+            self._add_command(*method)
+
+    async def close(self):
+        """
+        Release the claim (if we have one) and close the connection
+        """
+        if self._token is not None:
+            await self.unclaim()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._read_task is not None:
+            self._read_task.cancel()
+            self._read_task = None
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _add_command(self, command, docs, requires_token):
+        """
+        Add a command to the current session
+        """
+        if not hasattr(self, command):
+            async def new_command(*args):
+                if requires_token:
+                    self._raise_claim_error()
+                    if not self._token:
+                        raise RuntimeError(
+                            "[MPMRPC] Cannot execute `{}' -- no claim available!"
+                            .format(command))
+                    args = (self._token,) + args
+                return await self.call(command, *args)
+            new_command.__doc__ = docs
+            setattr(self, command, new_command)
+            self._remote_methods.append(command)
+
+    def call(self, command, *args):
+        """
+        Send a request for command, and return a Future of its result.
+        The request is sent right away, without waiting for the responses
+        to earlier requests.
+        """
+        if self._writer is None:
+            raise RuntimeError("[MPMRPC] Not connected to {}".format(self.host))
+        self._raise_claim_error()
+        msg_id = next(self._msg_ids) & 0xFFFFFFFF
+        future = self._loop.create_future()
+        self._pending[msg_id] = future
+        self._writer.write(msgpack.packb(
+            [MSGPACKRPC_REQUEST, msg_id, command, list(args)], use_bin_type=True))
+        return future
+
+    async def _read_responses(self):
+        """
+        Task which reads responses and completes the Future of each one
+        """
+        unpacker = msgpack.Unpacker(raw=False, max_buffer_size=50000000)
+        try:
+            while True:
+                data = await self._reader.read(self.READ_SIZE)
+                if not data:
+                    break
+                unpacker.feed(data)
+                for msg_type, msg_id, error, result in unpacker:
+                    assert msg_type == MSGPACKRPC_RESPONSE, \
+                        "Unexpected message type: {}".format(msg_type)
+                    future = self._pending.pop(msg_id, None)
+                    if future is None or future.done():
+                        continue
+                    if error is not None:
+                        future.set_exception(RPCError(error))
+                    else:
+                        future.set_result(result)
+            error = ConnectionError("[MPMRPC] Connection to {} closed".format(self.host))
+        except Exception as ex:
+            error = ex
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    async def claim(self, session_id="UHD"):
+        """
+        Claim the device, and keep the claim alive from a task until
+        unclaim() is called
+        """
+        if self._token is not None:
+            raise RuntimeError("[MPMRPC] Already have claim")
+        self._token = await self.call('claim', session_id)
+        self._reclaim_task = asyncio.ensure_future(self._reclaim_loop())
+        return self._token
+
+    async def _reclaim_loop(self):
+        """
+        Task which reclaims the device in regular intervals. If the claim is
+        lost, or reclaiming fails, the error is stored, and raised by the next
+        call.
+        """
+        try:
+            while True:
+                await asyncio.sleep(self.RECLAIM_INTERVAL)
+                if not await self.call('reclaim', self._token):
+                    raise RuntimeError("[MPMRPC] Lost claim on {}".format(self.host))
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex: # pylint: disable=broad-except
+            self._claim_error = ex
+            self._token = None
+            self._reclaim_task = None
+
+    def _raise_claim_error(self):
+        """
+        Raise the error which ended the claim, if there is one (once)
+        """
+        error, self._claim_error = self._claim_error, None
+        if error is not None:
+            raise error
+
+    async def unclaim(self):
+        """
+        Stop reclaiming and release the claim
+        """
+        if self._reclaim_task is not None:
+            self._reclaim_task.cancel()
+            self._reclaim_task = None
+        token, self._token = self._token, None
+        if token is not None:
+            await self.call('unclaim', token)
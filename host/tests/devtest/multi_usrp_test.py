@@ -283,6 +283,10 @@ def recv_num_samps(usrp):
     # Check that number of samples returned is correct and no sample is 0.
     if len(samples[0]) != num_samps:
         raise Exception("Number of samples received is not number requested.")
+    # Receive again into the same buffer, with the cached streamer
+    if usrp.recv_num_samps(num_samps, rate, out=samples) is not samples:
+        raise Exception("recv_num_samps() did not receive into the given buffer.")
+    usrp.clear_streamer_cache()
     return True
 
 
@@ -591,7 +595,7 @@ def run_api_test(usrp, device_config):
          usrp.get_tx_subdev_spec),
         (['get_mboard_name'],
          lambda: get_test(usrp, 'mboard_name', num_tx_chans)),
-        (['recv_num_samps'],
+        (['recv_num_samps', 'clear_streamer_cache'],
          lambda: recv_num_samps(usrp)),
         (['send_waveform'],
          lambda: send_waveform(usrp)),
@@ -0,0 +1,138 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+Unit test for uhd.usrp.RxBlockStream
+"""
+
+import asyncio
+import threading
+import unittest
+from unittest import mock
+import numpy
+import uhd
+
+class FakeRxMetadata:
+    """
+    Stand-in for uhd.types.RXMetadata, whose fields can't be set from Python
+    """
+    def __init__(self):
+        self.error_code = uhd.types.RXMetadataErrorCode.none
+        self.has_time_spec = False
+        self.time_spec = None
+        self.out_of_sequence = False
+
+class FakeRxStreamer:
+    """
+    RX streamer which returns packets of consecutive sample indices. The
+    first stream command starts streaming, the next one stops it.
+    """
+    def __init__(self, num_chans=1, packet_samps=100, overflow_packets=()):
+        self.num_chans = num_chans
+        self.packet_samps = packet_samps
+        self.overflow_packets = overflow_packets
+        self.stream_cmds = 0
+        self.num_packets = 0
+        self.num_samps = 0
+        # The receive thread waits for this before every packet
+        self.packet_gate = threading.Semaphore(1000000)
+
+    def get_max_num_samps(self):
+        return self.packet_samps
+
+    def get_num_channels(self):
+        return self.num_chans
+
+    def issue_stream_cmd(self, _stream_cmd):
+        self.stream_cmds += 1
+
+    def recv(self, buffer, metadata, timeout=0.1):
+        metadata.error_code = uhd.types.RXMetadataErrorCode.none
+        if self.stream_cmds != 1:
+            return 0
+        if not self.packet_gate.acquire(timeout=timeout):
+            metadata.error_code = uhd.types.RXMetadataErrorCode.timeout
+            return 0
+        if self.num_packets in self.overflow_packets:
+            metadata.error_code = uhd.types.RXMetadataErrorCode.overflow
+        self.num_packets += 1
+        samps = min(buffer.shape[1], self.packet_samps)
+        buffer[:, :samps] = numpy.arange(self.num_samps, self.num_samps + samps)
+        self.num_samps += samps
+        return samps
+
+class RxBlockStreamTest(unittest.TestCase):
+    """ Test RxBlockStream with a fake streamer """
+    def setUp(self):
+        patcher = mock.patch.object(uhd.libpyuhd.types, 'rx_metadata', FakeRxMetadata)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_block(self):
+        """ Test the 'block' policy delivers all samples, in order """
+        streamer = FakeRxStreamer(num_chans=2)
+        blocks = uhd.usrp.RxBlockStream(
+            streamer, block_samps=100, num_blocks=2, num_samps=1050)
+        samples = []
+        for block in blocks:
+            self.assertEqual(block.offset, sum(len(chunk) for chunk in samples))
+            self.assertTrue(numpy.array_equal(block.samples[0], block.samples[1]))
+            samples.append(block.samples[0].real.copy())
+        self.assertTrue(numpy.array_equal(numpy.concatenate(samples), numpy.arange(1050)))
+        self.assertEqual(blocks.dropped_blocks, 0)
+        self.assertEqual(streamer.stream_cmds, 2)
+
+    def test_drop_oldest(self):
+        """ Test the 'drop_oldest' policy, and that dropped errors get through """
+        streamer = FakeRxStreamer(overflow_packets=(1,))
+        blocks = uhd.usrp.RxBlockStream(
+            streamer, block_samps=100, num_blocks=3,
+            overflow_policy='drop_oldest', num_samps=1000)
+        blocks.start()
+        # Let the receive thread fill the pool, and drop blocks, before we
+        # take the first one
+        while blocks.num_samps < 1000:
+            threading.Event().wait(0.01)
+        received = [(block.offset, block.dropped_metadata) for block in blocks]
+        self.assertEqual([offset for offset, _ in received], [700, 800, 900])
+        self.assertEqual(blocks.dropped_blocks, 7)
+        self.assertEqual(blocks.dropped_samps, 700)
+        # The overflow of the second packet is reported with the first block
+        # that is delivered
+        self.assertEqual(received[0][1].error_code,
+                         uhd.types.RXMetadataErrorCode.overflow)
+        self.assertIsNone(received[1][1])
+
+    def test_stop(self):
+        """ Test stop() ends the stream, and an iteration that ends early stops it """
+        streamer = FakeRxStreamer()
+        streamer.packet_gate = threading.Semaphore(0)
+        blocks = uhd.usrp.RxBlockStream(streamer, block_samps=100)
+        blocks.start()
+        with self.assertRaises(TimeoutError):
+            blocks.get_block(timeout=0.05)
+        blocks.stop()
+        # Only blocks with the timeout error, and no samples, are left
+        block = blocks.get_block(timeout=1.0)
+        while block is not None:
+            self.assertEqual(block.samples.shape[1], 0)
+            block = blocks.get_block(timeout=1.0)
+        self.assertEqual(streamer.stream_cmds, 2)
+        streamer = FakeRxStreamer()
+        blocks = uhd.usrp.RxBlockStream(streamer, block_samps=100)
+        for _ in blocks:
+            break
+        self.assertEqual(streamer.stream_cmds, 2)
+
+    def test_async(self):
+        """ Test iterating with async for """
+        streamer = FakeRxStreamer()
+        async def count_samps():
+            num_samps = 0
+            async for block in uhd.usrp.RxBlockStream(
+                    streamer, block_samps=100, num_samps=550):
+                num_samps += block.samples.shape[1]
+            return num_samps
+        self.assertEqual(asyncio.run(count_samps()), 550)
@@ -0,0 +1,149 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+Unit test for uhd.usrp.RxCapture
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy
+import uhd
+
+class FakeRxMetadata:
+    """
+    Stand-in for uhd.types.RXMetadata, whose fields can't be set from Python
+    """
+    def __init__(self):
+        self.error_code = uhd.types.RXMetadataErrorCode.none
+        self.has_time_spec = False
+        self.time_spec = None
+        self.out_of_sequence = False
+
+class FakeRxStreamer:
+    """
+    RX streamer which returns packets of consecutive sample indices, plus
+    CHAN_OFFSET times the channel index. The first stream command starts
+    streaming, the next one stops it. After max_samps samples, it times out.
+    """
+    CHAN_OFFSET = 10000
+
+    def __init__(self, num_chans=1, packet_samps=100, max_samps=None, overflow_packets=()):
+        self.num_chans = num_chans
+        self.packet_samps = packet_samps
+        self.max_samps = max_samps
+        self.overflow_packets = overflow_packets
+        self.stream_cmds = 0
+        self.num_packets = 0
+        self.num_samps = 0
+
+    def get_max_num_samps(self):
+        return self.packet_samps
+
+    def get_num_channels(self):
+        return self.num_chans
+
+    def issue_stream_cmd(self, _stream_cmd):
+        self.stream_cmds += 1
+
+    def recv(self, buffer, metadata, timeout=0.1):
+        metadata.error_code = uhd.types.RXMetadataErrorCode.none
+        if self.stream_cmds != 1:
+            return 0
+        if self.max_samps is not None and self.num_samps >= self.max_samps:
+            metadata.error_code = uhd.types.RXMetadataErrorCode.timeout
+            return 0
+        self.num_packets += 1
+        if self.num_packets - 1 in self.overflow_packets:
+            metadata.error_code = uhd.types.RXMetadataErrorCode.overflow
+            return 0
+        samps = min(buffer.shape[1], self.packet_samps)
+        if self.max_samps is not None:
+            samps = min(samps, self.max_samps - self.num_samps)
+        buffer[:, :samps] = get_samples(self.num_chans, samps, self.num_samps)
+        self.num_samps += samps
+        return samps
+
+def get_samples(num_chans, num_samps, start=0):
+    """ Return the samples FakeRxStreamer sends, as (channels, samples) """
+    return numpy.arange(start, start + num_samps) + \
+        FakeRxStreamer.CHAN_OFFSET * numpy.arange(num_chans)[:, numpy.newaxis]
+
+class RxCaptureTest(unittest.TestCase):
+    """ Test RxCapture with a fake streamer """
+    def setUp(self):
+        patcher = mock.patch.object(uhd.libpyuhd.types, 'rx_metadata', FakeRxMetadata)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+
+    def capture(self, streamer, filename, num_samps, **kwargs):
+        """ Run a capture into the temporary directory, return the RxCapture """
+        capture = uhd.usrp.RxCapture(
+            streamer, os.path.join(self.tmp_dir, filename), num_samps,
+            buffer_samps=256, num_buffers=4, **kwargs)
+        capture.start()
+        self.assertTrue(capture.wait(5.0))
+        self.assertEqual(streamer.stream_cmds, 2)
+        return capture
+
+    def test_raw(self):
+        """ Test raw files are channel-major, unless interleave is set """
+        expected = get_samples(2, 1050)
+        capture = self.capture(FakeRxStreamer(num_chans=2), 'samps.dat', 1050)
+        self.assertEqual(capture.num_samps, 1050)
+        samps = numpy.fromfile(os.path.join(self.tmp_dir, 'samps.dat'), numpy.complex64)
+        self.assertTrue(numpy.array_equal(samps.reshape(2, 1050), expected))
+        self.capture(FakeRxStreamer(num_chans=2), 'samps.dat', 1050, interleave=True)
+        samps = numpy.fromfile(os.path.join(self.tmp_dir, 'samps.dat'), numpy.complex64)
+        self.assertTrue(numpy.array_equal(samps.reshape(1050, 2).T, expected))
+        with self.assertRaises(ValueError):
+            uhd.usrp.RxCapture(FakeRxStreamer(num_chans=2), 'samps.dat')
+
+    def test_early_end(self):
+        """ Test a capture which times out leaves a file without gaps """
+        expected = get_samples(3, 730)
+        for interleave in (False, True):
+            capture = self.capture(
+                FakeRxStreamer(num_chans=3, max_samps=730), 'samps.dat', 1050,
+                interleave=interleave)
+            self.assertEqual(capture.num_samps, 730)
+            self.assertEqual(capture.events[-1].error, 'timeout')
+            samps = numpy.fromfile(os.path.join(self.tmp_dir, 'samps.dat'), numpy.complex64)
+            if interleave:
+                samps = samps.reshape(730, 3).T
+            self.assertTrue(numpy.array_equal(samps.reshape(3, 730), expected))
+
+    def test_npy(self):
+        """ Test np.load() returns the captured samples with either layout """
+        for interleave in (False, True):
+            for max_samps, num_samps in ((None, 1050), (730, 730)):
+                self.capture(
+                    FakeRxStreamer(num_chans=2, max_samps=max_samps), 'samps.npy', 1050,
+                    file_format='npy', interleave=interleave)
+                samps = numpy.load(os.path.join(self.tmp_dir, 'samps.npy'))
+                self.assertTrue(numpy.array_equal(samps, get_samples(2, num_samps)))
+
+    def test_sigmf(self):
+        """ Test SigMF recordings are interleaved, and report overflows """
+        capture = self.capture(
+            FakeRxStreamer(num_chans=2, overflow_packets=(2,)), 'samps.sigmf', 500,
+            file_format='sigmf', rate=1e6)
+        self.assertEqual([event[:2] for event in capture.events], [(200, 'overflow')])
+        samps = numpy.fromfile(os.path.join(self.tmp_dir, 'samps.sigmf-data'), numpy.complex64)
+        self.assertTrue(numpy.array_equal(samps.reshape(500, 2).T, get_samples(2, 500)))
+        with open(os.path.join(self.tmp_dir, 'samps.sigmf-meta')) as meta_file:
+            meta = json.load(meta_file)
+        self.assertEqual(meta['global']['core:num_channels'], 2)
+        self.assertEqual(meta['global']['core:datatype'], 'cf32_le')
+        self.assertEqual(meta['annotations'][0]['core:sample_start'], 200)
+        with self.assertRaises(ValueError):
+            uhd.usrp.RxCapture(FakeRxStreamer(), 'samps.sigmf', 500,
+                               file_format='sigmf', interleave=False)
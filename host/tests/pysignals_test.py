@@ -0,0 +1,114 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+Unit test for uhd.dsp.signals
+"""
+
+import unittest
+import numpy
+from uhd.dsp import signals
+
+class SignalsTest(unittest.TestCase):
+    """ Test the waveform generators and the waveform cache """
+    def test_continuous_tone(self):
+        """ Test get_continuous_tone() repeats with a continuous phase """
+        rate, freq = 1e6, 12345
+        tone = signals.get_continuous_tone(rate, freq, 0.5, cache=None)
+        repeated = numpy.concatenate((tone, tone[:100]))
+        expected = 0.5 * numpy.exp(
+            2j * numpy.pi * freq / rate * numpy.arange(len(repeated)))
+        self.assertLess(numpy.max(numpy.abs(repeated - expected)), 1e-6)
+
+    def test_nco(self):
+        """ Test NCO chunks are continuous, for a sum of tones """
+        rate, freqs, ampls = 1e6, (1000.5, -2e5), (1.0, 0.25)
+        nco = signals.NCO(rate, freqs, ampls, chunk_size=1000)
+        samples = numpy.concatenate((nco.read(1234), nco.read(5000)))
+        times = numpy.arange(len(samples))
+        expected = sum(
+            ampl * numpy.exp(2j * numpy.pi * freq / rate * times)
+            for freq, ampl in zip(freqs, ampls))
+        self.assertLess(numpy.max(numpy.abs(samples - expected)), 1e-6)
+
+    def test_waveform_cache(self):
+        """ Test WaveformCache hits, and eviction by count and by size """
+        cache = signals.WaveformCache(max_entries=2, max_bytes=1000)
+        get_tone = lambda freq, size: signals.get_continuous_tone(
+            1e3, freq, 1.0, desired_size=size, cache=cache)
+        first = get_tone(100, 10)
+        self.assertIs(get_tone(100, 10), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # Too large to be cached
+        get_tone(1, 1000)
+        self.assertEqual(cache.get_nbytes(), first.nbytes)
+        get_tone(200, 10)
+        get_tone(300, 10)
+        self.assertIsNot(get_tone(100, 10), first)
+        cache.clear()
+        self.assertEqual(cache.get_nbytes(), 0)
+
+    def test_noise(self):
+        """ Test get_noise() amplitude and reproducibility """
+        noise = signals.get_noise(100000, 0.1, seed=42, cache=None)
+        self.assertAlmostEqual(numpy.sqrt(numpy.mean(numpy.abs(noise)**2)), 0.1, 2)
+        self.assertTrue(numpy.array_equal(
+            noise, signals.get_noise(100000, 0.1, seed=42, cache=None)))
+
+class EstimatorsTest(unittest.TestCase):
+    """ Test the streaming estimators """
+    def setUp(self):
+        rng = numpy.random.RandomState(0)
+        self.noise = (0.1 * (rng.standard_normal(200000)
+                             + 1j * rng.standard_normal(200000)) + 0.01) \
+            .astype(numpy.complex64)
+
+    def test_power_estimator(self):
+        """ Test PowerEstimator matches the estimate over all samples """
+        estimator = signals.PowerEstimator(tolerance=None)
+        for idx in range(0, len(self.noise), 2000):
+            estimator.update(self.noise[idx:idx+2000])
+        self.assertEqual(estimator.num_samps, len(self.noise))
+        self.assertAlmostEqual(
+            estimator.get_power_dbfs(), signals.get_power_dbfs(self.noise), 4)
+        self.assertAlmostEqual(estimator.get_mean(), self.noise.mean(), 6)
+        self.assertFalse(estimator.is_converged())
+        # A tone has the same power in every batch, so this converges quickly
+        estimator = signals.PowerEstimator(tolerance=0.01)
+        tone = signals.get_continuous_tone(1e6, 12345, 0.5, cache=None)
+        estimator.update(tone[:100000])
+        self.assertTrue(estimator.is_converged())
+        self.assertAlmostEqual(estimator.get_power_dbfs(), 20 * numpy.log10(0.5), 3)
+
+    def test_welch_psd(self):
+        """ Test WelchPSD finds a tone, independent of the chunk sizes """
+        tone = 0.5 * numpy.exp(2j * numpy.pi * 32 / 256 * numpy.arange(100000))
+        chunked = signals.WelchPSD(256)
+        for chunk in numpy.split(tone, [100, 1000, 1100, 50000]):
+            chunked.update(chunk)
+        psd = signals.WelchPSD(256)
+        psd.update(tone)
+        self.assertEqual(chunked.get_num_segments(), psd.get_num_segments())
+        self.assertTrue(numpy.allclose(chunked.get_psd(), psd.get_psd()))
+        psd_dbfs = psd.get_psd_dbfs()
+        self.assertEqual(psd.get_freqs(256)[numpy.argmax(psd_dbfs)], 32)
+        self.assertAlmostEqual(numpy.max(psd_dbfs), 20 * numpy.log10(0.5), 3)
+
+    def test_iq_imbalance(self):
+        """ Test IQImbalanceEstimator finds a known gain/phase imbalance """
+        gain_db, phase = 0.5, numpy.radians(2)
+        gain = 10**(gain_db / 20)
+        samples = self.noise.real + 1j * gain * (
+            self.noise.imag * numpy.cos(phase) + self.noise.real * numpy.sin(phase))
+        estimator = signals.IQImbalanceEstimator(tolerance=None)
+        estimator.update(samples)
+        est_gain_db, est_phase = estimator.get_imbalance()
+        self.assertAlmostEqual(est_gain_db, gain_db, 1)
+        self.assertAlmostEqual(est_phase, 2, 0)
+        # Ratio of the desired signal and its image
+        ideal = abs(1 + gain * numpy.exp(-1j * phase)) \
+            / abs(1 - gain * numpy.exp(1j * phase))
+        self.assertAlmostEqual(
+            estimator.get_image_rejection_db(), 20 * numpy.log10(ideal), 0)
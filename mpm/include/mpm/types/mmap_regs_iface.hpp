@@ -10,6 +10,8 @@
 #include <boost/noncopyable.hpp>
 #include <cstdint>
 #include <string>
+#include <utility>
+#include <vector>
 
 namespace mpm { namespace types {
 
@@ -37,6 +39,36 @@ public:
     //! Read data from \p addr
     uint32_t peek32(const uint32_t addr);
 
+    //! Read data from every address in \p addrs, in order
+    std::vector<uint32_t> peek32_many(const std::vector<uint32_t>& addrs);
+
+    //! Write every (address, data) pair in \p pokes, in order
+    void poke32_many(const std::vector<std::pair<uint32_t, uint32_t>>& pokes);
+
+    //! Replace the bits \p mask of \p addr with those of \p data
+    //
+    // \returns the value of \p addr before the write
+    uint32_t modify32(const uint32_t addr, const uint32_t mask, const uint32_t data);
+
+    //! Longest timeout poll32() accepts (in microseconds)
+    static constexpr uint32_t MAX_POLL_TIMEOUT_US = 10000;
+
+    //! Read \p addr until the bits \p mask are equal to those of \p data
+    //
+    // This blocks the calling thread. MPM runs all its greenlets on a single
+    // thread, so the timeout is limited to MAX_POLL_TIMEOUT_US; longer waits
+    // have to be split up by the caller.
+    //
+    // \param timeout_us Give up after this many microseconds
+    // \param interval_us Wait this many microseconds between two reads
+    // \returns true if the value was reached, false on timeout
+    // \throws mpm::value_error if \p timeout_us exceeds MAX_POLL_TIMEOUT_US
+    bool poll32(const uint32_t addr,
+        const uint32_t mask,
+        const uint32_t data,
+        const uint32_t timeout_us,
+        const uint32_t interval_us);
+
 private:
     void log(mpm::types::log_level_t level, const std::string path, const char* comment);
 
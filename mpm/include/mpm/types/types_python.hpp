@@ -11,6 +11,7 @@
 #include "log_buf.hpp"
 #include "mmap_regs_iface.hpp"
 #include "regs_iface.hpp"
+#include <pybind11/stl.h>
 
 void export_types(py::module& top_module)
 {
@@ -45,5 +46,13 @@ void export_types(py::module& top_module)
         .def("open", &mmap_regs_iface::open)
         .def("close", &mmap_regs_iface::close)
         .def("peek32", &mmap_regs_iface::peek32)
-        .def("poke32", &mmap_regs_iface::poke32);
+        .def("poke32", &mmap_regs_iface::poke32)
+        .def("peek32_many", &mmap_regs_iface::peek32_many)
+        .def("poke32_many", &mmap_regs_iface::poke32_many)
+        .def("modify32", &mmap_regs_iface::modify32)
+        .def("poll32",
+            &mmap_regs_iface::poll32,
+            py::call_guard<py::gil_scoped_release>())
+        .def_readonly_static(
+            "MAX_POLL_TIMEOUT_US", &mmap_regs_iface::MAX_POLL_TIMEOUT_US);
 }
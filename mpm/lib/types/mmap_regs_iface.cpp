@@ -12,11 +12,15 @@
 #include <sys/types.h>
 #include <unistd.h>
 #include <boost/format.hpp>
+#include <chrono>
 #include <iostream>
 #include <sstream>
+#include <thread>
 
 using namespace mpm::types;
 
+constexpr uint32_t mmap_regs_iface::MAX_POLL_TIMEOUT_US;
+
 
 mmap_regs_iface::mmap_regs_iface(const std::string& path,
     const size_t length,
@@ -91,6 +95,62 @@ uint32_t mmap_regs_iface::peek32(const uint32_t addr)
     return _mmap[addr / sizeof(uint32_t)];
 }
 
+std::vector<uint32_t> mmap_regs_iface::peek32_many(const std::vector<uint32_t>& addrs)
+{
+    MPM_ASSERT_THROW(_mmap);
+    std::vector<uint32_t> data;
+    data.reserve(addrs.size());
+    for (const uint32_t addr : addrs) {
+        data.push_back(_mmap[addr / sizeof(uint32_t)]);
+    }
+    return data;
+}
+
+void mmap_regs_iface::poke32_many(
+    const std::vector<std::pair<uint32_t, uint32_t>>& pokes)
+{
+    MPM_ASSERT_THROW(_mmap);
+    for (const auto& poke : pokes) {
+        _mmap[poke.first / sizeof(uint32_t)] = poke.second;
+    }
+}
+
+uint32_t mmap_regs_iface::modify32(
+    const uint32_t addr, const uint32_t mask, const uint32_t data)
+{
+    MPM_ASSERT_THROW(_mmap);
+    const uint32_t old_data = _mmap[addr / sizeof(uint32_t)];
+    _mmap[addr / sizeof(uint32_t)] = (old_data & ~mask) | (data & mask);
+    return old_data;
+}
+
+bool mmap_regs_iface::poll32(const uint32_t addr,
+    const uint32_t mask,
+    const uint32_t data,
+    const uint32_t timeout_us,
+    const uint32_t interval_us)
+{
+    MPM_ASSERT_THROW(_mmap);
+    if (timeout_us > MAX_POLL_TIMEOUT_US) {
+        throw mpm::value_error(
+            str(boost::format("poll32(): Timeout of %d us exceeds the maximum of %d us")
+                % timeout_us % MAX_POLL_TIMEOUT_US));
+    }
+    // The register can change under us, so every iteration must read it
+    const volatile uint32_t* reg = _mmap + addr / sizeof(uint32_t);
+    const auto deadline =
+        std::chrono::steady_clock::now() + std::chrono::microseconds(timeout_us);
+    while (true) {
+        if ((*reg & mask) == (data & mask)) {
+            return true;
+        }
+        if (std::chrono::steady_clock::now() >= deadline) {
+            return false;
+        }
+        std::this_thread::sleep_for(std::chrono::microseconds(interval_us));
+    }
+}
+
 void mmap_regs_iface::log(
     mpm::types::log_level_t level, const std::string path, const char* comment)
 {
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+Benchmark of the simulator's streaming datapath.
+
+This starts the sim periph manager in this process (just like
+usrp_hwd.py --init-only does), and streams to and from it with the
+pure Python CHDR client in sim_chdr_client.py. For every SPP value, it
+measures:
+
+- rx: The simulator streams to us. Packets and bytes per second we
+  receive, the latency of each packet (the time between its timestamp
+  and its arrival), and CPU time per packet.
+- tx: We stream to the simulator as fast as flow control allows.
+  Packets and bytes per second, the round-trip latency of flow control
+  (the time between sending a packet and receiving the STRS which
+  acknowledges it), and CPU time per packet.
+
+CPU time is that of the whole process, i.e. it includes the client.
+Latencies are in seconds. If the simulator can't keep up with --rate,
+the rx latency includes the time the stream spends catching up on its
+backlog, so use a rate below the measured throughput to measure the
+latency of the datapath alone.
+
+The results are stored as JSON, including the payload size of the
+packets of every run. Passing the results of an earlier run with
+--compare prints the change of every metric between runs with the same
+direction and payload size, and fails if any of them got worse by more
+than --threshold. For example:
+
+    python3 sim_benchmark.py --output before.json
+    (check out another commit and rebuild)
+    python3 sim_benchmark.py --output after.json --compare before.json
+
+MPM must be built for the simulator (-DMPM_DEVICE=sim), and the
+usrp_mpm and uhd Python modules must be on the PYTHONPATH.
+"""
+
+import sys
+import os
+import time
+import json
+import argparse
+import platform
+import subprocess
+# This monkey patches threading, socket, etc. (see rpc_server.py), so it
+# must come first. The simulator runs the same way inside usrp_hwd.py.
+import usrp_mpm as mpm
+from usrp_mpm.mpmlog import get_main_logger
+from usrp_mpm.simulator.chdr_stream import peek_data_header, RawDataPacket
+from usrp_mpm.simulator.noc_block_regs import RADIO_BASE_ADDR, REG_RX_MAX_WORDS_PER_PKT, \
+    REG_RX_HAS_TIME, REG_RX_CMD, RX_CMD_CONTINUOUS, RX_CMD_STOP
+from uhd.chdr import ChdrPacket, PacketType
+from sim_chdr_client import SimChdrClient, CHDR_W
+
+# Version of the format of the results file. Version 1 had no
+# payload_bytes, and its rx runs sent spp bytes (not samples) per packet.
+RESULTS_VERSION = 2
+# Metrics of a run, and whether a larger value is an improvement
+METRICS = {
+    'packets_per_sec': True,
+    'bytes_per_sec': True,
+    'latency_mean': False,
+    'latency_p50': False,
+    'latency_p99': False,
+    'cpu_per_packet': False,
+}
+# The radio is the first NoC block, i.e. on control port 1
+RADIO_CTRL_PORT = 1
+# Endpoint ids. UHD would assign these.
+CLIENT_EPID = 1
+SEP_EPID = 2
+# Flow control settings of our end of the streams
+RX_CAPACITY_PKTS = 64
+RX_CAPACITY_BYTES = 64 * 8192
+TX_FC_PKTS = 8
+TX_WINDOW_PKTS = 32
+# Bytes per sample, see ChdrOutputStream.SAMPLE_BYTES
+SAMPLE_BYTES = 4
+
+def spp_to_bytes(spp):
+    """Return the payload size (in bytes) of a packet with spp samples.
+    This is what the simulator expects in REG_RX_MAX_WORDS_PER_PKT (see
+    ChdrOutputStream), and what we send per tx packet.
+    """
+    return spp * SAMPLE_BYTES
+
+def get_payload_bytes(run, version):
+    """Return the payload size of the packets of a run, also for results
+    files which didn't record it
+    """
+    if version < 2:
+        return run['spp'] if run['direction'] == 'rx' else spp_to_bytes(run['spp'])
+    return run['payload_bytes']
+
+def percentile(values, fraction):
+    """Return the value below which fraction of the sorted list values lie"""
+    if not values:
+        return None
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+def summarize(direction, spp, payload_bytes, num_packets, num_bytes, elapsed, cpu_time,
+              latencies, **extra):
+    """Put the measurements of a run into a result dict. payload_bytes is
+    the payload size of the packets which were actually sent.
+    """
+    latencies = sorted(latencies)
+    result = {
+        'direction': direction,
+        'spp': spp,
+        'payload_bytes': payload_bytes,
+        'packets': num_packets,
+        'duration': elapsed,
+        'packets_per_sec': num_packets / elapsed,
+        'bytes_per_sec': num_bytes / elapsed,
+        'latency_mean': sum(latencies) / len(latencies) if latencies else None,
+        'latency_p50': percentile(latencies, 0.5),
+        'latency_p99': percentile(latencies, 0.99),
+        'cpu_per_packet': cpu_time / num_packets if num_packets else None,
+    }
+    result.update(extra)
+    return result
+
+def run_rx(client, timekeeper, spp, duration):
+    """Stream from the simulator to the client for duration seconds"""
+    strc = client.setup_output_stream(0, SEP_EPID, RX_CAPACITY_PKTS, RX_CAPACITY_BYTES)
+    fc_pkts = max(strc.num_pkts, 1)
+    chan_base = RADIO_BASE_ADDR
+    client.ctrl_write(SEP_EPID, RADIO_CTRL_PORT, chan_base + REG_RX_MAX_WORDS_PER_PKT,
+                      spp_to_bytes(spp))
+    client.ctrl_write(SEP_EPID, RADIO_CTRL_PORT, chan_base + REG_RX_HAS_TIME, 1)
+    num_packets = 0
+    num_bytes = 0
+    payload_bytes = 0
+    seq_errors = 0
+    next_seq_num = 0
+    latencies = []
+    client.ctrl_write(SEP_EPID, RADIO_CTRL_PORT, chan_base + REG_RX_CMD, RX_CMD_CONTINUOUS)
+    cpu_start = time.process_time()
+    start = time.monotonic()
+    end = start + duration
+    while time.monotonic() < end:
+        data = client.recv(max(end - time.monotonic(), 0))
+        if data is None:
+            break
+        header = peek_data_header(data)
+        if header is None:
+            continue
+        now = time.monotonic()
+        _, header_word = header
+        seq_num = (header_word >> 32) & 0xFFFF
+        if seq_num != next_seq_num:
+            seq_errors += 1
+        next_seq_num = (seq_num + 1) & 0xFFFF
+        num_packets += 1
+        num_bytes += len(data)
+        packet = RawDataPacket(CHDR_W, data, header_word)
+        payload_bytes = max(payload_bytes, len(packet.get_payload_bytes()))
+        timestamp = packet.get_timestamp()
+        if timestamp is not None:
+            latencies.append(now - timekeeper.ticks_to_time(timestamp))
+        if num_packets % fc_pkts == 0:
+            client.send_strs(SEP_EPID, RX_CAPACITY_PKTS, RX_CAPACITY_BYTES,
+                             num_packets, num_bytes)
+    elapsed = time.monotonic() - start
+    cpu_time = time.process_time() - cpu_start
+    client.ctrl_write(SEP_EPID, RADIO_CTRL_PORT, chan_base + REG_RX_CMD, RX_CMD_STOP)
+    # Give the stream the credit to send its end-of-burst, and drain it
+    client.send_strs(SEP_EPID, RX_CAPACITY_PKTS, RX_CAPACITY_BYTES, num_packets, num_bytes)
+    client.drain()
+    return summarize('rx', spp, payload_bytes, num_packets, num_bytes, elapsed, cpu_time,
+                     latencies, seq_errors=seq_errors)
+
+def run_tx(client, spp, duration):
+    """Stream from the client to the simulator for duration seconds"""
+    client.setup_input_stream(0, SEP_EPID)
+    client.init_flow_control(SEP_EPID, TX_FC_PKTS, 1 << 32)
+    payload = bytes(spp_to_bytes(spp))
+    num_packets = 0
+    num_bytes = 0
+    acked = 0
+    # Send times of the packets which haven't been acknowledged yet
+    send_times = []
+    latencies = []
+    cpu_start = time.process_time()
+    start = time.monotonic()
+    end = start + duration
+    while time.monotonic() < end:
+        while num_packets - acked < TX_WINDOW_PKTS:
+            num_bytes += client.send_data(SEP_EPID, payload)
+            num_packets += 1
+            send_times.append(time.monotonic())
+        # The window is full, wait for the simulator to make room
+        data = client.recv(max(end - time.monotonic(), 0))
+        if data is None:
+            break
+        now = time.monotonic()
+        if peek_data_header(data) is not None:
+            continue
+        packet = ChdrPacket.deserialize(CHDR_W, data)
+        if packet.get_header().pkt_type != PacketType.STRS:
+            continue
+        xfer_pkts = packet.get_payload_strs().xfer_count_pkts
+        if xfer_pkts > acked:
+            latencies.append(now - send_times[xfer_pkts - acked - 1])
+            del send_times[:xfer_pkts - acked]
+            acked = xfer_pkts
+    elapsed = time.monotonic() - start
+    cpu_time = time.process_time() - cpu_start
+    # Don't let late status updates confuse the next run
+    client.drain()
+    return summarize('tx', spp, len(payload), num_packets, num_bytes, elapsed, cpu_time,
+                     latencies)
+
+def get_git_hash():
+    """Return the commit the benchmark was run on, if we can find out"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(old_results, new_results, threshold):
+    """Print the relative change of every metric between two result
+    files. Runs are matched by direction and payload size. Returns the
+    number of metrics which got worse by more than threshold (a fraction).
+    """
+    old_version = old_results.get('version', 1)
+    old_runs = {(run['direction'], get_payload_bytes(run, old_version)): run
+                for run in old_results['runs']}
+    regressions = 0
+    print("{:<4} {:>6} {:<16} {:>14} {:>14} {:>9}".format(
+        "dir", "spp", "metric", "old", "new", "change"))
+    for run in new_results['runs']:
+        old_run = old_runs.get((run['direction'], run['payload_bytes']))
+        if old_run is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = old_run.get(metric), run.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = "REGRESSION"
+                regressions += 1
+            print("{:<4} {:>6} {:<16} {:>14.6g} {:>14.6g} {:>+8.1%} {}".format(
+                run['direction'], run['spp'], metric, old, new, change, flag))
+    return regressions
+
+def setup_arg_parser():
+    """
+    Create an arg parser
+    """
+    parser = argparse.ArgumentParser(description="USRP Simulator Streaming Benchmark")
+    parser.add_argument(
+        '--config',
+        help="Simulator config file, e.g. to select the stream workers",
+        default=None,
+    )
+    parser.add_argument(
+        '--spp',
+        help="Comma-separated list of samples per packet to measure",
+        default="64,256,1024,1800",
+    )
+    parser.add_argument(
+        '--rate',
+        help="Sample rate of the rx streams. The default is more than " \
+             "the simulator can do, which measures its maximum throughput.",
+        type=float,
+        default=1e9,
+    )
+    parser.add_argument(
+        '--duration',
+        help="Length of each run in seconds",
+        type=float,
+        default=5.0,
+    )
+    parser.add_argument(
+        '--directions',
+        help="Comma-separated list of directions to measure (rx, tx)",
+        default="rx,tx",
+    )
+    parser.add_argument(
+        '--addr',
+        help="Address to reach the simulator's CHDR port on",
+        default="127.0.0.1",
+    )
+    parser.add_argument(
+        '--output',
+        help="File to store the results in",
+        default="sim_benchmark.json",
+    )
+    parser.add_argument(
+        '--compare',
+        help="Results of an earlier run to compare with",
+        default=None,
+    )
+    parser.add_argument(
+        '--threshold',
+        help="Relative change of a metric which counts as a regression",
+        type=float,
+        default=0.1,
+    )
+    parser.add_argument(
+        '-v',
+        '--verbose',
+        help="Increase verbosity level",
+        action="count",
+        default=0
+    )
+    return parser
+
+def main():
+    """
+    Run the benchmark and store (and compare) the results
+    """
+    args = setup_arg_parser().parse_args()
+    log = get_main_logger(
+        use_logbuf=False,
+        log_default_delta=args.verbose - 1
+    ).getChild('sim_benchmark')
+    if not mpm.__simulated__:
+        log.error("MPM must be built with -DMPM_DEVICE=sim to run this benchmark")
+        return False
+    from usrp_mpm.periph_manager import periph_manager
+    default_args = {}
+    if args.config is not None:
+        default_args['config'] = args.config
+    mgr = periph_manager(default_args)
+    # The daughterboard sets the sample rate of the radio, as it would
+    # when UHD changes the master clock rate
+    mgr.dboards[0].set_catalina_clock_rate(args.rate)
+    config = mgr.config
+    network = config.network
+    timekeeper = mgr.chdr_endpoint.get_timekeeper()
+    client = SimChdrClient((args.addr, network.chdr_port), CLIENT_EPID, 0,
+                           config.topology.num_xports)
+    spps = [int(spp) for spp in args.spp.split(',')]
+    directions = args.directions.split(',')
+    runs = []
+    for spp in spps:
+        for direction in directions:
+            log.info("Measuring {} with {} samples per packet".format(direction, spp))
+            if direction == 'rx':
+                run = run_rx(client, timekeeper, spp, args.duration)
+            elif direction == 'tx':
+                run = run_tx(client, spp, args.duration)
+            else:
+                log.error("Unknown direction: {}".format(direction))
+                return False
+            log.info("{packets_per_sec:.1f} packets/sec, {bytes_per_sec:.0f} bytes/sec, "
+                     "{payload_bytes} payload bytes/packet".format(**run))
+            runs.append(run)
+    client.close()
+    results = {
+        'version': RESULTS_VERSION,
+        'git_hash': get_git_hash(),
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'host': platform.node(),
+        'config': args.config,
+        'stream_workers': config.topology.stream_workers,
+        'rate': args.rate,
+        'runs': runs,
+    }
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+    log.info("Results stored in {}".format(args.output))
+    if args.compare is not None:
+        with open(args.compare) as old_file:
+            old_results = json.load(old_file)
+        regressions = compare(old_results, results, args.threshold)
+        if regressions:
+            log.error("{} metrics regressed by more than {:.0%}"
+                      .format(regressions, args.threshold))
+            return False
+    return True
+
+if __name__ == '__main__':
+    sys.exit(not main())
@@ -0,0 +1,248 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+A minimal CHDR client written in Python, which talks to the simulator
+over UDP the same way UHD does, but without the rest of UHD. It
+configures stream endpoints with management packets, writes radio
+registers with control packets and exchanges flow control (STRC/STRS)
+with the streams of the simulator.
+
+Only the packet sequences which the simulator (see usrp_mpm/simulator)
+needs are implemented. The topology is assumed to be the one of
+ChdrEndpoint.get_default_nodes(): every xport and stream endpoint
+connected to a single crossbar.
+"""
+
+import socket
+import select
+import time
+from uhd.chdr import ChdrPacket, ChdrWidth, ChdrHeader, PacketType, MgmtPayload, MgmtHop, \
+    MgmtOp, MgmtOpCode, MgmtOpCfg, MgmtOpSelDest, CtrlPayload, CtrlOpCode, StrcPayload, \
+    StrcOpCode, StrsPayload, StrsStatus
+from usrp_mpm.simulator.chdr_stream import pack_data_header, peek_data_header
+from usrp_mpm.simulator.stream_ep_regs import REG_EPID_SELF, REG_OSTRM_DST_EPID, \
+    REG_OSTRM_CTRL_STATUS, REG_ISTRM_CTRL_STATUS
+
+CHDR_W = ChdrWidth.W64
+# See sim.py:get_proto_ver()
+PROTO_VER = 0x100
+# CtrlStatusWord with only cfg_start set (see stream_ep_regs.py)
+CTRL_STATUS_CFG_START = 0x1
+
+class ChdrClientError(RuntimeError):
+    """Raised when the simulator doesn't respond the way we expect"""
+
+class SimChdrClient:
+    """This class is one end of a CHDR link to xport xport_inst of a
+    simulated device listening at addr (a (host, port) tuple). It
+    identifies itself with the endpoint id epid.
+    """
+    MAX_PACKET_SIZE = 8192
+    # How long to wait for the response to a request
+    TIMEOUT = 2.0
+
+    def __init__(self, addr, epid=1, xport_inst=0, num_xports=1):
+        self.addr = addr
+        self.epid = epid
+        self.xport_inst = xport_inst
+        self.num_xports = num_xports
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect(addr)
+        self.ctrl_seq_num = 0
+        self.data_seq_num = 0
+        # Packets which arrived while we waited for something else
+        self.pending = []
+
+    def close(self):
+        """Close the socket"""
+        self.sock.close()
+
+    def send_packet(self, packet):
+        """Serialize packet and send it"""
+        self.sock.send(bytes(packet.serialize()))
+
+    def recv(self, timeout=None):
+        """Receive a datagram. Returns None if nothing arrived within
+        timeout seconds (None blocks forever, 0 polls).
+        """
+        if self.pending:
+            return self.pending.pop(0)
+        if timeout is not None:
+            readable, _, _ = select.select([self.sock], [], [], timeout)
+            if not readable:
+                return None
+        return self.sock.recv(self.MAX_PACKET_SIZE)
+
+    def drain(self, timeout=0.2):
+        """Discard everything which arrives until nothing has arrived
+        for timeout seconds
+        """
+        self.pending = []
+        while self.recv(timeout) is not None:
+            pass
+
+    def recv_matching(self, predicate, what):
+        """Wait for a non-DATA packet for which predicate(packet) is
+        true. Everything else which arrives in the meantime is kept for
+        later calls of recv().
+        """
+        deadline = time.monotonic() + self.TIMEOUT
+        skipped = []
+        try:
+            while True:
+                data = self.sock.recv(self.MAX_PACKET_SIZE) \
+                    if select.select([self.sock], [], [], deadline - time.monotonic())[0] \
+                    else None
+                if data is None:
+                    raise ChdrClientError("Timed out waiting for {}".format(what))
+                if peek_data_header(data) is None:
+                    packet = ChdrPacket.deserialize(CHDR_W, data)
+                    if predicate(packet):
+                        return packet
+                skipped.append(data)
+        finally:
+            self.pending.extend(skipped)
+
+    def _xbar_port(self, sep_inst):
+        """The crossbar port of stream endpoint sep_inst (see
+        rfnoc_graph.py:XbarNode)
+        """
+        return self.num_xports + sep_inst
+
+    def mgmt_transaction(self, sep_inst, sep_epid, sep_ops):
+        """Send a management packet which advertises us on our xport,
+        sets up the routes between us and stream endpoint sep_inst
+        (which has the id sep_epid) in the crossbar, and then runs
+        sep_ops (a list of MgmtOps) on the stream endpoint. Waits for
+        the packet to be returned.
+        """
+        payload = MgmtPayload()
+        payload.set_header(self.epid, PROTO_VER, CHDR_W)
+        xport_hop = MgmtHop()
+        xport_hop.add_op(MgmtOp(MgmtOpCode.ADVERTISE))
+        payload.add_hop(xport_hop)
+        xbar_hop = MgmtHop()
+        xbar_hop.add_op(MgmtOp(MgmtOpCode.CFG_WR_REQ, MgmtOpCfg(self.epid, self.xport_inst)))
+        xbar_hop.add_op(MgmtOp(MgmtOpCode.CFG_WR_REQ,
+                               MgmtOpCfg(sep_epid, self._xbar_port(sep_inst))))
+        xbar_hop.add_op(MgmtOp(MgmtOpCode.SEL_DEST, MgmtOpSelDest(self._xbar_port(sep_inst))))
+        payload.add_hop(xbar_hop)
+        sep_hop = MgmtHop()
+        for op in sep_ops:
+            sep_hop.add_op(op)
+        sep_hop.add_op(MgmtOp(MgmtOpCode.RETURN))
+        payload.add_hop(sep_hop)
+        header = ChdrHeader()
+        header.pkt_type = PacketType.MGMT
+        header.dst_epid = 0
+        self.send_packet(ChdrPacket(CHDR_W, header, payload))
+        self.recv_matching(lambda packet: packet.get_header().pkt_type == PacketType.MGMT,
+                           "management response")
+
+    def setup_output_stream(self, sep_inst, sep_epid, capacity_pkts, capacity_bytes):
+        """Give stream endpoint sep_inst the id sep_epid, and set it up
+        to stream to us. The stream endpoint initiates flow control with
+        a STRC packet, to which we respond with our buffer capacity.
+        Returns the StrcPayload, which tells us how often the stream
+        wants a status update.
+        """
+        self.mgmt_transaction(sep_inst, sep_epid, [
+            MgmtOp(MgmtOpCode.CFG_WR_REQ, MgmtOpCfg(REG_EPID_SELF, sep_epid)),
+            MgmtOp(MgmtOpCode.CFG_WR_REQ, MgmtOpCfg(REG_OSTRM_DST_EPID, self.epid)),
+            MgmtOp(MgmtOpCode.CFG_WR_REQ,
+                   MgmtOpCfg(REG_OSTRM_CTRL_STATUS, CTRL_STATUS_CFG_START)),
+        ])
+        strc = self.recv_matching(lambda packet: packet.get_header().pkt_type == PacketType.STRC,
+                                  "stream command").get_payload_strc()
+        self.send_strs(sep_epid, capacity_pkts, capacity_bytes, 0, 0)
+        return strc
+
+    def setup_input_stream(self, sep_inst, sep_epid):
+        """Give stream endpoint sep_inst the id sep_epid, and start its
+        input stream
+        """
+        self.mgmt_transaction(sep_inst, sep_epid, [
+            MgmtOp(MgmtOpCode.CFG_WR_REQ, MgmtOpCfg(REG_EPID_SELF, sep_epid)),
+            MgmtOp(MgmtOpCode.CFG_WR_REQ,
+                   MgmtOpCfg(REG_ISTRM_CTRL_STATUS, CTRL_STATUS_CFG_START)),
+        ])
+
+    def ctrl_write(self, sep_epid, ctrl_port, addr, value):
+        """Write value to register addr of the block on ctrl_port (0 is
+        client zero, n is NoC block n - 1), through stream endpoint
+        sep_epid. Waits for the acknowledgement.
+        """
+        header = ChdrHeader()
+        header.pkt_type = PacketType.CTRL
+        header.dst_epid = sep_epid
+        payload = CtrlPayload()
+        payload.dst_port = ctrl_port
+        payload.src_port = 0
+        payload.src_epid = self.epid
+        payload.seq_num = self.ctrl_seq_num
+        self.ctrl_seq_num = (self.ctrl_seq_num + 1) & 0x3F
+        payload.op_code = CtrlOpCode.WRITE
+        payload.address = addr
+        payload.byte_enable = 0xF
+        payload.set_data([value])
+        seq_num = payload.seq_num
+        self.send_packet(ChdrPacket(CHDR_W, header, payload))
+        def is_ack(packet):
+            if packet.get_header().pkt_type != PacketType.CTRL:
+                return False
+            response = packet.get_payload_ctrl()
+            return response.is_ack and response.seq_num == seq_num
+        self.recv_matching(is_ack, "control acknowledgement")
+
+    def send_strc(self, sep_epid, op_code, num_pkts=0, num_bytes=0):
+        """Send a stream command to the input stream of sep_epid"""
+        header = ChdrHeader()
+        header.pkt_type = PacketType.STRC
+        header.dst_epid = sep_epid
+        payload = StrcPayload()
+        payload.src_epid = self.epid
+        payload.op_code = op_code
+        payload.num_pkts = num_pkts
+        payload.num_bytes = num_bytes
+        self.send_packet(ChdrPacket(CHDR_W, header, payload))
+
+    def init_flow_control(self, sep_epid, fc_pkts, fc_bytes):
+        """Initialize the input stream of sep_epid, asking for a status
+        update every fc_pkts packets or fc_bytes bytes. Returns the
+        StrsPayload of the response.
+        """
+        self.send_strc(sep_epid, StrcOpCode.INIT, fc_pkts, fc_bytes)
+        return self.recv_matching(
+            lambda packet: packet.get_header().pkt_type == PacketType.STRS,
+            "stream status").get_payload_strs()
+
+    def send_strs(self, sep_epid, capacity_pkts, capacity_bytes, xfer_pkts, xfer_bytes):
+        """Tell the output stream of sep_epid how much we have received"""
+        header = ChdrHeader()
+        header.pkt_type = PacketType.STRS
+        header.dst_epid = sep_epid
+        payload = StrsPayload()
+        payload.src_epid = self.epid
+        payload.status = StrsStatus.OKAY
+        payload.capacity_pkts = capacity_pkts
+        payload.capacity_bytes = capacity_bytes
+        payload.xfer_count_pkts = xfer_pkts
+        payload.xfer_count_bytes = xfer_bytes
+        self.send_packet(ChdrPacket(CHDR_W, header, payload))
+
+    def send_data(self, sep_epid, payload, timestamp=None):
+        """Send a DATA packet with payload (a bytes-like object) to
+        sep_epid. Returns the length of the packet.
+        """
+        header = ChdrHeader()
+        header.pkt_type = PacketType.DATA_NO_TS if timestamp is None \
+            else PacketType.DATA_WITH_TS
+        header.dst_epid = sep_epid
+        header.seq_num = self.data_seq_num
+        self.data_seq_num = (self.data_seq_num + 1) & 0xFFFF
+        data = pack_data_header(CHDR_W, header, len(payload), timestamp) + payload
+        self.sock.send(data)
+        return len(data)
@@ -0,0 +1,164 @@
+#
+# Copyright 2021 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+Tests for the Eye Scan tool
+"""
+import unittest
+from unittest import mock
+import numpy as np
+from base_tests import TestBase
+from usrp_mpm.cores.eyescan import EyeScanTool
+
+
+class _NullLog(object):
+    """
+    Logger which drops all messages
+    """
+    def __getattr__(self, _name):
+        return lambda *args, **kwargs: None
+
+
+class _FakeJesdCore(object):
+    """
+    DRP backend of a JESD core, which simulates the eye scan circuitry of each
+    lane. The eye is open (no bit errors) within +/-eye_width horizontally and
+    +/-eye_height vertically. The sample count depends on the offsets, so
+    overwritten counters can be told apart from measured ones.
+    """
+    def __init__(self, lanes, eye_width=12, eye_height=40):
+        self.eye_width = eye_width
+        self.eye_height = eye_height
+        self.target = None
+        self.regs = {lane: {0x03B: 0, 0x03C: 0, 0x03D: 0, 0x082: 0x20} for lane in lanes}
+        self.running = {lane: False for lane in lanes}
+        self.acquisitions = 0
+
+    def set_drp_target(self, _kind, lane):
+        self.target = lane
+
+    def disable_drp_target(self):
+        self.target = None
+
+    def _offsets(self):
+        """ Returns the horizontal and vertical offset of the target lane """
+        regs = self.regs[self.target]
+        ver_offset = regs[0x03B] & 0x7F
+        if regs[0x03B] & 0x80:
+            ver_offset = -ver_offset
+        hor_offset = regs[0x03C] & 0xFFF
+        if hor_offset & 0x800:
+            hor_offset -= 0x1000
+        return hor_offset, ver_offset
+
+    def _read(self, addr):
+        hor_offset, ver_offset = self._offsets()
+        is_open = abs(hor_offset) <= self.eye_width and abs(ver_offset) <= self.eye_height
+        if addr == 0x151:
+            # es_control_status: END state with done bit once running
+            return 0b0101 if self.running[self.target] else 0
+        if addr == 0x14F:
+            return 0 if is_open else abs(hor_offset) + abs(ver_offset) + self.target
+        if addr == 0x150:
+            return 0x1000 + 64 * abs(hor_offset) + abs(ver_offset)
+        return self.regs[self.target].get(addr, 0)
+
+    def drp_access(self, rd=True, addr=0, wr_data=0):
+        assert self.target is not None
+        if rd:
+            return self._read(addr)
+        self.regs[self.target][addr] = wr_data
+        if addr == 0x03D:
+            if wr_data & 1 and not self.running[self.target]:
+                self.acquisitions += 1
+            self.running[self.target] = bool(wr_data & 1)
+        return 0
+
+    def drp_read_many(self, addrs):
+        assert self.target is not None
+        return [self._read(addr) for addr in addrs]
+
+
+class TestEyeScan(TestBase):
+    """
+    Tests the sweep of EyeScanTool against a fake DRP backend
+    """
+    LANES = [0, 1]
+    HOR_RANGE = {'start': -32, 'stop': 32, 'step': 2}
+    VER_RANGE = {'start': -127, 'stop': 127, 'step': 8}
+
+    def setUp(self):
+        patcher = mock.patch('usrp_mpm.cores.eyescan.get_logger',
+                             return_value=_NullLog())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _measure(self, eq_mode='LPM', coarse_step=0):
+        """
+        Sweeps the fake eye, returns (counters, measured, acquisitions)
+        """
+        core = _FakeJesdCore(self.LANES)
+        tool = EyeScanTool(core, eq_mode=eq_mode, coarse_step=coarse_step)
+        tool.lanes = self.LANES
+        tool.eyescan_config()
+        counters, measured = tool.eyescan_measure(
+            tool.parse_ranges(self.HOR_RANGE, self.VER_RANGE))
+        return counters, measured, core.acquisitions
+
+    def test_full_sweep(self):
+        """
+        Without coarse_step, every point is measured
+        """
+        for eq_mode, num_ut in (('LPM', 1), ('DFE', 2)):
+            counters, measured, acquisitions = self._measure(eq_mode)
+            self.assertTrue(measured.all())
+            self.assertEqual(counters.shape, measured.shape + (num_ut,))
+            self.assertEqual(acquisitions, measured.size * num_ut)
+
+    def test_coarse_sweep(self):
+        """
+        The coarse-to-fine sweep keeps every measured counter, and only fills
+        in the points inside the open eye.
+        """
+        for eq_mode in ('LPM', 'DFE'):
+            full, _, full_acquisitions = self._measure(eq_mode)
+            coarse, measured, coarse_acquisitions = self._measure(eq_mode, coarse_step=4)
+            self.assertLess(coarse_acquisitions, full_acquisitions)
+            self.assertFalse(measured.all())
+            # Measured points, including the coarse corners and the edges of
+            # closed cells, match the full sweep.
+            np.testing.assert_array_equal(coarse[measured], full[measured])
+            # Skipped points are error-free, and got a sample count no larger
+            # than the measured one.
+            skipped = ~measured
+            self.assertEqual(full['error_count'][skipped].sum(), 0)
+            self.assertEqual(coarse['error_count'][skipped].sum(), 0)
+            self.assertTrue(
+                (coarse['sample_count'][skipped] <= full['sample_count'][skipped]).all())
+
+    def test_refine_points(self):
+        """
+        _refine_points() doesn't touch the corners, or the points shared with a
+        closed cell.
+        """
+        tool = EyeScanTool(_FakeJesdCore([0]))
+        tool.lanes = [0]
+        counters = np.zeros((1, 5, 3, 1), dtype=EyeScanTool.COUNTERS_DTYPE)
+        counters['sample_count'][0, :, :, 0] = np.arange(15).reshape(5, 3) + 100
+        # Corner (4, 2) saw errors, so the cell (2..4, 0..2) is closed.
+        counters['error_count'][0, 4, 2, 0] = 1
+        original = counters.copy()
+        todo = tool._refine_points(counters, [0, 2, 4], [0, 2])
+        expected_todo = np.zeros((1, 5, 3), dtype=bool)
+        expected_todo[0, [0, 0, 2, 2, 4, 4], [0, 2, 0, 2, 0, 2]] = True
+        expected_todo[0, 2:, :] = True
+        np.testing.assert_array_equal(todo, expected_todo)
+        np.testing.assert_array_equal(counters[todo], original[todo])
+        # The open cell (0..2, 0..2) gets the smallest sample count of its corners.
+        self.assertTrue((counters['sample_count'][~todo] == 100).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+Tests for the MPM logging backend
+"""
+import logging
+import unittest
+from base_tests import TestBase
+from usrp_mpm import mpmlog
+
+
+class TestMpmLog(TestBase):
+    """
+    Tests for the handlers and formatters in mpmlog
+    """
+    def _make_record(self, msg, *args, level=logging.INFO):
+        """
+        Return a log record from logger 'MPM.test'
+        """
+        return logging.LogRecord('MPM.test', level, __file__, 0, msg, args, None)
+
+    def test_log_ring_buffer(self):
+        """
+        Checks that the ring buffer returns the youngest messages, oldest first,
+        and is empty after reading it
+        """
+        ring = mpmlog.LogRingBuffer(3)
+        for idx in range(5):
+            ring.handle(self._make_record("message %d", idx))
+        entries = ring.pop_all()
+        self.assertEqual([entry[1] for entry in entries],
+                         ["message 2", "message 3", "message 4"])
+        self.assertEqual(entries[0][0], 'MPM.test')
+        self.assertEqual(entries[0][2], 'INFO')
+        self.assertEqual(ring.pop_all(), [])
+        ring.handle(self._make_record("message %d", 5))
+        self.assertEqual([entry[1] for entry in ring.pop_all()], ["message 5"])
+
+    def test_log_ring_buffer_size_zero(self):
+        """
+        Checks that a ring buffer of size 0 stores nothing
+        """
+        ring = mpmlog.LogRingBuffer(0)
+        ring.handle(self._make_record("message"))
+        self.assertEqual(ring.pop_all(), [])
+
+    def test_color_formatter(self):
+        """
+        Checks that only the message is colored, and the record isn't modified
+        """
+        formatter = mpmlog.ColorFormatter("[%(name)s] [%(levelname)s] %(message)s")
+        record = self._make_record("value %d", 5, level=logging.ERROR)
+        self.assertEqual(
+            formatter.format(record),
+            "[MPM.test] [ERROR] " + mpmlog.BOLD + mpmlog.RED + "value 5" + mpmlog.RESET)
+        self.assertEqual(record.msg, "value %d")
+        self.assertEqual(record.args, (5,))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+Tests for the RPC call statistics
+"""
+import unittest
+from base_tests import TestBase
+from usrp_mpm.rpc_stats import LatencyHistogram, RPCStats
+
+
+class TestRPCStats(TestBase):
+    """
+    Tests for LatencyHistogram and RPCStats
+    """
+    def test_latency_histogram(self):
+        """
+        Checks that percentiles are within the bucket resolution of the
+        actual values
+        """
+        hist = LatencyHistogram()
+        self.assertIsNone(hist.get_percentile(50))
+        values = [idx * 1e-4 for idx in range(1, 1001)]
+        for value in values:
+            hist.record(value)
+        max_error = 1.0 / LatencyHistogram.SUB_BUCKETS
+        for percentile in (1, 50, 90, 99, 100):
+            expected = values[int(len(values) * percentile / 100) - 1]
+            actual = hist.get_percentile(percentile)
+            self.assertGreaterEqual(actual, expected)
+            self.assertLessEqual(actual, expected * (1 + max_error))
+        hist_dict = hist.to_dict()
+        self.assertEqual(hist_dict['count'], len(values))
+        self.assertEqual(sum(count for _, count in hist_dict['buckets']), len(values))
+        self.assertAlmostEqual(hist_dict['mean'], sum(values) / len(values))
+        self.assertEqual(hist_dict['min'], values[0])
+        self.assertEqual(hist_dict['max'], values[-1])
+
+    def test_rpc_stats(self):
+        """
+        Checks call, error and in-flight counting, and resetting
+        """
+        stats = RPCStats()
+        call_ids = [stats.call_started('foo') for _ in range(3)]
+        running_id = stats.call_started('bar')
+        stats.call_finished(call_ids[0])
+        stats.call_finished(call_ids[1], failed=True)
+        stats.call_finished(call_ids[2])
+        result = stats.get_stats(reset=True)
+        self.assertEqual(result['methods']['foo']['calls'], 3)
+        self.assertEqual(result['methods']['foo']['errors'], 1)
+        self.assertEqual(result['methods']['foo']['in_flight'], 0)
+        self.assertEqual(result['methods']['foo']['latency']['count'], 3)
+        self.assertEqual(result['methods']['bar']['in_flight'], 1)
+        self.assertEqual([method for method, _ in result['in_flight']], ['bar'])
+        # Calls which were running during the reset are not counted
+        stats.call_finished(running_id)
+        self.assertEqual(stats.get_stats()['methods'], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
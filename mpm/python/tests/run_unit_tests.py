@@ -10,8 +10,11 @@ USRP MPM Python Unit testing framework
 import unittest
 import sys
 import argparse
-from sys_utils_tests import TestNet
+from sys_utils_tests import TestNet, TestRegTransactions, TestDeviceIndex
 from mpm_utils_tests import TestMpmUtils
+from mpm_log_tests import TestMpmLog
+from rpc_stats_tests import TestRPCStats
+from sensor_cache_tests import TestSensorCache
 from eeprom_tests import TestEeprom
 from usrp_mpm import __simulated__
 
@@ -22,7 +25,12 @@ if importlib.util.find_spec("xmlrunner"):
 TESTS = {
     '__all__': {
         TestNet,
+        TestRegTransactions,
+        TestDeviceIndex,
         TestMpmUtils,
+        TestMpmLog,
+        TestRPCStats,
+        TestSensorCache,
         TestEeprom,
     },
     'n3xx': set(),
@@ -31,6 +39,9 @@ TESTS = {
 
 if not __simulated__:
     from components_tests import TestZynqComponents
+    from uio_tests import TestUIO
+    from eyescan_tests import TestEyeScan
+    TESTS['__all__'].update({TestUIO, TestEyeScan})
     TESTS['x4xx'].update({
         TestZynqComponents
     })
@@ -0,0 +1,172 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+Tests for the sensor cache
+"""
+import threading
+import time
+import unittest
+from unittest import mock
+from base_tests import TestBase
+from usrp_mpm.sensor_cache import SensorCache, SensorCachePolicy
+from usrp_mpm.sensor_cache import THERMAL_SENSOR_CACHE_POLICY, GPS_SENSOR_CACHE_POLICY
+
+
+class _NullLog(object):
+    """
+    Logger which drops all messages
+    """
+    def __getattr__(self, _name):
+        return lambda *args, **kwargs: None
+
+
+class _Sensor(object):
+    """
+    Sensor callback which counts its reads, and returns the read count as its
+    value
+    """
+    def __init__(self):
+        self.reads = 0
+        self.fail = False
+
+    def __call__(self):
+        if self.fail:
+            raise RuntimeError("Sensor read failed")
+        self.reads += 1
+        return {'name': 'test', 'value': str(self.reads)}
+
+
+def _wait_for(condition, timeout=2.0):
+    """
+    Wait until condition() is true, or timeout seconds have passed. Returns
+    the last result of condition().
+    """
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+class TestSensorCache(TestBase):
+    """
+    Tests for SensorCache and SensorCachePolicy
+    """
+    def setUp(self):
+        self.cache = SensorCache(_NullLog())
+        self.sensor = _Sensor()
+
+    def tearDown(self):
+        self.cache.clear()
+
+    def _get(self, policy):
+        return self.cache.get('key', 'test', self.sensor, policy)['value']
+
+    def test_policy(self):
+        """
+        Checks that invalid policies are rejected
+        """
+        with self.assertRaises(AssertionError):
+            SensorCachePolicy(ttl=-1)
+        with self.assertRaises(AssertionError):
+            SensorCachePolicy(ttl=1, refresh_interval=0)
+        # The refresher reads the stock policies' sensors before their
+        # values run out, so reads never wait for them
+        for policy in (THERMAL_SENSOR_CACHE_POLICY, GPS_SENSOR_CACHE_POLICY):
+            self.assertIsNotNone(policy.refresh_interval)
+            self.assertLessEqual(policy.refresh_interval,
+                                 policy.ttl + policy.max_stale)
+
+    def test_ttl(self):
+        """
+        Checks that values are cached for ttl seconds, and then read again
+        """
+        policy = SensorCachePolicy(ttl=0.05)
+        self.assertEqual(self._get(policy), '1')
+        self.assertEqual(self._get(policy), '1')
+        time.sleep(0.1)
+        self.assertEqual(self._get(policy), '2')
+        self.assertEqual(self.sensor.reads, 2)
+        # Without caching, every get() reads the sensor
+        self.cache.clear()
+        policy = SensorCachePolicy(ttl=0)
+        self._get(policy)
+        self._get(policy)
+        self.assertEqual(self.sensor.reads, 4)
+
+    def test_max_stale(self):
+        """
+        Checks that stale values are returned while a background read
+        refreshes them, and that failed background reads keep the old value
+        """
+        policy = SensorCachePolicy(ttl=0.05, max_stale=10)
+        self.assertEqual(self._get(policy), '1')
+        time.sleep(0.1)
+        self.assertEqual(self._get(policy), '1')
+        self.assertTrue(_wait_for(lambda: self._get(policy) == '2'))
+        self.sensor.fail = True
+        time.sleep(0.1)
+        self.assertEqual(self._get(policy), '2')
+        # Past the ttl and max_stale, the sensor is read right away, and its
+        # errors are passed on
+        policy = SensorCachePolicy(ttl=0.05)
+        time.sleep(0.1)
+        with self.assertRaises(RuntimeError):
+            self._get(policy)
+
+    def test_refresh_interval(self):
+        """
+        Checks that the refresher reads sensors in the background, and stops
+        on clear()
+        """
+        policy = SensorCachePolicy(ttl=10, refresh_interval=0.02)
+        self.assertEqual(self._get(policy), '1')
+        self.assertTrue(_wait_for(lambda: self.sensor.reads >= 3))
+        self.assertEqual(self._get(policy), str(self.sensor.reads))
+        self.cache.clear()
+        reads = self.sensor.reads
+        time.sleep(0.1)
+        self.assertEqual(self.sensor.reads, reads)
+
+    def test_refresh_worker(self):
+        """
+        Drives the refresher by hand: Once their refresh_interval has passed,
+        entries are read again, and failed reads keep the old value. Entries
+        without a refresh_interval are left alone.
+        """
+        stop_event = threading.Event()
+        def read_and_stop():
+            " Sensor callback which stops the refresher after each read "
+            stop_event.set()
+            return self.sensor()
+        other_sensor = _Sensor()
+        policy = SensorCachePolicy(ttl=10, refresh_interval=5)
+        with mock.patch.object(self.cache, '_start_refresher'):
+            self.cache.get('key', 'test', read_and_stop, policy)
+            self.cache.get('other', 'other', other_sensor, SensorCachePolicy(ttl=10))
+        now = time.monotonic()
+        with mock.patch('usrp_mpm.sensor_cache.time.monotonic', return_value=now + 1):
+            stop_event.clear()
+            # Nothing is due yet, so this only waits for the stop event
+            threading.Timer(0.05, stop_event.set).start()
+            self.cache._refresh_worker(stop_event)
+            self.assertEqual(self.sensor.reads, 1)
+        with mock.patch('usrp_mpm.sensor_cache.time.monotonic', return_value=now + 6):
+            stop_event.clear()
+            self.cache._refresh_worker(stop_event)
+            self.assertEqual(self.sensor.reads, 2)
+            self.assertEqual(
+                self.cache.get('key', 'test', read_and_stop, policy)['value'], '2')
+        self.sensor.fail = True
+        with mock.patch('usrp_mpm.sensor_cache.time.monotonic', return_value=now + 12):
+            stop_event.clear()
+            self.cache._refresh_worker(stop_event)
+            self.assertEqual(
+                self.cache.get('key', 'test', read_and_stop, policy)['value'], '2')
+        self.assertEqual(other_sensor.reads, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
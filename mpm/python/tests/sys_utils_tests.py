@@ -8,9 +8,17 @@ Tests related to usrp_mpm.sys_utils
 """
 
 from base_tests import TestBase
+from collections import namedtuple
+import os
+import tempfile
 import unittest
+from unittest import mock
 import test_utilities
 from usrp_mpm.sys_utils import net
+from usrp_mpm.sys_utils import reg_transactions
+from usrp_mpm.sys_utils import device_index
+from usrp_mpm.sys_utils import dtoverlay
+from usrp_mpm.periph_manager.common import MboardRegsCommon
 import platform
 
 
@@ -139,5 +147,170 @@ class TestNet(TestBase):
         expected_string = '2F:16:AB:BF:90:63'
         self.assertEqual(expected_string, net.byte_to_mac(byte_str).upper())
 
+class TestRegTransactions(TestBase):
+    """
+    Tests the transaction recorder and ReplayUIO in
+    usrp_mpm.sys_utils.reg_transactions
+    """
+    def _record(self):
+        """
+        Record the transactions of a short register sequence
+        """
+        recorder = reg_transactions.TransactionRecorder()
+        recorder.poke(0x10, 0x1)
+        recorder.peek(0x14, 0xF0)
+        recorder.peek(0x18, 0x0F)
+        recorder.poll(0x1C, 0x1, 0x1, True)
+        return recorder.transactions
+
+    def test_replay(self):
+        """
+        Test that replaying the recorded sequence returns the recorded values
+        """
+        regs = reg_transactions.ReplayUIO(self._record())
+        regs.poke32(0x10, 0x1)
+        self.assertEqual(regs.peek32_many([0x14, 0x18]), [0xF0, 0x0F])
+        self.assertTrue(regs.poll32(0x1C, 0x1, 0x1, timeout=1.0))
+        regs.assert_done()
+
+    def test_replay_mismatch(self):
+        """
+        Test that an access which differs from the recording is caught
+        """
+        regs = reg_transactions.ReplayUIO(self._record())
+        self.assertRaises(AssertionError, regs.poke32, 0x10, 0x2)
+        regs = reg_transactions.ReplayUIO(self._record())
+        regs.poke32(0x10, 0x1)
+        self.assertRaises(AssertionError, regs.assert_done)
+
+    def test_modify(self):
+        """
+        Test that a read-modify-write replays as a peek and a poke
+        """
+        recorder = reg_transactions.TransactionRecorder()
+        recorder.peek(0x20, 0xAB)
+        recorder.poke(0x20, 0xA5)
+        regs = reg_transactions.ReplayUIO(recorder.transactions)
+        self.assertEqual(regs.modify32(0x20, 0x0F, 0x05), 0xAB)
+        regs.assert_done()
+
+    def test_timekeeper(self):
+        """
+        Test that the batched timekeeper accesses of MboardRegsCommon replay
+        in order
+        """
+        regs_ctrl = MboardRegsCommon.__new__(MboardRegsCommon)
+        regs_ctrl.log = mock.Mock()
+        tk_offset = MboardRegsCommon.MB_TIMEKEEPER_OFFSET
+        recorder = reg_transactions.TransactionRecorder()
+        recorder.peek(MboardRegsCommon.MB_TIME_NOW_LO + tk_offset, 0x89ABCDEF)
+        recorder.peek(MboardRegsCommon.MB_TIME_NOW_HI + tk_offset, 0x01234567)
+        recorder.poke(MboardRegsCommon.MB_TIME_EVENT_LO, 0x89ABCDEF)
+        recorder.poke(MboardRegsCommon.MB_TIME_EVENT_HI, 0x01234567)
+        recorder.poke(MboardRegsCommon.MB_TIME_CTRL,
+                      MboardRegsCommon.MB_TIME_SET_NEXT_PPS)
+        regs_ctrl.regs = reg_transactions.ReplayUIO(recorder.transactions)
+        regs_ctrl.peek32_many = regs_ctrl.regs.peek32_many
+        regs_ctrl.poke32_many = regs_ctrl.regs.poke32_many
+        self.assertEqual(regs_ctrl.get_timekeeper_time(1, False),
+                         0x0123456789ABCDEF)
+        regs_ctrl.set_timekeeper_time(0, 0x0123456789ABCDEF, True)
+        regs_ctrl.regs.assert_done()
+
+class TestDeviceIndex(TestBase):
+    """
+    Tests the device lookup cache in usrp_mpm.sys_utils.device_index
+    """
+    UdevEvent = namedtuple('UdevEvent', ['action', 'sys_path'])
+
+    def setUp(self):
+        # Use a new process-wide index, which doesn't talk to udev
+        for patcher in (
+                mock.patch.object(device_index.pyudev, 'Context'),
+                mock.patch.object(device_index.DeviceIndex, '_watch_udev'),
+                mock.patch.object(device_index, 'get_logger'),
+                mock.patch.object(device_index, '_DEVICE_INDEX',
+                                  device_index.DeviceIndex())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.num_finds = 0
+
+    def _find(self, result):
+        """
+        Return a find_func for lookup(), which returns result and counts its
+        calls in self.num_finds
+        """
+        def find_func(context):
+            self.assertIs(context, device_index.get_context())
+            self.num_finds += 1
+            return result
+        return find_func
+
+    def test_lookup(self):
+        """
+        Test that results are cached per kind and key, unless they're empty
+        """
+        for _ in range(3):
+            self.assertEqual(device_index.lookup('uio', 'a', self._find(['a0'])), ['a0'])
+        self.assertEqual(self.num_finds, 1)
+        device_index.lookup('uio', 'b', self._find(['b0']))
+        device_index.lookup('gpio', 'a', self._find(['a1']))
+        self.assertEqual(self.num_finds, 3)
+        for _ in range(2):
+            self.assertEqual(device_index.lookup('uio', 'c', self._find([])), [])
+            device_index.lookup('uio', 'd', self._find(5), cache_if=lambda x: x > 10)
+        self.assertEqual(self.num_finds, 7)
+        device_index.forget('uio', 'a')
+        device_index.lookup('uio', 'a', self._find(['a0']))
+        self.assertEqual(self.num_finds, 8)
+
+    def test_stats(self):
+        """
+        Test that hits and misses are counted per kind
+        """
+        for _ in range(3):
+            device_index.lookup('uio', 'a', self._find(['a0']))
+        device_index.lookup('gpio', 'a', self._find(None))
+        stats = device_index.get_stats()
+        self.assertEqual(sorted(stats.keys()), ['gpio', 'uio'])
+        self.assertEqual((stats['uio']['hits'], stats['uio']['misses']), (2, 1))
+        self.assertEqual((stats['gpio']['hits'], stats['gpio']['misses']), (0, 1))
+        self.assertGreaterEqual(stats['uio']['lookup_time'], 0.0)
+        self.assertIn("uio: 3 lookups (2 cached)", device_index.format_stats())
+
+    def test_udev_events(self):
+        """
+        Test that devices coming and going drop the index, other events don't
+        """
+        device_index.lookup('uio', 'a', self._find(['a0']))
+        index = device_index._DEVICE_INDEX
+        index._on_udev_event(self.UdevEvent('change', '/sys/devices/a'))
+        device_index.lookup('uio', 'a', self._find(['a0']))
+        self.assertEqual(self.num_finds, 1)
+        for action in ('add', 'remove'):
+            index._on_udev_event(self.UdevEvent(action, '/sys/devices/a'))
+            device_index.lookup('uio', 'a', self._find(['a0']))
+        self.assertEqual(self.num_finds, 3)
+
+    def test_overlays(self):
+        """
+        Test that applying or removing an overlay drops the index
+        """
+        overlay_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(overlay_dir.cleanup)
+        for patcher in (
+                mock.patch.object(dtoverlay, 'SYSFS_OVERLAY_BASE_DIR', overlay_dir.name),
+                mock.patch.object(dtoverlay, 'get_logger')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        device_index.lookup('uio', 'a', self._find(['a0']))
+        dtoverlay.apply_overlay('test')
+        self.assertTrue(os.path.isdir(os.path.join(overlay_dir.name, 'test')))
+        device_index.lookup('uio', 'a', self._find(['a0']))
+        os.remove(os.path.join(overlay_dir.name, 'test', 'path'))
+        dtoverlay.rm_overlay('test')
+        device_index.lookup('uio', 'a', self._find(['a0']))
+        self.assertEqual(self.num_finds, 3)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,72 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+Tests for usrp_mpm.sys_utils.uio
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+from base_tests import TestBase
+import usrp_mpm.libpyusrp_periphs as lib
+from usrp_mpm.sys_utils import uio
+from usrp_mpm.sys_utils import reg_transactions
+
+MAP_SIZE = 4096
+
+class TestUIO(TestBase):
+    """
+    Tests the batched register accesses of UIO. A regular file takes the
+    place of the UIO device.
+    """
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.write(fd, bytes(MAP_SIZE))
+        os.close(fd)
+        # Skip the UIO constructor, which looks the device up in sysfs
+        self.regs = uio.UIO.__new__(uio.UIO)
+        self.regs._uio = lib.types.mmap_regs_iface(self.path, MAP_SIZE, 0, False, True)
+        self.regs._read_only = False
+        self.regs._recorder = None
+
+    def tearDown(self):
+        self.regs._uio.close()
+        os.remove(self.path)
+
+    def test_poll_success(self):
+        """
+        Checks that poll32() returns True as soon as the value is reached,
+        also if another thread changes the register while it waits
+        """
+        self.regs.poke32(0x10, 0x4)
+        self.assertTrue(self.regs.poll32(0x10, 0x0F, 0xF4, timeout=0))
+        timer = threading.Timer(0.05, self.regs.poke32, (0x10, 0x5))
+        timer.start()
+        recorder = reg_transactions.TransactionRecorder()
+        self.regs.set_recorder(recorder)
+        start = time.monotonic()
+        self.assertTrue(self.regs.poll32(0x10, 0x1, 0x1, timeout=2.0))
+        self.assertLess(time.monotonic() - start, 1.0)
+        timer.join()
+        self.assertTrue(recorder.transactions[-1].result)
+
+    def test_poll_timeout(self):
+        """
+        Checks that poll32() returns False after the timeout, also for
+        timeouts longer than the C++ code accepts in one call
+        """
+        timeout = 2 * lib.types.mmap_regs_iface.MAX_POLL_TIMEOUT_US / 1e6
+        start = time.monotonic()
+        self.assertFalse(self.regs.poll32(0x10, 0x1, 0x1, timeout=timeout))
+        self.assertGreaterEqual(time.monotonic() - start, timeout)
+        # Larger timeouts are rejected by the C++ code
+        with self.assertRaises(Exception):
+            self.regs._uio.poll32(
+                0x10, 0x1, 0x1, lib.types.mmap_regs_iface.MAX_POLL_TIMEOUT_US + 1, 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -80,6 +80,12 @@ Using the Eye Scan tool:
          Valid range is -127 to 127 (full range), corresponding to 0.39 %
          increments.
          Definition example: {'start':-127, 'stop':127, 'step': 2}
+       Coarse step.
+         When set, the sweep first measures every coarse_step-th point of the ranges.
+         Points which are surrounded by coarse points without bit errors are then
+         not measured, but stored with an error count of 0. This speeds up scans of
+         wide open eyes considerably.
+         Valid values for this tool: 0 (disabled), 2 and up.
 
   3. Determine which GT(s) will be scanned.
      The tool supports single scan and parallel multi-lane scan. The previous GT
@@ -105,7 +111,7 @@ Using the Eye Scan tool:
      Assuming the EyeScanTool class has been imported to the calling file, here is
      an object creation example:
        args = {'rxout_div': 2, 'rx_int_datawidth': 20, 'eq_mode': 'LPM', 'prescale': 1,
-               'SAVE_DIR': "/home/root/my_dir/"}
+               'coarse_step': 4, 'SAVE_DIR': "/home/root/my_dir/"}
        eyescan_tool = EyeScanTool(jesdcore=jesdcore_object,
                                   slot_idx=0,
                                   **args)
@@ -154,6 +160,12 @@ Theory of operation:
   eyescan_full_scan(...) method; which handles the measurement configuration, the binary
   file creation, the GT(s) configuration, and the measurement sweep across the ranges.
 
+  The sweep measures all lanes in parallel: At each offset coordinate, the FSMs of all
+  lanes are started before any of them is polled. The counters are collected into a
+  NumPy array, which is written to the .pes file in one go at the end of the sweep.
+  Optionally, the sweep can be done coarse-to-fine (see the coarse_step parameter),
+  which skips most of the error-free points in the open eye.
+
 
 Future work ideas:
 
@@ -170,6 +182,7 @@ import time
 import math
 import datetime
 from builtins import object
+import numpy as np
 from usrp_mpm.mpmlog import get_logger
 
 class EyeScanTool(object):
@@ -186,6 +199,21 @@ class EyeScanTool(object):
     # E.g. PRINT_STATUS_EVERY = 1 will print a status message every offset measurement.
     PRINT_STATUS_EVERY = 10
 
+    # DRP addresses used during a sweep.
+    ES_VERT_OFFSET_ADDR    = 0x03B
+    ES_HORZ_OFFSET_ADDR    = 0x03C
+    ES_CONTROL_ADDR        = 0x03D
+    ES_ERROR_COUNT_ADDR    = 0x14F
+    ES_SAMPLE_COUNT_ADDR   = 0x150
+    ES_CONTROL_STATUS_ADDR = 0x151
+    # Value of es_control_status[3:1] in the END state.
+    ES_STATE_END = 0b010
+    # Number of polls of all lanes after which a sweep acquisition times out.
+    SWEEP_MAX_POLLS = 10000
+
+    # Counters of a single acquisition, in the order they're written to the .pes file.
+    COUNTERS_DTYPE = np.dtype([('sample_count', '<u2'), ('error_count', '<u2')])
+
     lanes = None
     # Array that defines the available lanes to measure.
     lane_num = None
@@ -219,6 +247,7 @@ class EyeScanTool(object):
             assert self.rxout_div in (1, 2, 4, 8, 16)
             assert self.rx_int_datawidth in (16, 20, 32, 40)
             assert self.eq_mode.upper() in ('LPM', 'DFE')
+            assert self.coarse_step == 0 or self.coarse_step >= 2
             self.log.debug("Valid Eye Scan configuration: prescale=%d rxout_div=%d"
                            " rx_int_datawidth=%d eq_mode=%s",
                            self.prescale, self.rxout_div, self.rx_int_datawidth, self.eq_mode)
@@ -230,6 +259,7 @@ class EyeScanTool(object):
         assert hasattr(self.jesdcore, 'set_drp_target')
         assert hasattr(self.jesdcore, 'disable_drp_target')
         assert hasattr(self.jesdcore, 'drp_access')
+        assert hasattr(self.jesdcore, 'drp_read_many')
         # Some global parameters defined.
         #
         # Control the prescaling of the sample count to keep both sample
@@ -254,6 +284,13 @@ class EyeScanTool(object):
         # Valid values = 'LPM', 'DFE'.
         self.eq_mode = 'LPM'
         #
+        # Coarse-to-fine sweep: When set, the sweep first measures every
+        # coarse_step-th offset in both directions. Offsets between coarse
+        # points without bit errors are then skipped (the open eye), the
+        # remaining ones are measured. See eyescan_measure().
+        # Valid values: 0 (measure every offset), or 2 and up.
+        self.coarse_step = 0
+        #
         # Overwrite the default configuration parameters with the ones given
         # by the user (host) through kwargs.
         for key, new_val in list(kwargs.items()):
@@ -420,6 +457,53 @@ class EyeScanTool(object):
         return
 
 
+    def _build_control_reg(self, drp_x03d_rb, err_det_en=True, run=False, arm=False):
+        """
+        Returns the value of the eye scan control register (DRP 0x03D), given its
+        current value drp_x03d_rb. See eyescan_control() for the parameters.
+        """
+        ARM_TRIGGER_ON = {"error_detected"   : 0b0001,\
+                          "qualifier_pattern": 0b0010,\
+                          "es_trigger"       : 0b0100,\
+                          "immediate"        : 0b1000}
+        EYE_SCAN_EN_VAL = 0b1
+        # Determine the GT Channel attributes to be changed.
+        es_errdet_en   = int(err_det_en)
+        es_eye_scan_en = EYE_SCAN_EN_VAL
+        es_control     = (int(run)                         << 0) | \
+                         (int(arm)                         << 1) | \
+                         (ARM_TRIGGER_ON["error_detected"] << 2)
+        self.log.trace("Control attributes... ES_ERRDET_EN:0b%s"
+                       " ES_EYE_SCAN_EN:0b%s ES_CONTROL:0b%s",
+                       format(es_errdet_en, 'b'), format(es_eye_scan_en, 'b'),
+                       format(es_control, '06b'))
+        return ((drp_x03d_rb & ~0x023F) << 0) | \
+               (es_errdet_en            << 9) | \
+               (es_eye_scan_en          << 8) | \
+               (es_control              << 0)
+
+
+    def _build_offset_regs(self, drp_x03b_rb, drp_x03c_rb,
+                           hor_offset=0, ver_offset=0, ut_sign='+UT'):
+        """
+        Returns a tuple with the values of the vertical offset (DRP 0x03B) and
+        horizontal offset (DRP 0x03C) registers, given their current values.
+        See eyescan_offset() for the parameters.
+        """
+        UT_SIGN_BIT = {'+UT': 0b0, '-UT': 0b1}
+        # Do some input validation for the given parameters.
+        assert ut_sign.upper() in ('+UT', '-UT')
+        # Determine the GT channel attributes to be changed.
+        es_vert_offset = ((abs(ver_offset) & 0x007F) << 0) | \
+                         ( int(ver_offset < 0)       << 7) | \
+                         ( UT_SIGN_BIT[ut_sign]      << 8)
+        es_horz_offset = (hor_offset & 0x0FFF)
+        self.log.trace("Offset attributes... ES_HORZ_OFFSET:0b%s ES_VERT_OFFSET:0b%s",
+                       format(es_horz_offset, '012b'), format(es_vert_offset, '09b'))
+        return ((drp_x03b_rb & ~0x01FF) | (es_vert_offset & 0x01FF),
+                (drp_x03c_rb & ~0x0FFF) | (es_horz_offset & 0x0FFF))
+
+
     def eyescan_control(self, err_det_en=True, run=False, arm=False):
         """
         Configures the eye scan control state machine for the current XCVR lane.
@@ -436,28 +520,11 @@ class EyeScanTool(object):
                         to the READ state if one of the states of bits x03D[5:2] below is
                         not met.
         """
-        ARM_TRIGGER_ON = {"error_detected"   : 0b0001,\
-                          "qualifier_pattern": 0b0010,\
-                          "es_trigger"       : 0b0100,\
-                          "immediate"        : 0b1000}
-        EYE_SCAN_EN_VAL = 0b1
         self.log.trace("Eyescan state machine control for MGT #%d", self.lane_num)
         # Read the current register values.
         drp_x03d_rb = self.jesdcore.drp_access(rd=True, addr=0x03D)
-        # Determine the GT Channel attributes to be changed.
-        es_errdet_en   = int(err_det_en)
-        es_eye_scan_en = EYE_SCAN_EN_VAL
-        es_control     = (int(run)                         << 0) | \
-                         (int(arm)                         << 1) | \
-                         (ARM_TRIGGER_ON["error_detected"] << 2)
-        self.log.trace("Control attributes... ES_ERRDET_EN:0b{0:b}"
-                       " ES_EYE_SCAN_EN:0b{1:b} ES_CONTROL:0b{2:06b}"
-                       .format(es_errdet_en, es_eye_scan_en, es_control))
         # Build and write the new register values.
-        drp_x03d_wr = ((drp_x03d_rb & ~0x023F) << 0) | \
-                      (es_errdet_en            << 9) | \
-                      (es_eye_scan_en          << 8) | \
-                      (es_control              << 0)
+        drp_x03d_wr = self._build_control_reg(drp_x03d_rb, err_det_en, run, arm)
         self.jesdcore.drp_access(rd=False, addr=0x03D, wr_data=drp_x03d_wr)
         return drp_x03d_rb != drp_x03d_wr # Return True when the register changed.
 
@@ -475,25 +542,15 @@ class EyeScanTool(object):
                         [-127, 127] corresponding to 0.39% increments.
           ut_sign    -> UT tap sign: '+UT' or '-UT'.
         """
-        UT_SIGN_BIT = {'+UT': 0b0, '-UT': 0b1}
         self.log.trace("Offset configuration for MGT #{}:".format(self.lane_num))
-        # Do some input validation for the given parameters.
-        assert ut_sign.upper() in ('+UT', '-UT')
         self.log.trace("GT #%d  Horizontal offset: %d  Vertical offset: %d  Tap: %s",
                        self.lane_num, hor_offset, ver_offset, ut_sign)
         # Read the current register values.
         drp_x03b_rb = self.jesdcore.drp_access(rd=True, addr=0x03B)
         drp_x03c_rb = self.jesdcore.drp_access(rd=True, addr=0x03C)
-        # Determine the GT channel attributes to be changed.
-        es_vert_offset = ((abs(ver_offset) & 0x007F) << 0) | \
-                         ( int(ver_offset < 0)       << 7) | \
-                         ( UT_SIGN_BIT[ut_sign]      << 8)
-        es_horz_offset = (hor_offset & 0x0FFF)
-        self.log.trace("Offset attributes... ES_HORZ_OFFSET:0b{0:012b} ES_VERT_OFFSET:0b{1:09b}"
-                       .format(es_horz_offset, es_vert_offset))
         # Build and write new register values.
-        drp_x03b_wr = (drp_x03b_rb & ~0x01FF) | (es_vert_offset & 0x01FF)
-        drp_x03c_wr = (drp_x03c_rb & ~0x0FFF) | (es_horz_offset & 0x0FFF)
+        drp_x03b_wr, drp_x03c_wr = self._build_offset_regs(
+            drp_x03b_rb, drp_x03c_rb, hor_offset, ver_offset, ut_sign)
         self.jesdcore.drp_access(rd=False, addr=0x03B, wr_data=drp_x03b_wr)
         self.jesdcore.drp_access(rd=False, addr=0x03C, wr_data=drp_x03c_wr)
         # Return True when at least one of the two registers changed.
@@ -634,81 +691,276 @@ class EyeScanTool(object):
         return acq_counters
 
 
-    def eyescan_sweep(self, bin_file, parsed_ranges):
+    def _sweep_setup(self):
+        """
+        Prepares all lanes for a sweep: Reads the offset and control registers of
+        each lane into self._drp_shadow, and stops any running measurement.
+        During the sweep, the registers are only written through _sweep_write(),
+        so the shadow copies stay valid.
+        """
+        self._drp_shadow = {}
+        for lane in self.lanes:
+            self.set_global_lane(lane)
+            vert_offset, horz_offset, control = self.jesdcore.drp_read_many(
+                [self.ES_VERT_OFFSET_ADDR, self.ES_HORZ_OFFSET_ADDR, self.ES_CONTROL_ADDR])
+            self._drp_shadow[lane] = {
+                self.ES_VERT_OFFSET_ADDR: vert_offset,
+                self.ES_HORZ_OFFSET_ADDR: horz_offset,
+                self.ES_CONTROL_ADDR: control,
+            }
+            # Clear run & arm bits in the Eyescan control.
+            self._sweep_write(lane, self.ES_CONTROL_ADDR,
+                              self._build_control_reg(control, run=False))
+
+
+    def _sweep_write(self, lane, addr, value):
+        """
+        Writes a DRP register of the given lane, unless it already holds value.
+        """
+        shadow = self._drp_shadow[lane]
+        if shadow[addr] == value:
+            return
+        if self.lane_num != lane:
+            self.set_global_lane(lane)
+        self.jesdcore.drp_access(rd=False, addr=addr, wr_data=value)
+        shadow[addr] = value
+
+
+    def _sweep_arm(self, lane, hor_offset, ver_offset, ut_sign):
+        """
+        Sets the offsets of the given lane, and starts its eye scan FSM.
+        The run bit must have been cleared before.
+        """
+        shadow = self._drp_shadow[lane]
+        drp_x03b_wr, drp_x03c_wr = self._build_offset_regs(
+            shadow[self.ES_VERT_OFFSET_ADDR], shadow[self.ES_HORZ_OFFSET_ADDR],
+            hor_offset, ver_offset, ut_sign)
+        # The horizontal offset only changes once per column, so most of these
+        # writes are skipped.
+        self._sweep_write(lane, self.ES_VERT_OFFSET_ADDR, drp_x03b_wr)
+        self._sweep_write(lane, self.ES_HORZ_OFFSET_ADDR, drp_x03c_wr)
+        # Start eyescan FSM: set run with ErrDet enabled.
+        self._sweep_write(lane, self.ES_CONTROL_ADDR, self._build_control_reg(
+            shadow[self.ES_CONTROL_ADDR], run=True))
+
+
+    def _sweep_acquisition(self, lanes, hor_offset, ver_offset):
+        """
+        Measures one offset coordinate on the given lanes at the same time.
+        All lanes are armed first, then they are polled in turns. Every poll of a
+        lane is a single batched read of its status and counters. A lane that has
+        reached the END state is stopped, and (in DFE mode) immediately re-armed
+        with -UT, while the other lanes keep counting.
+
+        Returns a dictionary lane -> list of (sample_count, error_count) tuples,
+        one for +UT and (in DFE mode only) one for -UT.
+        """
+        ut_signs = ('+UT', '-UT') if self.eq_mode.upper() == 'DFE' else ('+UT',)
+        results = {lane: [] for lane in lanes}
+        for lane in lanes:
+            self._sweep_arm(lane, hor_offset, ver_offset, ut_signs[0])
+        delay = 2 ** (self.prescale - 13) if (self.prescale > 13) else 0
+        pending = list(lanes)
+        polls = 0
+        while pending:
+            still_pending = []
+            for lane in pending:
+                if self.lane_num != lane:
+                    self.set_global_lane(lane)
+                # The status is read first, so the counters are final when it
+                # says END.
+                es_control_status, error_count, sample_count = self.jesdcore.drp_read_many(
+                    [self.ES_CONTROL_STATUS_ADDR,
+                     self.ES_ERROR_COUNT_ADDR,
+                     self.ES_SAMPLE_COUNT_ADDR])
+                if (es_control_status & 0x000E) >> 1 != self.ES_STATE_END:
+                    still_pending.append(lane)
+                    continue
+                # Clear run & arm bits in the Eyescan control.
+                self._sweep_write(lane, self.ES_CONTROL_ADDR, self._build_control_reg(
+                    self._drp_shadow[lane][self.ES_CONTROL_ADDR], run=False))
+                results[lane].append((sample_count & 0xFFFF, error_count & 0xFFFF))
+                if len(results[lane]) < len(ut_signs):
+                    self._sweep_arm(lane, hor_offset, ver_offset, ut_signs[len(results[lane])])
+                    still_pending.append(lane)
+            pending = still_pending
+            if not pending:
+                break
+            polls += 1
+            if polls >= self.SWEEP_MAX_POLLS:
+                self.log.error("END state was not reached at GTs %s after %d polls (H=%d, V=%d).",
+                               pending, polls, hor_offset, ver_offset)
+                raise RuntimeError("Eyescan status timed out, see log for details.")
+            time.sleep(delay / 1000.0)
+        return results
+
+
+    def _sweep_points(self, todo, hor_offsets, ver_offsets, counters, measured):
+        """
+        Measures all points for which todo[lane_index, hor_index, ver_index] is
+        True, and stores the results in counters. The lanes which need a given
+        coordinate are measured at the same time. measured is set for every
+        point that was measured.
+        """
+        total_points = int(todo.any(axis=0).sum())
+        points = 0
+        for hor_index, ver_index in zip(*np.nonzero(todo.any(axis=0))):
+            lane_indexes = np.flatnonzero(todo[:, hor_index, ver_index])
+            results = self._sweep_acquisition(
+                [self.lanes[lane_index] for lane_index in lane_indexes],
+                hor_offsets[hor_index], ver_offsets[ver_index])
+            for lane_index in lane_indexes:
+                counters[lane_index, hor_index, ver_index] = \
+                    results[self.lanes[lane_index]]
+                measured[lane_index, hor_index, ver_index] = True
+            # Report Eye Scan progress.
+            points += 1
+            # Only print status messages every PRINT_STATUS_EVERY iterations.
+            if points % self.PRINT_STATUS_EVERY == 0:
+                self.log.info("Eye Scan progress for GTs %s sweep: %.2f %%",
+                              self.lanes, points / total_points * 100)
+
+
+    def _refine_points(self, counters, hor_coarse, ver_coarse):
+        """
+        Decides which points of a coarse-to-fine sweep still need to be measured,
+        after the coarse points (hor_coarse x ver_coarse) were.
+
+        The coarse points divide each lane's eye into cells. When none of the four
+        corners of a cell saw a bit error, the cell is assumed to be inside the
+        open eye: its other points are not measured, but get an error count of 0,
+        and the smallest sample count of its corners. All points of the other
+        cells need to be measured.
+
+        Returns a boolean array like counters, which is True for points that need
+        to be measured.
+        """
+        errors = counters['error_count'].sum(axis=-1)
+        corner_errors = errors[:, hor_coarse][:, :, ver_coarse] != 0
+        open_cells = ~(corner_errors[:, :-1, :-1] | corner_errors[:, 1:, :-1] |
+                       corner_errors[:, :-1, 1:] | corner_errors[:, 1:, 1:])
+        skip = np.zeros(errors.shape, dtype=bool)
+        keep = np.zeros(errors.shape, dtype=bool)
+        cells = []
+        for hor_cell in range(len(hor_coarse) - 1):
+            hor_corners = hor_coarse[hor_cell:hor_cell+2]
+            hor_slice = slice(hor_corners[0], hor_corners[1] + 1)
+            for ver_cell in range(len(ver_coarse) - 1):
+                ver_corners = ver_coarse[ver_cell:ver_cell+2]
+                ver_slice = slice(ver_corners[0], ver_corners[1] + 1)
+                for lane_index in range(len(self.lanes)):
+                    if open_cells[lane_index, hor_cell, ver_cell]:
+                        skip[lane_index, hor_slice, ver_slice] = True
+                        cells.append((lane_index, hor_corners, ver_corners))
+                    else:
+                        keep[lane_index, hor_slice, ver_slice] = True
+        # Points on the edge of an open and a closed cell are measured, and so
+        # were the corners. Only the remaining points get filled in.
+        todo = ~skip | keep
+        fill = ~todo
+        fill[:, np.array(hor_coarse)[:, None], np.array(ver_coarse)] = False
+        todo[:, np.array(hor_coarse)[:, None], np.array(ver_coarse)] = True
+        for lane_index, hor_corners, ver_corners in cells:
+            hor_slice = slice(hor_corners[0], hor_corners[1] + 1)
+            ver_slice = slice(ver_corners[0], ver_corners[1] + 1)
+            cell_fill = fill[lane_index, hor_slice, ver_slice]
+            corner_samples = counters['sample_count'][lane_index][hor_corners][:, ver_corners]
+            counters['sample_count'][lane_index, hor_slice, ver_slice][cell_fill] = \
+                corner_samples.min(axis=(0, 1))
+        return todo
+
+
+    def eyescan_measure(self, parsed_ranges):
         """
         Performs Eye Scan "measurement loop" (error counting) acquisitions across the
-        given phase and voltage offset ranges.
+        given phase and voltage offset ranges, on all lanes in parallel.
+
+        If coarse_step is set, a coarse-to-fine sweep is done: Only every
+        coarse_step-th offset in each direction (and the last one) is measured
+        first. Points inside the open eye are then skipped, see _refine_points().
+
+        Returns a tuple (counters, measured):
+          counters -> NumPy array of shape (lanes, hor_iterations, ver_iterations, ut)
+                      and type COUNTERS_DTYPE, with ut = 2 in DFE mode (+UT, -UT), and
+                      ut = 1 otherwise.
+          measured -> Boolean NumPy array of shape (lanes, hor_iterations,
+                      ver_iterations), which is False for points that were skipped.
+
+        Parameters:
+          parsed_ranges -> This is a keyed list with parsed parameters from parse_ranges().
+        """
+        hor_offsets = list(range(parsed_ranges['hor_start'], parsed_ranges['hor_stop'] + 1,
+                                 parsed_ranges['hor_step']))
+        ver_offsets = list(range(parsed_ranges['ver_start'], parsed_ranges['ver_stop'] + 1,
+                                 parsed_ranges['ver_step']))
+        num_ut = 2 if self.eq_mode.upper() == 'DFE' else 1
+        counters = np.zeros((len(self.lanes), len(hor_offsets), len(ver_offsets), num_ut),
+                            dtype=self.COUNTERS_DTYPE)
+        measured = np.zeros(counters.shape[:3], dtype=bool)
+        self.log.trace("Starting sweep for GTs %s ...", self.lanes)
+        start_time = time.monotonic()
+        try:
+            self._sweep_setup()
+            if self.coarse_step:
+                def coarse_indexes(num_points):
+                    """ Every coarse_step-th index, and the last one """
+                    indexes = list(range(0, num_points, self.coarse_step))
+                    if indexes[-1] != num_points - 1:
+                        indexes.append(num_points - 1)
+                    return indexes
+                hor_coarse = coarse_indexes(len(hor_offsets))
+                ver_coarse = coarse_indexes(len(ver_offsets))
+                todo = np.zeros(measured.shape, dtype=bool)
+                todo[:, np.array(hor_coarse)[:, None], np.array(ver_coarse)] = True
+                self.log.debug("Coarse sweep for GTs %s...", self.lanes)
+                self._sweep_points(todo, hor_offsets, ver_offsets, counters, measured)
+                todo = self._refine_points(counters, hor_coarse, ver_coarse) & ~measured
+                self.log.debug("Fine sweep for GTs %s...", self.lanes)
+            else:
+                todo = np.ones(measured.shape, dtype=bool)
+            self._sweep_points(todo, hor_offsets, ver_offsets, counters, measured)
+        finally:
+            self.set_global_lane(None)
+        self.log.info("Eye Scan sweep for GTs %s done in %.1f s, measured %d of %d points.",
+                      self.lanes, time.monotonic() - start_time,
+                      measured.sum(), measured.size)
+        return counters, measured
+
+
+    def eyescan_sweep(self, bin_file, parsed_ranges):
+        """
+        Performs the Eye Scan sweep (see eyescan_measure()), and writes the results
+        to the binary file.
 
-        This function creates a binary file containing the sweep results.
           The binary file is a set of bytes, where file[position] represents a byte
           (8-bit) at the given position. The bytes are saved as follows:
 
           If eq_mode = 'LPM'...
-            file[offset + 4*lanes*i + 4*curr_lane + 0] = sample_count[15:0] (+UT) (ith acquisition)
-            file[offset + 4*lanes*i + 4*curr_lane + 2] =  error_count[15:0] (+UT) (ith acquisition)
+            file[offset + 4*lanes*i + 4*lane_index + 0] = sample_count[15:0] (+UT) (ith acquisition)
+            file[offset + 4*lanes*i + 4*lane_index + 2] =  error_count[15:0] (+UT) (ith acquisition)
 
           If eq_mode = 'DFE'...
-            file[offset + 4*lanes*(i*2 + 0) + 4*curr_lane + 0] = sample_count[15:0] (+UT) (ith acquisition)
-            file[offset + 4*lanes*(i*2 + 0) + 4*curr_lane + 2] =  error_count[15:0] (+UT) (ith acquisition)
-            file[offset + 4*lanes*(i*2 + 1) + 4*curr_lane + 0] = sample_count[15:0] (-UT) (ith acquisition)
-            file[offset + 4*lanes*(i*2 + 1) + 4*curr_lane + 2] =  error_count[15:0] (-UT) (ith acquisition)
+            file[offset + 8*lanes*i + 8*lane_index + 0] = sample_count[15:0] (+UT) (ith acquisition)
+            file[offset + 8*lanes*i + 8*lane_index + 2] =  error_count[15:0] (+UT) (ith acquisition)
+            file[offset + 8*lanes*i + 8*lane_index + 4] = sample_count[15:0] (-UT) (ith acquisition)
+            file[offset + 8*lanes*i + 8*lane_index + 6] =  error_count[15:0] (-UT) (ith acquisition)
 
           Where,
-            i         -> single acquisition iteration number, ranging from 0 to
-                         (hor_iterations * ver_iterations - 1).
-            offset    -> set offset for metadata to be stored at the beginning of
-                         the binary file.
-            lanes     -> total number of lanes to be scanned. Defined as len(self.lanes).
-            curr_lane -> a given lane number. It should be any value in the lanes array.
+            i          -> single acquisition iteration number, ranging from 0 to
+                          (hor_iterations * ver_iterations - 1). The vertical offset
+                          changes fastest.
+            offset     -> set offset for metadata to be stored at the beginning of
+                          the binary file.
+            lanes      -> total number of lanes to be scanned. Defined as len(self.lanes).
+            lane_index -> index of a given lane in the lanes array.
 
         Parameters:
           bin_file      -> Binary file reference to write data to. Passed from top level function.
           parsed_ranges -> This is a keyed list with parsed parameters from parse_ranges().
         """
-        def write_byte_counters(acq_counters):
-            """
-            This method writes the acquisition counters for each lane to the binary file.
-            """
-            # Write the sample and error counters for all given lanes.
-            for current_lane in self.lanes:
-                # Write the counters for the current lane.
-                sl_counters = acq_counters[current_lane]
-                self.log.debug("Writing +UT counters for GT #{0}: {1}"
-                               .format(current_lane, sl_counters))
-                byte_number = (sl_counters['+UT']['sample_count']).to_bytes(2, 'little')
-                bin_file.write(byte_number)
-                byte_number = (sl_counters['+UT']['error_count' ]).to_bytes(2, 'little')
-                bin_file.write(byte_number)
-                # -UT results only exists when DFE eq. mode is used.
-                if '-UT' in sl_counters:
-                    self.log.debug("Writing -UT counters for GT #%d...", current_lane)
-                    byte_number = (sl_counters['-UT']['sample_count']).to_bytes(2, 'little')
-                    bin_file.write(byte_number)
-                    byte_number = (sl_counters['-UT']['error_count' ]).to_bytes(2, 'little')
-                    bin_file.write(byte_number)
-        #
-        gts_string = "GTs {}".format(self.lanes)
-        self.log.trace("Starting sweep for %s ...", gts_string)
-        # Perform the Eye Scan sweep!
-        acq_counters = []
-        total_iterations = parsed_ranges['hor_iterations'] * parsed_ranges['ver_iterations']
-        iterations = 0
-        # Outer loop iterates horizontally.
-        for hor_offset in range(parsed_ranges['hor_start'], parsed_ranges['hor_stop'] + 1,
-                                parsed_ranges['hor_step']):
-            # Inner loop iterates vertically.
-            for ver_offset in range(parsed_ranges['ver_start'], parsed_ranges['ver_stop'] + 1,
-                                    parsed_ranges['ver_step']):
-                # Perform a single acquisition at each "coordinate".
-                acq_counters = self.eyescan_acquisition(hor_offset, ver_offset)
-                # Write the data to a binary file.
-                write_byte_counters(acq_counters)
-                # Report Eye Scan progress.
-                iterations += 1
-                progress = iterations / total_iterations * 100
-                # Only print status messages every PRINT_STATUS_EVERY iterations.
-                if iterations % self.PRINT_STATUS_EVERY == 0:
-                    self.log.info("Eye Scan progress for %s sweep: %.2f %%", gts_string, progress)
+        counters, _ = self.eyescan_measure(parsed_ranges)
+        # Reorder to (hor, ver, lane, ut) and write everything at once.
+        bin_file.write(np.ascontiguousarray(counters.transpose(1, 2, 0, 3)).tobytes())
 
 
     def create_pes_file(self, hor_range, ver_range):
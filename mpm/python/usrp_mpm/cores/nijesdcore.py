@@ -436,3 +436,19 @@ class NIJESDCore(object):
                 self.log.error("DRP read after write failed to match!")
 
         return rd_data
+
+    def drp_read_many(self, addrs):
+        """
+        Reads several DRP registers of the current DRP target, in order, and returns
+        a list of their values. This is equivalent to calling drp_access(rd=True) for
+        each address, but only checks the busy flag once and reads all registers in
+        a single batch.
+        """
+        # Check the DRP port is not busy.
+        if (self.regs.peek32(self.JESD_MGT_DRP_CONTROL) & (0b1 << 20)) != 0:
+            self.log.error("MGT/QPLL DRP Port is reporting busy during an attempted access.")
+            raise RuntimeError("MGT/QPLL DRP Port is reporting busy during an attempted access.")
+        core_offsets = [0x2800 + (addr << 2) for addr in addrs]
+        if hasattr(self.regs, 'peek32_many'):
+            return self.regs.peek32_many(core_offsets)
+        return [self.regs.peek32(core_offset) for core_offset in core_offsets]
@@ -12,14 +12,10 @@ import math
 from fractions import gcd
 from functools import reduce
 from builtins import object
+import numpy as np
 from usrp_mpm.mpmutils import poll_with_timeout
 from usrp_mpm.mpmlog import get_logger
 
-def mean(vals):
-    " Calculate arithmetic mean of vals "
-    return float(sum(vals)) / max(len(vals), 1)
-
-
 class ClockSynchronizer(object):
     """
     Runs the clock synchronization routine for the daughterboard. Sets up and then
@@ -47,6 +43,16 @@ class ClockSynchronizer(object):
     SYNC_OLDESTCOMPAT        = 0x108
     SYNC_SCRATCH             = 0x10C
 
+    # Registers holding a single TDC measurement, in the order they must be read.
+    # Reading SP_OFFSET_1 locks the other ones.
+    TDC_MEAS_REGS = [SP_OFFSET_1, SP_OFFSET_0, RP_OFFSET_1, RP_OFFSET_0]
+    # Number of TDC measurements measure() reads before checking if it can stop early
+    MEAS_CHUNK_SIZE = 64
+    # z-value of the confidence interval used by measure() (95 %)
+    MEAS_CONFIDENCE_Z = 1.96
+    # Tolerated skew of a single TDC measurement from the average, either direction
+    MAX_MEAS_SKEW = 0.5e-9
+
     def __init__(
             self,
             regs_iface,
@@ -67,6 +73,11 @@ class ClockSynchronizer(object):
         self.slot_idx = slot_idx
         self.peek32 = lambda addr: self._iface.peek32(addr + offset)
         self.poke32 = lambda addr, data: self._iface.poke32(addr + offset, data)
+        if hasattr(self._iface, 'peek32_many'):
+            self.peek32_many = lambda addrs: \
+                self._iface.peek32_many([addr + offset for addr in addrs])
+        else:
+            self.peek32_many = lambda addrs: [self.peek32(addr) for addr in addrs]
         self.lmk = lmk
         self.phase_dac = phase_dac
         self.radio_clk_freq = radio_clk_freq
@@ -387,44 +398,66 @@ class ClockSynchronizer(object):
         self.configured = True
 
 
-    def measure(self, num_meas=512):
+    def measure(self, num_meas=512, ci_target=None):
         """
-        Read num_meas measurements from the device. Average them and return the final
-        offset value.
+        Read up to num_meas measurements from the device. Average them and return the
+        final offset value.
+
+        The measurements are read in chunks of MEAS_CHUNK_SIZE. After every chunk, if
+        the confidence interval of the average is within +/- ci_target (seconds), no
+        more measurements are read. ci_target defaults to the fine delay step, since
+        the clocks can't be aligned more precisely than that anyway. Set it to 0 to
+        always read num_meas measurements.
         """
 
         # Make sure the TDC is configured before attempting to read measurements.
         if not self.configured:
             self.log.error("TDC is not configured prior to requesting measurements!")
             raise RuntimeError("TDC is not configured prior to requesting measurements!")
-
-        measure_offset = lambda: self._read_tdc_meas(
-            self.meas_clk_freq, self.ref_clk_freq, self.radio_clk_freq
-        )
+        if ci_target is None:
+            ci_target = self.fine_delay_step
 
         # Retrieve the measurements.
-        tdc_start_time = time.time()
-        self.log.trace("Reading {} TDC measurements from device...".format(num_meas))
-        measurements = [measure_offset() for _ in range(num_meas)]
+        tdc_start_time = time.monotonic()
+        self.log.trace("Reading up to {} TDC measurements from device...".format(num_meas))
+        raw_meas = np.zeros((num_meas, len(self.TDC_MEAS_REGS)), dtype=np.int64)
+        num_read = 0
+        while num_read < num_meas:
+            chunk_end = min(num_read + self.MEAS_CHUNK_SIZE, num_meas)
+            for meas_idx in range(num_read, chunk_end):
+                raw_meas[meas_idx] = self._read_tdc_raw()
+            num_read = chunk_end
+            if ci_target and num_read < num_meas:
+                measurements = self._tdc_raw_to_offsets(raw_meas[:num_read])
+                conf_interval = self.MEAS_CONFIDENCE_Z * \
+                    measurements.std(ddof=1) / math.sqrt(num_read)
+                if conf_interval <= ci_target:
+                    self.log.trace("TDC average is within +/- {:.3f} ps after {} "
+                                   "measurements, stopping early."
+                                   .format(conf_interval*1e12, num_read))
+                    break
+        tdc_duration = time.monotonic() - tdc_start_time
+        measurements = self._tdc_raw_to_offsets(raw_meas[:num_read])
 
         # All the measurements taken in a single run should be nearly identical. The
         # expected max delta between all measurements (from accuracy calculations)
         # is 1 ns. Take the average of the measurements and then compare each value mean
         # to see if it fits this criteria.
-        current_value = mean(measurements)
+        current_value = float(measurements.mean())
 
-        max_skew = 0.5e-9 # 500 ps of tolerated skew either direction
-        meas_err = bool(sum([x < current_value-max_skew for x in measurements])) or \
-                   bool(sum([x > current_value+max_skew for x in measurements]))
-        meas_range = max(measurements) - min(measurements)
+        outliers = (measurements < current_value - self.MAX_MEAS_SKEW) | \
+                   (measurements > current_value + self.MAX_MEAS_SKEW)
+        meas_range = float(measurements.max() - measurements.min())
 
         self.log.trace("TDC Measurements Collected! Average = {:.3f} ns. "
                        "Range: {:.3f} ns".format(current_value*1e9, meas_range*1e9))
-        self.log.trace("TDC Measurement Duration: {:.3f} s" \
-                       .format(time.time()-tdc_start_time))
-        if meas_err:
+        self.log.trace("TDC Measurement Duration: {:.3f} s ({} measurements, {:.0f}/s)"
+                       .format(tdc_duration, num_read, num_read / max(tdc_duration, 1e-9)))
+        if outliers.any():
             self.log.error("TDC measurements show a wide range of values! "
-                           "Check your clock rates for incompatibilities.")
+                           "Check your clock rates for incompatibilities. "
+                           "{} of {} measurements are off by more than {:.0f} ps."
+                           .format(int(outliers.sum()), num_read, self.MAX_MEAS_SKEW*1e12))
             raise RuntimeError("TDC measurement out of expected range!")
 
         return current_value
@@ -483,51 +516,47 @@ class ClockSynchronizer(object):
         return distance_to_target
 
 
-    def _read_tdc_meas(
-            self,
-            meas_clk_freq=170.542641116e6,
-            ref_clk_freq=10e6,
-            radio_clk_freq=125e6,
-        ):
+    def _read_tdc_raw(self):
         """
-        Return the offset (in seconds) from the SP to the RP.
+        Return the raw register values of the next TDC measurement, in the order of
+        TDC_MEAS_REGS.
         """
         # Current worst-case time given a 40kHz pulse rate and 2^17 measurements for
         # the period average operation is ~3.28 s... Round up to 5.0 s. This value is
         # only for the first measurement to appear... subsequent repeat runs should be
         # only a few us long.
-        timeout = time.time() + 5.0
+        timeout = time.monotonic() + 5.0
         while True:
-            sp_offset_msb = self.peek32(self.SP_OFFSET_1)
-            if sp_offset_msb & 0x100 == 0x100:
-                break
-            if time.time() > timeout:
+            # CRITICAL: These register values are locked when SP_OFFSET_1 is read and
+            # reloaded when SP_OFFSET_1 is read again, to keep one value from updating
+            # before the other. The SP and RP measurements are only meaningful when
+            # compared to one another from the same TDC run. So SP_OFFSET_1 is read
+            # first, and the other values are only valid if it says so.
+            raw_meas = self.peek32_many(self.TDC_MEAS_REGS)
+            if raw_meas[0] & 0x100 == 0x100:
+                return raw_meas
+            if time.monotonic() > timeout:
                 error_msg = "Offsets failed to update within timeout."
                 self.log.error(error_msg)
                 raise RuntimeError(error_msg)
 
-        # CRITICAL: These register values are locked when SP_OFFSET_1 is read and
-        # reloaded when SP_OFFSET_1 is read again, to keep one value from updating before
-        # the other. The SP and RP measurements are only meaningful when compared to one
-        # another from the same TDC run.
-        sp_offset_lsb = self.peek32(self.SP_OFFSET_0)
-        rp_offset_msb = self.peek32(self.RP_OFFSET_1)
-        rp_offset_lsb = self.peek32(self.RP_OFFSET_0)
 
-        sp_offset = (sp_offset_msb & 0xFF) << 32
-        sp_offset = (sp_offset | sp_offset_lsb)
-        rp_offset = (rp_offset_msb & 0xFF) << 32
-        rp_offset = (rp_offset | rp_offset_lsb)
+    def _tdc_raw_to_offsets(self, raw_meas):
+        """
+        Return the offsets (in seconds) from the SP to the RP, given an array of raw
+        TDC measurements (one row per measurement, see _read_tdc_raw()).
+        """
+        sp_offset = ((raw_meas[:, 0] & 0xFF) << 32) | raw_meas[:, 1]
+        rp_offset = ((raw_meas[:, 2] & 0xFF) << 32) | raw_meas[:, 3]
 
         # Do the subtraction before converting to floating point.
-        sp_rp = float(sp_offset - rp_offset) / (1<<27)
+        sp_rp = (sp_offset - rp_offset).astype(np.float64) / (1<<27)
 
         # Some Math...
         # Convert the reading from meas_clk ticks to picoseconds
-        sp_rp_samp = sp_rp/meas_clk_freq
+        sp_rp_samp = sp_rp/self.meas_clk_freq
         # True difference between the SP and RP pulses, due to sampling locations
-        offset = sp_rp_samp + 1.0/ref_clk_freq - 1.0/radio_clk_freq
-        return offset
+        return sp_rp_samp + 1.0/self.ref_clk_freq - 1.0/self.radio_clk_freq
 
 
     def _oracle(self, target_values, current_value, lmk_vco_freq, fine_delay_step):
@@ -617,7 +646,7 @@ class ClockSynchronizer(object):
         for x in range(middle_samples + 2):
             self.log.debug("Test Progress: {:.2f}%".format(x*100/(middle_samples+2)))
             self.write_dac_word(x*inc + low_bound, 0.1)
-            meas_value = self.measure(test_duration)
+            meas_value = self.measure(test_duration, ci_target=0)
             meas_file.write("{}, {:.4f}\n".format(x*inc + low_bound, meas_value*1e12))
             results.append(meas_value*1e12)
 
@@ -659,14 +688,14 @@ class ClockSynchronizer(object):
         # Take a first measurement without altering the PDAC.
         self.log.trace("PDAC BIST: Taking center measurement.")
         self.configure(force=True)
-        center_meas = self.measure(test_duration)
+        center_meas = self.measure(test_duration, ci_target=0)
 
         # Modify the DAC word to below the default value, then above, repeating the
         # measurements each time.
         self.write_dac_word(self.current_phase_dac_word + taps_from_center, 0.5)
-        high_meas = self.measure(test_duration)
+        high_meas = self.measure(test_duration, ci_target=0)
         self.write_dac_word(self.current_phase_dac_word - 2*taps_from_center, 0.5)
-        low_meas  = self.measure(test_duration)
+        low_meas  = self.measure(test_duration, ci_target=0)
 
         self.log.info("PDAC BIST: Phase DAC BIST Raw Results:")
         self.log.info("PDAC BIST: Low Measurement:    {:.6f} ns".format(low_meas*1e9))
@@ -11,6 +11,8 @@ from builtins import object
 from six import iteritems
 from usrp_mpm.mpmlog import get_logger
 from usrp_mpm.mpmutils import to_native_str
+from usrp_mpm.rpc_server import no_rpc
+from usrp_mpm.sensor_cache import SensorCache
 
 class DboardManagerBase(object):
     """
@@ -31,6 +33,10 @@ class DboardManagerBase(object):
     rx_sensor_callback_map = {}
     # See PeriphManager.mboard_sensor_callback_map for a description.
     tx_sensor_callback_map = {}
+    # See PeriphManager.mboard_sensor_cache_policy for a description.
+    rx_sensor_cache_policy = {}
+    # See PeriphManager.mboard_sensor_cache_policy for a description.
+    tx_sensor_cache_policy = {}
     # A dictionary that maps chips or components to chip selects for SPI.
     # If this is given, a dictionary called self._spi_nodes is created which
     # maps these keys to actual spidev paths. Also throws a warning/error if
@@ -41,6 +47,7 @@ class DboardManagerBase(object):
     def __init__(self, slot_idx, **kwargs):
         self.log = get_logger('dboardManager')
         self.slot_idx = slot_idx
+        self._sensor_cache = SensorCache(self.log)
         if 'eeprom_md' not in kwargs:
             self.log.debug("No EEPROM metadata given!")
         # In C++, we can only handle dicts if all the values are of the
@@ -164,16 +171,49 @@ class DboardManagerBase(object):
         See PeriphManager.get_mb_sensor() for a description of the return value
         format.
         """
-        callback_map = \
-            self.rx_sensor_callback_map if direction.lower() == 'rx' \
-            else self.tx_sensor_callback_map
+        callback_map, policy_map = \
+            (self.rx_sensor_callback_map, self.rx_sensor_cache_policy) \
+            if direction.lower() == 'rx' \
+            else (self.tx_sensor_callback_map, self.tx_sensor_cache_policy)
         if sensor_name not in callback_map:
             error_msg = "Was asked for non-existent sensor `{}'.".format(
                 sensor_name
             )
             self.log.error(error_msg)
             raise RuntimeError(error_msg)
-        return getattr(
-            self, callback_map.get(sensor_name)
-        )(chan)
+        callback_name = callback_map.get(sensor_name)
+        policy = policy_map.get(sensor_name)
+        if policy is None:
+            return getattr(self, callback_name)(chan)
+        # RX and TX sensors which share a callback also share the cache entry
+        return self._sensor_cache.get(
+            (callback_name, chan),
+            sensor_name,
+            lambda: getattr(self, callback_name)(chan),
+            policy)
+
+    def get_sensors_values(self, direction, chan=0):
+        """
+        Return the values of all RX or TX sensors of channel chan in one call,
+        as a dictionary sensor_name -> sensor value.
+
+        See PeriphManager.get_mb_sensors_values() for details.
+        """
+        sensor_values = {}
+        for sensor_name in self.get_sensors(direction, chan):
+            try:
+                sensor_values[sensor_name] = \
+                    self.get_sensor(direction, sensor_name, chan)
+            except Exception as ex:
+                self.log.warning("Failed to read sensor `{}': {}"
+                                 .format(sensor_name, ex))
+        return sensor_values
+
+    @no_rpc
+    def clear_sensor_cache(self):
+        """
+        Drop all cached sensor values and stop refreshing them. This is called
+        by the periph manager when the dboard gets deinitialized.
+        """
+        self._sensor_cache.clear()
 
@@ -13,6 +13,7 @@ from usrp_mpm.dboard_manager import DboardManagerBase
 from usrp_mpm.mpmlog import get_logger
 from usrp_mpm.periph_manager.e31x_periphs import MboardRegsControl
 from usrp_mpm.mpmutils import async_exec
+from usrp_mpm.sensor_cache import THERMAL_SENSOR_CACHE_POLICY
 
 ###############################################################################
 # Main dboard control class
@@ -46,6 +47,12 @@ class E31x_db(DboardManagerBase):
         'lo_lock' : 'get_tx_lo_lock_sensor',
         'lo_locked' : 'get_tx_lo_lock_sensor',
     }
+    rx_sensor_cache_policy = {
+        'ad9361_temperature': THERMAL_SENSOR_CACHE_POLICY,
+    }
+    tx_sensor_cache_policy = {
+        'ad9361_temperature': THERMAL_SENSOR_CACHE_POLICY,
+    }
     # Maps the chipselects to the corresponding devices:
     spi_chipselect = {"catalina": 0}
     ### End of overridables #################################################
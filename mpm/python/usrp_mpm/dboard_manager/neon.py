@@ -19,6 +19,7 @@ from usrp_mpm.sys_utils.udev import get_eeprom_paths
 from usrp_mpm.sys_utils.uio import UIO
 from usrp_mpm.periph_manager.e320_periphs import MboardRegsControl
 from usrp_mpm.mpmutils import async_exec
+from usrp_mpm.sensor_cache import THERMAL_SENSOR_CACHE_POLICY
 
 ###############################################################################
 # Main dboard control class
@@ -48,6 +49,12 @@ class Neon(DboardManagerBase):
         'lo_lock' : 'get_tx_lo_lock_sensor',
         'lo_locked' : 'get_tx_lo_lock_sensor',
     }
+    rx_sensor_cache_policy = {
+        'ad9361_temperature': THERMAL_SENSOR_CACHE_POLICY,
+    }
+    tx_sensor_cache_policy = {
+        'ad9361_temperature': THERMAL_SENSOR_CACHE_POLICY,
+    }
     # Maps the chipselects to the corresponding devices:
     spi_chipselect = {"catalina": 0,
                       "adf4002": 1}
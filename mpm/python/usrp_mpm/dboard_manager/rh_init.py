@@ -379,9 +379,11 @@ class RhodiumInitManager(object):
         given configuration and lanes.
 
         Parameters:
-          prescale   -> Controls the prescaling of the sample count to keep both sample
-                        count and error count in reasonable precision.
-                        Valid values: from 0 to 31.
+          prescale    -> Controls the prescaling of the sample count to keep both sample
+                         count and error count in reasonable precision.
+                         Valid values: from 0 to 31.
+          coarse_step -> Enables a coarse-to-fine sweep, which skips most of the open
+                         eye. Valid values: 0 (full sweep), 2 and up.
         """
         # The following constants must be defined according to GTs configuration
         # for each project. For further details, refer to the eyescan.py file.
@@ -391,14 +393,15 @@ class RhodiumInitManager(object):
         eq_mode          = 'LPM'
         # The following variables define the GTs to be scanned and the range of the
         # measurement.
-        prescale   = 0
-        scan_lanes = [0, 1, 2, 3]
-        hor_range  = {'start':-32 , 'stop':32 , 'step': 2}
-        ver_range  = {'start':-127, 'stop':127, 'step': 2}
+        prescale    = 0
+        coarse_step = 0
+        scan_lanes  = [0, 1, 2, 3]
+        hor_range   = {'start':-32 , 'stop':32 , 'step': 2}
+        ver_range   = {'start':-127, 'stop':127, 'step': 2}
         # Set default configuration values for Rhodium when the user is not intentionally
         # changing the constants/variables default values.
         for key in ('rxout_div', 'rx_int_datawidth', 'eq_mode',
-                    'prescale', 'scan_lanes', 'hor_range', 'ver_range'):
+                    'prescale', 'coarse_step', 'scan_lanes', 'hor_range', 'ver_range'):
             if key not in args:
                 self.log.trace("Setting Rh default value for {0}... val: {1}"
                                .format(key, locals()[key]))
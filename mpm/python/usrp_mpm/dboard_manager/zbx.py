@@ -13,6 +13,7 @@ from usrp_mpm.dboard_manager import DboardManagerBase
 from usrp_mpm.mpmlog import get_logger
 from usrp_mpm.chips.ic_reg_maps import zbx_cpld_regs_t
 from usrp_mpm.periph_manager.x4xx_periphs import get_temp_sensor
+from usrp_mpm.sensor_cache import THERMAL_SENSOR_CACHE_POLICY
 from usrp_mpm.sys_utils.udev import get_eeprom_paths_by_symbol
 
 ###############################################################################
@@ -64,6 +65,12 @@ class ZBX(DboardManagerBase):
     tx_sensor_callback_map = {
         'temperature': 'get_rf_temp_sensor',
     }
+    rx_sensor_cache_policy = {
+        'temperature': THERMAL_SENSOR_CACHE_POLICY,
+    }
+    tx_sensor_cache_policy = {
+        'temperature': THERMAL_SENSOR_CACHE_POLICY,
+    }
     ### End of overridables #################################################
 
     ### Daughterboard driver/hardware compatibility value
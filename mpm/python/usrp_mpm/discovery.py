@@ -40,10 +40,15 @@ def spawn_discovery_process(shared_state, discovery_addr):
     return proc
 
 
-def _discovery_process(state, discovery_addr):
+def _discovery_process(state, discovery_addr, bind_addr="0.0.0.0",
+                       port=MPM_DISCOVERY_PORT):
     """
     The actual process for device discovery. Is spawned by
     spawn_discovery_process().
+
+    bind_addr and port select the socket discovery listens on. The
+    simulator farm (see simulator/sim_farm.py) runs one of these per
+    simulated device, each on its own address or port.
     """
     log = get_main_logger().getChild('discovery')
     def create_response_string(state):
@@ -61,7 +66,7 @@ def _discovery_process(state, discovery_addr):
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     # FIXME really, we should only bind to the subnet but I haven't gotten that
     # working yet
-    sock.bind((("0.0.0.0", MPM_DISCOVERY_PORT)))
+    sock.bind(((bind_addr, port)))
     send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     send_sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DO)
 
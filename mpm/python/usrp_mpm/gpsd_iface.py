@@ -14,8 +14,32 @@ import select
 import datetime
 import math
 import re
+import threading
 from usrp_mpm.mpmlog import get_logger
 
+GPSD_ADDR = ('localhost', 2947)
+
+def _get_logger(name):
+    """
+    Return the MPM logger, or the main logger if there is none (i.e., when
+    running from the command line)
+    """
+    try:
+        return get_logger(name)
+    except AssertionError:
+        from usrp_mpm.mpmlog import get_main_logger
+        return get_main_logger(name)
+
+def _parse_gps_time(time_str):
+    """
+    Parse a GPSd time string (%Y-%m-%dT%H:%M:%S.%fZ, the fraction is optional)
+    and return it in seconds since the epoch
+    """
+    time_format = "%Y-%m-%dT%H:%M:%S.%fZ" if '.' in time_str else "%Y-%m-%dT%H:%M:%SZ"
+    time_dt = datetime.datetime.strptime(time_str, time_format)
+    epoch_dt = datetime.datetime(1970, 1, 1)
+    return (time_dt - epoch_dt).total_seconds()
+
 def _deg_to_dm(angle):
     """
     Convert a latitude or longitude from NMEA degrees to degrees minutes
@@ -122,11 +146,7 @@ class GPSDIface:
     """
     def __init__(self):
         # Make a logger
-        try:
-            self.log = get_logger('GPSDIface')
-        except AssertionError:
-            from usrp_mpm.mpmlog import get_main_logger
-            self.log = get_main_logger('GPSDIface')
+        self.log = _get_logger('GPSDIface')
         # Make a socket to connect to GPSD
         self.gpsd_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
@@ -141,7 +161,7 @@ class GPSDIface:
 
     def open(self):
         """Open the socket to GPSD"""
-        self.gpsd_socket.connect(('localhost', 2947))
+        self.gpsd_socket.connect(GPSD_ADDR)
         version_str = self.read_class("VERSION")
         self.enable_watch()
         self.log.trace("GPSD version: %s", version_str)
@@ -257,6 +277,179 @@ class GPSDIface:
         return result.get(resp_class, [{}])[0]
 
 
+class GPSDWatcher:
+    """
+    Keeps a watch session with GPSd open, and tracks the latest TPV, SKY and
+    PPS reports GPSd sends. The reports are read and parsed once, by a
+    background thread (under MPM, threading is monkey-patched by gevent, so
+    this is a greenlet), and can then be read by any number of callers without
+    waiting for GPSd.
+
+    Reports are the dictionaries described at
+    https://gpsd.gitlab.io/gpsd/gpsd_json.html. TPV reports with mode 0 (no
+    data) are ignored.
+    """
+    WATCH_CMD = b'?WATCH={"enable":true,"json":true,"pps":true};'
+    # Seconds between two attempts to reconnect to GPSd
+    RECONNECT_INTERVAL = 2.0
+    # Bytes to read from the socket at once
+    READ_SIZE = 4096
+
+    def __init__(self, log):
+        self.log = log
+        self._cond = threading.Condition()
+        # Report class ('tpv', 'sky', 'pps') -> (report, time.monotonic() of arrival)
+        self._reports = {}
+        # GPS time (in integer seconds) of the latest second edge we've seen
+        self._last_second = None
+        self._sock = None
+        self._running = False
+
+    def start(self):
+        """
+        Connect to GPSd and start the reader thread. Raises an OSError if
+        GPSd is not reachable.
+        """
+        self._sock = self._connect()
+        self._running = True
+        threading.Thread(target=self._read_reports, daemon=True).start()
+
+    def stop(self):
+        """
+        Stop the reader thread and close the connection to GPSd
+        """
+        self._running = False
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+
+    def _connect(self):
+        """
+        Open a connection to GPSd and start watching
+        """
+        sock = socket.create_connection(GPSD_ADDR)
+        sock.sendall(self.WATCH_CMD)
+        return sock
+
+    def _reconnect(self):
+        """
+        Try to reconnect to GPSd until it works, or until we're stopped.
+        Returns the new socket, or None if we were stopped.
+        """
+        while self._running:
+            time.sleep(self.RECONNECT_INTERVAL)
+            try:
+                return self._connect()
+            except OSError:
+                continue
+        return None
+
+    def _read_reports(self):
+        """
+        Reader thread: Split the stream from GPSd into lines (one JSON object
+        each), and process them
+        """
+        buf = b''
+        while self._running:
+            try:
+                data = self._sock.recv(self.READ_SIZE)
+                if not data:
+                    raise ConnectionError("Connection closed by GPSd")
+            except OSError as ex:
+                if not self._running:
+                    break
+                self.log.warning("Lost connection to GPSd ({}), reconnecting."
+                                 .format(ex))
+                self._sock.close()
+                buf = b''
+                self._sock = self._reconnect()
+                continue
+            lines = (buf + data).split(b'\n')
+            buf = lines.pop()
+            for line in lines:
+                self._handle_line(line)
+
+    def _handle_line(self, line):
+        """
+        Decode a line from GPSd and store the report, if we track its class
+        """
+        try:
+            report = json.loads(line.decode('ascii'))
+        except ValueError:
+            self.log.warning("Unable to decode report from GPSd: {}".format(line))
+            return
+        resp_class = report.get('class', '').lower()
+        if resp_class not in ('tpv', 'sky', 'pps'):
+            return
+        if resp_class == 'tpv' and report.get('mode', 0) == 0:
+            return
+        second = None
+        try:
+            if resp_class == 'pps':
+                second = int(report['real_sec'])
+            elif resp_class == 'tpv' and 'time' in report:
+                second = int(_parse_gps_time(report['time']))
+        except (KeyError, ValueError):
+            self.log.warning("Unable to get the time from {} report: {}"
+                             .format(resp_class.upper(), report))
+        with self._cond:
+            self._reports[resp_class] = (report, time.monotonic())
+            if second is not None \
+                    and (self._last_second is None or second > self._last_second):
+                self._last_second = second
+            self._cond.notify_all()
+
+    def get_report(self, resp_class, timeout=15):
+        """
+        Return the latest report of class resp_class ('tpv', 'sky' or 'pps').
+        This only waits (up to timeout seconds) if there hasn't been any report
+        of that class yet. Returns an empty dictionary on timeout.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: resp_class in self._reports, timeout):
+                self.log.warning(
+                    "Timeout trying to get GPS info (response class `{}')"
+                    .format(resp_class))
+                return {}
+            return self._reports[resp_class][0]
+
+    def get_report_age(self, resp_class):
+        """
+        Return the seconds since the latest report of class resp_class arrived,
+        or None if there hasn't been one
+        """
+        with self._cond:
+            if resp_class not in self._reports:
+                return None
+            return time.monotonic() - self._reports[resp_class][1]
+
+    def wait_for_pps_edge(self, timeout=15):
+        """
+        Wait for the next second edge, and return the GPS time (in integer
+        seconds) which starts at it. If GPSd reports PPS events, these are
+        used, otherwise the edge is when the first TPV report of the next
+        second arrives.
+
+        Returns None on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            start_second = self._last_second
+            while True:
+                if start_second is None:
+                    # We can't tell an edge from the first report we see
+                    start_second = self._last_second
+                elif self._last_second > start_second:
+                    return self._last_second
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+
 class GPSDIfaceExtension:
     """
     Wrapper class that facilitates the 'extension' of a `context` object. The
@@ -275,20 +468,24 @@ class GPSDIfaceExtension:
             # we can call `get_gps_time`
             print(self.get_gps_time())
     """
+    # If there was no TPV report for this many seconds, GPSd has lost the GPS,
+    # and we don't report a lock
+    TPV_MAX_AGE = 10.0
+
     def __init__(self):
-        self._gpsd_iface = GPSDIface()
-        self._log = self._gpsd_iface.log
+        self._log = _get_logger('GPSDIface')
+        self._watcher = GPSDWatcher(self._log)
         self._initialized = False
         try:
-            self._gpsd_iface.open()
+            self._watcher.start()
             self._initialized = True
-        except (ConnectionRefusedError, ConnectionResetError):
+        except OSError:
             self._log.warning(
                 "Could not connect to GPSd! None of the GPS sensors will work!")
 
     def __del__(self):
         if self._initialized:
-            self._gpsd_iface.close()
+            self._watcher.stop()
 
     def extend(self, context):
         """
@@ -305,6 +502,13 @@ class GPSDIfaceExtension:
             setattr(context, method_name, new_method)
         return new_methods
 
+    def wait_for_pps_edge(self, timeout=15):
+        """
+        Wait for the next PPS edge, and return the GPS time (in integer seconds)
+        which starts at it, or None on timeout. See GPSDWatcher.wait_for_pps_edge().
+        """
+        return self._watcher.wait_for_pps_edge(timeout)
+
     def get_gps_time_sensor(self):
         """
         Retrieve the GPS time using a TPV response from GPSd, and returns as a sensor dict.
@@ -313,43 +517,20 @@ class GPSDIfaceExtension:
         just after 2.000s to return 2 second. This effect is similar to get gps time on
         the next edge of pps.
         """
-        def parse_time(time_str):
-            """parse a string of time in format of %Y-%m-%dT%H:%M:%S.%fZ
-               return in unit second
-            """
-            time_dt = datetime.datetime.strptime(time_str, "%Y-%m-%dT%H:%M:%S.%fZ")
-            epoch_dt = datetime.datetime(1970, 1, 1)
-            return (time_dt - epoch_dt).total_seconds()
-        # Read responses from GPSD until we get a non-trivial mode and until next second.
-        gps_time_prev = 0
-        while True:
-            gps_info = self._gpsd_iface.get_gps_info(resp_class='tpv', timeout=15)
-            gps_mode = gps_info.get("mode", 0)
-            gps_time = parse_time(gps_info.get("time", ""))
-            if gps_mode == 0:
-                self._log.warning("GPSD reported invalid mode."
-                                  "Return from GPSD is %s", gps_info)
-                continue
-            if gps_time_prev == 0:
-                gps_time_prev = gps_time
-                continue
-            if int(gps_time) - int(gps_time_prev) >= 1:
-                return {
-                    'name': 'gps_time',
-                    'type': 'INTEGER',
-                    'unit': 'seconds',
-                    'value': str(int(gps_time)),
-                }
+        gps_time = self._watcher.wait_for_pps_edge(timeout=15)
+        if gps_time is None:
+            raise RuntimeError("Timeout waiting for the next second from GPSd")
+        return {
+            'name': 'gps_time',
+            'type': 'INTEGER',
+            'unit': 'seconds',
+            'value': str(gps_time),
+        }
 
     def get_gps_tpv_sensor(self):
-        """Get a TPV response from GPSd as a sensor dict"""
-        self._log.trace("Polling GPS TPV results from GPSD")
-        # Read responses from GPSD until we get a non-trivial mode
-        while True:
-            gps_info = self._gpsd_iface.get_gps_info(resp_class='tpv', timeout=15)
-            self._log.trace("GPS info: {}".format(gps_info))
-            if gps_info.get("mode", 0) > 0:
-                break
+        """Get the latest TPV response from GPSd as a sensor dict"""
+        gps_info = self._watcher.get_report('tpv')
+        self._log.trace("GPS info: {}".format(gps_info))
         # Return the JSON'd results
         gps_tpv = json.dumps(gps_info)
         return {
@@ -360,10 +541,8 @@ class GPSDIfaceExtension:
         }
 
     def get_gps_sky_sensor(self):
-        """Get a SKY response from GPSd as a sensor dict"""
-        self._log.trace("Polling GPS SKY results from GPSD")
-        # Just get the first SKY result
-        gps_info = self._gpsd_iface.get_gps_info(resp_class='sky', timeout=15)
+        """Get the latest SKY response from GPSd as a sensor dict"""
+        gps_info = self._watcher.get_report('sky')
         # Return the JSON'd results
         gps_sky = json.dumps(gps_info)
         return {
@@ -374,22 +553,9 @@ class GPSDIfaceExtension:
         }
 
     def get_gps_gpgga_sensor(self):
-        """Get GPGGA sensor data by parsing TPV and SKY sensor data"""
-        self._log.trace("Polling GPS TPV and SKY results from GPSD")
-        # Read responses from GPSD until we get both a SKY response and TPV
-        # response in non-trivial mode
-        while True:
-            gps_info = self._gpsd_iface.get_gps_info(resp_class='', timeout=15)
-            self._log.trace("GPS info: {}".format(gps_info))
-            # Response types are 'list of dicts', but they can be empty lists so
-            # we need to prepare for that:
-            tpv_sensor_data = gps_info.get('tpv')
-            sky_sensor_data = gps_info.get('sky')
-            if tpv_sensor_data and sky_sensor_data:
-                tpv_sensor_data = tpv_sensor_data[0]
-                sky_sensor_data = sky_sensor_data[0]
-                if tpv_sensor_data.get("mode", 0) > 0:
-                    break
+        """Get GPGGA sensor data by parsing the latest TPV and SKY responses"""
+        tpv_sensor_data = self._watcher.get_report('tpv')
+        sky_sensor_data = self._watcher.get_report('sky')
         return {
             'name': 'gpgga',
             'type': 'STRING',
@@ -407,12 +573,11 @@ class GPSDIfaceExtension:
         if not self._initialized:
             self._log.warning("Cannot query GPS lock, GPSd not initialized!")
             return False
-        # Read responses from GPSD until we get a non-trivial mode
-        while True:
-            gps_info = self._gpsd_iface.get_gps_info(resp_class='tpv', timeout=15)
-            self._log.trace("GPS info: {}".format(gps_info))
-            if gps_info.get("mode", 0) > 0:
-                break
+        gps_info = self._watcher.get_report('tpv')
+        self._log.trace("GPS info: {}".format(gps_info))
+        tpv_age = self._watcher.get_report_age('tpv')
+        if tpv_age is None or tpv_age > self.TPV_MAX_AGE:
+            return False
         # 2 == 2D fix, 3 == 3D fix.
         # https://gpsd.gitlab.io/gpsd/gpsd_json.html
         return gps_info.get("mode", 0) >= 2
@@ -8,11 +8,11 @@ MPM Logging
 """
 
 from __future__ import print_function
-import copy
+import os
 import logging
 from logging import CRITICAL, ERROR, WARNING, INFO, DEBUG
 from logging import handlers
-import collections
+import queue
 from builtins import str
 
 # Colors
@@ -27,48 +27,177 @@ RESET = str('\x1b[0m')
 # Additional log level
 TRACE = 1
 
+# Bumped whenever the level of any MPMLogger changes, see
+# MPMLogger.isEnabledFor()
+_LEVEL_GENERATION = 0
+
+def get_level_color(levelno):
+    """
+    Return the color for messages of log level levelno
+    """
+    if levelno >= CRITICAL:
+        return RED
+    if levelno >= ERROR:
+        return RED
+    if levelno >= WARNING:
+        return YELLOW
+    if levelno >= INFO:
+        return GREEN
+    if levelno >= DEBUG:
+        return PINK
+    if levelno >= TRACE:
+        return ''
+    # NOTSET and anything else
+    return RESET
+
+class _ColorRecordView(object):
+    """
+    Mapping for %-style format strings, which returns the attributes of a
+    record, but the message in color
+    """
+    def __init__(self, record):
+        self.record = record
+
+    def __getitem__(self, key):
+        if key == 'message':
+            return BOLD + get_level_color(self.record.levelno) + \
+                self.record.message + RESET
+        return self.record.__dict__[key]
+
+class ColorFormatter(logging.Formatter):
+    """
+    Formatter that prints the message of a record in color. Only %-style format
+    strings are supported.
+    The record is not modified (other than by logging.Formatter itself), so
+    there is no need to copy it.
+    """
+    def formatMessage(self, record):
+        """
+        Replaces logging.Formatter.formatMessage()
+        """
+        return self._fmt % _ColorRecordView(record)
+
 class ColorStreamHandler(logging.StreamHandler):
     """
-    StreamHandler that prints colored output
+    StreamHandler that prints colored output, using a ColorFormatter
     """
+    def setFormatter(self, fmt):
+        """
+        Sets the formatter, turning it into a ColorFormatter if needed
+        """
+        if fmt is not None and not isinstance(fmt, ColorFormatter):
+            fmt = ColorFormatter(fmt._fmt, fmt.datefmt)
+        logging.StreamHandler.setFormatter(self, fmt)
+
+class LogRingBuffer(logging.Handler):
+    """
+    Keeps the youngest maxlen log messages for get_log_buf().
+
+    Messages are stored as preformatted (name, message, levelname, msecs) tuples
+    in a ring of fixed size, so records don't have to be kept alive, and
+    storing a message never allocates more than the tuple.
+    """
+    def __init__(self, maxlen):
+        logging.Handler.__init__(self)
+        self.maxlen = maxlen
+        self._ring = [None] * maxlen
+        # Index the next message will be stored at
+        self._next = 0
+        self._count = 0
+
     def emit(self, record):
         """
-        Prints record with colors.
-        record is not modified.
-        """
-        record_ = copy.copy(record)
-        levelno = record_.levelno
-        if levelno >= CRITICAL:
-            color = RED
-        elif levelno >= ERROR:
-            color = RED
-        elif levelno >= WARNING:
-            color = YELLOW
-        elif levelno >= INFO:
-            color = GREEN
-        elif levelno >= DEBUG:
-            color = PINK
-        elif levelno >= TRACE:
-            color = ''
-        else: # NOTSET and anything else
-            color = RESET
-        record_.msg = BOLD + color + str(record_.msg) + RESET
-        logging.StreamHandler.emit(self, record_)
-
-class LossyQueueHandler(handlers.QueueHandler):
-    """
-    Like QueueHandler, except it'll try and keep the youngest, not oldest,
-    entries.
+        Store the message of record. logging.Handler.handle() holds our lock
+        while we're here.
+        """
+        if not self.maxlen:
+            return
+        try:
+            message = record.getMessage()
+        except Exception:
+            self.handleError(record)
+            return
+        self._ring[self._next] = \
+            (record.name, message, record.levelname, int(record.msecs))
+        self._next = (self._next + 1) % self.maxlen
+        self._count = min(self._count + 1, self.maxlen)
+
+    def pop_all(self):
+        """
+        Return all stored messages (the oldest first), and clear the ring
+        """
+        self.acquire()
+        try:
+            start = (self._next - self._count) % max(self.maxlen, 1)
+            entries = [
+                self._ring[(start + idx) % self.maxlen]
+                for idx in range(self._count)
+            ]
+            self._ring = [None] * self.maxlen
+            self._count = 0
+            return entries
+        finally:
+            self.release()
+
+class AsyncLogHandler(handlers.QueueHandler):
     """
+    Passes records on to other handlers (e.g., console and journal output)
+    from a background thread, so logging doesn't wait for their output.
+
+    Messages are formatted before they're queued. If the queue is full, records
+    are dropped rather than blocking the caller, and counted in self.dropped.
+    The background thread is (re)started on the first record in every process,
+    because it doesn't survive a fork().
+    """
+    def __init__(self, target_handlers, maxsize=1000):
+        handlers.QueueHandler.__init__(self, queue.Queue(maxsize))
+        self.target_handlers = target_handlers
+        self.dropped = 0
+        self._listener = None
+        # The process self._listener runs in
+        self._pid = None
+
+    def _start_listener(self):
+        """
+        Start the background thread, with a new queue
+        """
+        self.queue = queue.Queue(self.queue.maxsize)
+        self._listener = handlers.QueueListener(
+            self.queue, *self.target_handlers, respect_handler_level=True)
+        self._listener.start()
+        self._pid = os.getpid()
+
     def enqueue(self, record):
         """
         Replaces logging.handlers.QueueHandler.enqueue()
         """
-        self.queue.appendleft(record)
+        if self._pid != os.getpid():
+            self._start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """
+        Stop the background thread, after it has passed on all queued records
+        """
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+        handlers.QueueHandler.close(self)
 
 class MPMLogger(logging.getLoggerClass()):
     """
     Extends the regular Python logging with level 'trace' (like UHD)
+
+    Log messages should be formatted lazily, i.e., passed as a format string
+    and arguments (log.trace("Got %d bytes", num_bytes)), so no string is built
+    for messages that aren't logged. If even computing the arguments is
+    expensive, guard the call with is_trace_enabled():
+
+    >>> if log.is_trace_enabled():
+    ...     log.trace("Packet: %s", packet.to_string_with_payload())
     """
     def __init__(self, *args, **kwargs):
         logging.Logger.__init__(self, *args, **kwargs)
@@ -78,35 +207,63 @@ class MPMLogger(logging.getLoggerClass()):
             self.cpp_log_buf = lib.types.log_buf.make_singleton()
         except ImportError:
             pass
-        from usrp_mpm import prefs
-        self.py_log_buf = collections.deque(
-            maxlen=prefs.get_prefs().getint('mpm', 'log_buf_size')
-        )
+        # LogRingBuffer, only set up for the main logger
+        self.py_log_buf = None
+        # level -> isEnabledFor(level), valid for self._enabled_cache_key
+        self._enabled_cache = {}
+        self._enabled_cache_key = None
 
-    def trace(self, *args, **kwargs):
+    def setLevel(self, level):
+        """
+        Replaces logging.Logger.setLevel(). Invalidates the isEnabledFor()
+        results of all MPMLoggers, because children inherit levels.
+        """
+        global _LEVEL_GENERATION
+        logging.Logger.setLevel(self, level)
+        _LEVEL_GENERATION += 1
+
+    def isEnabledFor(self, level):
+        """
+        Replaces logging.Logger.isEnabledFor(), which walks up the logger
+        hierarchy on every call (before Python 3.7). The results are cached
+        until a level changes.
+        """
+        cache_key = (_LEVEL_GENERATION, self.manager.disable)
+        if self._enabled_cache_key != cache_key:
+            self._enabled_cache = {}
+            self._enabled_cache_key = cache_key
+        try:
+            return self._enabled_cache[level]
+        except KeyError:
+            enabled = logging.Logger.isEnabledFor(self, level)
+            self._enabled_cache[level] = enabled
+            return enabled
+
+    def is_trace_enabled(self):
+        """
+        Return True if trace messages are logged. Use this to skip building
+        expensive trace message arguments.
+        """
+        return self.isEnabledFor(TRACE)
+
+    def trace(self, msg, *args, **kwargs):
         """ Extends logging for super-high verbosity """
-        self.log(TRACE, *args, **kwargs)
+        if self.isEnabledFor(TRACE):
+            self._log(TRACE, msg, args, **kwargs)
 
     def get_log_buf(self):
         """
         Return the contents of the logging queue, formatted as a list of
         dictionaries.
         """
-        records = []
-        # Note: This loop does not guarantee that all log items will be
-        # returned. The while loop is set up to be bounded, and to return as
-        # soon as is sensible.
-        while len(records) < self.py_log_buf.maxlen:
-            try:
-                records.append(self.py_log_buf.pop())
-            except IndexError:
-                break
+        if self.py_log_buf is None:
+            return []
         return [{
-            'name': record.name,
-            'message': record.message,
-            'levelname': record.levelname,
-            'msecs': int(record.msecs),
-        } for record in records]
+            'name': name,
+            'message': message,
+            'levelname': levelname,
+            'msecs': msecs,
+        } for name, message, levelname, msecs in self.py_log_buf.pop_all()]
 
 
 LOGGER = None # Logger singleton
@@ -115,11 +272,16 @@ def get_main_logger(
         use_journal=False,
         use_logbuf=True,
         console_color=True,
-        log_default_delta=0
+        log_default_delta=0,
+        use_async=None
     ):
     """
     Returns the top-level logger object. This is the only API call from this
     file that should be used outside.
+
+    If use_async is True, console and journal output is written from a
+    background thread (see AsyncLogHandler). It defaults to the log_async
+    setting in mpm.conf.
     """
     global LOGGER
     if LOGGER is not None:
@@ -127,23 +289,31 @@ def get_main_logger(
     logging.addLevelName(TRACE, 'TRACE')
     logging.setLoggerClass(MPMLogger)
     LOGGER = logging.getLogger('MPM')
+    from usrp_mpm import prefs
+    mpm_prefs = prefs.get_prefs()
+    if use_async is None:
+        use_async = mpm_prefs.getboolean('mpm', 'log_async')
+    output_handlers = []
     if use_console:
         console_handler = ColorStreamHandler() if console_color else logging.StreamHandler()
         console_formatter = logging.Formatter("[%(name)s] [%(levelname)s] %(message)s")
         console_handler.setFormatter(console_formatter)
-        LOGGER.addHandler(console_handler)
+        output_handlers.append(console_handler)
     if use_journal:
         from systemd.journal import JournalHandler
         journal_handler = JournalHandler(SYSLOG_IDENTIFIER='usrp_hwd')
         journal_formatter = logging.Formatter('[%(levelname)s] [%(module)s] %(message)s')
         journal_handler.setFormatter(journal_formatter)
-        LOGGER.addHandler(journal_handler)
+        output_handlers.append(journal_handler)
+    if use_async and output_handlers:
+        LOGGER.addHandler(AsyncLogHandler(output_handlers))
+    else:
+        for output_handler in output_handlers:
+            LOGGER.addHandler(output_handler)
     if use_logbuf:
-        queue_handler = LossyQueueHandler(LOGGER.py_log_buf)
-        LOGGER.addHandler(queue_handler)
+        LOGGER.py_log_buf = LogRingBuffer(mpm_prefs.getint('mpm', 'log_buf_size'))
+        LOGGER.addHandler(LOGGER.py_log_buf)
     # Set default level:
-    from usrp_mpm import prefs
-    mpm_prefs = prefs.get_prefs()
     default_log_level = int(min(
         mpm_prefs.get_log_level() - log_default_delta * 10,
         CRITICAL
@@ -24,10 +24,12 @@ from usrp_mpm.sys_utils.udev import get_eeprom_paths_by_symbol
 from usrp_mpm.sys_utils.udev import get_eeprom_paths
 from usrp_mpm.sys_utils.udev import get_spidev_nodes
 from usrp_mpm.sys_utils import dtoverlay
+from usrp_mpm.sys_utils import device_index
 from usrp_mpm.sys_utils import net
 from usrp_mpm import eeprom
 from usrp_mpm.rpc_server import no_claim, no_rpc
 from usrp_mpm import prefs
+from usrp_mpm.sensor_cache import SensorCache
 
 def get_dboard_class_from_pid(pid):
     """
@@ -109,6 +111,10 @@ class PeriphManagerBase(object):
     # A list of available sensors on the motherboard. This dictionary is a map
     # of the form sensor_name -> method name
     mboard_sensor_callback_map = {}
+    # Sensors which may be cached. This dictionary is a map of the form
+    # sensor_name -> SensorCachePolicy. Sensors which aren't listed here are
+    # read every time.
+    mboard_sensor_cache_policy = {}
     # This is a sanity check value to see if the correct number of
     # daughterboards are detected. If somewhere along the line more than
     # max_num_dboards dboards are found, an error or warning is raised,
@@ -246,6 +252,7 @@ class PeriphManagerBase(object):
         # Set up logging
         self.log = get_logger('PeriphManager')
         self.claimed = False
+        self._sensor_cache = SensorCache(self.log)
         try:
             self.mboard_info = self._get_mboard_info()
             self.log.info("Device serial number: {}"
@@ -292,6 +299,8 @@ class PeriphManagerBase(object):
         )
         self._device_initialized = True
         self._initialization_status = "No errors."
+        self.log.debug("Device lookups during initialization: {}"
+                       .format(device_index.format_stats()))
 
     def _read_mboard_eeprom_data(self, path):
         return eeprom.read_eeprom(
@@ -759,6 +768,8 @@ class PeriphManagerBase(object):
         for slot, dboard in enumerate(self.dboards):
             self.log.trace("call deinit() on dBoard in slot {}".format(slot))
             dboard.deinit()
+            dboard.clear_sensor_cache()
+        self._sensor_cache.clear()
 
     def tear_down(self):
         """
@@ -768,6 +779,8 @@ class PeriphManagerBase(object):
         self.log.trace("Teardown called for Peripheral Manager base.")
         for each in self.dboards:
             each.tear_down()
+            each.clear_sensor_cache()
+        self._sensor_cache.clear()
 
     ###########################################################################
     # RFNoC & Device Info
@@ -1011,9 +1024,30 @@ class PeriphManagerBase(object):
             )
             self.log.error(error_msg)
             raise RuntimeError(error_msg)
-        return getattr(
-            self, self.mboard_sensor_callback_map.get(sensor_name)
-        )()
+        callback_name = self.mboard_sensor_callback_map.get(sensor_name)
+        policy = self.mboard_sensor_cache_policy.get(sensor_name)
+        if policy is None:
+            return getattr(self, callback_name)()
+        return self._sensor_cache.get(
+            callback_name, sensor_name, getattr(self, callback_name), policy)
+
+    def get_mb_sensors_values(self):
+        """
+        Return the values of all motherboard sensors in one call, as a
+        dictionary sensor_name -> sensor value (see get_mb_sensor() for the
+        format of the sensor values).
+
+        Sensors with an entry in mboard_sensor_cache_policy are returned from
+        the cache. Sensors which fail to read are logged and left out.
+        """
+        sensor_values = {}
+        for sensor_name in self.get_mb_sensors():
+            try:
+                sensor_values[sensor_name] = self.get_mb_sensor(sensor_name)
+            except Exception as ex:
+                self.log.warning("Failed to read sensor `{}': {}"
+                                 .format(sensor_name, ex))
+        return sensor_values
 
     ##########################################################################
     # EEPROMS
@@ -51,6 +51,8 @@ class MboardRegsCommon:
         )
         self.poke32 = self.regs.poke32
         self.peek32 = self.regs.peek32
+        self.poke32_many = self.regs.poke32_many
+        self.peek32_many = self.regs.peek32_many
 
     ###########################################################################
     # Device ID
@@ -168,8 +170,7 @@ class MboardRegsCommon:
             tk_idx * self.MB_TIMEKEEPER_OFFSET
         addr_hi = addr_lo + 4
         with self.regs:
-            time_lo = self.peek32(addr_lo)
-            time_hi = self.peek32(addr_hi)
+            time_lo, time_hi = self.peek32_many([addr_lo, addr_hi])
         return (time_hi << 32) | time_lo
 
     def set_timekeeper_time(self, tk_idx, ticks, next_pps):
@@ -193,9 +194,11 @@ class MboardRegsCommon:
         self.log.trace("Setting time on timekeeper %d to %d %s", tk_idx, ticks,
                        ("on next pps" if next_pps else "now"))
         with self.regs:
-            self.poke32(addr_lo, time_lo)
-            self.poke32(addr_hi, time_hi)
-            self.poke32(addr_ctrl, time_ctrl)
+            self.poke32_many([
+                (addr_lo, time_lo),
+                (addr_hi, time_hi),
+                (addr_ctrl, time_ctrl),
+            ])
 
     def set_tick_period(self, tk_idx, period_ns):
         """
@@ -210,5 +213,4 @@ class MboardRegsCommon:
         period_lo = period_ns & 0xFFFFFFFF
         period_hi = (period_ns >> 32) & 0xFFFFFFFF
         with self.regs:
-            self.poke32(addr_lo, period_lo)
-            self.poke32(addr_hi, period_hi)
+            self.poke32_many([(addr_lo, period_lo), (addr_hi, period_hi)])
@@ -18,6 +18,7 @@ from usrp_mpm.gpsd_iface import GPSDIfaceExtension
 from usrp_mpm.mpmutils import assert_compat_number, str2bool
 from usrp_mpm.periph_manager import PeriphManagerBase
 from usrp_mpm.rpc_server import no_rpc
+from usrp_mpm.sensor_cache import THERMAL_SENSOR_CACHE_POLICY, GPS_SENSOR_CACHE_POLICY
 from usrp_mpm.sys_utils import dtoverlay
 from usrp_mpm.sys_utils.sysfs_thermal import read_sysfs_sensors_value
 from usrp_mpm.sys_utils.udev import get_spidev_nodes
@@ -92,6 +93,15 @@ class e31x(ZynqComponents, PeriphManagerBase):
         'temp_fpga' : 'get_fpga_temp_sensor',
         'temp_mb' : 'get_mb_temp_sensor',
     }
+    mboard_sensor_cache_policy = {
+        'temp_fpga' : THERMAL_SENSOR_CACHE_POLICY,
+        'temp_mb' : THERMAL_SENSOR_CACHE_POLICY,
+        # The lock status is read from the gpsd TPV report
+        'gps_locked': GPS_SENSOR_CACHE_POLICY,
+        'gps_tpv': GPS_SENSOR_CACHE_POLICY,
+        'gps_sky': GPS_SENSOR_CACHE_POLICY,
+        'gps_gpgga': GPS_SENSOR_CACHE_POLICY,
+    }
     # The E310 has a single EEPROM that stores both DB and MB information
     dboard_eeprom_addr = "e0004000.i2c"
     dboard_eeprom_path_index = 0
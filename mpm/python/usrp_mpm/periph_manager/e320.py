@@ -19,6 +19,7 @@ from usrp_mpm.gpsd_iface import GPSDIfaceExtension
 from usrp_mpm.mpmutils import assert_compat_number, str2bool
 from usrp_mpm.periph_manager import PeriphManagerBase
 from usrp_mpm.rpc_server import no_rpc
+from usrp_mpm.sensor_cache import THERMAL_SENSOR_CACHE_POLICY, GPS_SENSOR_CACHE_POLICY
 from usrp_mpm.sys_utils import dtoverlay
 from usrp_mpm.sys_utils.sysfs_thermal import read_thermal_sensor_value, read_thermal_sensors_value
 from usrp_mpm.sys_utils.udev import get_spidev_nodes
@@ -98,6 +99,17 @@ class e320(ZynqComponents, PeriphManagerBase):
         'temp_rf_channelB' : 'get_rf_channelB_temp_sensor',
         'temp_main_power' : 'get_main_power_temp_sensor',
     }
+    mboard_sensor_cache_policy = {
+        'fan': THERMAL_SENSOR_CACHE_POLICY,
+        'temp_fpga' : THERMAL_SENSOR_CACHE_POLICY,
+        'temp_internal' : THERMAL_SENSOR_CACHE_POLICY,
+        'temp_rf_channelA' : THERMAL_SENSOR_CACHE_POLICY,
+        'temp_rf_channelB' : THERMAL_SENSOR_CACHE_POLICY,
+        'temp_main_power' : THERMAL_SENSOR_CACHE_POLICY,
+        'gps_tpv': GPS_SENSOR_CACHE_POLICY,
+        'gps_sky': GPS_SENSOR_CACHE_POLICY,
+        'gps_gpgga': GPS_SENSOR_CACHE_POLICY,
+    }
     max_num_dboards = 1
 
     # We're on a Zynq target, so the following two come from the Zynq standard
@@ -19,6 +19,7 @@ from usrp_mpm.gpsd_iface import GPSDIfaceExtension
 from usrp_mpm.periph_manager import PeriphManagerBase
 from usrp_mpm.mpmutils import assert_compat_number, str2bool, poll_with_timeout
 from usrp_mpm.rpc_server import no_rpc
+from usrp_mpm.sensor_cache import THERMAL_SENSOR_CACHE_POLICY, GPS_SENSOR_CACHE_POLICY
 from usrp_mpm.sys_utils import dtoverlay
 from usrp_mpm.sys_utils import i2c_dev
 from usrp_mpm.sys_utils.sysfs_thermal import read_thermal_sensor_value
@@ -133,6 +134,13 @@ class n3xx(ZynqComponents, PeriphManagerBase):
         'temp': 'get_temp_sensor',
         'fan': 'get_fan_sensor',
     }
+    mboard_sensor_cache_policy = {
+        'temp': THERMAL_SENSOR_CACHE_POLICY,
+        'fan': THERMAL_SENSOR_CACHE_POLICY,
+        'gps_tpv': GPS_SENSOR_CACHE_POLICY,
+        'gps_sky': GPS_SENSOR_CACHE_POLICY,
+        'gps_gpgga': GPS_SENSOR_CACHE_POLICY,
+    }
     dboard_eeprom_addr = "e0004000.i2c"
     dboard_eeprom_offset = 0
     dboard_eeprom_max_len = 64
@@ -17,7 +17,9 @@ from usrp_mpm.rpc_server import no_claim
 from usrp_mpm.periph_manager import PeriphManagerBase
 from usrp_mpm.simulator.sim_dboard import registry as dboards
 from usrp_mpm.simulator.chdr_endpoint import ChdrEndpoint
-from usrp_mpm.simulator.config import Config
+from usrp_mpm.simulator.chdr_endpoint_async import AsyncChdrEndpoint
+from usrp_mpm.simulator.config import Config, NetworkDescriptor
+from usrp_mpm.simulator import sim_farm
 
 CLOCK_SOURCE_INTERNAL = "internal"
 
@@ -27,8 +29,17 @@ class SimXportMgrUDP(XportMgrUDP):
     """This is an adaptor class for the normal XportMgrUDP
     In radios, the interface names are hardcoded. Since we are on a
     desktop computer, we generate the names at runtime.
+
+    The simulator may have more than one xport (see
+    simulator/config.py:TopologyDescriptor), each listening on its own
+    port, so every interface offers one link per xport.
+
+    If the simulator is bound to a single address (see
+    simulator/config.py:NetworkDescriptor), only that address is offered.
     """
-    def __init__(self, log, args, eth_dispatcher_cls):
+    def __init__(self, log, args, eth_dispatcher_cls, num_xports=1, network=None):
+        self.num_xports = num_xports
+        self.network = network if network is not None else NetworkDescriptor()
         with IPRoute() as ipr:
             self.iface_config = {
                 link.get_attr('IFLA_IFNAME'): {
@@ -37,6 +48,27 @@ class SimXportMgrUDP(XportMgrUDP):
                 } for link in ipr.get_links()
             }
         super().__init__(log, args, eth_dispatcher_cls)
+        self.chdr_port = self.network.chdr_port
+
+    def _is_bound(self):
+        return self.network.bind_addr != "0.0.0.0"
+
+    def get_xport_info(self):
+        if self._is_bound():
+            return {'addr': self.network.bind_addr}
+        return super().get_xport_info()
+
+    def get_chdr_link_options(self, host_location='all'):
+        """
+        Returns the link options of XportMgrUDP, repeated for the ports
+        of all xports after the first one.
+        """
+        options = super().get_chdr_link_options(host_location)
+        if self._is_bound():
+            options = [dict(options[0], ipv4=self.network.bind_addr)] if options else []
+        return [dict(option, port=str(int(option['port']) + xport_inst))
+                for xport_inst in range(self.num_xports)
+                for option in options]
 
 class SimEthDispatcher:
     """This is the hardware specific part of the normal XportMgrUDP
@@ -79,7 +111,15 @@ class sim(PeriphManagerBase):
         # Logger is initialized in super().__init__ but we need config values
         # before we call that
         config_log = get_logger("PeriphConfig")
-        if 'config' in args:
+        # The event loop of the AsyncChdrEndpoint, if it is shared
+        chdr_loop = None
+        if 'sim_farm_device' in args:
+            # We are one of many devices in a sim farm, which has
+            # already prepared our config
+            farm_device = sim_farm.get_device(args['sim_farm_device'])
+            self.config = farm_device.config
+            chdr_loop = farm_device.loop
+        elif 'config' in args:
             config_path = args['config']
             config_log.info("Loading config from {}".format(config_path))
             self.config = Config.from_path(config_log, config_path)
@@ -96,7 +136,10 @@ class sim(PeriphManagerBase):
         # This uses the description, mboard_info, and pids
         super().__init__()
 
-        self.chdr_endpoint = ChdrEndpoint(self.log, self.config)
+        if self.config.topology.stream_workers == "asyncio":
+            self.chdr_endpoint = AsyncChdrEndpoint(self.log, self.config, chdr_loop)
+        else:
+            self.chdr_endpoint = ChdrEndpoint(self.log, self.config)
 
         # Unlike the real hardware drivers, if there is an exception here,
         # we just crash. No use missing an error when testing.
@@ -151,7 +194,8 @@ class sim(PeriphManagerBase):
 
         # Init CHDR transports
         self._xport_mgrs = {
-            'udp': SimXportMgrUDP(self.log, args, SimEthDispatcher)
+            'udp': SimXportMgrUDP(self.log, args, SimEthDispatcher,
+                                  self.config.topology.num_xports, self.config.network)
         }
 
         # Init complete.
@@ -257,6 +301,7 @@ class sim(PeriphManagerBase):
         """
         self.log.debug("Setting timekeeper time (tx_idx:{}, ticks: {}, next_pps: {})"
                        .format(tk_idx, ticks, next_pps))
+        self.chdr_endpoint.get_timekeeper().set_ticks(ticks, next_pps)
 
     def get_timekeeper_time(self, tk_idx, last_pps):
         """
@@ -266,7 +311,10 @@ class sim(PeriphManagerBase):
         tk_idx: Index of timekeeper
         next_pps: If True, get time at last PPS. Otherwise, get time now.
         """
-        return 0
+        timekeeper = self.chdr_endpoint.get_timekeeper()
+        if last_pps:
+            return timekeeper.get_ticks_last_pps()
+        return timekeeper.get_ticks()
 
     def set_tick_period(self, tk_idx, period_ns):
         """
@@ -278,6 +326,8 @@ class sim(PeriphManagerBase):
         """
         self.log.debug("Setting tick period (tk_idx: {}, period_ns: {})"
                        .format(tk_idx, period_ns))
+        # period_ns is a Q32 fixed point number (see mb_controller.cpp)
+        self.chdr_endpoint.get_timekeeper().set_tick_rate(1e9 * (1 << 32) / period_ns)
 
     def get_clocks(self):
         """
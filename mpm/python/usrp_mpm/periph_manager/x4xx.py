@@ -22,6 +22,7 @@ from usrp_mpm.sys_utils import i2c_dev
 from usrp_mpm.sys_utils.gpio import Gpio
 from usrp_mpm.sys_utils.udev import dt_symbol_get_spidev
 from usrp_mpm.rpc_server import no_claim, no_rpc
+from usrp_mpm.sensor_cache import THERMAL_SENSOR_CACHE_POLICY, GPS_SENSOR_CACHE_POLICY
 from usrp_mpm.mpmutils import assert_compat_number, poll_with_timeout
 from usrp_mpm.periph_manager import PeriphManagerBase
 from usrp_mpm.xports import XportMgrUDP
@@ -175,6 +176,20 @@ class x4xx(ZynqComponents, PeriphManagerBase):
         'temp_main_power' : 'get_main_power_temp_sensor',
         'temp_scu_internal' : 'get_scu_internal_temp_sensor',
     }
+    mboard_sensor_cache_policy = {
+        'fan0': THERMAL_SENSOR_CACHE_POLICY,
+        'fan1': THERMAL_SENSOR_CACHE_POLICY,
+        'temp_fpga' : THERMAL_SENSOR_CACHE_POLICY,
+        'temp_internal' : THERMAL_SENSOR_CACHE_POLICY,
+        'temp_main_power' : THERMAL_SENSOR_CACHE_POLICY,
+        'temp_scu_internal' : THERMAL_SENSOR_CACHE_POLICY,
+        # GPS status lines on the clocking aux board (see X4xxGPSMgr)
+        'gps_locked': GPS_SENSOR_CACHE_POLICY,
+        'gps_alarm': GPS_SENSOR_CACHE_POLICY,
+        'gps_warmup': GPS_SENSOR_CACHE_POLICY,
+        'gps_survey': GPS_SENSOR_CACHE_POLICY,
+        'gps_phase_lock': GPS_SENSOR_CACHE_POLICY,
+    }
     db_iface = X4xxDboardIface
     dboard_eeprom_magic = eeprom_magic
     updateable_components = {
@@ -17,6 +17,7 @@ _PREFS = None
 MPM_DEFAULT_CONFFILE_PATH = '/etc/uhd/mpm.conf'
 MPM_DEFAULT_LOG_LEVEL = 'info'
 MPM_DEFAULT_LOG_BUF_SIZE = 100 # Number of log records to buf
+MPM_DEFAULT_LOG_ASYNC = False # Write console/journal output from a thread
 
 # ConfigParser has too many parents for PyLint's liking, but we don't control
 # that, so disable that warning
@@ -39,6 +40,7 @@ class _MPMPrefs(configparser.ConfigParser):
         'mpm': {
             'log_level': MPM_DEFAULT_LOG_LEVEL,
             'log_buf_size': MPM_DEFAULT_LOG_BUF_SIZE,
+            'log_async': MPM_DEFAULT_LOG_ASYNC,
         },
         'overrides': {
             'override_db_pids': '',
@@ -26,6 +26,7 @@ from contextlib import contextmanager
 from mprpc import RPCServer
 from usrp_mpm.mpmlog import get_main_logger
 from usrp_mpm.mpmutils import to_binary_str
+from usrp_mpm.rpc_stats import RPCStats, RPCProfiler
 from usrp_mpm.sys_utils import watchdog
 from usrp_mpm.sys_utils import net
 
@@ -51,7 +52,8 @@ class MPMServer(RPCServer):
     """
     # This is a list of methods in this class which require a claim
     default_claimed_methods = ['init', 'update_component', 'reclaim', 'unclaim',
-                               'get_log_buf']
+                               'get_log_buf', 'multicall', 'reset_rpc_stats',
+                               'start_profiling', 'stop_profiling']
 
     ###########################################################################
     # RPC Server Initialization
@@ -70,6 +72,10 @@ class MPMServer(RPCServer):
             TIMEOUT_INTERVAL
         ))
         self.session_id = None
+        # Call statistics of all periph_manager and dboard methods, see
+        # get_rpc_stats()
+        self._rpc_stats = RPCStats()
+        self._profiler = RPCProfiler()
         # Create the periph_manager for this device
         # This call will be forwarded to the device specific implementation
         # e.g. in periph_manager/n3xx.py
@@ -177,27 +183,23 @@ class MPMServer(RPCServer):
             " Define a function that requires a claim token check "
             if not self._check_token_valid(token):
                 self.log.warning(
-                    "Thwarted attempt to access function `{}' with invalid " \
-                    "token `{}'.".format(command, token)
+                    "Thwarted attempt to access function `%s' with invalid "
+                    "token `%s'.", command, token
                 )
                 raise RuntimeError("Invalid token!")
+            # Because we can only reach this point with a valid claim,
+            # there's no harm in resetting the timer
+            self._reset_timer()
             try:
-                # Because we can only reach this point with a valid claim,
-                # there's no harm in resetting the timer
-                self._reset_timer()
-                return function(*args)
-            except Exception as ex:
-                self.log.error(
-                    "Uncaught exception in method %s: %s \n %s ",
-                    command, str(ex), traceback.format_exc()
-                )
-                self._last_error = str(ex)
-                raise
+                return self._run_command(command, function, args)
             finally:
                 if not self._state.claim_status.value:
                     self.log.error("Lost claim during API call to `%s'!",
                                    command)
         new_claimed_function.__doc__ = function.__doc__
+        # multicall() checks the token once for all of its calls, and
+        # then calls the function directly
+        new_claimed_function._unchecked = function
         setattr(self, command, new_claimed_function)
 
     def _add_safe_command(self, function, command):
@@ -209,18 +211,31 @@ class MPMServer(RPCServer):
         self.log.trace("adding safe command %s pointing to %s", command, function)
         def new_unclaimed_function(*args):
             " Define a function that does not require a claim token check "
-            try:
-                return function(*args)
-            except Exception as ex:
-                self.log.error(
-                    "Uncaught exception in method %s :%s\n %s ",
-                    command, str(ex), traceback.format_exc()
-                )
-                self._last_error = str(ex)
-                raise
+            return self._run_command(command, function, args)
         new_unclaimed_function.__doc__ = function.__doc__
         setattr(self, command, new_unclaimed_function)
 
+    def _run_command(self, command, function, args):
+        """
+        Call function(*args) on behalf of the RPC method command: Record the
+        call in the RPC statistics, and log and store uncaught exceptions
+        before re-raising them.
+        """
+        call_id = self._rpc_stats.call_started(command)
+        failed = False
+        try:
+            return function(*args)
+        except Exception as ex:
+            failed = True
+            self.log.error(
+                "Uncaught exception in method %s: %s \n %s ",
+                command, str(ex), traceback.format_exc()
+            )
+            self._last_error = str(ex)
+            raise
+        finally:
+            self._rpc_stats.call_finished(call_id, failed)
+
     ###########################################################################
     # Diagnostics and introspection
     ###########################################################################
@@ -249,6 +264,115 @@ class MPMServer(RPCServer):
         self.log.debug("I was pinged from: %s:%s", self.client_host, self.client_port)
         return data
 
+    def get_rpc_stats(self):
+        """
+        Return call statistics of all motherboard and daughterboard RPC
+        methods: Number of calls and errors, latency percentiles and histogram,
+        and the calls which are running right now (see
+        rpc_stats.RPCStats.get_stats()). Latencies are in seconds.
+        This is a safe method which can be called without a claim on the device
+        """
+        return self._rpc_stats.get_stats()
+
+    def reset_rpc_stats(self, token):
+        """
+        Return the call statistics like get_rpc_stats(), and clear them.
+        """
+        if not self._check_token_valid(token):
+            self.log.warning(
+                "Attempt to reset RPC stats without valid claim from {}".format(
+                    self.client_host
+                )
+            )
+            err_msg = "reset_rpc_stats() called without valid claim."
+            self._last_error = err_msg
+            raise RuntimeError(err_msg)
+        return self._rpc_stats.get_stats(reset=True)
+
+    def start_profiling(self, token):
+        """
+        Start profiling the RPC server with cProfile, until stop_profiling()
+        is called. Profiling slows down every call, so only use this for
+        debugging.
+        """
+        if not self._check_token_valid(token):
+            self.log.warning(
+                "Attempt to start profiling without valid claim from {}".format(
+                    self.client_host
+                )
+            )
+            err_msg = "start_profiling() called without valid claim."
+            self._last_error = err_msg
+            raise RuntimeError(err_msg)
+        self.log.info("Starting profiler (requested by %s).", self.client_host)
+        self._profiler.start()
+
+    def stop_profiling(self, token):
+        """
+        Stop profiling, and return the profile as binary string in the pstats
+        file format. Write it to a file, and load it with
+        pstats.Stats(filename).
+        """
+        if not self._check_token_valid(token):
+            self.log.warning(
+                "Attempt to stop profiling without valid claim from {}".format(
+                    self.client_host
+                )
+            )
+            err_msg = "stop_profiling() called without valid claim."
+            self._last_error = err_msg
+            raise RuntimeError(err_msg)
+        duration, stats = self._profiler.stop()
+        self.log.info("Stopped profiler after %.1f s.", duration)
+        return stats
+
+    ###########################################################################
+    # Batched calls
+    ###########################################################################
+    def multicall(self, token, calls):
+        """
+        Run a list of RPC calls, in order, with a single token check and a
+        single reset of the claim timer. This saves a round trip per call.
+
+        calls is a list of (method, args) pairs, where args is the list of
+        arguments of the call, without the token. Returns a list with one
+        (success, value) pair per call, where value is the return value of
+        the call, or the error message if it failed. A failed call does not
+        stop the calls after it.
+        """
+        if not self._check_token_valid(token):
+            self.log.warning(
+                "Thwarted attempt to access function `multicall' with invalid "
+                "token `%s'.", token
+            )
+            raise RuntimeError("Invalid token!")
+        self._reset_timer()
+        results = []
+        for method, args in calls:
+            try:
+                results.append((True, self._multicall_one(token, method, args)))
+            except Exception as ex:
+                results.append((False, str(ex)))
+        if not self._state.claim_status.value:
+            self.log.error("Lost claim during multicall!")
+        return results
+
+    def _multicall_one(self, token, method, args):
+        """
+        Run a single call of a multicall(). The token has already been
+        checked.
+        """
+        function = getattr(self, method, None) \
+            if not method.startswith('_') and method != 'multicall' else None
+        if not callable(function):
+            raise RuntimeError("Unknown RPC method `{}'".format(method))
+        unchecked_function = getattr(function, '_unchecked', None)
+        if unchecked_function is None:
+            if method in self.claimed_methods:
+                return function(token, *args)
+            return function(*args)
+        return self._run_command(method, unchecked_function, args)
+
     ###########################################################################
     # Claiming logic
     ###########################################################################
@@ -0,0 +1,249 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+RPC call statistics and profiling for the MPM RPC server
+
+RPCStats counts the calls of every RPC method, and records their latencies in
+HDR-style histograms: The buckets are spaced logarithmically, with
+LatencyHistogram.SUB_BUCKETS linear buckets per power of two, so the relative
+error of every latency is bounded no matter its magnitude.
+
+RPCProfiler runs cProfile on request. All greenlets of the RPC server run in
+the same OS thread, so it sees every RPC call (and everything else the server
+does) while it's running.
+"""
+
+import cProfile
+import marshal
+import math
+import threading
+import time
+
+class LatencyHistogram(object):
+    """
+    Histogram of latencies (in seconds), with logarithmically spaced buckets
+    """
+    # Number of buckets per power of two. The upper bound of a bucket is at
+    # most 1/SUB_BUCKETS larger than any value in it.
+    SUB_BUCKETS = 8
+    # Smallest latency that's distinguished from 0
+    RESOLUTION = 1e-6
+
+    def __init__(self):
+        # bucket index -> count
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def _get_bucket(self, value):
+        """
+        Return the index of the bucket which value goes into
+        """
+        if value < self.RESOLUTION:
+            return 0
+        mantissa, exponent = math.frexp(value / self.RESOLUTION)
+        # mantissa is in [0.5, 1)
+        return exponent * self.SUB_BUCKETS + int((mantissa - 0.5) * 2 * self.SUB_BUCKETS)
+
+    def _get_upper_bound(self, bucket):
+        """
+        Return the largest value that goes into bucket
+        """
+        if bucket == 0:
+            return self.RESOLUTION
+        exponent, sub_bucket = divmod(bucket, self.SUB_BUCKETS)
+        return math.ldexp(0.5 + (sub_bucket + 1) / (2 * self.SUB_BUCKETS), exponent) \
+            * self.RESOLUTION
+
+    def record(self, value):
+        """
+        Add a latency value (in seconds)
+        """
+        bucket = self._get_bucket(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def get_percentile(self, percentile):
+        """
+        Return the latency below which percentile % of all values are (as the
+        upper bound of the bucket it falls into), or None if there are no
+        values
+        """
+        if not self.count:
+            return None
+        threshold = self.count * percentile / 100.0
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= threshold:
+                return min(self._get_upper_bound(bucket), self.max)
+        return self.max
+
+    def to_dict(self):
+        """
+        Return the histogram as a dictionary. 'buckets' is a list of
+        (upper bound, count) pairs, only for non-empty buckets.
+        """
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.get_percentile(50),
+            'p90': self.get_percentile(90),
+            'p99': self.get_percentile(99),
+            'buckets': [
+                (self._get_upper_bound(bucket), self.buckets[bucket])
+                for bucket in sorted(self.buckets)
+            ],
+        }
+
+class _MethodStats(object):
+    """
+    Statistics of a single RPC method
+    """
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latency = LatencyHistogram()
+
+    def to_dict(self):
+        """
+        Return the statistics as a dictionary
+        """
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'in_flight': self.in_flight,
+            'latency': self.latency.to_dict(),
+        }
+
+class RPCStats(object):
+    """
+    Call counts, error counts and latency histograms per RPC method, and the
+    calls which are currently running
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # method name -> _MethodStats
+        self._methods = {}
+        # call ID -> (method name, start time)
+        self._in_flight = {}
+        self._next_call_id = 0
+        self._start_time = time.monotonic()
+
+    def call_started(self, method):
+        """
+        Register the start of a call to method. Returns a call ID, which must
+        be passed to call_finished().
+        """
+        with self._lock:
+            call_id = self._next_call_id
+            self._next_call_id += 1
+            method_stats = self._methods.get(method)
+            if method_stats is None:
+                method_stats = _MethodStats()
+                self._methods[method] = method_stats
+            method_stats.in_flight += 1
+            self._in_flight[call_id] = (method, time.monotonic())
+        return call_id
+
+    def call_finished(self, call_id, failed=False):
+        """
+        Register the end of the call with call_id (see call_started())
+        """
+        now = time.monotonic()
+        with self._lock:
+            call = self._in_flight.pop(call_id, None)
+            if call is None:
+                # The statistics were reset in the meantime
+                return
+            method, start_time = call
+            method_stats = self._methods[method]
+            method_stats.in_flight -= 1
+            method_stats.calls += 1
+            if failed:
+                method_stats.errors += 1
+            method_stats.latency.record(now - start_time)
+
+    def get_stats(self, reset=False):
+        """
+        Return the statistics as a dictionary:
+        - 'duration': Seconds since the statistics were (re)set
+        - 'methods': method name -> {'calls', 'errors', 'in_flight', 'latency'}
+          (see LatencyHistogram.to_dict() for 'latency')
+        - 'in_flight': List of (method name, seconds running) for all calls
+          which are running right now
+
+        If reset is True, all statistics are cleared afterwards. Calls that
+        are running then aren't counted.
+        """
+        now = time.monotonic()
+        with self._lock:
+            stats = {
+                'duration': now - self._start_time,
+                'methods': {
+                    method: method_stats.to_dict()
+                    for method, method_stats in self._methods.items()
+                },
+                'in_flight': [
+                    (method, now - start_time)
+                    for method, start_time in self._in_flight.values()
+                ],
+            }
+            if reset:
+                self._methods = {}
+                self._in_flight = {}
+                self._start_time = now
+        return stats
+
+class RPCProfiler(object):
+    """
+    Wrapper around cProfile, which can be started and stopped from different
+    RPC calls
+    """
+    def __init__(self):
+        self._profiler = None
+        self._start_time = None
+
+    def is_running(self):
+        """
+        Return True if the profiler is running
+        """
+        return self._profiler is not None
+
+    def start(self):
+        """
+        Start profiling. Raises a RuntimeError if the profiler is already
+        running.
+        """
+        if self._profiler is not None:
+            raise RuntimeError("Profiler is already running!")
+        self._profiler = cProfile.Profile()
+        self._start_time = time.monotonic()
+        self._profiler.enable()
+
+    def stop(self):
+        """
+        Stop profiling, and return a tuple (duration, stats). stats is the
+        profile in the pstats file format: Write it to a file, and load it
+        with pstats.Stats(filename).
+        Raises a RuntimeError if the profiler isn't running.
+        """
+        if self._profiler is None:
+            raise RuntimeError("Profiler is not running!")
+        profiler, self._profiler = self._profiler, None
+        profiler.disable()
+        profiler.create_stats()
+        return time.monotonic() - self._start_time, marshal.dumps(profiler.stats)
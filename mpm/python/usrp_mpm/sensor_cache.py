@@ -0,0 +1,185 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+Cache for sensor values
+
+Sensor callbacks often go to sysfs, I2C or gpsd, and some of them take a
+long time to return. Periph and dboard managers can declare a
+SensorCachePolicy for such sensors, and get_mb_sensor()/get_sensor() will
+then read them through a SensorCache.
+"""
+
+import threading
+import time
+
+class SensorCachePolicy(object):
+    """
+    Describes how long the value of a sensor may be cached.
+
+    ttl -- Seconds for which a value is returned from the cache without reading
+           the sensor again.
+    max_stale -- Seconds past the ttl for which the old value is still returned.
+                 Such reads start a refresh in the background instead of
+                 waiting for the sensor.
+    refresh_interval -- If given, the sensor is read in the background every
+                        refresh_interval seconds once it has been read for the
+                        first time, so reads don't have to wait for it.
+    """
+    def __init__(self, ttl, max_stale=0.0, refresh_interval=None):
+        assert ttl >= 0 and max_stale >= 0
+        assert refresh_interval is None or refresh_interval > 0
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.refresh_interval = refresh_interval
+
+    def __repr__(self):
+        return "SensorCachePolicy(ttl={}, max_stale={}, refresh_interval={})" \
+            .format(self.ttl, self.max_stale, self.refresh_interval)
+
+class _CacheEntry(object):
+    """
+    The last value of a sensor, and how to read it again
+    """
+    def __init__(self, name, read_func, policy):
+        self.name = name
+        self.read_func = read_func
+        self.policy = policy
+        self.value = None
+        # time.monotonic() of the last successful read, None if there was none
+        self.timestamp = None
+        self.refreshing = False
+
+class SensorCache(object):
+    """
+    Cache of sensor values. Every entry is identified by a key, and read by
+    calling a sensor callback.
+
+    Background reads run in threads. Under MPM, threading is monkey-patched by
+    gevent, so they are greenlets.
+    """
+    def __init__(self, log):
+        self.log = log
+        self._lock = threading.Lock()
+        # key -> _CacheEntry
+        self._entries = {}
+        self._refresher = None
+        self._stop_refresher = None
+
+    def get(self, key, name, read_func, policy):
+        """
+        Return the value of the sensor name, which is cached under key, and
+        read by calling read_func() according to policy.
+
+        If the sensor has to be read right away, exceptions from read_func()
+        are passed on.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _CacheEntry(name, read_func, policy)
+                self._entries[key] = entry
+            if entry.timestamp is not None:
+                age = now - entry.timestamp
+                if age <= policy.ttl:
+                    return dict(entry.value)
+                if age <= policy.ttl + policy.max_stale:
+                    if not entry.refreshing:
+                        entry.refreshing = True
+                        threading.Thread(
+                            target=self._refresh, args=(entry,), daemon=True
+                        ).start()
+                    return dict(entry.value)
+        value = read_func()
+        with self._lock:
+            entry.value = value
+            entry.timestamp = time.monotonic()
+            if policy.refresh_interval is not None and self._refresher is None:
+                self._start_refresher()
+        return dict(value)
+
+    def clear(self):
+        """
+        Drop all cached values, and stop the background refresher. Entries are
+        re-created (and the refresher restarted) by the next call to get().
+        """
+        with self._lock:
+            self._entries = {}
+            refresher = self._refresher
+            if refresher is not None:
+                self._stop_refresher.set()
+                self._refresher = None
+        if refresher is not None and refresher is not threading.current_thread():
+            refresher.join()
+
+    def _refresh(self, entry):
+        """
+        Read a sensor and store its value. Failures are logged, and the old
+        value is kept.
+        """
+        try:
+            value = entry.read_func()
+        except Exception as ex:
+            self.log.warning("Background read of sensor `{}' failed: {}"
+                             .format(entry.name, ex))
+            value = None
+        with self._lock:
+            if value is not None:
+                entry.value = value
+                entry.timestamp = time.monotonic()
+            entry.refreshing = False
+
+    def _start_refresher(self):
+        """
+        Start the thread which refreshes all entries that have a
+        refresh_interval. Must be called with the lock held.
+        """
+        self._stop_refresher = threading.Event()
+        self._refresher = threading.Thread(
+            target=self._refresh_worker,
+            args=(self._stop_refresher,),
+            daemon=True)
+        self._refresher.start()
+
+    def _refresh_worker(self, stop_event):
+        """
+        Refresh every entry which has a refresh_interval when it's due, until
+        stop_event is set
+        """
+        self.log.trace("Starting sensor refresh thread")
+        while not stop_event.is_set():
+            now = time.monotonic()
+            due = []
+            next_due = None
+            with self._lock:
+                for entry in self._entries.values():
+                    interval = entry.policy.refresh_interval
+                    if interval is None or entry.timestamp is None or entry.refreshing:
+                        continue
+                    entry_due = entry.timestamp + interval
+                    if entry_due <= now:
+                        entry.refreshing = True
+                        due.append(entry)
+                    elif next_due is None or entry_due < next_due:
+                        next_due = entry_due
+            for entry in due:
+                if stop_event.is_set():
+                    break
+                self._refresh(entry)
+            if due:
+                continue
+            stop_event.wait(1.0 if next_due is None else next_due - now)
+        self.log.trace("Sensor refresh thread stopped")
+
+# Temperatures and fan speeds change slowly, and reading them goes through
+# sysfs or I2C
+THERMAL_SENSOR_CACHE_POLICY = \
+    SensorCachePolicy(ttl=2.0, max_stale=3.0, refresh_interval=2.0)
+# GPS status lines and gpsd reports change at most once per second, and
+# reading them goes through GPIO expanders or the gpsd socket. Sensors which
+# wait for the next PPS edge (gps_time) must not be cached.
+GPS_SENSOR_CACHE_POLICY = \
+    SensorCachePolicy(ttl=1.0, max_stale=1.0, refresh_interval=1.0)
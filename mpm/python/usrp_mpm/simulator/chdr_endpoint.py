@@ -8,46 +8,64 @@ packet dispatch, and acts as an interface between these and the RFNoC
 Graph.
 """
 
-from threading import Thread
+from threading import Thread, Lock
 import socket
 import queue
 import select
 from uhd.chdr import ChdrPacket, ChdrWidth
 from .rfnoc_graph import XbarNode, XportNode, StreamEndpointNode, RFNoCGraph, NodeType
-from .chdr_stream import ChdrOutputStream, ChdrInputStream
+from .chdr_stream import ChdrOutputStream, ChdrInputStream, RawDataPacket, peek_data_header
 
 CHDR_W = ChdrWidth.W64
 
 class SelectableQueue:
     """ A simple python Queue implementation which can be selected.
     This allows waiting on a queue and a socket simultaneously.
+
+    The queue only becomes readable when it goes from empty to non-empty,
+    so the consumer is woken up once per batch of elements rather than
+    once per element.
     """
     def __init__(self, max_size=0):
         self._queue = queue.Queue(max_size)
         self._send_signal_rx, self._send_signal_tx = socket.socketpair()
+        self._signal_lock = Lock()
+        self._signaled = False
 
     def put(self, item, block=True, timeout=None):
         """ Put an element into the queue, optionally blocking """
         self._queue.put(item, block, timeout)
-        self._send_signal_tx.send(b"\x00")
+        with self._signal_lock:
+            if not self._signaled:
+                self._signaled = True
+                self._send_signal_tx.send(b"\x00")
 
     def fileno(self):
         """ A fileno compatible with select.select """
         return self._send_signal_rx.fileno()
 
-    def get(self):
-        """ Return the first element in the queue, blocking if none
-        are available.
+    def get_all(self):
+        """ Return a list of all elements in the queue, blocking until
+        the queue has been signaled. The list may be empty.
         """
         self._send_signal_rx.recv(1)
-        return self._queue.get_nowait()
+        with self._signal_lock:
+            self._signaled = False
+        items = []
+        try:
+            while True:
+                items.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return items
 
 class SendWrapper:
     """This class is used as an abstraction over queueing packets to be
     sent by the socket thread.
     """
-    def __init__(self, queue):
+    def __init__(self, queue, get_socket=None):
         self.queue = queue
+        self.get_socket = get_socket
 
     def send_packet(self, packet, addr):
         """Serialize packet and then queue the data to be sent to addr
@@ -59,7 +77,35 @@ class SendWrapper:
 
     def send_data(self, data, addr):
         """Queue data to be sent to addr"""
-        self.queue.put((data, addr))
+        self.send_buffers((data,), addr)
+
+    def send_buffers(self, buffers, addr):
+        """Queue a sequence of bytes-like objects to be sent to addr as
+        a single datagram. The buffers are not copied, so they must not
+        be modified until they are sent.
+        """
+        self.queue.put((buffers, addr))
+
+    def for_process(self):
+        """Return a SendWrapper which can be used from a forked process,
+        where there is no socket thread to empty the queue.
+        """
+        return DirectSendWrapper(self.get_socket)
+
+class DirectSendWrapper(SendWrapper):
+    """This SendWrapper sends packets right away from the calling thread
+    (or process) on the socket get_socket(addr) returns, instead of
+    queueing them for the socket thread.
+    """
+    def __init__(self, get_socket):
+        super().__init__(None, get_socket)
+
+    def send_buffers(self, buffers, addr):
+        sent_len = self.get_socket(addr).sendmsg(buffers, (), 0, addr)
+        assert sum(len(buf) for buf in buffers) == sent_len, "Didn't send whole packet."
+
+    def for_process(self):
+        return self
 
 
 class ChdrEndpoint:
@@ -68,8 +114,18 @@ class ChdrEndpoint:
     traffic to the appropriate destination, and responding to said
     traffic.
 
+    Every xport of the topology gets a UDP socket of its own. Xport n
+    listens on port chdr_port + n of the config's NetworkDescriptor.
+
     The config parameter is a Config object (see simulator/config.py)
     """
+    # Largest datagram we expect to receive (Max MTU)
+    MAX_PACKET_SIZE = 8000
+    # Upper bound of datagrams received per wakeup of the socket thread
+    RECV_BATCH_SIZE = 64
+    # Requested kernel socket buffer size, to absorb bursts between wakeups
+    SOCKET_BUFFER_SIZE = 4 * 1024 * 1024
+
     def __init__(self, log, config):
         self.log = log.getChild("ChdrEndpoint")
         self.config = config
@@ -77,87 +133,175 @@ class ChdrEndpoint:
         self.sink_gen = config.sink_gen
         self.xport_map = {}
 
-        self.send_queue = SelectableQueue()
-        self.send_wrapper = SendWrapper(self.send_queue)
+        # The sockets are opened here rather than in the socket thread,
+        # so that streams which run in a forked process inherit them.
+        network = config.network
+        self.sockets = [self._open_socket(network.bind_addr, network.chdr_port + xport_inst)
+                        for xport_inst in range(config.topology.num_xports)]
+        self.entry_xports = {sock: (NodeType.XPORT, xport_inst)
+                             for xport_inst, sock in enumerate(self.sockets)}
+        # Remote address -> the socket we last received from it on. Replies
+        # must come from the port the client sent to.
+        self.addr_to_socket = {}
+
+        self.send_wrapper = self._make_send_wrapper()
 
         self.graph = RFNoCGraph(self.get_default_nodes(), self.log, 0, self.send_wrapper,
-                                CHDR_W, config.hardware.rfnoc_device_type)
+                                CHDR_W, config.hardware.rfnoc_device_type,
+                                config.topology.num_radios, config.topology.radio_channels)
+        self._start()
+
+    def _make_send_wrapper(self):
+        """Create the SendWrapper which the graph and streams send with"""
+        self.send_queue = SelectableQueue()
+        return SendWrapper(self.send_queue, self.get_socket)
+
+    def _start(self):
+        """Start processing packets"""
         self.thread = Thread(target=self.socket_worker, daemon=True)
         self.thread.start()
 
+    def _open_socket(self, bind_addr, port):
+        """Open and bind the UDP socket of an xport"""
+        sock = socket.socket(socket.AF_INET,
+                             socket.SOCK_DGRAM)
+        for opt in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, opt, self.SOCKET_BUFFER_SIZE)
+            except OSError as ex:
+                self.log.debug("Unable to resize socket buffer: {}".format(ex))
+        sock.bind((bind_addr, port))
+        return sock
+
+    def get_socket(self, addr):
+        """Get the socket which packets to addr should be sent from"""
+        return self.addr_to_socket.get(addr, self.sockets[0])
+
     def set_device_id(self, device_id):
         """Set the device_id for this endpoint"""
         self.graph.set_device_id(device_id)
 
+    def get_timekeeper(self):
+        """Get the SimTimekeeper of this endpoint's device"""
+        return self.graph.timekeeper
+
     def set_sample_rate(self, rate):
         """Set the sample_rate of the next tx_stream.
 
         This method is called by the daughterboard. It coresponds to
         sim_dboard.py:sim_db#set_catalina_clock_rate()
         """
-        self.graph.get_stream_spec().sample_rate = rate
+        self.graph.set_sample_rate(rate)
 
     def get_default_nodes(self):
-        """Get a sensible NoC Core setup. This is the simplest
-        functional layout. It has one of each required component.
+        """Get the NoC Core setup described by the topology in the
+        config. All xports and stream endpoints are connected to a
+        single crossbar. By default, this is the simplest functional
+        layout, which has one of each required component.
         """
-        nodes = [
-            XportNode(0),
-            XbarNode(0, [2], [0]),
-            StreamEndpointNode(0, self.source_gen, self.sink_gen)
-        ]
+        topology = self.config.topology
+        nodes = [XportNode(xport_inst) for xport_inst in range(topology.num_xports)]
+        # Stream endpoints come after the xbar in the list of nodes
+        first_sep = len(nodes) + 1
+        nodes.append(XbarNode(0, list(range(first_sep, first_sep + topology.num_stream_eps)),
+                              list(range(topology.num_xports))))
+        nodes.extend(StreamEndpointNode(sep_inst, self.source_gen, self.sink_gen,
+                                        topology.stream_workers)
+                     for sep_inst in range(topology.num_stream_eps))
         return nodes
 
     def send_strc(self, stream_ep, addr):
-        pass # TODO: currently not implemented
+        """Send a Stream Command packet from stream_ep to addr"""
+        stream_ep.send_strc(addr)
 
     def begin_tx(self, src_epid, stream_spec):
-        pass # TODO: currently not implemented
+        """Start transmitting from the stream endpoint src_epid"""
+        self.graph.find_ep_by_id(src_epid).begin_output(stream_spec)
 
     def end_tx(self, src_epid):
-        pass # TODO: currently not implemented
+        """Stop transmitting from the stream endpoint src_epid"""
+        self.graph.find_ep_by_id(src_epid).end_output()
 
     def begin_rx(self, dst_epid):
-        pass # TODO: currently not implemented
+        """Start receiving on the stream endpoint dst_epid"""
+        self.graph.find_ep_by_id(dst_epid).begin_input()
 
     def socket_worker(self):
         """This is the method that runs in a background thread. It
-        blocks on the CHDR socket and processes packets as they come
+        blocks on the CHDR sockets and processes packets as they come
         in.
+
+        Every wakeup, it drains up to RECV_BATCH_SIZE datagrams from
+        each readable socket into a pool of preallocated buffers, and
+        then sends everything which has been queued by the streams.
         """
         self.log.info("Starting ChdrEndpoint Thread")
-        main_sock = socket.socket(socket.AF_INET,
-                                  socket.SOCK_DGRAM)
-        main_sock.bind(("0.0.0.0", 49153))
+        recv_pool = [memoryview(bytearray(self.MAX_PACKET_SIZE))
+                     for _ in range(self.RECV_BATCH_SIZE)]
 
         while True:
             # This allows us to block on multiple sockets at the same time
-            ready_list, _, _ = select.select([main_sock, self.send_queue], [], [])
-            buffer = bytearray(8000) # Max MTU
+            ready_list, _, _ = select.select(self.sockets + [self.send_queue], [], [])
             for sock in ready_list:
-                if sock is main_sock:
-                    # Received Data over socket
-                    n_bytes, sender = main_sock.recvfrom_into(buffer)
-                    self.log.trace("Received {} bytes of data from {}"
-                                   .format(n_bytes, sender))
-                    try:
-                        packet = ChdrPacket.deserialize(CHDR_W, buffer[:n_bytes])
-                        self.log.trace("Decoded Packet: {}"
-                                       .format(packet.to_string_with_payload()))
-                        entry_xport = (NodeType.XPORT, 0)
-                        response = self.graph.handle_packet(packet, entry_xport, sender,
-                                                            sender, n_bytes)
-
-                        if response is not None:
-                            data = response.serialize()
-                            self.log.trace("Returning Packet: {}"
-                                           .format(packet.to_string_with_payload()))
-                            main_sock.sendto(bytes(data), sender)
-                    except BaseException as ex:
-                        self.log.warning("Unable to decode packet: {}"
-                                         .format(ex))
-                        raise ex
+                if sock is self.send_queue:
+                    for buffers, addr in self.send_queue.get_all():
+                        sent_len = self.get_socket(addr).sendmsg(buffers, (), 0, addr)
+                        assert sum(len(buf) for buf in buffers) == sent_len, \
+                            "Didn't send whole packet."
                 else:
-                    data, addr = self.send_queue.get()
-                    sent_len = main_sock.sendto(data, addr)
-                    assert len(data) == sent_len, "Didn't send whole packet."
+                    self._recv_batch(sock, recv_pool)
+
+    def _recv_batch(self, sock, recv_pool):
+        """Receive all datagrams which are pending on sock (up to one per
+        buffer in recv_pool) without blocking, then process them.
+        """
+        received = []
+        for buffer in recv_pool:
+            try:
+                n_bytes, sender = sock.recvfrom_into(buffer, 0, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                break
+            received.append((buffer, n_bytes, sender))
+        entry_xport = self.entry_xports[sock]
+        for buffer, n_bytes, sender in received:
+            self.log.trace("Received %d bytes of data from %s", n_bytes, sender)
+            self.addr_to_socket[sender] = sock
+            self._handle_datagram(sock, entry_xport, buffer[:n_bytes], sender)
+
+    def _handle_datagram(self, sock, entry_xport, data, sender):
+        """Decode a single datagram (a memoryview into the receive
+        buffer) and pass it through the graph.
+
+        DATA packets for a known stream endpoint skip the graph. Only
+        their header word is parsed, and they are queued straight onto
+        the endpoint's ChdrInputStream.
+        """
+        n_bytes = len(data)
+        data_header = peek_data_header(data)
+        if data_header is not None:
+            dst_epid, header_word = data_header
+            stream_ep = self.graph.get_data_routes(entry_xport).get(dst_epid)
+            if stream_ep is not None and stream_ep.input_stream is not None:
+                # The receive buffer is reused, so the packet needs its own copy
+                packet = RawDataPacket(CHDR_W, bytes(data), header_word)
+                stream_ep.input_stream.queue_packet(packet, n_bytes, sender)
+                return
+        try:
+            # Converting to bytes picks the deserialize() overload which
+            # copies the buffer in one go rather than element by element
+            packet = ChdrPacket.deserialize(CHDR_W, bytes(data))
+            if self.log.is_trace_enabled():
+                self.log.trace("Decoded Packet: %s", packet.to_string_with_payload())
+            response = self.graph.handle_packet(packet, entry_xport, sender,
+                                                sender, n_bytes)
+
+            if response is not None:
+                data = response.serialize()
+                if self.log.is_trace_enabled():
+                    self.log.trace("Returning Packet: %s",
+                                   packet.to_string_with_payload())
+                sock.sendto(bytes(data), sender)
+        except BaseException as ex:
+            self.log.warning("Unable to decode packet: {}"
+                             .format(ex))
+            raise ex
@@ -0,0 +1,120 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""This module houses the AsyncChdrEndpoint class, which does the same
+job as ChdrEndpoint, but in an asyncio event loop instead of a socket
+thread and a thread per stream.
+"""
+
+import asyncio
+from threading import Thread, get_ident
+from .chdr_endpoint import ChdrEndpoint, SendWrapper
+
+class AsyncSendWrapper(SendWrapper):
+    """This SendWrapper sends packets right away on the transport of
+    the socket get_socket(addr) returns. It must only be used from
+    within the event loop.
+    """
+    def __init__(self, get_socket, transports):
+        super().__init__(None, get_socket)
+        self.transports = transports
+
+    def send_buffers(self, buffers, addr):
+        # The transport buffers the datagram if the socket isn't writable
+        self.transports[self.get_socket(addr)].sendto(b"".join(buffers), addr)
+
+    def for_process(self):
+        raise RuntimeError("Streams of an AsyncChdrEndpoint can't run in a process")
+
+class ChdrProtocol(asyncio.DatagramProtocol):
+    """Receives the datagrams of one xport socket and hands them to the
+    AsyncChdrEndpoint
+    """
+    def __init__(self, endpoint, sock):
+        self.endpoint = endpoint
+        self.sock = sock
+        self.entry_xport = endpoint.entry_xports[sock]
+
+    def datagram_received(self, data, addr):
+        self.endpoint.log.trace("Received {} bytes of data from {}"
+                                .format(len(data), addr))
+        self.endpoint.addr_to_socket[addr] = self.sock
+        self.endpoint._handle_datagram(self.sock, self.entry_xport, data, addr)
+
+    def error_received(self, exc):
+        self.endpoint.log.warning("Socket error: {}".format(exc))
+
+class AsyncChdrEndpoint(ChdrEndpoint):
+    """This is a ChdrEndpoint which does all of its work in an asyncio
+    event loop. Every xport socket is served by a ChdrProtocol, and the
+    streams run as tasks (see chdr_stream_async.py).
+
+    If loop is None, the endpoint creates a loop of its own and runs it
+    in a background thread. Otherwise, the caller is responsible for
+    running loop, which allows many simulated devices to share one loop
+    (and one thread).
+
+    Methods which are called from outside the event loop (RPC calls)
+    are forwarded to it.
+    """
+    def __init__(self, log, config, loop=None):
+        self.loop = loop
+        self.transports = {}
+        # Identifies the thread the loop runs in, once it is running
+        self.loop_thread_id = None
+        super().__init__(log, config)
+
+    def _make_send_wrapper(self):
+        return AsyncSendWrapper(self.get_socket, self.transports)
+
+    def _start(self):
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self.thread = Thread(target=self._run_loop, daemon=True)
+            self.thread.start()
+        else:
+            self.thread = None
+        self.loop.call_soon_threadsafe(
+            lambda: asyncio.ensure_future(self._open_endpoints(), loop=self.loop))
+
+    def _run_loop(self):
+        """This is the method that runs in the background thread, if
+        the endpoint owns its loop
+        """
+        asyncio.set_event_loop(self.loop)
+        self.log.info("Starting AsyncChdrEndpoint Thread")
+        self.loop.run_forever()
+
+    async def _open_endpoints(self):
+        """Attach a ChdrProtocol to each xport socket"""
+        self.loop_thread_id = get_ident()
+        for sock in self.sockets:
+            transport, _ = await self.loop.create_datagram_endpoint(
+                lambda sock=sock: ChdrProtocol(self, sock), sock=sock)
+            self.transports[sock] = transport
+
+    def _call_in_loop(self, func, *args):
+        """Run func(*args) in the event loop. It is called right away
+        if we are already in the loop.
+        """
+        if get_ident() == self.loop_thread_id:
+            func(*args)
+        else:
+            self.loop.call_soon_threadsafe(func, *args)
+
+    def send_strc(self, stream_ep, addr):
+        self._call_in_loop(super().send_strc, stream_ep, addr)
+
+    def begin_tx(self, src_epid, stream_spec):
+        self._call_in_loop(super().begin_tx, src_epid, stream_spec)
+
+    def end_tx(self, src_epid):
+        self._call_in_loop(super().end_tx, src_epid)
+
+    def begin_rx(self, dst_epid):
+        self._call_in_loop(super().begin_rx, dst_epid)
+
+    def socket_worker(self):
+        raise RuntimeError("AsyncChdrEndpoint has no socket thread")
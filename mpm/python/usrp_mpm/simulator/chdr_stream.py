@@ -9,10 +9,114 @@ handles managing threads, as well as interfacing with sample sources
 and sinks.
 """
 import time
-from threading import Thread
+from threading import Thread, Event
+import multiprocessing
 import queue
 import socket
-from uhd.chdr import PacketType, StrcOpCode, StrcPayload, StrsPayload, StrsStatus, ChdrHeader, ChdrPacket
+import struct
+from uhd.chdr import PacketType, StrcOpCode, StrcPayload, StrsPayload, StrsStatus, ChdrHeader, \
+    ChdrPacket, ChdrWidth
+from .rfnoc_common import SimTimekeeper
+
+# Size of a CHDR line in bytes, for each CHDR width
+CHDR_W_BYTES = {
+    ChdrWidth.W64: 8,
+    ChdrWidth.W128: 16,
+    ChdrWidth.W256: 32,
+    ChdrWidth.W512: 64,
+}
+
+def pack_data_header(chdr_w, header, payload_len, timestamp=None):
+    """Serialize the header (and timestamp, if there is one) of a data
+    packet with a payload_len bytes long payload. This allows sending a
+    payload which is already in a buffer without building a ChdrPacket,
+    which would copy it.
+
+    The length field of header is updated. Metadata is not supported.
+    """
+    line_bytes = CHDR_W_BYTES[chdr_w]
+    if timestamp is None:
+        header_len = line_bytes
+    else:
+        # With a 64 bit CHDR width, the timestamp needs a line of its
+        # own. On wider buses it fits in the first line.
+        header_len = 2 * line_bytes if line_bytes == 8 else line_bytes
+    header.length = header_len + payload_len
+    data = bytearray(header_len)
+    struct.pack_into("<Q", data, 0, header.pack())
+    if timestamp is not None:
+        struct.pack_into("<Q", data, 8, timestamp)
+    return data
+
+# Fields of the 64 bit CHDR header, see chdr_types.hpp:chdr_header
+_PKT_TYPE_OFFSET = 53
+_NUM_MDATA_OFFSET = 48
+_LENGTH_OFFSET = 16
+_DATA_PKT_TYPES = {
+    int(PacketType.DATA_NO_TS): PacketType.DATA_NO_TS,
+    int(PacketType.DATA_WITH_TS): PacketType.DATA_WITH_TS,
+}
+
+def peek_data_header(data):
+    """Parse just enough of the first header word in data to route a
+    DATA packet. Returns (dst_epid, header_word) if data holds a DATA
+    packet, and None for all other packet types.
+    """
+    header_word, = struct.unpack_from("<Q", data)
+    if (header_word >> _PKT_TYPE_OFFSET) & 0x7 not in _DATA_PKT_TYPES:
+        return None
+    return header_word & 0xFFFF, header_word
+
+class RawDataPacket:
+    """A DATA packet of which only the header word has been parsed. It
+    offers the parts of the ChdrPacket interface which sample sinks
+    use, but the payload is returned as a memoryview into the received
+    datagram instead of being deserialized.
+    """
+    def __init__(self, chdr_w, data, header_word):
+        self.data = data
+        self.header_word = header_word
+        self.pkt_type = _DATA_PKT_TYPES[(header_word >> _PKT_TYPE_OFFSET) & 0x7]
+        line_bytes = CHDR_W_BYTES[chdr_w]
+        num_mdata = (header_word >> _NUM_MDATA_OFFSET) & 0x1F
+        has_ts = self.pkt_type == PacketType.DATA_WITH_TS
+        self._ts_offset = 8 if has_ts else None
+        self._payload_offset = line_bytes * (1 + num_mdata)
+        if has_ts and line_bytes == 8:
+            self._payload_offset += 8
+        self._length = (header_word >> _LENGTH_OFFSET) & 0xFFFF
+        self._header = None
+
+    def get_header(self):
+        """Build a ChdrHeader from the header word. This is only done
+        when something actually asks for it.
+        """
+        if self._header is None:
+            header = ChdrHeader()
+            header.vc = (self.header_word >> 58) & 0x3F
+            header.eob = bool((self.header_word >> 57) & 0x1)
+            header.eov = bool((self.header_word >> 56) & 0x1)
+            header.pkt_type = self.pkt_type
+            header.num_mdata = (self.header_word >> _NUM_MDATA_OFFSET) & 0x1F
+            header.seq_num = (self.header_word >> 32) & 0xFFFF
+            header.length = self._length
+            header.dst_epid = self.header_word & 0xFFFF
+            self._header = header
+        return self._header
+
+    def get_timestamp(self):
+        """Return the timestamp of the packet, or None if it has none"""
+        if self._ts_offset is None:
+            return None
+        return struct.unpack_from("<Q", self.data, self._ts_offset)[0]
+
+    def get_payload_bytes(self):
+        """Return the payload as a memoryview into the received data"""
+        return memoryview(self.data)[self._payload_offset:self._length]
+
+    def get_packet_len(self):
+        """Return the length of the packet in bytes"""
+        return self._length
 
 class XferCount:
     """This class keeps track of flow control transfer status which are
@@ -76,8 +180,12 @@ class ChdrInputStream:
         self.command_addr = None
         self.command_epid = None
         self.our_epid = our_epid
-        self.rx_queue = queue.Queue(ChdrInputStream.QUEUE_CAP)
         self.stop = False
+        self._start_worker()
+
+    def _start_worker(self):
+        """Create the queue and start the worker thread"""
+        self.rx_queue = queue.Queue(ChdrInputStream.QUEUE_CAP)
         self.thread = Thread(target=self._rx_worker, daemon=True)
         self.thread.start()
 
@@ -89,39 +197,49 @@ class ChdrInputStream:
             # a tuple of 3 None values is pushed into the queue to unblock the worker.
             if self.stop:
                 break
-            header = packet.get_header()
-            self.xfer.count_packet(recv_len)
-            self.accum.count_packet(recv_len)
-            pkt_type = header.pkt_type
-            if pkt_type in (PacketType.DATA_WITH_TS, PacketType.DATA_NO_TS):
-                self.sample_sink.accept_packet(packet)
-            elif pkt_type == PacketType.STRC:
-                req_payload = packet.get_payload_strc()
-                # Ping doesn't change anything, just requests a stream status packet
-                if req_payload.op_code == StrcOpCode.INIT:
-                    self.xfer.clear()
-                    self.fc_freq = XferCount.from_strc(req_payload)
-                    self.command_addr = addr
-                    self.command_epid = req_payload.src_epid
-                elif req_payload.op_code == StrcOpCode.RESYNC:
-                    self.xfer = XferCount.from_strc(req_payload)
-                resp_packet = self._generate_strs_packet(req_payload.src_epid, self.our_epid)
-                self.send_wrapper.send_packet(resp_packet, addr)
-            else:
-                raise RuntimeError("RX Worker received unsupported packet: {}".format(pkt_type))
-
-            # Check if a fc status packet is due
-            if self.fc_freq is not None and self.accum.has_exceeded(self.fc_freq):
-                self.accum.clear()
-                self.log.trace("Flow Control Due, sending STRS")
-                self.command_target = None
-                resp_packet = self._generate_strs_packet(self.command_epid, self.our_epid)
-                self.log.trace("Sending Flow Control: {}".format(resp_packet.to_string_with_payload()))
-                self.send_wrapper.send_packet(resp_packet, self.command_addr)
+            self._process_packet(packet, recv_len, addr)
 
         self.sample_sink.close()
         self.log.info("Stream RX Worker Done")
 
+    def _process_packet(self, packet, recv_len, addr):
+        """Handle a single DATA or STRC packet"""
+        self.xfer.count_packet(recv_len)
+        self.accum.count_packet(recv_len)
+        if packet.__class__ is RawDataPacket:
+            # DATA packets which took the fast path (see ChdrEndpoint)
+            # don't need their header decoded
+            pkt_type = packet.pkt_type
+        else:
+            pkt_type = packet.get_header().pkt_type
+        if pkt_type in (PacketType.DATA_WITH_TS, PacketType.DATA_NO_TS):
+            self.sample_sink.accept_packet(packet)
+        elif pkt_type == PacketType.STRC:
+            req_payload = packet.get_payload_strc()
+            # Ping doesn't change anything, just requests a stream status packet
+            if req_payload.op_code == StrcOpCode.INIT:
+                self.xfer.clear()
+                self.fc_freq = XferCount.from_strc(req_payload)
+                self.command_addr = addr
+                self.command_epid = req_payload.src_epid
+            elif req_payload.op_code == StrcOpCode.RESYNC:
+                self.xfer = XferCount.from_strc(req_payload)
+            resp_packet = self._generate_strs_packet(req_payload.src_epid, self.our_epid)
+            self.send_wrapper.send_packet(resp_packet, addr)
+        else:
+            raise RuntimeError("RX Worker received unsupported packet: {}".format(pkt_type))
+
+        # Check if a fc status packet is due
+        if self.fc_freq is not None and self.accum.has_exceeded(self.fc_freq):
+            self.accum.clear()
+            self.log.trace("Flow Control Due, sending STRS")
+            self.command_target = None
+            resp_packet = self._generate_strs_packet(self.command_epid, self.our_epid)
+            if self.log.is_trace_enabled():
+                self.log.trace("Sending Flow Control: %s",
+                               resp_packet.to_string_with_payload())
+            self.send_wrapper.send_packet(resp_packet, self.command_addr)
+
     def finish(self):
         """Unblocks the worker and stops the thread.
         The worker will close its sample_sink
@@ -147,6 +265,103 @@ class ChdrInputStream:
         """Queue a packet to be processed by the ChdrInputStream"""
         self.rx_queue.put((packet, recv_len, addr))
 
+class PacketPacer:
+    """This class paces packets to a given rate, using a token bucket.
+
+    Rather than sleeping once per packet, the worker sleeps until the
+    next packet is due, but at least min_interval since the previous
+    wakeup, and then sends every packet which has become due as a batch.
+    The schedule is kept relative to the start time, so any packets the
+    worker falls behind by (late wakeups, flow control) are made up for
+    in the following batches and the long-run rate stays exact. If the
+    backlog grows beyond max_backlog packets, the excess is dropped from
+    the schedule and counted as skipped.
+    """
+    def __init__(self, rate, min_interval, max_backlog, start_time=None):
+        """start_time is the monotonic time the first packet is due at,
+        by default right away
+        """
+        self.rate = rate
+        self.period = 1 / rate
+        self.min_interval = min_interval
+        self.max_backlog = max_backlog
+        self.start_time = time.monotonic() if start_time is None else start_time
+        self.last_wakeup = self.start_time - min_interval
+        # Number of packets sent or skipped, i.e. how far into the
+        # schedule we are
+        self.scheduled = 0
+        self.sent = 0
+        self.skipped = 0
+        self.fc_stalls = 0
+        self.wakeups = 0
+        self.lateness_sum = 0.0
+        self.lateness_sq_sum = 0.0
+
+    def wait(self, max_delay=None):
+        """Sleep until at least one packet is due and return how many
+        packets are due now. If that would take longer than max_delay
+        seconds, sleep for max_delay and return 0.
+        """
+        delay = self.get_delay()
+        if max_delay is not None and delay > max_delay:
+            time.sleep(max_delay)
+            return 0
+        if delay > 0:
+            time.sleep(delay)
+        return self.wakeup()
+
+    def get_delay(self):
+        """Return how long to sleep until the next wakeup"""
+        return self._get_wakeup_time() - time.monotonic()
+
+    def _get_wakeup_time(self):
+        due_time = self.start_time + self.scheduled * self.period
+        return max(due_time, self.last_wakeup + self.min_interval)
+
+    def wakeup(self):
+        """Call this after sleeping for get_delay() seconds. Returns how
+        many packets are due now.
+        """
+        wakeup_time = self._get_wakeup_time()
+        now = time.monotonic()
+        self.last_wakeup = now
+        lateness = now - wakeup_time
+        self.wakeups += 1
+        self.lateness_sum += lateness
+        self.lateness_sq_sum += lateness * lateness
+        num_due = int((now - self.start_time) * self.rate) + 1 - self.scheduled
+        if num_due > self.max_backlog:
+            self.skipped += num_due - self.max_backlog
+            self.scheduled += num_due - self.max_backlog
+            num_due = self.max_backlog
+        return num_due
+
+    def count_sent(self):
+        """Account for a packet which was sent"""
+        self.sent += 1
+        self.scheduled += 1
+
+    def count_fc_stall(self):
+        """Account for the stream running out of flow control credit"""
+        self.fc_stalls += 1
+
+    def get_metrics(self):
+        """Return a dict of statistics about the pacing so far"""
+        elapsed = time.monotonic() - self.start_time
+        wakeups = max(self.wakeups, 1)
+        mean_lateness = self.lateness_sum / wakeups
+        variance = max(self.lateness_sq_sum / wakeups - mean_lateness ** 2, 0.0)
+        return {
+            'requested_rate': self.rate,
+            'achieved_rate': self.sent / elapsed if elapsed > 0 else 0.0,
+            'jitter': variance ** 0.5,
+            'mean_lateness': mean_lateness,
+            'mean_batch': self.sent / wakeups,
+            'sent': self.sent,
+            'skipped': self.skipped,
+            'fc_stalls': self.fc_stalls,
+        }
+
 class ChdrOutputStream:
     """This class encapsulates a Tx Thread. It takes data from its
     sample_source and then sends it in a data packet using its
@@ -154,90 +369,284 @@ class ChdrOutputStream:
 
     The tx stream is configured using the stream_spec object, which
     sets parameters such as sample rate and destination
+
+    Data packets are timestamped (unless stream_spec.has_time is
+    cleared) from the timekeeper of stream_spec. Timed streams start
+    once the timekeeper reaches stream_spec.init_timestamp. The last
+    packet of a finite stream, and the last packet sent after the
+    stream was stopped, or before the sample source ran out, carry an
+    end-of-burst.
+
+    If use_process is True, the worker runs in a forked process instead
+    of a thread, so that several streams can use several cores. In that
+    case, send_wrapper must be able to send from the forked process
+    (see SendWrapper.for_process()), and STRS packets cross the process
+    boundary in serialized form. finish() waits for the process to exit,
+    and then makes its metrics available in the metrics attribute.
     """
-    def __init__(self, log, chdr_w, sample_source, stream_spec, send_wrapper):
+    STRS_QUEUE_CAP = 100
+    # Minimum time between two wakeups of the worker. All packets which
+    # become due in the meantime are sent as one batch.
+    PACING_INTERVAL = 1e-3
+    # Largest number of packets the worker may fall behind schedule by
+    # (e.g. while it waits for flow control) before they are skipped
+    MAX_BACKLOG = 1024
+    # How long to wait for flow control credit before checking for stop
+    FC_POLL_TIMEOUT = 0.1
+    # How long finish() waits for a worker process to send its
+    # end-of-burst and exit before it is terminated
+    PROCESS_JOIN_TIMEOUT = 1.0
+    # Bytes per sample on the wire
+    # TODO: Put sample format/width in the stream spec
+    SAMPLE_BYTES = 4
+
+    def __init__(self, log, chdr_w, sample_source, stream_spec, send_wrapper,
+                 use_process=False):
         self.log = log
         self.chdr_w = chdr_w
         self.sample_source = sample_source
         self.stream_spec = stream_spec
         self.send_wrapper = send_wrapper
+        self.use_process = use_process
         self.xfer = XferCount()
         self.recv = XferCount()
-        self.stop = False
-        self.strs_queue = queue.Queue(100)
         self.strc_seq_num = 0
         self.data_seq_num = 0
+        self.metrics = None
+        self._start_worker()
 
-        self.thread = Thread(target=self._tx_worker, daemon=True)
-        self.thread.start()
+    def _start_worker(self):
+        """Create the queue and stop flag, and start the worker"""
+        if self.use_process:
+            # The worker inherits the stream (including its sample source
+            # and send_wrapper) instead of having it pickled, so it must be
+            # forked regardless of the platform's default start method
+            ctx = multiprocessing.get_context("fork")
+            self.stop = ctx.Event()
+            self.strs_queue = ctx.Queue(ChdrOutputStream.STRS_QUEUE_CAP)
+            self._metrics_conn, metrics_conn = ctx.Pipe(duplex=False)
+            self.thread = ctx.Process(target=self._process_worker, args=(metrics_conn,),
+                                      daemon=True)
+            self.thread.start()
+            metrics_conn.close()
+        else:
+            self.stop = Event()
+            self.strs_queue = queue.Queue(ChdrOutputStream.STRS_QUEUE_CAP)
+            self.thread = Thread(target=self._tx_worker, daemon=True)
+            self.thread.start()
+
+    def _process_worker(self, metrics_conn):
+        """Run the worker in a forked process, and send its metrics back
+        to the parent through metrics_conn
+        """
+        self._tx_worker()
+        metrics_conn.send(self.metrics)
+        metrics_conn.close()
 
     def _tx_worker(self):
         self.log.info("Stream TX Worker Starting with {} packets/sec"
                       .format(1/self.stream_spec.seconds_per_packet()))
         self.log.info("Downstream Buffer Capacity: {} packets or {} bytes"
                       .format(self.stream_spec.capacity_packets, self.stream_spec.capacity_bytes))
+        self.sample_source.set_sample_rate(self.stream_spec.sample_rate)
+        timekeeper = self._get_timekeeper()
+        start_ticks, start_time = self._get_start(timekeeper)
+        packets = self._generate_packets(start_ticks, timekeeper.tick_rate)
+        pacer = PacketPacer(1 / self.stream_spec.seconds_per_packet(),
+                            self.PACING_INTERVAL, self.MAX_BACKLOG, start_time)
+        pending = None
+        exhausted = False
+        stalled = False
+        while not exhausted:
+            stopping = self.stop.is_set()
+            # Once the stream has started, keep going until the
+            # generator has produced its end-of-burst packet
+            if stopping and pacer.sent == 0:
+                self.log.info("Stream Worker Stopped")
+                break
+            if stalled:
+                # Out of credit: Wake up for whichever comes first, a
+                # flow control update or the next pacing deadline
+                self._poll_strs(min(max(pacer.get_delay(), 0), self.FC_POLL_TIMEOUT))
+                num_due = pacer.wakeup()
+            else:
+                num_due = pacer.wait(self.FC_POLL_TIMEOUT)
+                # Apply whatever flow control updates have arrived, without waiting
+                self._poll_strs(0)
+            while num_due > 0:
+                if pending is None:
+                    pending = next(packets, None)
+                    if pending is None:
+                        exhausted = True
+                        break
+                send_data, send_len = pending
+                # Check Flow Control to assert there is space downstream
+                if not self._can_fit_packet(send_len):
+                    # Packets which can't be sent now are sent in a burst
+                    # once credit returns, just like the pacer's backlog
+                    if not stalled:
+                        pacer.count_fc_stall()
+                    stalled = True
+                    if stopping:
+                        # Nobody is waiting for the end-of-burst anymore
+                        exhausted = True
+                    break
+                stalled = False
+                self.send_wrapper.send_buffers(send_data, self.stream_spec.addr)
+                self.xfer.count_packet(send_len)
+                pacer.count_sent()
+                pending = None
+                num_due -= 1
+
+        self.log.info("Stream Worker Done")
+        self.metrics = pacer.get_metrics()
+        self.log.info("Actual Packet Rate was {achieved_rate:.1f} packets/sec "
+                      "(requested {requested_rate:.1f}), jitter {jitter:.6f} s, "
+                      "{mean_batch:.2f} packets per wakeup, {fc_stalls} flow control stalls, "
+                      "{skipped} packets skipped".format(**self.metrics))
+        self.sample_source.close()
+
+    def _get_timekeeper(self):
+        """Return the timekeeper of the stream. Without one, time starts
+        at 0 and ticks at the sample rate.
+        """
+        if self.stream_spec.timekeeper is None:
+            return SimTimekeeper(self.stream_spec.sample_rate)
+        return self.stream_spec.timekeeper
+
+    def _get_start(self, timekeeper):
+        """Return the time of the first sample of the stream, both in
+        ticks of timekeeper and as a monotonic time
+        """
+        if self.stream_spec.is_timed:
+            start_ticks = self.stream_spec.init_timestamp
+            return start_ticks, timekeeper.ticks_to_time(start_ticks)
+        start_time = time.monotonic()
+        return timekeeper.get_ticks(start_time), start_time
+
+    def _read_payload(self, header, num_bytes):
+        """Return the next num_bytes of samples from the sample source,
+        as a bytes-like object, or as a ChdrPacket (with the header
+        fields still to be set) for sources which only implement
+        fill_packet(). Returns None once the source is exhausted.
+        """
+        # Prefer sending the payload straight out of the source's buffer
+        payload = self.sample_source.get_payload(num_bytes)
+        if payload is NotImplemented:
+            packet = ChdrPacket(self.chdr_w, header, bytes(0))
+            return self.sample_source.fill_packet(packet, num_bytes)
+        return payload
+
+    def _generate_packets(self, start_ticks, tick_rate):
+        """Generator which yields the (send_data, send_len) of each data
+        packet of this stream until the stream is complete, it is
+        stopped, or the sample source is exhausted. The last packet
+        carries an end-of-burst in each case. send_data is a tuple of
+        buffers. The first sample is at start_ticks, and time advances
+        at tick_rate ticks per second.
+
+        The payload of the next packet is read ahead, so that the
+        packet before the source runs out can be marked.
+        """
         header = ChdrHeader()
-        start_time = time.time()
-        next_send = start_time
         header.dst_epid = self.stream_spec.dst_epid
-        header.pkt_type = PacketType.DATA_NO_TS
+        has_time = self.stream_spec.has_time
+        header.pkt_type = PacketType.DATA_WITH_TS if has_time else PacketType.DATA_NO_TS
 
         is_continuous = self.stream_spec.is_continuous
-        num_samps_left = None
+        # The packet size and the amount left to send are in bytes
+        num_bytes_left = None
         if not is_continuous:
-            # TODO: Put sample format/width in the stream spec
-            num_samps_left = self.stream_spec.total_samples * 4 # SC16 is 4 bytes per sample
+            num_bytes_left = self.stream_spec.total_samples * self.SAMPLE_BYTES
 
-        timestamp = self.stream_spec.init_timestamp  \
-            if self.stream_spec.is_timed else None
+        ticks_per_sample = tick_rate / self.stream_spec.sample_rate
+        samples_sent = 0
 
-        while is_continuous or num_samps_left > 0:
-            if self.stop:
-                self.log.info("Stream Worker Stopped")
-                break
+        def get_packet_bytes():
+            """Return the payload size of the next packet"""
+            if num_bytes_left is None:
+                return self.stream_spec.packet_samples
+            return min(self.stream_spec.packet_samples, num_bytes_left)
+
+        packet_bytes = get_packet_bytes()
+        payload = self._read_payload(header, packet_bytes) \
+            if is_continuous or num_bytes_left > 0 else None
+        while payload is not None:
             header.seq_num = self.data_seq_num
             # When seq_num gets to 65535 (Max Unsigned 16 bit integer)
             # It wraps back around to 0
             self.data_seq_num = int(self.data_seq_num + 1) & 0xFFFF
-            packet = ChdrPacket(self.chdr_w, header, bytes(0), timestamp)
-            packet_samples = self.stream_spec.packet_samples
-            if num_samps_left is not None:
-                packet_samples = min(packet_samples, num_samps_left)
-                num_samps_left -= packet_samples
-            packet = self.sample_source.fill_packet(packet, packet_samples)
-            if packet is None:
-                break
-            send_data = bytes(packet.serialize()) # Serialize before waiting
-
-            delay = next_send - time.time()
-            if delay > 0:
-                time.sleep(delay)
-            next_send = next_send + self.stream_spec.seconds_per_packet()
-
-            timestamp = None
-
-            # Check Flow Control to assert there is space downstream
-            while not self._can_fit_packet(len(send_data)):
-                strs_update = self.strs_queue.get()
-                strs_payload = strs_update.get_payload_strs()
-                self._update_recv(strs_payload)
-
-            self.send_wrapper.send_data(send_data, self.stream_spec.addr)
-            self.xfer.count_packet(len(send_data))
-
-        self.log.info("Stream Worker Done")
-        finish_time = time.time()
-        self.log.info("Actual Packet Rate was {} packets/sec"
-                      .format(self.xfer.num_packets/(finish_time - start_time)))
-        self.sample_source.close()
+            if num_bytes_left is not None:
+                num_bytes_left -= packet_bytes
+            if num_bytes_left == 0:
+                next_payload = None
+            else:
+                packet_bytes = get_packet_bytes()
+                next_payload = self._read_payload(header, packet_bytes)
+            # This is the last packet if the stream is complete, or the
+            # source has run out
+            header.eob = next_payload is None or self.stop.is_set()
+            timestamp = start_ticks + int(round(samples_sent * ticks_per_sample)) \
+                if has_time else None
+            if isinstance(payload, ChdrPacket):
+                payload.set_header(header)
+                payload.set_timestamp(timestamp)
+                send_data = (bytes(payload.serialize()),) # Serialize before waiting
+                payload_len = len(payload.get_payload_bytes())
+            else:
+                send_data = (pack_data_header(self.chdr_w, header, len(payload), timestamp),
+                             payload)
+                payload_len = len(payload)
+            send_len = sum(len(buf) for buf in send_data)
+            # The next timestamp follows the samples actually sent
+            samples_sent += payload_len // self.SAMPLE_BYTES
+            yield send_data, send_len
+            if header.eob:
+                return
+            payload = next_payload
 
     def finish(self):
-        """Stops the ChdrOutputStream"""
-        self.stop = True
+        """Stops the ChdrOutputStream. A worker process is waited for,
+        and its metrics are collected.
+        """
+        self.stop.set()
+        if not self.use_process:
+            return
+        self.thread.join(self.PROCESS_JOIN_TIMEOUT)
+        if self.thread.is_alive():
+            self.log.warning("Stream worker process {} didn't stop, terminating it"
+                             .format(self.thread.pid))
+            self.thread.terminate()
+            self.thread.join()
+        try:
+            if self._metrics_conn.poll():
+                self.metrics = self._metrics_conn.recv()
+        except EOFError:
+            # The worker was terminated before it sent its metrics
+            pass
+        self._metrics_conn.close()
 
     def queue_packet(self, packet):
         """ Place an incoming STRS packet in the Queue """
-        self.strs_queue.put_nowait(packet)
+        if self.use_process:
+            # ChdrPackets can't be pickled
+            self.strs_queue.put_nowait(bytes(packet.serialize()))
+        else:
+            self.strs_queue.put_nowait(packet)
+
+    def _poll_strs(self, timeout):
+        """ Apply all STRS packets in the Queue. Waits up to timeout
+        seconds for the first one to arrive.
+        """
+        try:
+            strs_update = self.strs_queue.get(timeout=timeout)
+            while True:
+                if self.use_process:
+                    strs_update = ChdrPacket.deserialize(self.chdr_w, strs_update)
+                self._update_recv(strs_update.get_payload_strs())
+                strs_update = self.strs_queue.get_nowait()
+        except queue.Empty:
+            pass
 
     def _can_fit_packet(self, length):
         """ Can the downstream buffer fit a packet of length right now """
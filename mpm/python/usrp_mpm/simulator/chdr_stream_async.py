@@ -0,0 +1,131 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+This module contains asyncio versions of the streams in chdr_stream.py.
+Instead of a thread each, they run as tasks in the event loop they are
+created from (see chdr_endpoint_async.py).
+"""
+import asyncio
+from .chdr_stream import ChdrInputStream, ChdrOutputStream, PacketPacer
+
+class AsyncChdrInputStream(ChdrInputStream):
+    """This is a ChdrInputStream which processes its queue in a task
+    instead of a thread. It must be created from within the event loop.
+    """
+    def _start_worker(self):
+        # Flow control limits how many packets UHD can have in flight,
+        # so the queue doesn't need a bound of its own
+        self.rx_queue = asyncio.Queue()
+        self.task = asyncio.ensure_future(self._rx_worker())
+
+    async def _rx_worker(self):
+        self.log.info("Stream RX Worker Starting")
+        while True:
+            packet, recv_len, addr = await self.rx_queue.get()
+            if self.stop:
+                break
+            self._process_packet(packet, recv_len, addr)
+
+        self.sample_sink.close()
+        self.log.info("Stream RX Worker Done")
+
+    def finish(self):
+        """Unblocks the worker and stops the task.
+        The worker will close its sample_sink
+        """
+        self.stop = True
+        self.rx_queue.put_nowait((None, None, None))
+
+    def queue_packet(self, packet, recv_len, addr):
+        """Queue a packet to be processed by the AsyncChdrInputStream"""
+        self.rx_queue.put_nowait((packet, recv_len, addr))
+
+class AsyncChdrOutputStream(ChdrOutputStream):
+    """This is a ChdrOutputStream which runs as a task instead of a
+    thread. It must be created from within the event loop.
+    """
+    def _start_worker(self):
+        self.stop = asyncio.Event()
+        self.strs_queue = asyncio.Queue(ChdrOutputStream.STRS_QUEUE_CAP)
+        self.task = asyncio.ensure_future(self._tx_worker())
+
+    async def _tx_worker(self):
+        self.log.info("Stream TX Worker Starting with {} packets/sec"
+                      .format(1/self.stream_spec.seconds_per_packet()))
+        self.log.info("Downstream Buffer Capacity: {} packets or {} bytes"
+                      .format(self.stream_spec.capacity_packets, self.stream_spec.capacity_bytes))
+        self.sample_source.set_sample_rate(self.stream_spec.sample_rate)
+        timekeeper = self._get_timekeeper()
+        start_ticks, start_time = self._get_start(timekeeper)
+        packets = self._generate_packets(start_ticks, timekeeper.tick_rate)
+        pacer = PacketPacer(1 / self.stream_spec.seconds_per_packet(),
+                            self.PACING_INTERVAL, self.MAX_BACKLOG, start_time)
+        pending = None
+        exhausted = False
+        stalled = False
+        while not exhausted:
+            stopping = self.stop.is_set()
+            if stopping and pacer.sent == 0:
+                self.log.info("Stream Worker Stopped")
+                break
+            delay = pacer.get_delay()
+            if stalled:
+                # Out of credit: Wake up for whichever comes first, a
+                # flow control update or the next pacing deadline
+                await self._poll_strs_async(min(max(delay, 0), self.FC_POLL_TIMEOUT))
+                num_due = pacer.wakeup()
+            elif delay > self.FC_POLL_TIMEOUT:
+                # Timed streams may start far in the future
+                await asyncio.sleep(self.FC_POLL_TIMEOUT)
+                continue
+            else:
+                # Always yield to the event loop, even if we are behind
+                await asyncio.sleep(max(delay, 0))
+                num_due = pacer.wakeup()
+                await self._poll_strs_async(0)
+            while num_due > 0:
+                if pending is None:
+                    pending = next(packets, None)
+                    if pending is None:
+                        exhausted = True
+                        break
+                send_data, send_len = pending
+                if not self._can_fit_packet(send_len):
+                    if not stalled:
+                        pacer.count_fc_stall()
+                    stalled = True
+                    if stopping:
+                        exhausted = True
+                    break
+                stalled = False
+                self.send_wrapper.send_buffers(send_data, self.stream_spec.addr)
+                self.xfer.count_packet(send_len)
+                pacer.count_sent()
+                pending = None
+                num_due -= 1
+
+        self.log.info("Stream Worker Done")
+        self.metrics = pacer.get_metrics()
+        self.log.info("Actual Packet Rate was {achieved_rate:.1f} packets/sec "
+                      "(requested {requested_rate:.1f}), jitter {jitter:.6f} s, "
+                      "{mean_batch:.2f} packets per wakeup, {fc_stalls} flow control stalls, "
+                      "{skipped} packets skipped".format(**self.metrics))
+        self.sample_source.close()
+
+    async def _poll_strs_async(self, timeout):
+        """ Apply all STRS packets in the Queue. Waits up to timeout
+        seconds for the first one to arrive.
+        """
+        try:
+            if timeout:
+                strs_update = await asyncio.wait_for(self.strs_queue.get(), timeout)
+            else:
+                strs_update = self.strs_queue.get_nowait()
+            while True:
+                self._update_recv(strs_update.get_payload_strs())
+                strs_update = self.strs_queue.get_nowait()
+        except (asyncio.QueueEmpty, asyncio.TimeoutError):
+            pass
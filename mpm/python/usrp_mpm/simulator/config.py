@@ -54,6 +54,70 @@ class HardwareDescriptor:
             dict['dboard_class'],
             dict['rfnoc_device_type'])
 
+class TopologyDescriptor:
+    """This class describes the NoC core layout of the simulated device,
+    i.e. how many of each node and block it has, and how its streams
+    are executed.
+    """
+    STREAM_WORKERS = ("thread", "process", "asyncio")
+
+    def __init__(self, num_stream_eps=1, num_radios=1, radio_channels=2, num_xports=1,
+                 stream_workers="thread"):
+        """
+        num_stream_eps -> Number of stream endpoints. Every stream
+            endpoint can run one output and one input stream at a time.
+        num_radios -> Number of radio NoC blocks
+        radio_channels -> Number of channels (ports) per radio block.
+            Radio channels are connected to stream endpoints round robin,
+            so with num_stream_eps == num_radios * radio_channels, every
+            channel gets an endpoint (and therefore a stream) of its own.
+        num_xports -> Number of transports. Each one gets its own UDP
+            port, counting upwards from the CHDR port.
+        stream_workers -> "thread" runs output streams in threads of the
+            MPM process, "process" runs each one in a process of its own
+            so that several of them can use multiple cores. Input streams
+            run in threads with either setting, since each of their
+            packets would have to cross the process boundary. "asyncio" runs
+            the whole CHDR endpoint, including all streams, in an asyncio
+            event loop (see chdr_endpoint_async.py).
+        """
+        self.num_stream_eps = int(num_stream_eps)
+        self.num_radios = int(num_radios)
+        self.radio_channels = int(radio_channels)
+        self.num_xports = int(num_xports)
+        if stream_workers not in TopologyDescriptor.STREAM_WORKERS:
+            raise ValueError("Invalid stream_workers: {} (must be one of {})"
+                             .format(stream_workers, ", ".join(TopologyDescriptor.STREAM_WORKERS)))
+        self.stream_workers = stream_workers
+        for name in ("num_stream_eps", "num_radios", "radio_channels", "num_xports"):
+            if getattr(self, name) < 1:
+                raise ValueError("Topology {} must be at least 1".format(name))
+
+    @classmethod
+    def from_dict(cls, dict):
+        return cls(**dict)
+
+class NetworkDescriptor:
+    """This class describes where the simulated device listens for CHDR
+    traffic. The defaults match real hardware, other values allow
+    several simulated devices to run on one computer (see sim_farm.py).
+    """
+    DEFAULT_CHDR_PORT = 49153
+
+    def __init__(self, bind_addr="0.0.0.0", chdr_port=DEFAULT_CHDR_PORT):
+        """
+        bind_addr -> Address the CHDR sockets are bound to. If this is
+            not "0.0.0.0", it is also the only address which is
+            advertised to UHD, e.g. a loopback alias such as 127.0.0.2
+        chdr_port -> UDP port of the first xport
+        """
+        self.bind_addr = bind_addr
+        self.chdr_port = int(chdr_port)
+
+    @classmethod
+    def from_dict(cls, dict):
+        return cls(**dict)
+
 class Config:
     """This class represents a configuration file for the usrp simulator.
     This file should conform to the .ini format defined by the
@@ -64,11 +128,23 @@ class Config:
     Source/Sink class to instanitate (see the decorators in
     sample_source.py). The other key value pairs in the section are
     passed to the source/sink constructor as strings through **kwargs
+
+    An optional [topology] section sets the keys of TopologyDescriptor,
+    and an optional [network] section those of NetworkDescriptor.
+
+    For example, this provides a 100 kHz tone in the sc16 wire format:
+        [sample.source]
+        class = ToneSource
+        freq = 100e3
+        ampl = 0.5
+        wire_format = sc16
     """
-    def __init__(self, source_gen, sink_gen, hardware):
+    def __init__(self, source_gen, sink_gen, hardware, topology=None, network=None):
         self.source_gen = source_gen
         self.sink_gen = sink_gen
         self.hardware = hardware
+        self.topology = topology if topology is not None else TopologyDescriptor()
+        self.network = network if network is not None else NetworkDescriptor()
 
     @classmethod
     def from_path(cls, log, path):
@@ -92,6 +168,14 @@ class Config:
         hardware_preset.update(hardware_section)
         hardware = HardwareDescriptor.from_dict(hardware_preset)
         parser.pop('hardware')
+        topology = TopologyDescriptor()
+        if 'topology' in parser:
+            topology = TopologyDescriptor.from_dict(dict(parser['topology']))
+            parser.pop('topology')
+        network = NetworkDescriptor()
+        if 'network' in parser:
+            network = NetworkDescriptor.from_dict(dict(parser['network']))
+            parser.pop('network')
         for unused_section in parser:
             # Python sticks this into all config files
             if unused_section == 'DEFAULT':
@@ -99,7 +183,7 @@ class Config:
             # This helps stop you from shooting yourself in the foot when you add
             # the [sampel.sink] section
             log.warning("Unrecognized section in config file: {}".format(unused_section))
-        return cls(source_gen, sink_gen, hardware)
+        return cls(source_gen, sink_gen, hardware, topology, network)
 
     @staticmethod
     def _read_sample_section(section, lookup):
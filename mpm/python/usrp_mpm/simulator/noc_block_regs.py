@@ -29,10 +29,15 @@ REG_RX_CMD_NUM_WORDS_LO = 0x18
 REG_RX_CMD_TIME_LO = 0x20
 REG_RX_CMD_TIME_HI = 0x24
 REG_RX_CMD = 0x14
+REG_RX_ERR_REM_PORT = 0x30
+REG_RX_ERR_REM_EPID = 0x34
+REG_RX_ERR_ADDR = 0x38
+REG_RX_HAS_TIME = 0x70
 
 RX_CMD_CONTINUOUS = 0x2
 RX_CMD_STOP = 0x0
 RX_CMD_FINITE = 0x1
+RX_CMD_TIMED = 1 << 31
 
 RADIO_BASE_ADDR = 0x1000
 REG_CHAN_OFFSET = 128 # 0x80
@@ -129,8 +134,10 @@ class NocBlockRegs:
             Port is either StreamEndpointPort or NocBlockPort
         sample_width -> Sample width of radio
         samples_per_cycle -> Samples produced by a radio cycle
-        get_stream_spec -> Callback which returns the current stream spec
-        create_tx_stream -> Callback which takes a block_index and starts a tx stream
+        get_stream_spec -> Callback which takes a radio index and channel and
+            returns the stream spec of that channel
+        create_tx_stream -> Callback which takes a block_index and a stream spec
+            and starts a tx stream
         stop_tx_stream -> Callback which takes a block_index and stops a tx stream
         """
         self.log = log.getChild("Regs")
@@ -147,12 +154,16 @@ class NocBlockRegs:
         self.adjacency_list_reg = NocBlockRegs._parse_adjacency_list(self.adjacency_list)
         self.sample_width = sample_width
         self.samples_per_cycle = samples_per_cycle
-        self.radio_reg = {}
+        self.radio_reg = [{} for _ in blocks]
         self.get_stream_spec = get_stream_spec
         self.create_tx_stream = create_tx_stream
         self.stop_tx_stream = stop_tx_stream
 
-    def read(self, addr):
+    def read(self, addr, ctrl_port=0):
+        """Read a register. ctrl_port is the control port the request
+        was addressed to. Port 0 is client zero, and port n is NoC
+        block n - 1.
+        """
         # See client_zero.cpp
         if addr == PROTOVER_ADDR:
             return self.read_protover()
@@ -168,14 +179,32 @@ class NocBlockRegs:
             return self.read_port_reg(addr)
         # See radio_control_impl.cpp
         elif addr >= 0x1000 and addr < 0x10000:
-            return self.read_radio(addr)
+            block = self._port_to_block(ctrl_port)
+            if not self._is_valid_block(block, addr):
+                return 0
+            return self.read_radio(addr, block)
         # See client_zero.cpp
         elif addr >= 0x10000:
             return self.read_adjacency_list(addr)
         else:
             raise RuntimeError("Unsupported register addr: 0x{:08X}".format(addr))
 
-    def read_radio(self, addr):
+    @staticmethod
+    def _port_to_block(ctrl_port):
+        """Find the block index a control port belongs to. Radio
+        registers accessed through client zero go to the first block.
+        """
+        return max(ctrl_port - 1, 0)
+
+    def _is_valid_block(self, block, addr):
+        """Check that block exists, and log a warning if it doesn't"""
+        if block < len(self.blocks):
+            return True
+        self.log.warning("Access to register 0x%08X of block %d ignored, "
+                         "there are only %d blocks", addr, block, len(self.blocks))
+        return False
+
+    def read_radio(self, addr, block=0):
         if addr == 0x1000:
             raise NotImplementedError() # TODO: This should be REG_COMPAT
         elif addr == 0x1004:
@@ -185,13 +214,13 @@ class NocBlockRegs:
             chan = offset // 0x80
             radio_offset = offset % 0x80
             if radio_offset == 0x40:
-                return self.radio_reg
+                return self.radio_reg[block]
             elif radio_offset == 0x3C:
-                return self.radio_reg
+                return self.radio_reg[block]
             else:
                 raise NotImplementedError("Radio addr 0x{:08X} not implemented".format(addr))
 
-    def write_radio(self, addr, value):
+    def write_radio(self, addr, value, block=0):
         """Write a value to radio registers
 
         See radio_control_impl.cpp
@@ -199,36 +228,46 @@ class NocBlockRegs:
         offset = addr - 0x1000
         assert offset >= 0
         chan = offset // 0x80
-        if chan > 0: # For now, just operate as if there is one channel
-            self.log.warn("Channel {} not suported".format(chan))
-            return
+        stream_spec = self.get_stream_spec(block, chan)
         reg = offset % 0x80
         if reg == REG_RX_MAX_WORDS_PER_PKT:
-            self.get_stream_spec().packet_samples = value
+            stream_spec.packet_samples = value
         elif reg == REG_RX_CMD_NUM_WORDS_HI:
-            self.get_stream_spec().set_num_words_hi(value)
+            stream_spec.set_num_words_hi(value)
         elif reg == REG_RX_CMD_NUM_WORDS_LO:
-            self.get_stream_spec().set_num_words_lo(value)
+            stream_spec.set_num_words_lo(value)
         elif reg == REG_RX_CMD_TIME_HI:
-            self.get_stream_spec().set_timestamp_hi(value)
+            stream_spec.set_timestamp_hi(value)
         elif reg == REG_RX_CMD_TIME_LO:
-            self.get_stream_spec().set_timestamp_lo(value)
+            stream_spec.set_timestamp_lo(value)
+        elif reg == REG_RX_ERR_REM_PORT:
+            stream_spec.err_port = value
+        elif reg == REG_RX_ERR_REM_EPID:
+            stream_spec.err_epid = value
+        elif reg == REG_RX_ERR_ADDR:
+            stream_spec.err_addr = value
+        elif reg == REG_RX_HAS_TIME:
+            stream_spec.has_time = bool(value)
         elif reg == REG_RX_CMD:
-            if value & (1 << 31) != 0:
-                value = value & ~(1 << 31) # Clear the flag
-                self.get_stream_spec().is_timed = True
+            sep_block_id = self.resolve_ep_towards_outputs((self.get_radio_port(block), chan))
+            # Each stream endpoint can only stream from its first port
+            if sep_block_id is None or sep_block_id[1] != 0:
+                self.log.warn("Channel {} of radio {} has no stream endpoint of its own, "
+                              "not streaming".format(chan, block))
+                return
+            # Every command is either timed or not
+            stream_spec.is_timed = value & RX_CMD_TIMED != 0
+            value = value & ~RX_CMD_TIMED # Clear the flag
             if value == RX_CMD_STOP:
-                sep_block_id = self.resolve_ep_towards_outputs((self.get_radio_port(), chan))
                 self.stop_tx_stream(sep_block_id)
                 return
             elif value == RX_CMD_CONTINUOUS:
-                self.get_stream_spec().is_continuous = True
+                stream_spec.is_continuous = True
             elif value == RX_CMD_FINITE:
-                self.get_stream_spec().is_continuous = False
+                stream_spec.is_continuous = False
             else:
                 raise RuntimeError("Unknown Stream RX_CMD: {:08X}".format(value))
-            sep_block_id = self.resolve_ep_towards_outputs((self.get_radio_port(), chan))
-            self.create_tx_stream(sep_block_id)
+            self.create_tx_stream(sep_block_id, stream_spec)
 
     def resolve_ep_towards_outputs(self, block_id):
         """Follow dataflow downstream through the adjacency list until
@@ -242,12 +281,12 @@ class NocBlockRegs:
                 else:
                     return self.resolve_ep_towards_outputs(dst_blk)
 
-    def get_radio_port(self):
-        """Returns the block_id of the radio block"""
+    def get_radio_port(self, block=0):
+        """Returns the block_id of the radio block with index block"""
         radio_noc_id = 0x12AD1000
-        for i, block in enumerate(self.blocks):
-            if block.noc_id == radio_noc_id:
-                return i + 1 + self.num_stream_ep
+        assert self.blocks[block].noc_id == radio_noc_id, \
+            "Block {} is not a radio".format(block)
+        return block + 1 + self.num_stream_ep
 
     # This is the FPGA compat number
     def read_protover(self):
@@ -278,14 +317,19 @@ class NocBlockRegs:
             index = (offset // 4) - 1
             return self.adjacency_list_reg[index]
 
-    def write(self, addr, value):
+    def write(self, addr, value, ctrl_port=0):
+        """Write a register. See read() for the meaning of ctrl_port"""
+        block = self._port_to_block(ctrl_port)
+        if not self._is_valid_block(block, addr):
+            return
+        num_chans = self.blocks[block].num_outputs
         if addr == 0x1040 or addr == 0x10C0:
-            self.log.trace("Storing value: 0x:{:08X} to self.radio_reg for data loopback test".format(value))
-            self.radio_reg = value
-        # assuming 2 channels, out of bounds is
-        # BASE + 2 * CHAN_OFFSET = 0x1000 + 2 * 0x80 = 0x1100
-        elif 0x1000 <= addr < 0x1100:
-            self.write_radio(addr, value)
+            self.log.trace("Storing value: 0x:%08X to self.radio_reg for data loopback test", value)
+            self.radio_reg[block] = value
+        # Out of bounds is BASE + num_chans * CHAN_OFFSET
+        # e.g. 0x1000 + 2 * 0x80 = 0x1100 for two channels
+        elif 0x1000 <= addr < RADIO_BASE_ADDR + num_chans * REG_CHAN_OFFSET:
+            self.write_radio(addr, value, block)
 
     def read_port_reg(self, addr):
         port = addr // 0x40
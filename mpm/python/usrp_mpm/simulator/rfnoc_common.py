@@ -7,6 +7,8 @@
 This file contains common classes that are used by both rfnoc_graph.py
 and stream_endpoint_node.py
 """
+import math
+import time
 from enum import IntEnum
 from uhd.chdr import MgmtOpCode, MgmtOpNodeInfo, MgmtOp, PacketType
 
@@ -129,11 +131,65 @@ class Node:
             op_code=MgmtOpCode.INFO_RESP
         )
 
+class SimTimekeeper:
+    """This class simulates a timekeeper, which counts ticks at
+    tick_rate. The time is derived from the monotonic clock, so copies
+    of a timekeeper (e.g. in a forked stream process) stay in sync.
+
+    PPS edges are simulated on the whole seconds of the monotonic clock.
+    """
+    DEFAULT_TICK_RATE = 122.88e6
+
+    def __init__(self, tick_rate=DEFAULT_TICK_RATE):
+        # (ticks, monotonic time, tick rate) at the last time the time
+        # or the tick rate was set. This is replaced as a whole, so
+        # readers never see a mix of old and new values.
+        self._ref = (0, time.monotonic(), float(tick_rate))
+
+    @property
+    def tick_rate(self):
+        """Ticks per second"""
+        return self._ref[2]
+
+    def get_ticks(self, now=None):
+        """Return the time in ticks at monotonic time now (default:
+        the current time)
+        """
+        ref_ticks, ref_time, tick_rate = self._ref
+        if now is None:
+            now = time.monotonic()
+        return ref_ticks + int(round((now - ref_time) * tick_rate))
+
+    def get_ticks_last_pps(self):
+        """Return the time in ticks at the last PPS edge"""
+        return self.get_ticks(math.floor(time.monotonic()))
+
+    def set_ticks(self, ticks, next_pps=False):
+        """Set the time to ticks, either right away or at the next PPS
+        edge
+        """
+        now = time.monotonic()
+        at_time = math.ceil(now) if next_pps else now
+        self._ref = (int(ticks), at_time, self.tick_rate)
+
+    def set_tick_rate(self, tick_rate):
+        """Change the tick rate. The time in ticks continues from where
+        it is now.
+        """
+        now = time.monotonic()
+        self._ref = (self.get_ticks(now), now, float(tick_rate))
+
+    def ticks_to_time(self, ticks):
+        """Return the monotonic time at which the time will be ticks"""
+        ref_ticks, ref_time, tick_rate = self._ref
+        return ref_time + (ticks - ref_ticks) / tick_rate
+
 class StreamSpec:
     """This class carries the configuration parameters of a Tx stream.
 
-    total_samples, is_continuous, and packet_samples come from the
-    radio registers (noc_block_regs.py)
+    total_samples, is_continuous, packet_samples, has_time and the
+    error reporting settings (err_*) come from the radio registers
+    (noc_block_regs.py)
 
     sample_rate comes from an rpc to the daughterboard (through the
     set_sample_rate method in chdr_endpoint.py)
@@ -141,6 +197,9 @@ class StreamSpec:
     dst_epid comes from the source stream_ep
 
     addr comes from the xport passed through when routing to dst_epid
+
+    timekeeper is the SimTimekeeper of the device, which the stream
+    takes its timestamps from
     """
     LOW_MASK = 0xFFFFFFFF
     HIGH_MASK = (0xFFFFFFFF) << 32
@@ -155,6 +214,14 @@ class StreamSpec:
         self.addr = None
         self.capacity_packets = 0
         self.capacity_bytes = 0
+        self.has_time = True
+        self.timekeeper = None
+        # Control port of the radio block, which async messages come from
+        self.radio_ctrl_port = None
+        # Where UHD wants async error messages (see radio_control_impl.cpp)
+        self.err_epid = None
+        self.err_port = None
+        self.err_addr = None
 
     def set_timestamp_lo(self, low):
         """Set the low 32 bits of the initial timestamp"""
@@ -186,6 +253,7 @@ class StreamSpec:
 
     def __str__(self):
         return "StreamSpec{{total_samples: {}, is_continuous: {}, packet_samples: {}," \
-               "sample_rate: {}, dst_epid: {}, addr: {}}}" \
+               "sample_rate: {}, dst_epid: {}, addr: {}, is_timed: {}, init_timestamp: {}}}" \
                .format(self.total_samples, self.is_continuous, self.packet_samples,
-                       self.sample_rate, self.dst_epid, self.addr)
+                       self.sample_rate, self.dst_epid, self.addr, self.is_timed,
+                       self.init_timestamp)
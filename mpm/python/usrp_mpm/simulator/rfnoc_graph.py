@@ -10,9 +10,12 @@ This module handles and responds to Management and Ctrl Packets. It
 also instantiates the registers and acts as an interface between
 the chdr packets on the network and the registers.
 """
-from uhd.chdr import MgmtOpCode, MgmtOpCfg, MgmtOpSelDest
+import copy
+from uhd.chdr import MgmtOpCode, MgmtOpCfg, MgmtOpSelDest, ChdrHeader, ChdrPacket, PacketType, \
+    CtrlPayload, CtrlOpCode
 from .noc_block_regs import NocBlockRegs, NocBlock, StreamEndpointPort, NocBlockPort
-from .rfnoc_common import Node, NodeType, StreamSpec, to_iter, swap_src_dst, RETURN_TO_SENDER
+from .rfnoc_common import Node, NodeType, StreamSpec, SimTimekeeper, to_iter, swap_src_dst, \
+    RETURN_TO_SENDER
 from .stream_endpoint_node import StreamEndpointNode
 
 class XportNode(Node):
@@ -50,8 +53,7 @@ class XportNode(Node):
                 self.addr_map[payload.src_epid] = addr
             else:
                 raise NotImplementedError(op.op_code)
-        self.log.trace("Xport {} processed hop:\n{}"
-                       .format(self.node_inst, our_hop))
+        self.log.trace("Xport %s processed hop:\n%s", self.node_inst, our_hop)
         packet.set_payload(payload)
         if send_upstream:
             return RETURN_TO_SENDER
@@ -79,6 +81,11 @@ class XbarNode(Node):
         self.nports_xport = len(xport_ports)
         self.ports = xport_ports + ports
         self.routing_table = {}
+        self.route_changed = None
+
+    def graph_init(self, log, get_device_id, route_changed=None, **kwargs):
+        super().graph_init(log, get_device_id)
+        self.route_changed = route_changed
 
     def get_type(self):
         return NodeType.XBAR
@@ -103,6 +110,8 @@ class XbarNode(Node):
                 cfg = op.get_op_payload()
                 cfg = MgmtOpCfg.parse(cfg)
                 self.routing_table[cfg.addr] = cfg.data
+                if self.route_changed is not None:
+                    self.route_changed()
                 self.log.debug("Xbar {} routing changed: {}"
                                .format(self.node_inst, self.routing_table))
             elif op.op_code == MgmtOpCode.SEL_DEST:
@@ -112,8 +121,7 @@ class XbarNode(Node):
                 destination = self.ports[dest_port]
             else:
                 raise NotImplementedError(op.op_code)
-        self.log.trace("Xbar {} processed hop:\n{}"
-                       .format(self.node_inst, our_hop))
+        self.log.trace("Xbar %s processed hop:\n%s", self.node_inst, our_hop)
         packet.set_payload(payload)
         if send_upstream:
             return RETURN_TO_SENDER
@@ -148,37 +156,69 @@ class RFNoCGraph:
     It serves as an interface between the ChdrEndpoint and the
     individual blocks/nodes.
     """
-    def __init__(self, graph_list, log, device_id, send_wrapper, chdr_w, rfnoc_device_id):
+    RADIO_NOC_ID = 0x12AD1000
+    # Async error code for a timed command which arrived too late
+    # (see radio_control_impl.hpp:err_codes)
+    ERR_RX_LATE_CMD = 1
+
+    def __init__(self, graph_list, log, device_id, send_wrapper, chdr_w, rfnoc_device_id,
+                 num_radios=1, radio_channels=2):
         self.log = log.getChild("Graph")
         self.device_id = device_id
-        self.stream_spec = StreamSpec()
+        # One StreamSpec per radio channel, keyed by (radio index, channel)
+        self.stream_specs = {}
+        self.sample_rate = None
+        self.timekeeper = SimTimekeeper()
+        self.send_wrapper = send_wrapper
+        self.chdr_w = chdr_w
+        self.async_seq_num = 0
         self.stream_ep = []
+        # Maps entry xport id -> {dst_epid: StreamEndpointNode} for DATA
+        # packets. It is compiled on demand and dropped whenever an xbar
+        # route or an endpoint's EPID changes.
+        self.data_routes = {}
         for node in graph_list:
             if node.__class__ is StreamEndpointNode:
                 self.stream_ep.append(node)
             node.graph_init(self.log, self.get_device_id, send_wrapper=send_wrapper,
-                            chdr_w=chdr_w, dst_to_addr=self.dst_to_addr)
+                            chdr_w=chdr_w, dst_to_addr=self.dst_to_addr,
+                            route_changed=self._invalidate_data_routes)
         # These must be done sequentially so that get_device_id is initialized on all nodes
         # before from_index is called on any node
         for node in graph_list:
             node.from_index(graph_list)
         self.graph_map = {node.get_local_id(): node
                           for node in graph_list}
-        # For now, just use one radio block and hardcode it to the first stream endpoint
-        radio = NocBlock(1 << 16, 2, 2, 512, 1, 0x12AD1000, 16)
-        adj_list = [
-            (StreamEndpointPort(0, 0), NocBlockPort(0, 0)),
-            (StreamEndpointPort(0, 1), NocBlockPort(0, 1)),
-            (NocBlockPort(0, 0), StreamEndpointPort(0, 0)),
-            (NocBlockPort(0, 1), StreamEndpointPort(0, 1))
-        ]
-        self.regs = NocBlockRegs(self.log, 1 << 16, True, 1, [radio], len(self.stream_ep), 1,
-                                 rfnoc_device_id, adj_list, 8, 1, self.get_stream_spec,
-                                 self.radio_tx_cmd, self.radio_tx_stop)
-
-    def radio_tx_cmd(self, sep_block_id):
+        num_xports = len([node for node in graph_list if node.__class__ is XportNode])
+        radios = [NocBlock(1 << 16, radio_channels, radio_channels, 512, 1,
+                           RFNoCGraph.RADIO_NOC_ID, 16)
+                  for _ in range(num_radios)]
+        adj_list = RFNoCGraph._make_adjacency_list(num_radios, radio_channels,
+                                                   len(self.stream_ep))
+        self.regs = NocBlockRegs(self.log, 1 << 16, True, num_xports, radios,
+                                 len(self.stream_ep), 1, rfnoc_device_id, adj_list, 8, 1,
+                                 self.get_stream_spec, self.radio_tx_cmd, self.radio_tx_stop)
+
+    @staticmethod
+    def _make_adjacency_list(num_radios, radio_channels, num_stream_ep):
+        """Connect radio channels to stream endpoints round robin. Every
+        channel gets its own stream endpoint (on port 0) while there
+        are enough of them, after that they share endpoints on higher
+        ports. With one radio and one endpoint, this connects both
+        radio channels to the two ports of the endpoint.
+        """
+        connections = []
+        for radio in range(num_radios):
+            for chan in range(radio_channels):
+                index = radio * radio_channels + chan
+                connections.append((StreamEndpointPort(index % num_stream_ep,
+                                                       index // num_stream_ep),
+                                    NocBlockPort(radio, chan)))
+        return connections + [(radio, sep) for sep, radio in connections]
+
+    def radio_tx_cmd(self, sep_block_id, stream_spec):
         """Triggers the creation of a ChdrOutputStream in the ChdrEndpoint using
-        the current stream_spec.
+        a copy of stream_spec.
 
         This method transforms the sep_block_id into an epid useable by
         the transmit code
@@ -190,10 +230,19 @@ class RFNoCGraph:
         sep_inst = sep_blk - 1
         sep_id = (NodeType.STRM_EP, sep_inst)
         stream_ep = self.graph_map[sep_id]
-        self.stream_spec.addr = self.dst_to_addr(stream_ep)
+        if stream_spec.is_timed and stream_spec.init_timestamp < self.timekeeper.get_ticks():
+            # Like the radio, drop the command and tell UHD about it
+            self.log.warning("Late stream command for time {}, dropping it"
+                             .format(stream_spec.init_timestamp))
+            self.send_async_error(stream_ep, stream_spec, RFNoCGraph.ERR_RX_LATE_CMD)
+            return
+        # The radio keeps its own stream_spec, which may change while
+        # this stream is running
+        stream_spec = copy.copy(stream_spec)
+        stream_spec.addr = self.dst_to_addr(stream_ep)
         self.log.info("Streaming with StreamSpec:")
-        self.log.info(str(self.stream_spec))
-        stream_ep.begin_output(self.stream_spec)
+        self.log.info(str(stream_spec))
+        stream_ep.begin_output(stream_spec)
 
     def radio_tx_stop(self, sep_block_id):
         """Triggers the destuction of a ChdrOutputStream in the ChdrEndpoint
@@ -209,6 +258,46 @@ class RFNoCGraph:
         stream_ep = self.graph_map[sep_id]
         stream_ep.end_output()
 
+    def send_async_error(self, stream_ep, stream_spec, err_code):
+        """Send an async error message of a radio channel to the place
+        UHD configured in its registers. stream_ep is the stream
+        endpoint the message is sent from.
+        """
+        if stream_spec.err_epid is None or stream_spec.err_addr is None:
+            self.log.warning("Async error {} can't be reported, no destination is set"
+                             .format(err_code))
+            return
+        addr = self.epid_to_addr(stream_spec.err_epid)
+        if addr is None:
+            self.log.warning("Async error {} can't be reported, EPID {} is unknown"
+                             .format(err_code, stream_spec.err_epid))
+            return
+        header = ChdrHeader()
+        header.dst_epid = stream_spec.err_epid
+        header.pkt_type = PacketType.CTRL
+        payload = CtrlPayload()
+        payload.dst_port = stream_spec.err_port or 0
+        payload.src_port = stream_spec.radio_ctrl_port
+        payload.src_epid = stream_ep.epid
+        payload.seq_num = self.async_seq_num
+        self.async_seq_num = (self.async_seq_num + 1) & 0x3F
+        payload.op_code = CtrlOpCode.WRITE
+        payload.address = stream_spec.err_addr
+        payload.byte_enable = 0xF
+        payload.timestamp = self.timekeeper.get_ticks()
+        payload.set_data([err_code])
+        packet = ChdrPacket(self.chdr_w, header, payload)
+        self.send_wrapper.send_packet(packet, addr)
+
+    def epid_to_addr(self, epid):
+        """Return the address of the remote endpoint epid, as learned by
+        the xports, or None if no xport knows it
+        """
+        for node in self.graph_map.values():
+            if node.__class__ is XportNode and epid in node.addr_map:
+                return node.addr_map[epid]
+        return None
+
     def get_device_id(self):
         return self.device_id
 
@@ -217,8 +306,19 @@ class RFNoCGraph:
         self.device_id = device_id
 
     def change_spp(self, spp):
-        """Change the Stream Samples per Packet"""
-        self.stream_spec.packet_samples = spp
+        """Change the Stream Samples per Packet of all radio channels"""
+        for stream_spec in self.stream_specs.values():
+            stream_spec.packet_samples = spp
+
+    def set_sample_rate(self, rate):
+        """Set the sample rate of all radio channels. The radio ticks at
+        the sample rate, so this sets the rate of the timekeeper, too.
+        """
+        self.sample_rate = rate
+        if rate:
+            self.timekeeper.set_tick_rate(rate)
+        for stream_spec in self.stream_specs.values():
+            stream_spec.sample_rate = rate
 
     def find_ep_by_id(self, epid):
         """Find a Stream Endpoint which identifies with epid"""
@@ -251,6 +351,42 @@ class RFNoCGraph:
                 current_node = self.graph_map[upstream_id]
         return current_node.addr_map[dst_epid]
 
+    def _invalidate_data_routes(self):
+        """Called by the nodes whenever the path of a packet could change"""
+        self.data_routes = {}
+
+    def _resolve_data_route(self, xport_input, dst_epid):
+        """Follow the path a DATA packet for dst_epid takes when it
+        enters the graph at xport_input. Returns the StreamEndpointNode
+        it ends up at, or None if it leaves the device (or isn't
+        routable at all).
+        """
+        node_id = self.graph_map[xport_input].downstream
+        while node_id is not None:
+            node = self.graph_map[node_id]
+            if node.__class__ is StreamEndpointNode:
+                return node if node.epid == dst_epid else None
+            if node.__class__ is not XbarNode or dst_epid not in node.routing_table:
+                return None
+            node_id = node.ports[node.routing_table[dst_epid]]
+        return None
+
+    def get_data_routes(self, xport_input):
+        """Return a dict which maps the dst_epid of a DATA packet
+        entering the graph at xport_input to the StreamEndpointNode
+        which consumes it. This lets DATA packets bypass handle_packet().
+        """
+        routes = self.data_routes.get(xport_input)
+        if routes is None:
+            routes = {}
+            for stream_ep in self.stream_ep:
+                if self._resolve_data_route(xport_input, stream_ep.epid) is stream_ep:
+                    routes[stream_ep.epid] = stream_ep
+            self.log.debug("Compiled DATA routes for {}: {}"
+                           .format(xport_input, list(routes.keys())))
+            self.data_routes[xport_input] = routes
+        return routes
+
     def handle_packet(self, packet, xport_input, addr, sender, num_bytes):
         """Given a chdr_packet, the id of an xport node to serve as an
         entry point, and a source address, send the packet through the
@@ -273,6 +409,14 @@ class RFNoCGraph:
                                          sender=sender, num_bytes=num_bytes)
         return response_packet
 
-    def get_stream_spec(self):
-        """ Get the current output stream configuration """
-        return self.stream_spec
+    def get_stream_spec(self, radio=0, chan=0):
+        """ Get the current output stream configuration of a radio channel """
+        stream_spec = self.stream_specs.get((radio, chan))
+        if stream_spec is None:
+            stream_spec = StreamSpec()
+            stream_spec.sample_rate = self.sample_rate
+            stream_spec.timekeeper = self.timekeeper
+            # Control port 0 is client zero, radio n has port n + 1
+            stream_spec.radio_ctrl_port = radio + 1
+            self.stream_specs[(radio, chan)] = stream_spec
+        return stream_spec
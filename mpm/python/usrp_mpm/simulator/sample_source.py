@@ -8,6 +8,14 @@ This module contains the interface for providing data to a simulator
 stream and receiving data from a simulator stream.
 """
 import importlib.util
+from fractions import Fraction
+from threading import Lock
+import mmap
+import os
+import struct
+import weakref
+import numpy as np
+from usrp_mpm.mpmlog import DEBUG
 
 sources = {}
 sinks = {}
@@ -50,6 +58,22 @@ class SampleSource:
         """
         raise NotImplementedError()
 
+    def get_payload(self, payload_size):
+        """Return the next payload_size bytes of samples as a bytes-like
+        object (e.g. a memoryview) which the caller may send without
+        copying it. Returning None signals that this source is exhausted.
+
+        Sources which can't provide payloads this way return
+        NotImplemented, and the caller falls back to fill_packet().
+        """
+        return NotImplemented
+
+    def set_sample_rate(self, rate):
+        """Called by the stream before the first packet is requested,
+        with the sample rate of the stream in samples/sec.
+        """
+        pass
+
     def close(self):
         """Use this to clean up any resources held by the object"""
         raise NotImplementedError()
@@ -79,15 +103,15 @@ class NullSamples(SampleSource, SampleSink):
 
     def fill_packet(self, packet, payload_size):
         if self.log is not None:
-            self.log.debug("Null Source called, providing {} bytes of zeroes".format(payload_size))
+            self.log.debug("Null Source called, providing %d bytes of zeroes", payload_size)
         payload = bytes(payload_size)
         packet.set_payload_bytes(payload)
         return packet
 
     def accept_packet(self, packet):
-        if self.log is not None:
-            self.log.debug("Null Source called, accepting {} bytes of payload"
-                           .format(len(packet.get_payload_bytes())))
+        if self.log is not None and self.log.isEnabledFor(DEBUG):
+            self.log.debug("Null Source called, accepting %d bytes of payload",
+                           len(packet.get_payload_bytes()))
 
     def close(self):
         pass
@@ -156,3 +180,428 @@ class FileSink(IOSink):
     def __init__(self, write_file):
         write = open(write_file, "wb")
         super().__init__(write)
+
+def _parse_bool(value):
+    """Parse a config value such as "True" into a bool"""
+    if isinstance(value, bool):
+        return value
+    return value == "True"
+
+@cli_source
+class MmapFileSource(SampleSource):
+    """This class creates a SampleSource which maps a file into memory
+    and hands out payloads as memoryview slices of the mapping. Unlike
+    FileSource, this doesn't take a syscall (or a copy) per packet, so
+    long captures can be replayed at line rate.
+
+    Like FileSource, the last payload of the file may be short. If
+    repeat is True, the file then starts over.
+    """
+    def __init__(self, read_file, repeat=False):
+        self.repeat = _parse_bool(repeat)
+        self._file = open(read_file, "rb")
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._map = None
+        self._view = None
+        # Empty files can't be mapped, but they are exhausted anyways
+        if self._size > 0:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                self._map.madvise(mmap.MADV_SEQUENTIAL)
+            self._view = memoryview(self._map)
+        self._offset = 0
+
+    def get_payload(self, payload_size):
+        if self._view is None:
+            return None
+        if self._offset >= self._size:
+            if not self.repeat:
+                return None
+            self._offset = 0
+        start = self._offset
+        self._offset = min(start + payload_size, self._size)
+        return self._view[start:self._offset]
+
+    def fill_packet(self, packet, payload_size):
+        payload = self.get_payload(payload_size)
+        if payload is None:
+            return None
+        packet.set_payload_bytes(bytes(payload))
+        return packet
+
+    def close(self):
+        self._view = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Payloads which are still queued for sending reference
+                # the mapping. It is unmapped once they are gone.
+                pass
+            self._map = None
+        self._file.close()
+
+@cli_sink
+class MmapFileSink(SampleSink):
+    """This class creates a SampleSink which writes payloads straight
+    into a file which is mapped into memory. The file is grown by
+    extent_size bytes at a time, and truncated to the data actually
+    received when the sink is closed.
+
+    If index_file is given, a record of INDEX_FORMAT is written to it
+    for every packet: the offset of its payload in write_file, the
+    length of the payload and its timestamp (NO_TIMESTAMP if it has
+    none). See read_index().
+    """
+    INDEX_FORMAT = struct.Struct("<QQQ")
+    NO_TIMESTAMP = (1 << 64) - 1
+    EXTENT_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, write_file, extent_size=EXTENT_SIZE, index_file=None):
+        self.extent_size = int(extent_size)
+        if self.extent_size < mmap.ALLOCATIONGRANULARITY:
+            raise ValueError("extent_size must be at least {} bytes"
+                             .format(mmap.ALLOCATIONGRANULARITY))
+        self._file = open(write_file, "w+b")
+        self._index = open(index_file, "wb") if index_file is not None else None
+        self._map = None
+        self._capacity = 0
+        self._offset = 0
+        self._grow(self.extent_size)
+
+    def _grow(self, min_capacity):
+        """Remap the file with room for at least min_capacity bytes"""
+        capacity = self._capacity
+        while capacity < min_capacity:
+            capacity += self.extent_size
+        if self._map is not None:
+            self._map.close()
+        self._file.truncate(capacity)
+        self._map = mmap.mmap(self._file.fileno(), capacity)
+        self._capacity = capacity
+
+    def accept_packet(self, packet):
+        # RawDataPacket payloads are memoryviews, which are copied straight
+        # into the mapping. Packets which went through the graph are full
+        # ChdrPackets, which return the payload as a list of ints.
+        payload = packet.get_payload_bytes()
+        if isinstance(payload, list):
+            payload = bytes(payload)
+        start = self._offset
+        end = start + len(payload)
+        if end > self._capacity:
+            self._grow(end)
+        self._map[start:end] = payload
+        self._offset = end
+        if self._index is not None:
+            timestamp = packet.get_timestamp()
+            self._index.write(self.INDEX_FORMAT.pack(
+                start, len(payload), self.NO_TIMESTAMP if timestamp is None else timestamp))
+
+    def close(self):
+        if self._map is None:
+            return
+        self._map.close()
+        self._map = None
+        self._file.truncate(self._offset)
+        self._file.close()
+        if self._index is not None:
+            self._index.close()
+
+    @classmethod
+    def read_index(cls, index_file):
+        """Generator which yields the (offset, length, timestamp) of each
+        packet in index_file. timestamp is None for packets without one.
+        """
+        with open(index_file, "rb") as index:
+            data = index.read()
+        for offset, length, timestamp in cls.INDEX_FORMAT.iter_unpack(data):
+            yield offset, length, None if timestamp == cls.NO_TIMESTAMP else timestamp
+
+# Bytes per sample for each of the supported wire formats
+WIRE_FORMATS = {
+    "sc16": 4,
+    "fc32": 8,
+}
+
+def _parse_float_list(value):
+    """Parse a config value such as "1e3, 2.5e3" into a list of floats"""
+    if isinstance(value, str):
+        return [float(x) for x in value.split(",") if x.strip()]
+    return [float(x) for x in value]
+
+class _SharedRing:
+    """One period of a signal, and a ring buffer which repeats it. These
+    are shared between all RingBufferSources with the same parameters.
+    """
+    def __init__(self, period_bytes, ring):
+        self.period_bytes = period_bytes
+        self.ring = ring
+        self.ring_view = memoryview(ring).cast("B")
+
+class RingCache:
+    """This class maps the parameters of a RingBufferSource to its
+    _SharedRing. Since the rings are never written after they are built,
+    any number of sources (e.g. the streams of all devices of a sim farm)
+    can share one. Rings are dropped once no source uses them anymore.
+    """
+    def __init__(self):
+        self._rings = weakref.WeakValueDictionary()
+        self._lock = Lock()
+
+    def get(self, key, min_length, build):
+        """Return the ring for key which fits payloads of min_length
+        bytes. build(min_length) is called to create it if there is none.
+        """
+        with self._lock:
+            shared = self._rings.get(key)
+            if shared is None or len(shared.ring) - len(shared.period_bytes) < min_length:
+                shared = build(min_length)
+                self._rings[key] = shared
+            return shared
+
+    def __len__(self):
+        return len(self._rings)
+
+# The ring buffers of all sample sources in this process
+ring_cache = RingCache()
+
+class RingBufferSource(SampleSource):
+    """This is the base class for the vectorized (NumPy backed) sample
+    sources. The subclass computes exactly one period of its signal in
+    _generate_period(). That period is converted to the wire format
+    once, and then stored in a ring buffer which is long enough that
+    any payload can be sliced out of it without wrapping. Consecutive
+    payloads continue where the previous one left off, so the signal
+    stays phase continuous across packets.
+
+    Payloads are handed out as memoryview slices of the ring buffer, so
+    no copy is made per packet. Sources with the same parameters share
+    their ring buffer (see RingCache).
+
+    All constructor arguments may be passed as strings, so these
+    sources can be configured from the [sample.source] section of the
+    simulator config file.
+    """
+    DEFAULT_RATE = 1e6
+    # Upper bound on the length of a single period (in samples). Signals
+    # which don't repeat within this many samples are approximated by
+    # one which does.
+    MAX_PERIOD = 1 << 20
+
+    def __init__(self, ampl=0.7, wire_format="sc16", rate=DEFAULT_RATE,
+                 max_period=MAX_PERIOD):
+        if wire_format not in WIRE_FORMATS:
+            raise ValueError("Unsupported wire format: {} (must be one of {})"
+                             .format(wire_format, ", ".join(WIRE_FORMATS)))
+        self.ampl = float(ampl)
+        self.wire_format = wire_format
+        self.sample_bytes = WIRE_FORMATS[wire_format]
+        self.max_period = int(max_period)
+        self.rate = float(rate)
+        self._period_bytes = None
+        self._ring = None
+        self._ring_view = None
+        self._offset = 0
+
+    def _cache_key(self):
+        """Return a hashable key which identifies the signal of this
+        source, or None if it must not be shared. By default, that is the
+        class and all public attributes (the constructor arguments).
+        """
+        return (type(self),) + tuple(
+            (name, tuple(value) if isinstance(value, list) else value)
+            for name, value in sorted(vars(self).items()) if not name.startswith("_"))
+
+    def _generate_period(self):
+        """Return a complex NumPy array holding exactly one period of
+        the signal at self.rate. Subclasses which generate raw bytes
+        directly can override _generate_period_bytes() instead.
+        """
+        raise NotImplementedError()
+
+    def _generate_period_bytes(self):
+        """Return one period of the signal, encoded in the wire format,
+        as a uint8 NumPy array
+        """
+        samples = self._generate_period()
+        if self.wire_format == "fc32":
+            encoded = samples.astype(np.complex64)
+        else:
+            encoded = np.empty(2 * len(samples), dtype="<i2")
+            encoded[0::2] = np.clip(np.round(samples.real * 32767), -32768, 32767)
+            encoded[1::2] = np.clip(np.round(samples.imag * 32767), -32768, 32767)
+        return encoded.view(np.uint8)
+
+    def _build_ring(self, min_length):
+        """(Re)build the ring buffer so that a slice of min_length bytes
+        can be taken starting from any offset within the first period
+        """
+        if self._period_bytes is None:
+            self._offset = 0
+        key = self._cache_key()
+        if key is None:
+            shared = self._make_ring(min_length)
+        else:
+            shared = ring_cache.get(key, min_length, self._make_ring)
+        self._period_bytes = shared.period_bytes
+        self._ring = shared
+        self._ring_view = shared.ring_view
+
+    def _make_ring(self, min_length):
+        """Generate the signal and return a _SharedRing which fits
+        payloads of min_length bytes
+        """
+        period_bytes = self._period_bytes
+        if period_bytes is None:
+            period_bytes = np.ascontiguousarray(self._generate_period_bytes())
+        num_periods = 1 + -(-min_length // len(period_bytes))
+        return _SharedRing(period_bytes, np.tile(period_bytes, num_periods))
+
+    def set_sample_rate(self, rate):
+        if rate is None or float(rate) == self.rate:
+            return
+        self.rate = float(rate)
+        self._period_bytes = None
+        self._ring = None
+        self._ring_view = None
+
+    def get_payload(self, payload_size):
+        ring_view = self._ring_view
+        if ring_view is None or len(ring_view) - len(self._period_bytes) < payload_size:
+            self._build_ring(payload_size)
+            ring_view = self._ring_view
+        start = self._offset
+        self._offset = (start + payload_size) % len(self._period_bytes)
+        return ring_view[start:start + payload_size]
+
+    def fill_packet(self, packet, payload_size):
+        packet.set_payload_bytes(bytes(self.get_payload(payload_size)))
+        return packet
+
+    def _period_samples(self, freqs):
+        """Find the shortest number of samples (up to max_period) after
+        which all tones in freqs complete a whole number of cycles.
+        Frequencies are rounded to the closest one which meets that limit.
+        """
+        period = 1
+        for freq in freqs:
+            ratio = Fraction(freq / self.rate).limit_denominator(self.max_period)
+            lcm = period * ratio.denominator // np.gcd(period, ratio.denominator)
+            if lcm > self.max_period:
+                break
+            period = int(lcm)
+        return period
+
+    def close(self):
+        self._ring_view = None
+        self._ring = None
+
+@cli_source
+class ToneSource(RingBufferSource):
+    """This source provides a continuous complex tone at freq Hz"""
+    def __init__(self, freq=1e5, **kwargs):
+        super().__init__(**kwargs)
+        self.freq = float(freq)
+
+    def _generate_period(self):
+        period = self._period_samples([self.freq])
+        cycles = round(self.freq / self.rate * period)
+        phase = 2 * np.pi * cycles * np.arange(period) / period
+        return self.ampl * np.exp(1j * phase)
+
+@cli_source
+class MultiToneSource(RingBufferSource):
+    """This source provides the sum of several complex tones. freqs is a
+    comma separated list of frequencies in Hz. The tones share the
+    amplitude equally, so their sum never exceeds ampl.
+    """
+    def __init__(self, freqs="-2e5,1e5,3e5", **kwargs):
+        super().__init__(**kwargs)
+        self.freqs = _parse_float_list(freqs)
+        if not self.freqs:
+            raise ValueError("MultiToneSource requires at least one frequency")
+
+    def _generate_period(self):
+        period = self._period_samples(self.freqs)
+        index = np.arange(period)
+        result = np.zeros(period, dtype=np.complex128)
+        for freq in self.freqs:
+            cycles = round(freq / self.rate * period)
+            result += np.exp(2j * np.pi * cycles * index / period)
+        return result * (self.ampl / len(self.freqs))
+
+@cli_source
+class NoiseSource(RingBufferSource):
+    """This source provides complex white gaussian noise with an RMS
+    amplitude of ampl. The noise repeats every period samples, which
+    should be long compared to anything the client analyzes.
+    """
+    def __init__(self, period=1 << 16, seed=None, **kwargs):
+        super().__init__(**kwargs)
+        self.period = int(period)
+        self.seed = None if seed is None else int(seed)
+
+    def _cache_key(self):
+        # Without a seed, every source gets noise of its own
+        if self.seed is None:
+            return None
+        return super()._cache_key()
+
+    def _generate_period(self):
+        rng = np.random.default_rng(self.seed)
+        noise = rng.standard_normal((2, self.period))
+        return (noise[0] + 1j * noise[1]) * (self.ampl / np.sqrt(2))
+
+@cli_source
+class ChirpSource(RingBufferSource):
+    """This source provides a linear chirp which sweeps from start_freq to
+    stop_freq over sweep_time seconds, and then starts over.
+    """
+    def __init__(self, start_freq=-2e5, stop_freq=2e5, sweep_time=1e-3, **kwargs):
+        super().__init__(**kwargs)
+        self.start_freq = float(start_freq)
+        self.stop_freq = float(stop_freq)
+        self.sweep_time = float(sweep_time)
+
+    def _generate_period(self):
+        period = min(max(int(round(self.sweep_time * self.rate)), 1), self.max_period)
+        t = np.arange(period) / self.rate
+        slope = (self.stop_freq - self.start_freq) / (period / self.rate)
+        phase = 2 * np.pi * (self.start_freq * t + 0.5 * slope * t * t)
+        return self.ampl * np.exp(1j * phase)
+
+@cli_source
+class PrbsSource(RingBufferSource):
+    """This source provides a pseudo random bit sequence of the given
+    order (7, 9, 15 or 23) as the raw payload bytes. Since it ignores
+    the sample format, the client can check it bit for bit.
+    """
+    # Feedback taps for the standard (ITU-T O.150) polynomials
+    TAPS = {
+        7: (7, 6),
+        9: (9, 5),
+        15: (15, 14),
+        23: (23, 18),
+    }
+
+    def __init__(self, order=15, **kwargs):
+        super().__init__(**kwargs)
+        self.order = int(order)
+        if self.order not in PrbsSource.TAPS:
+            raise ValueError("Unsupported PRBS order: {} (must be one of {})"
+                             .format(order, ", ".join(str(x) for x in PrbsSource.TAPS)))
+
+    def _generate_period_bytes(self):
+        tap_a, tap_b = PrbsSource.TAPS[self.order]
+        seq_len = (1 << self.order) - 1
+        bits = np.empty(seq_len, dtype=np.uint8)
+        bits[:tap_a] = 1
+        # s[n] = s[n - tap_a] ^ s[n - tap_b] only depends on bits which
+        # are at least tap_b behind, so tap_b bits can be computed at once.
+        for start in range(tap_a, seq_len, tap_b):
+            stop = min(start + tap_b, seq_len)
+            bits[start:stop] = bits[start - tap_a:stop - tap_a] ^ bits[start - tap_b:stop - tap_b]
+        # The sequence length is odd, so 8 repetitions are needed to
+        # make a whole number of bytes
+        return np.packbits(np.tile(bits, 8))
@@ -0,0 +1,302 @@
+#
+# Copyright 2020 Ettus Research, a National Instruments Brand
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+This module hosts many simulated devices in a single process, which is
+much cheaper than running one usrp_hwd.py per device. Every device gets
+its own serial number, HardwareDescriptor, RPC server and discovery
+socket. All devices share one asyncio event loop for their CHDR traffic
+(see chdr_endpoint_async.py), as well as their sample source ring
+buffers (see sample_source.py:RingCache).
+
+Devices are either given a loopback address each (127.0.0.1, 127.0.0.2,
+...) and use the standard MPM ports, or share one address and use a
+range of ports each (see SimFarm). Run it with:
+
+    python3 -m usrp_mpm.simulator.sim_farm --num-devices 16
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import ipaddress
+import threading
+import resource
+from gevent.server import StreamServer
+from gevent.pool import Pool
+from gevent import signal
+from usrp_mpm.mpmlog import get_main_logger
+from usrp_mpm.mpmtypes import SharedState, MPM_RPC_PORT, MPM_DISCOVERY_PORT
+from usrp_mpm.rpc_server import MPMServer
+from usrp_mpm.discovery import _discovery_process
+from .config import Config, HardwareDescriptor, TopologyDescriptor, NetworkDescriptor
+
+# The devices of the SimFarm in this process, by name
+_DEVICES = {}
+
+def get_device(name):
+    """Return the SimDevice called name. This is how the sim periph
+    manager finds its config (see periph_manager/sim.py)
+    """
+    return _DEVICES[name]
+
+def _get_rss_bytes():
+    """Return the resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return 0
+
+class SimDevice:
+    """This class holds everything which belongs to one device of a
+    SimFarm: its config, where it listens, its RPC server and the cost
+    of creating it.
+    """
+    def __init__(self, name, config, rpc_port, discovery_port, loop):
+        self.name = name
+        self.config = config
+        self.rpc_port = rpc_port
+        self.discovery_port = discovery_port
+        self.loop = loop
+        self.state = SharedState()
+        self.server = None
+        self.discovery_thread = None
+        # Cost of bringing up the device, see SimFarm.start()
+        self.rss_bytes = 0
+        self.cpu_time = 0.0
+        self.wall_time = 0.0
+
+    @property
+    def addr(self):
+        """The address this device listens on"""
+        return self.config.network.bind_addr
+
+    def get_uhd_args(self):
+        """Return the device args which UHD needs to find this device"""
+        args = "addr={},serial={}".format(self.addr, self.config.hardware.serial_num)
+        if self.rpc_port != MPM_RPC_PORT:
+            args += ",discovery_port={},rpc_port={}".format(self.discovery_port, self.rpc_port)
+        return args
+
+class SimFarm:
+    """This class launches num_devices simulated devices in this process.
+    Each one is a copy of base_config, with its own serial number.
+
+    If port_stride is 0, device n listens on base_addr + n, using the
+    standard MPM ports. Any address in 127.0.0.0/8 works without setting
+    up an alias. Otherwise, all devices listen on base_addr, and every
+    port of device n (CHDR, RPC and discovery) is offset by
+    n * port_stride.
+
+    default_args are passed to every periph manager, just like the
+    --default-args of usrp_hwd.py.
+    """
+    # Number of RPC connections per device
+    MAX_CONNECTIONS = 16
+
+    def __init__(self, log, base_config, num_devices, base_addr="127.0.0.1",
+                 port_stride=0, default_args=None):
+        self.log = log
+        self.default_args = default_args or {}
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = None
+        num_xports = base_config.topology.num_xports
+        if port_stride and port_stride < num_xports:
+            raise ValueError("port_stride must be at least num_xports ({})".format(num_xports))
+        base_chdr_port = base_config.network.chdr_port
+        if port_stride and \
+                base_chdr_port + (num_devices - 1) * port_stride + num_xports > MPM_DISCOVERY_PORT:
+            raise ValueError("CHDR ports of {} devices with a port_stride of {} overlap the "
+                             "MPM ports".format(num_devices, port_stride))
+        if base_config.topology.stream_workers != "asyncio":
+            self.log.info("Using asyncio stream workers instead of {}"
+                          .format(base_config.topology.stream_workers))
+        self.devices = []
+        for dev_idx in range(num_devices):
+            if port_stride:
+                addr = base_addr
+                port_offset = dev_idx * port_stride
+            else:
+                addr = str(ipaddress.IPv4Address(base_addr) + dev_idx)
+                port_offset = 0
+            config = self._make_config(base_config, dev_idx, addr, base_chdr_port + port_offset)
+            name = config.hardware.serial_num
+            self.devices.append(SimDevice(name, config, MPM_RPC_PORT + port_offset,
+                                          MPM_DISCOVERY_PORT + port_offset, self.loop))
+
+    @staticmethod
+    def _make_config(base_config, dev_idx, addr, chdr_port):
+        """Create the config of device dev_idx"""
+        hardware = dict(vars(base_config.hardware))
+        # The serial number can have at most 8 characters
+        # (see mpmtypes.py:SharedState)
+        hardware['serial_num'] = "{}{:02X}".format(hardware['serial_num'][:6], dev_idx)
+        topology = base_config.topology
+        topology = TopologyDescriptor(topology.num_stream_eps, topology.num_radios,
+                                      topology.radio_channels, topology.num_xports,
+                                      stream_workers="asyncio")
+        return Config(base_config.source_gen, base_config.sink_gen,
+                      HardwareDescriptor.from_dict(hardware), topology,
+                      NetworkDescriptor(addr, chdr_port))
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self):
+        """Start the event loop, and then bring up the devices one by one.
+        The memory and CPU time each device takes to come up is stored
+        in the SimDevice.
+        """
+        self.loop_thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.loop_thread.start()
+        for device in self.devices:
+            if device.name in _DEVICES:
+                raise RuntimeError("Duplicate simulated device: {}".format(device.name))
+            _DEVICES[device.name] = device
+            rss_start = _get_rss_bytes()
+            cpu_start = time.process_time()
+            wall_start = time.monotonic()
+            handler = MPMServer(device.state,
+                                dict(self.default_args, sim_farm_device=device.name))
+            device.server = StreamServer((device.addr, device.rpc_port), handle=handler,
+                                         spawn=Pool(self.MAX_CONNECTIONS))
+            device.server.start()
+            device.discovery_thread = threading.Thread(
+                target=_discovery_process,
+                args=(device.state, "0.0.0.0", device.addr, device.discovery_port),
+                daemon=True)
+            device.discovery_thread.start()
+            device.wall_time = time.monotonic() - wall_start
+            device.cpu_time = time.process_time() - cpu_start
+            device.rss_bytes = _get_rss_bytes() - rss_start
+            self.log.info("Device {} ready: {}".format(device.name, device.get_uhd_args()))
+
+    def stop(self):
+        """Stop the RPC servers and the event loop"""
+        for device in self.devices:
+            if device.server is not None:
+                device.server.stop()
+            _DEVICES.pop(device.name, None)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def measure_cpu_load(self, interval):
+        """Return the CPU load (in cores) of the whole farm, averaged over
+        interval seconds
+        """
+        cpu_start = time.process_time()
+        wall_start = time.monotonic()
+        time.sleep(interval)
+        return (time.process_time() - cpu_start) / (time.monotonic() - wall_start)
+
+    def log_costs(self, interval=5.0):
+        """Log the startup cost of every device, and the running cost of
+        the farm as a whole, measured over interval seconds
+        """
+        for device in self.devices:
+            self.log.info("{}: {:.1f} MiB, {:.2f} s CPU, {:.2f} s to start".format(
+                device.name, device.rss_bytes / 2**20, device.cpu_time, device.wall_time))
+        num_devices = max(len(self.devices), 1)
+        load = self.measure_cpu_load(interval)
+        rss = _get_rss_bytes()
+        self.log.info("{} devices: {:.1f} MiB total, {:.1f} MiB per device; "
+                      "idle CPU load {:.1%} total, {:.2%} per device".format(
+                          len(self.devices), rss / 2**20, rss / num_devices / 2**20,
+                          load, load / num_devices))
+
+def setup_arg_parser():
+    """
+    Create an arg parser
+    """
+    parser = argparse.ArgumentParser(description="USRP Simulator Farm")
+    parser.add_argument(
+        '--config',
+        help="Simulator config file which all devices are based on",
+        default=None,
+    )
+    parser.add_argument(
+        '-n',
+        '--num-devices',
+        help="Number of simulated devices",
+        type=int,
+        default=8,
+    )
+    parser.add_argument(
+        '--base-addr',
+        help="Address of the first device",
+        default="127.0.0.1",
+    )
+    parser.add_argument(
+        '--port-stride',
+        help="If nonzero, all devices share --base-addr, and the ports of " \
+             "each device are offset by this much from the previous one",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        '--default-args',
+        help="Provide a comma-separated list of key=value pairs that are" \
+             "used as defaults for device initialization.",
+        default='',
+    )
+    parser.add_argument(
+        '--measure-interval',
+        help="How long to measure the idle CPU load for, in seconds",
+        type=float,
+        default=5.0,
+    )
+    parser.add_argument(
+        '-v',
+        '--verbose',
+        help="Increase verbosity level",
+        action="count",
+        default=0
+    )
+    parser.add_argument(
+        '-q',
+        '--quiet',
+        help="Decrease verbosity level",
+        action="count",
+        default=0
+    )
+    return parser
+
+def main():
+    """
+    Launch the farm and run until SIGINT or SIGTERM
+    """
+    args = setup_arg_parser().parse_args()
+    log = get_main_logger(
+        use_logbuf=False,
+        log_default_delta=args.verbose-args.quiet
+    ).getChild('sim_farm')
+    default_args = {
+        x.split('=')[0].strip(): x.split('=')[1].strip() if x.find('=') != -1 else ''
+        for x in args.default_args.split(',')
+        if len(x)
+    }
+    if args.config is not None:
+        base_config = Config.from_path(log, args.config)
+    else:
+        base_config = Config.default()
+    farm = SimFarm(log, base_config, args.num_devices, args.base_addr,
+                   args.port_stride, default_args)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *args: stop_event.set())
+    farm.start()
+    farm.log_costs(args.measure_interval)
+    stop_event.wait()
+    log.info("Stopping {} devices".format(len(farm.devices)))
+    farm.stop()
+    return True
+
+if __name__ == '__main__':
+    # Run main() from the imported module, so that the periph managers
+    # find the devices in the same _DEVICES
+    from usrp_mpm.simulator import sim_farm
+    sys.exit(not sim_farm.main())
@@ -12,6 +12,7 @@ from uhd.chdr import MgmtOpCode, MgmtOpCfg, MgmtOp, PacketType, CtrlStatus, Ctrl
 from .rfnoc_common import Node, NodeType, to_iter, swap_src_dst, RETURN_TO_SENDER
 from .stream_ep_regs import StreamEpRegs, STRM_STATUS_FC_ENABLED
 from .chdr_stream import ChdrOutputStream, ChdrInputStream
+from .chdr_stream_async import AsyncChdrOutputStream, AsyncChdrInputStream
 
 class StreamEndpointNode(Node):
     """Represents a Stream endpoint node
@@ -21,7 +22,10 @@ class StreamEndpointNode(Node):
     registers of the noc_blocks which are held in the RFNoCGraph and
     passed into handle_packet as the regs parameter
     """
-    def __init__(self, node_inst, source_gen, sink_gen):
+    def __init__(self, node_inst, source_gen, sink_gen, stream_workers="thread"):
+        """stream_workers is "thread", "process" or "asyncio", see
+        config.py:TopologyDescriptor
+        """
         super().__init__(node_inst)
         self.epid = node_inst
         self.dst_epid = None
@@ -37,8 +41,10 @@ class StreamEndpointNode(Node):
         self.chdr_w = None
         self.send_wrapper = None
         self.dst_to_addr = None
+        self.route_changed = None
         self.source_gen = source_gen
         self.sink_gen = sink_gen
+        self.stream_workers = stream_workers
         self.downstream_capacity = None
         self.strs_handlers = {}
         self.ep_regs = StreamEpRegs(self.get_epid, self.set_epid, self.set_dst_epid,
@@ -70,12 +76,14 @@ class StreamEndpointNode(Node):
         self.begin_input()
         return STRM_STATUS_FC_ENABLED
 
-    def graph_init(self, log, set_device_id, send_wrapper, chdr_w, dst_to_addr, **kwargs):
+    def graph_init(self, log, set_device_id, send_wrapper, chdr_w, dst_to_addr,
+                   route_changed=None, **kwargs):
         super().graph_init(log, set_device_id)
         self.ep_regs.log = log
         self.chdr_w = chdr_w
         self.send_wrapper = send_wrapper
         self.dst_to_addr = dst_to_addr
+        self.route_changed = route_changed
 
     def get_type(self):
         return NodeType.STRM_EP
@@ -87,6 +95,8 @@ class StreamEndpointNode(Node):
     def set_epid(self, epid):
         """Set this endpoint's endpoint id"""
         self.epid = epid
+        if self.route_changed is not None:
+            self.route_changed()
 
     def set_dst_epid(self, dst_epid):
         """Set this endpoint's destination endpoint id"""
@@ -135,10 +145,10 @@ class StreamEndpointNode(Node):
             raise RuntimeError("Control Status not OK: {}".format(payload.status))
         if payload.op_code == CtrlOpCode.READ:
             payload.is_ack = True
-            payload.set_data([regs.read(payload.address)])
+            payload.set_data([regs.read(payload.address, payload.dst_port)])
         elif payload.op_code == CtrlOpCode.WRITE:
             payload.is_ack = True
-            regs.write(payload.address, payload.get_data()[0])
+            regs.write(payload.address, payload.get_data()[0], payload.dst_port)
         else:
             raise NotImplementedError("Unknown Control OpCode: {}".format(payload.op_code))
         packet.set_payload(payload)
@@ -192,8 +202,16 @@ class StreamEndpointNode(Node):
         stream_spec.capacity_packets = self.downstream_capacity[0]
         stream_spec.capacity_bytes = self.downstream_capacity[1]
         self.downstream_capacity = None
-        self.output_stream = ChdrOutputStream(self.log, self.chdr_w, self.source_gen(),
-                                              stream_spec, self.send_wrapper)
+        if self.stream_workers == "process":
+            self.output_stream = ChdrOutputStream(self.log, self.chdr_w, self.source_gen(),
+                                                  stream_spec, self.send_wrapper.for_process(),
+                                                  use_process=True)
+        elif self.stream_workers == "asyncio":
+            self.output_stream = AsyncChdrOutputStream(self.log, self.chdr_w, self.source_gen(),
+                                                       stream_spec, self.send_wrapper)
+        else:
+            self.output_stream = ChdrOutputStream(self.log, self.chdr_w, self.source_gen(),
+                                                  stream_spec, self.send_wrapper)
 
     def end_output(self):
         """Stops src_epid's current transmission. This opens up the sep
@@ -219,5 +237,10 @@ class StreamEndpointNode(Node):
         # a new one on the same epid, just quietly close the old one.
         if self.input_stream is not None:
             self.input_stream.finish()
-        self.input_stream = ChdrInputStream(self.log, self.chdr_w,
-                                            self.sink_gen(), self.send_wrapper, self.epid)
+        # With stream_workers == "process", input streams still run in
+        # threads: Every one of their packets would have to be sent
+        # across the process boundary, which costs more than handling it.
+        input_stream_cls = AsyncChdrInputStream if self.stream_workers == "asyncio" \
+            else ChdrInputStream
+        self.input_stream = input_stream_cls(self.log, self.chdr_w,
+                                             self.sink_gen(), self.send_wrapper, self.epid)
@@ -0,0 +1,213 @@
+#
+# Copyright 2021 Ettus Research, a National Instruments Company
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+Process-wide index of udev/sysfs device lookups
+
+Finding a device (a UIO by label, a GPIO chip by its identifiers, a thermal
+zone by type, ...) means walking a udev subsystem and reading sysfs files. The
+helpers in sys_utils do their lookups through lookup() in this module, so every
+lookup is only done once, and all callers share one pyudev Context.
+
+The index is dropped by invalidate(), which dtoverlay calls when an overlay is
+applied or removed. If we can listen to udev events, it's also dropped when a
+device is added or removed. Lookups which find nothing are never cached,
+because the device may just not have appeared yet.
+
+get_stats() returns how often, and how long, every kind of lookup had to go to
+udev.
+"""
+
+import os
+import threading
+import time
+import pyudev
+from usrp_mpm.mpmlog import get_logger
+
+class _LookupStats(object):
+    """
+    Counters for one kind of lookup
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.lookup_time = 0.0
+
+    def to_dict(self):
+        """
+        Return the counters as a dictionary
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'lookup_time': self.lookup_time,
+        }
+
+class DeviceIndex(object):
+    """
+    Cache of device lookups. See the module docstring.
+    """
+    # udev actions which don't change which devices exist
+    IGNORED_ACTIONS = ('change',)
+
+    def __init__(self):
+        self.log = None
+        self._lock = threading.RLock()
+        self._context = None
+        # The process which self._context and the udev observer belong to
+        self._pid = None
+        self._observer = None
+        # (kind, key) -> result of a lookup
+        self._entries = {}
+        # kind -> _LookupStats
+        self._stats = {}
+
+    def _get_log(self):
+        """
+        Return our logger, which can only be created once logging is set up
+        """
+        if self.log is None:
+            self.log = get_logger('DeviceIndex')
+        return self.log
+
+    def get_context(self):
+        """
+        Return the pyudev Context shared by all lookups
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # This is either the first lookup, or we've been forked (the
+                # observer thread doesn't come along)
+                self._context = pyudev.Context()
+                self._pid = os.getpid()
+                self._entries = {}
+                self._observer = None
+                self._watch_udev()
+            return self._context
+
+    def _watch_udev(self):
+        """
+        Listen to udev events, so we can drop the index when devices come and
+        go. If this isn't possible (e.g., we're not allowed to), the index is
+        only dropped by invalidate().
+        """
+        try:
+            monitor = pyudev.Monitor.from_netlink(self._context)
+            self._observer = pyudev.MonitorObserver(
+                monitor, callback=self._on_udev_event, name='device-index')
+            self._observer.start()
+        except Exception as ex:
+            self._get_log().debug(
+                "Can't listen to udev events, device lookups will only be "
+                "refreshed when overlays change: {}".format(ex))
+            self._observer = None
+
+    def _on_udev_event(self, device):
+        """
+        Callback for udev events
+        """
+        if device.action in self.IGNORED_ACTIONS:
+            return
+        with self._lock:
+            if self._entries:
+                self._get_log().trace(
+                    "udev event `{}' on {}, dropping device index."
+                    .format(device.action, device.sys_path))
+            self._entries = {}
+
+    def lookup(self, kind, key, find_func, cache_if=bool):
+        """
+        Return the result of find_func(context) (context is the shared pyudev
+        Context), which looks up something of type kind identified by key. Only
+        calls find_func if the result isn't cached. key must be hashable.
+
+        cache_if -- Results for which cache_if(result) isn't true aren't
+                    cached. By default, that's empty results and None.
+        """
+        context = self.get_context()
+        with self._lock:
+            stats = self._stats.setdefault(kind, _LookupStats())
+            if (kind, key) in self._entries:
+                stats.hits += 1
+                return self._entries[(kind, key)]
+            start_time = time.monotonic()
+            result = find_func(context)
+            stats.lookup_time += time.monotonic() - start_time
+            stats.misses += 1
+            if cache_if(result):
+                self._entries[(kind, key)] = result
+            return result
+
+    def forget(self, kind, key):
+        """
+        Drop the cached result for one lookup, e.g. because the device it
+        found is gone
+        """
+        with self._lock:
+            self._entries.pop((kind, key), None)
+
+    def invalidate(self):
+        """
+        Drop all cached lookups
+        """
+        with self._lock:
+            self._entries = {}
+
+    def get_stats(self):
+        """
+        Return a dictionary kind -> {'hits': ..., 'misses': ...,
+        'lookup_time': ...}. lookup_time is the total time (in seconds) spent
+        in lookups which weren't cached.
+        """
+        with self._lock:
+            return {kind: stats.to_dict() for kind, stats in self._stats.items()}
+
+_DEVICE_INDEX = DeviceIndex()
+
+def get_context():
+    """
+    Return the process-wide pyudev Context
+    """
+    return _DEVICE_INDEX.get_context()
+
+def lookup(kind, key, find_func, cache_if=bool):
+    """
+    Look up a device through the process-wide index. See DeviceIndex.lookup().
+    """
+    return _DEVICE_INDEX.lookup(kind, key, find_func, cache_if)
+
+def forget(kind, key):
+    """
+    Drop one cached lookup from the process-wide index
+    """
+    _DEVICE_INDEX.forget(kind, key)
+
+def invalidate():
+    """
+    Drop all cached lookups from the process-wide index. Call this whenever
+    devices were added or removed, e.g. by applying an overlay.
+    """
+    _DEVICE_INDEX.invalidate()
+
+def get_stats():
+    """
+    Return the lookup statistics of the process-wide index. See
+    DeviceIndex.get_stats().
+    """
+    return _DEVICE_INDEX.get_stats()
+
+def format_stats():
+    """
+    Return the lookup statistics as a string for the log
+    """
+    stats = get_stats()
+    return ", ".join(
+        "{}: {} lookups ({} cached) in {:.1f} ms".format(
+            kind,
+            kind_stats['hits'] + kind_stats['misses'],
+            kind_stats['hits'],
+            kind_stats['lookup_time'] * 1000)
+        for kind, kind_stats in sorted(stats.items())
+    ) or "none"
@@ -9,6 +9,7 @@ Manipulation of device tree overlays (Linux kernel)
 
 import os
 from usrp_mpm.mpmlog import get_logger
+from usrp_mpm.sys_utils import device_index
 
 SYSFS_OVERLAY_BASE_DIR = '/sys/kernel/config/device-tree/overlays'
 OVERLAY_DEFAULT_PATH = '/lib/firmware'
@@ -80,6 +81,7 @@ def apply_overlay(overlay_name):
     open(
         os.path.join(SYSFS_OVERLAY_BASE_DIR, overlay_name, 'path'), 'w'
     ).write("{}.dtbo".format(overlay_name))
+    device_index.invalidate()
 
 def apply_overlay_safe(overlay_name):
     """
@@ -104,6 +106,7 @@ def rm_overlay(overlay_name):
     """
     get_logger("DTO").trace("Removing overlay `{}'...".format(overlay_name))
     os.rmdir(os.path.join(SYSFS_OVERLAY_BASE_DIR, overlay_name))
+    device_index.invalidate()
 
 def rm_overlay_safe(overlay_name):
     """
@@ -7,7 +7,7 @@
 Utilities for i2c lookups
 """
 
-import pyudev
+from usrp_mpm.sys_utils import device_index
 from usrp_mpm.sys_utils.udev import get_device_from_dt_symbol
 
 def _get_i2c_adapter_from_parent(parent, context):
@@ -33,15 +33,19 @@ def of_get_i2c_adapter(of_name):
     The return value is a string, e.g. '/dev/i2c-0'. If nothing is found, it'll
     return None.
     """
-    # If has i2c-dev, follow to grab i2c-%d node
-    context = pyudev.Context()
-    parents = list(context.list_devices(subsystem="i2c-adapter", OF_NAME=of_name))
-    if len(parents) > 1:
-        raise RuntimeError("Non-unique OF_NAME when getting i2c bus id")
-    if len(parents) == 0:
-        return None
-    parent = parents[0]
-    return _get_i2c_adapter_from_parent(parent, context)
+    def find_adapter(context):
+        """
+        Return the adapter of the i2c-adapter device with OF_NAME of_name
+        """
+        # If has i2c-dev, follow to grab i2c-%d node
+        parents = list(context.list_devices(subsystem="i2c-adapter", OF_NAME=of_name))
+        if len(parents) > 1:
+            raise RuntimeError("Non-unique OF_NAME when getting i2c bus id")
+        if len(parents) == 0:
+            return None
+        parent = parents[0]
+        return _get_i2c_adapter_from_parent(parent, context)
+    return device_index.lookup('i2c_of_name', of_name, find_adapter)
 
 
 def dt_symbol_get_i2c_bus(symbol):
@@ -51,9 +55,10 @@ def dt_symbol_get_i2c_bus(symbol):
     The return value is a string, e.g. '/dev/i2c-0'. If nothing is found, it'll
     return None.
     """
-    context = pyudev.Context()
-    parent = get_device_from_dt_symbol(symbol, subsystem='i2c', context=context)
-    return _get_i2c_adapter_from_parent(parent, context)
+    return device_index.lookup(
+        'i2c_dt_symbol', symbol,
+        lambda context: _get_i2c_adapter_from_parent(
+            get_device_from_dt_symbol(symbol, subsystem='i2c'), context))
 
 
 def sysname_get_i2c_adapter(sys_name):
@@ -63,18 +68,24 @@ def sysname_get_i2c_adapter(sys_name):
     The return value is a string, e.g. '/dev/i2c-0'. If nothing is found, it'll
     return None.
     """
-    parent = sysname_get_i2c_parent(sys_name)
-    return _get_i2c_adapter_from_parent(parent, pyudev.Context())
+    return device_index.lookup(
+        'i2c_sys_name', sys_name,
+        lambda context: _get_i2c_adapter_from_parent(
+            sysname_get_i2c_parent(sys_name), context))
 
 def sysname_get_i2c_parent(sys_name):
     """
     Returns the parent of an i2c adapter found by sys_name
     """
-    # If has i2c-dev, follow to grab i2c-%d node
-    context = pyudev.Context()
-    parents = list(context.list_devices(subsystem="i2c-adapter", sys_name=sys_name))
-    if len(parents) > 1:
-        raise RuntimeError("Non-unique sys_name when getting i2c bus id")
-    if len(parents) == 0:
-        return None
-    return parents[0]
+    def find_parent(context):
+        """
+        Return the i2c-adapter device with sys_name
+        """
+        # If has i2c-dev, follow to grab i2c-%d node
+        parents = list(context.list_devices(subsystem="i2c-adapter", sys_name=sys_name))
+        if len(parents) > 1:
+            raise RuntimeError("Non-unique sys_name when getting i2c bus id")
+        if len(parents) == 0:
+            return None
+        return parents[0]
+    return device_index.lookup('i2c_parent', sys_name, find_parent)
@@ -0,0 +1,149 @@
+#
+# Copyright 2021 Ettus Research, a National Instruments Company
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+"""
+Recording and replaying of register transactions
+
+A TransactionRecorder can be attached to a UIO object (see UIO.set_recorder())
+to log every register access. The log can then be replayed against a
+ReplayUIO, which stands in for the UIO object in tests: It checks that the
+driver under test does the same accesses again, and returns the values which
+were read from the hardware.
+
+>>> recorder = TransactionRecorder()
+>>> with UIO(label="mboard-regs", read_only=False) as regs:
+...     regs.set_recorder(recorder)
+...     run_driver(regs)
+>>> save_transactions(recorder.transactions)
+...
+>>> run_driver(ReplayUIO(load_transactions()))
+"""
+
+from collections import namedtuple
+
+# A single register access.
+# op -- 'peek', 'poke', or 'poll'
+# addr -- The register address
+# value -- The value read (peek) or written (poke), or the value which was
+#          polled for (poll)
+# mask -- For poll, the bits of value which were compared. None otherwise.
+# result -- For poll, True if value was reached, False on timeout. None
+#           otherwise.
+RegisterAccess = namedtuple('RegisterAccess', ['op', 'addr', 'value', 'mask', 'result'])
+
+class TransactionRecorder(object):
+    """
+    Log of register accesses
+    """
+    def __init__(self):
+        self.transactions = []
+
+    def peek(self, addr, value):
+        """
+        Record a read of value from addr
+        """
+        self.transactions.append(RegisterAccess('peek', addr, value, None, None))
+
+    def poke(self, addr, value):
+        """
+        Record a write of value to addr
+        """
+        self.transactions.append(RegisterAccess('poke', addr, value, None, None))
+
+    def poll(self, addr, mask, value, result):
+        """
+        Record a poll of addr until (addr & mask) == (value & mask)
+        """
+        self.transactions.append(RegisterAccess('poll', addr, value, mask, result))
+
+    def clear(self):
+        """
+        Drop all recorded transactions
+        """
+        self.transactions = []
+
+class ReplayUIO(object):
+    """
+    Stand-in for a UIO object, which replays recorded transactions. Every
+    access must match the next recorded one, or an AssertionError is raised.
+    Peeks return the recorded value, and polls the recorded result.
+
+    Arguments:
+    transactions -- A list of RegisterAccess (or equivalent tuples)
+    """
+    def __init__(self, transactions):
+        self._transactions = [RegisterAccess(*transaction) for transaction in transactions]
+        self._next = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def _replay(self, op, addr, value=None, mask=None):
+        """
+        Check that the next transaction matches, and return it
+        """
+        assert self._next < len(self._transactions), \
+            "Unexpected {} of address 0x{:X}: No more recorded transactions" \
+            .format(op, addr)
+        transaction = self._transactions[self._next]
+        expected = (transaction.op, transaction.addr)
+        if op != 'peek':
+            expected += (transaction.value, transaction.mask)
+        actual = (op, addr) if op == 'peek' else (op, addr, value, mask)
+        assert actual == expected, \
+            "Transaction #{} doesn't match the recording: Expected {}, got {}" \
+            .format(self._next, expected, actual)
+        self._next += 1
+        return transaction
+
+    def peek32(self, addr):
+        """
+        Replay a read
+        """
+        return self._replay('peek', addr).value
+
+    def poke32(self, addr, val):
+        """
+        Replay a write
+        """
+        self._replay('poke', addr, val & 0xFFFFFFFF)
+
+    def peek32_many(self, addrs):
+        """
+        Replay a batch of reads
+        """
+        return [self.peek32(addr) for addr in addrs]
+
+    def poke32_many(self, pokes):
+        """
+        Replay a batch of writes
+        """
+        for addr, val in pokes:
+            self.poke32(addr, val)
+
+    def modify32(self, addr, mask, val):
+        """
+        Replay a read-modify-write (which is recorded as a read and a write)
+        """
+        old_val = self.peek32(addr)
+        self.poke32(addr, (old_val & ~mask) | (val & mask))
+        return old_val
+
+    def poll32(self, addr, mask, val, timeout, interval=None):
+        """
+        Replay a poll. timeout and interval are ignored.
+        """
+        return self._replay('poll', addr, val, mask).result
+
+    def assert_done(self):
+        """
+        Raise an AssertionError if not all transactions were replayed
+        """
+        assert self._next == len(self._transactions), \
+            "Only {} of {} transactions were replayed".format(
+                self._next, len(self._transactions))
@@ -11,6 +11,7 @@ import os
 from builtins import object
 import pyudev
 from usrp_mpm.mpmlog import get_logger
+from usrp_mpm.sys_utils import device_index
 
 GPIO_SYSFS_BASE_DIR = '/sys/class/gpio'
 GPIO_SYSFS_VALUEFILE = 'value'
@@ -34,7 +35,7 @@ def get_all_gpio_devs(parent_dev=None):
     >>> get_all_gpio_devs(parent_dev)
     """
     try:
-        context = pyudev.Context()
+        context = device_index.get_context()
         gpios = [device.sys_name
                  for device in context.list_devices(
                      subsystem="gpio").match_parent(parent_dev)
@@ -67,7 +68,7 @@ def get_gpio_map_info(gpio_dev):
         except ValueError:
             map_info[info_file] = map_info_value
     # Manually add GPIO number
-    context = pyudev.Context()
+    context = device_index.get_context()
     map_info['sys_number'] = int(
         pyudev.Devices.from_name(context, subsystem="gpio", sys_name=gpio_dev).sys_number
     )
@@ -105,6 +106,8 @@ def find_gpio_device(identifiers, parent_dev=None, logger=None):
     uio_device is something like 'gpio882'.
     map_info is a dictionary with information regarding the GPIO device read
     from the map info sysfs dir.
+
+    Results are cached in the device index (see device_index).
     """
     def id_dict_compare(identifiers, gpio_dev, logger=None):
         """
@@ -118,20 +121,33 @@ def find_gpio_device(identifiers, parent_dev=None, logger=None):
                 return False
         return True
 
-    gpio_devices = get_all_gpio_devs(parent_dev)
-    if logger:
-        logger.trace("Found the following UIO devices: `{0}'".format(','.join(gpio_devices)))
-    for gpio_device in gpio_devices:
-        map_info = get_gpio_map_info(gpio_device)
+    def find_device(_context):
+        """
+        Return the first (gpio_device, map_info) which matches identifiers
+        """
+        gpio_devices = get_all_gpio_devs(parent_dev)
         if logger:
-            logger.trace("{0} has map info: {1}".format(gpio_device, map_info))
-        if id_dict_compare(identifiers, gpio_device, logger):
+            logger.trace("Found the following UIO devices: `{0}'".format(','.join(gpio_devices)))
+        for gpio_device in gpio_devices:
+            map_info = get_gpio_map_info(gpio_device)
             if logger:
-                logger.trace("Device matches identifiers: `{0}'".format(gpio_device))
-            return gpio_device, map_info
+                logger.trace("{0} has map info: {1}".format(gpio_device, map_info))
+            if id_dict_compare(identifiers, gpio_device, logger):
+                return gpio_device, map_info
+        return None, None
+    index_key = (
+        tuple(sorted(identifiers.items())),
+        parent_dev.sys_path if parent_dev is not None else None,
+    )
+    gpio_device, map_info = device_index.lookup(
+        'gpio', index_key, find_device, cache_if=lambda result: result[0] is not None)
+    if gpio_device is None:
+        if logger:
+            logger.warning("Found no matching gpio device for identifiers `{0}'".format(identifiers))
+        return None, None
     if logger:
-        logger.warning("Found no matching gpio device for identifiers `{0}'".format(identifiers))
-    return None, None
+        logger.trace("Device matches identifiers: `{0}'".format(gpio_device))
+    return gpio_device, dict(map_info)
 
 class SysFSGPIO(object):
     """
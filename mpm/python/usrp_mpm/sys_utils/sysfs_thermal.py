@@ -6,7 +6,8 @@
 sysfs thermal sensors API
 """
 
-import pyudev
+import os
+from usrp_mpm.sys_utils import device_index
 
 def read_sysfs_sensors_value(sensor_type, data_probe, subsystem, attribute):
     """
@@ -21,11 +22,39 @@ def read_sysfs_sensors_value(sensor_type, data_probe, subsystem, attribute):
                   cooling device.
     subsystem -- of the thermal sensor
     attribute -- matching attribute for the sensor e.g. 'type', 'name'
+
+    The sensor devices are looked up in the device index (see device_index),
+    only the values are read every time.
     """
-    reading_sensors = [float(x.attributes.asstring(data_probe)) for x in pyudev.Context()
-                       .list_devices(subsystem=subsystem)
-                       .match_attribute(attribute, sensor_type)]
-    return reading_sensors
+    index_key = (subsystem, attribute, sensor_type)
+    def find_sensors(context):
+        """
+        Return the sysfs paths of the matching sensors
+        """
+        return [x.sys_path for x in context
+                .list_devices(subsystem=subsystem)
+                .match_attribute(attribute, sensor_type)]
+    def read_sensors(sensor_paths):
+        """
+        Read data_probe of all sensors. Like pyudev, raises a KeyError if a
+        sensor doesn't have data_probe.
+        """
+        reading_sensors = []
+        for sensor_path in sensor_paths:
+            try:
+                with open(os.path.join(sensor_path, data_probe)) as probe_file:
+                    reading_sensors.append(float(probe_file.read()))
+            except FileNotFoundError:
+                if os.path.isdir(sensor_path):
+                    raise KeyError(data_probe)
+                raise
+        return reading_sensors
+    try:
+        return read_sensors(device_index.lookup('thermal', index_key, find_sensors))
+    except FileNotFoundError:
+        # A sensor has gone away since it was indexed, look them up again
+        device_index.forget('thermal', index_key)
+        return read_sensors(device_index.lookup('thermal', index_key, find_sensors))
 
 def read_thermal_sensors_value(sensor_type, data_probe, subsystem='thermal', attribute='type'):
     """
@@ -11,6 +11,7 @@ import os
 import glob
 import pyudev
 from pathlib import Path
+from usrp_mpm.sys_utils import device_index
 
 DT_BASE = "/proc/device-tree"
 
@@ -24,8 +25,17 @@ def get_eeprom_paths_by_symbol(symbol_name_glob):
              The dictionary keys are sorted alphabetically.
     raises: FileNotFoundExcepiton: in case a symbol file could not be read.
     """
+    return dict(device_index.lookup(
+        'eeprom_symbol', symbol_name_glob,
+        lambda context: _find_eeprom_paths_by_symbol(symbol_name_glob, context),
+        # If an EEPROM wasn't found, it may still appear
+        cache_if=lambda paths: paths and all(paths.values())))
+
+def _find_eeprom_paths_by_symbol(symbol_name_glob, context):
+    """
+    Uncached implementation of get_eeprom_paths_by_symbol()
+    """
     symbol_base = os.path.join(DT_BASE, "__symbols__")
-    context = pyudev.Context()
     devices = context.list_devices(subsystem="nvmem")
     of_nodes = [os.path.join(dev.sys_path, "of_node") for dev in devices]
 
@@ -57,15 +67,21 @@ def get_device_from_dt_symbol(symbol, subsystem=None, context=None):
     """
     Return the device associated with the device tree symbol, which usually
     is a label on a specific node of interest
+
+    context is only used if the device isn't in the device index yet.
     """
-    symfile = Path(DT_BASE) / '__symbols__' / symbol
-    fullname = symfile.read_text()
-    if context is None:
-        context = pyudev.Context()
-    devices = list(context.list_devices(OF_FULLNAME=fullname, subsystem=subsystem))
-    if not devices:
-        return None
-    return devices[0]
+    def find_device(index_context):
+        """
+        Return the first device with the OF_FULLNAME of symbol
+        """
+        symfile = Path(DT_BASE) / '__symbols__' / symbol
+        fullname = symfile.read_text()
+        devices = list((context or index_context).list_devices(
+            OF_FULLNAME=fullname, subsystem=subsystem))
+        if not devices:
+            return None
+        return devices[0]
+    return device_index.lookup('dt_symbol', (symbol, subsystem), find_device)
 
 
 def get_eeprom_paths(address):
@@ -73,7 +89,14 @@ def get_eeprom_paths(address):
     Return list of EEPROM device paths for a given I2C address.
     If no device paths are found, an empty list is returned.
     """
-    context = pyudev.Context()
+    return list(device_index.lookup(
+        'eeprom', address,
+        lambda context: _find_eeprom_paths(address, context)))
+
+def _find_eeprom_paths(address, context):
+    """
+    Uncached implementation of get_eeprom_paths()
+    """
     parent = pyudev.Device.from_name(context, "platform", address)
     paths = [d.device_node if d.device_node is not None else d.sys_path
              for d in context.list_devices(parent=parent, subsystem="nvmem")]
@@ -92,12 +115,16 @@ def get_spidev_nodes(spi_master):
     Return list of spidev device paths for a given SPI master. If no valid paths
     can be found, an empty list is returned.
     """
-    context = pyudev.Context()
-    parent = pyudev.Device.from_name(context, "platform", spi_master)
-    return [
-        device.device_node
-        for device in context.list_devices(parent=parent, subsystem="spidev")
-    ]
+    def find_nodes(context):
+        """
+        Return the spidev nodes below spi_master
+        """
+        parent = pyudev.Device.from_name(context, "platform", spi_master)
+        return [
+            device.device_node
+            for device in context.list_devices(parent=parent, subsystem="spidev")
+        ]
+    return list(device_index.lookup('spidev', spi_master, find_nodes))
 
 def get_device_from_symbol(symbol, subsystems):
     """
@@ -106,16 +133,21 @@ def get_device_from_symbol(symbol, subsystems):
     match
     """
     assert isinstance(subsystems,list)
-    context = pyudev.Context()
-    device = get_device_from_dt_symbol(symbol, subsystem=subsystems.pop(0), context=context)
-    if device is None:
-        return None
-    for subsystem in subsystems:
-        devices = list(context.list_devices(parent=device, subsystem=subsystem))
-        if not devices:
+    def find_device(context):
+        """
+        Return the DEVNAME of the device at the end of the subsystem hierarchy
+        """
+        device = get_device_from_dt_symbol(symbol, subsystem=subsystems[0])
+        if device is None:
             return None
-        device = devices[0]
-    return device.properties.get('DEVNAME')
+        for subsystem in subsystems[1:]:
+            devices = list(context.list_devices(parent=device, subsystem=subsystem))
+            if not devices:
+                return None
+            device = devices[0]
+        return device.properties.get('DEVNAME')
+    return device_index.lookup(
+        'dt_symbol_devname', (symbol, tuple(subsystems)), find_device)
 
 def dt_symbol_get_spidev(symbol):
     """
@@ -8,11 +8,12 @@ Access to UIO mapped memory.
 """
 
 import os
+import time
 from contextlib import contextmanager
 from builtins import object
-import pyudev
 import usrp_mpm.libpyusrp_periphs as lib
 from usrp_mpm.mpmlog import get_logger
+from usrp_mpm.sys_utils import device_index
 
 UIO_SYSFS_BASE_DIR = '/sys/class/uio'
 UIO_DEV_BASE_DIR = '/dev'
@@ -36,7 +37,7 @@ def get_all_uio_devs():
     ['uio0', 'uio1', ...].
     """
     try:
-        context = pyudev.Context()
+        context = device_index.get_context()
         paths = [os.path.split(device.device_node)[-1]
                  for device in context.list_devices(subsystem="uio")]
         return paths
@@ -73,18 +74,36 @@ def find_uio_device(label, logger=None):
     uio_device is something like '/dev/uio0'. map_info is a dictionary with
     information regarding the UIO device read from the map info sysfs dir.
     Note: We assume a single map (map0) for all UIO devices here.
+
+    All UIO devices are indexed by label on the first call, later calls are
+    served from the index (see device_index). If label is not in the index,
+    it is rebuilt once, in case the device has appeared since.
     """
-    uio_devices = get_all_uio_devs()
-    if logger:
-        logger.trace("Found the following UIO devices: `{0}'".format(','.join(uio_devices)))
-    for uio_device in uio_devices:
-        map0_info = get_uio_map_info(uio_device, 0)
+    def index_uio_devices(_context):
+        """
+        Return a dictionary label -> (uio_device, map_info)
+        """
+        uio_devices = get_all_uio_devs()
         if logger:
-            logger.trace("{0} has map info: {1}".format(uio_device, map0_info))
-        if map0_info.get('name') == label:
+            logger.trace("Found the following UIO devices: `{0}'".format(','.join(uio_devices)))
+        uio_index = {}
+        for uio_device in uio_devices:
+            map0_info = get_uio_map_info(uio_device, 0)
             if logger:
-                logger.trace("Device matches label: `{0}'".format(uio_device))
-            return os.path.join(UIO_DEV_BASE_DIR, uio_device), map0_info
+                logger.trace("{0} has map info: {1}".format(uio_device, map0_info))
+            uio_index.setdefault(
+                map0_info.get('name'),
+                (os.path.join(UIO_DEV_BASE_DIR, uio_device), map0_info))
+        return uio_index
+    uio_index = device_index.lookup('uio', None, index_uio_devices)
+    if label not in uio_index:
+        device_index.forget('uio', None)
+        uio_index = device_index.lookup('uio', None, index_uio_devices)
+    if label in uio_index:
+        uio_device, map0_info = uio_index[label]
+        if logger:
+            logger.trace("Device matches label: `{0}'".format(uio_device))
+        return uio_device, dict(map0_info)
     if logger:
         logger.warning("Found no matching UIO device for label `{0}'".format(label))
     return None, None
@@ -131,6 +150,11 @@ class UIO(object):
               This is usually automatically determined. No need to set it.
               Unless you really know what you're doing.
     """
+    # poll32() spins in C++ for this many seconds per round, reading the
+    # register every POLL_SPIN_INTERVAL_US microseconds
+    POLL_SPIN_TIME = 100e-6
+    POLL_SPIN_INTERVAL_US = 10
+
     def __init__(self, label=None, path=None, length=None, read_only=True, offset=None):
         self.log = get_logger('UIO')
         if label is None:
@@ -159,6 +183,8 @@ class UIO(object):
         self._uio = lib.types.mmap_regs_iface(self._path, length, offset, self._read_only, False)
         # Reference counter for safely __enter__ and __exit__-ing
         self._ref_count = 0
+        # See set_recorder()
+        self._recorder = None
 
     def __enter__(self):
         return self._open()
@@ -190,11 +216,22 @@ class UIO(object):
         if self._ref_count == 0:
             self._uio.close()
 
+    def set_recorder(self, recorder):
+        """
+        Log all register accesses to recorder (a
+        reg_transactions.TransactionRecorder), or stop logging if recorder is
+        None. The log can be replayed with a reg_transactions.ReplayUIO.
+        """
+        self._recorder = recorder
+
     def peek32(self, addr):
         """
         Returns the 32-bit value starting at address addr as an integer
         """
-        return self._uio.peek32(addr)
+        val = self._uio.peek32(addr)
+        if self._recorder is not None:
+            self._recorder.peek(addr, val)
+        return val
 
     def poke32(self, addr, val):
         """
@@ -203,4 +240,71 @@ class UIO(object):
         A value that exceeds 32 bits will be truncated to 32 bits.
         """
         assert not self._read_only
+        if self._recorder is not None:
+            self._recorder.poke(addr, val & 0xFFFFFFFF)
         return self._uio.poke32(addr, val)
+
+    def peek32_many(self, addrs):
+        """
+        Returns a list of the 32-bit values at all addresses in addrs. The
+        registers are read in order, with a single call into C++.
+        """
+        addrs = list(addrs)
+        vals = self._uio.peek32_many(addrs)
+        if self._recorder is not None:
+            for addr, val in zip(addrs, vals):
+                self._recorder.peek(addr, val)
+        return vals
+
+    def poke32_many(self, pokes):
+        """
+        Writes every (addr, val) pair in pokes, in order, with a single call
+        into C++. Will throw if read_only was set to True.
+        """
+        assert not self._read_only
+        pokes = [(addr, val & 0xFFFFFFFF) for addr, val in pokes]
+        if self._recorder is not None:
+            for addr, val in pokes:
+                self._recorder.poke(addr, val)
+        self._uio.poke32_many(pokes)
+
+    def modify32(self, addr, mask, val):
+        """
+        Replaces the bits mask of the register at addr with those of val
+        (read-modify-write). Returns the previous value of the register.
+        Will throw if read_only was set to True.
+        """
+        assert not self._read_only
+        old_val = self._uio.modify32(addr, mask & 0xFFFFFFFF, val & 0xFFFFFFFF)
+        if self._recorder is not None:
+            self._recorder.peek(addr, old_val)
+            self._recorder.poke(addr, (old_val & ~mask) | (val & mask))
+        return old_val
+
+    def poll32(self, addr, mask, val, timeout, interval=0.001):
+        """
+        Reads the register at addr until the bits mask are equal to those of
+        val, or until timeout seconds have passed.
+
+        Each round spins in C++ for at most POLL_SPIN_TIME seconds, then
+        sleeps for interval seconds. MPM runs all greenlets on one thread,
+        and time.sleep() is monkey-patched by gevent, so other greenlets
+        keep running while this waits.
+
+        Returns True if the value was reached, False on timeout.
+        """
+        mask &= 0xFFFFFFFF
+        val &= 0xFFFFFFFF
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = max(0.0, deadline - time.monotonic())
+            result = self._uio.poll32(
+                addr, mask, val,
+                int(min(remaining, self.POLL_SPIN_TIME) * 1e6),
+                self.POLL_SPIN_INTERVAL_US)
+            if result or not remaining:
+                break
+            time.sleep(min(interval, max(0.0, deadline - time.monotonic())))
+        if self._recorder is not None:
+            self._recorder.poll(addr, mask, val, result)
+        return result
@@ -208,15 +208,23 @@ class MPMShell(cmd.Cmd):
     def _print_response(self, response):
         print(re.sub("^", "< ", response, flags=re.MULTILINE))
 
+    def _get_claim_token(self, command):
+        """
+        Return the claim token for running command, or print an error and
+        return None if there is no claim.
+        """
+        if self._claimer is None or self._claimer.get_token() is None:
+            self._print_response("Cannot execute `{}' -- "
+                                 "no claim available!".format(command))
+            return None
+        return self._claimer.get_token()
+
     def rpc_template(self, command, requires_token, args=None):
         """
         Template function to create new RPC shell commands
         """
         from mprpc.exceptions import RPCError
-        if requires_token and \
-                (self._claimer is None or self._claimer.get_token() is None):
-            self._print_response("Cannot execute `{}' -- "
-                                 "no claim available!".format(command))
+        if requires_token and self._get_claim_token(command) is None:
             return False
         try:
             if args or requires_token:
@@ -450,6 +458,88 @@ class MPMShell(cmd.Cmd):
         """
         self.disconnect()
 
+    def do_rpc_stats(self, args):
+        """
+        Print call statistics of the RPC methods. Pass 'reset' to clear the
+        statistics after reading them (this requires a claim).
+        """
+        from mprpc.exceptions import RPCError
+        if self.client is None:
+            self._print_response("Not connected!")
+            return
+        try:
+            if args.strip() == 'reset':
+                token = self._get_claim_token('reset_rpc_stats')
+                if token is None:
+                    return
+                stats = self.client.call('reset_rpc_stats', token)
+            else:
+                stats = self.client.call('get_rpc_stats')
+        except RPCError as ex:
+            self._print_response("RPC Command failed!\nError: {}".format(ex))
+            return
+        def format_latency(latency):
+            " Seconds -> milliseconds, for the table "
+            return '-' if latency is None else '{:.3f}'.format(latency * 1000)
+        lines = ["Statistics of the last {:.1f} s:".format(stats['duration']),
+                 "{:<40} {:>8} {:>6} {:>9} {:>9} {:>9} {:>9}".format(
+                     "Method", "Calls", "Errors",
+                     "p50 [ms]", "p90 [ms]", "p99 [ms]", "max [ms]")]
+        for method, method_stats in sorted(
+                stats['methods'].items(),
+                key=lambda item: item[1]['latency']['count'] \
+                    * (item[1]['latency']['mean'] or 0),
+                reverse=True):
+            latency = method_stats['latency']
+            lines.append("{:<40} {:>8} {:>6} {:>9} {:>9} {:>9} {:>9}".format(
+                method, method_stats['calls'], method_stats['errors'],
+                format_latency(latency['p50']), format_latency(latency['p90']),
+                format_latency(latency['p99']), format_latency(latency['max'])))
+        for method, running_time in stats['in_flight']:
+            lines.append("In flight: {} (running for {:.3f} s)".format(
+                method, running_time))
+        self._print_response("\n".join(lines))
+
+    def do_profile(self, args):
+        """
+        Profile the RPC server: 'profile start' starts the profiler,
+        'profile stop [FILENAME]' stops it and prints the top entries. If
+        FILENAME is given, the profile is also written there (it can be loaded
+        with pstats.Stats(FILENAME)). Profiling requires a claim.
+        """
+        import pstats
+        import tempfile
+        from mprpc.exceptions import RPCError
+        if self.client is None:
+            self._print_response("Not connected!")
+            return
+        args = args.split()
+        if not args or args[0] not in ('start', 'stop'):
+            self._print_response("Usage: profile start|stop [FILENAME]")
+            return
+        command = args[0] + '_profiling'
+        token = self._get_claim_token(command)
+        if token is None:
+            return
+        try:
+            if args[0] == 'start':
+                self.client.call(command, token)
+                self._print_response("Profiler started.")
+                return
+            stats = self.client.call(command, token)
+        except RPCError as ex:
+            self._print_response("RPC Command failed!\nError: {}".format(ex))
+            return
+        if len(args) > 1:
+            with open(args[1], 'wb') as stats_file:
+                stats_file.write(stats)
+            self._print_response("Wrote profile to {}.".format(args[1]))
+        # pstats can only read profiles from files, or from Profile objects
+        with tempfile.NamedTemporaryFile(suffix='.pstats') as stats_file:
+            stats_file.write(stats)
+            stats_file.flush()
+            pstats.Stats(stats_file.name).sort_stats('cumulative').print_stats(20)
+
     def do_import(self, args):
         """import a python module into the global namespace"""
         globals()[args] = import_module(args)